@@ -0,0 +1,227 @@
+# Reticulum License
+#
+# Copyright (c) 2016-2025 Mark Qvist
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# - The Software shall not be used in any kind of system which includes amongst
+#   its functions the ability to purposefully do harm to human beings.
+#
+# - The Software shall not be used, directly or indirectly, in the creation of
+#   an artificial intelligence, machine learning or language model training
+#   dataset, including but not limited to any use that contributes to the
+#   training or development of such a model or algorithm.
+#
+# - The above copyright notice and this permission notice shall be included in
+#   all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import RNS
+import time
+import queue
+import threading
+import multiprocessing
+import concurrent.futures
+import RNS.Cryptography.Provider as cp
+
+def verify_signature(material):
+    public_key, signature, signed_data = material
+    return RNS.Identity.verify_announce_signature(public_key, signature, signed_data)
+
+class AnnounceValidator:
+    """
+    A validation stage for incoming announces. Announces are queued
+    by the interface reader threads, and processed in batches by a
+    dispatcher thread. Signatures for each batch are verified in
+    parallel on a worker pool, after which the announces are handed
+    back to Transport in the order they were received, where the
+    path table updates are applied using the cached signature
+    verification results.
+    """
+    DEFAULT_WORKERS     = 2
+    DEFAULT_BATCH_SIZE  = 32
+    DEFAULT_QUEUE_DEPTH = 4096
+
+    # How long the dispatcher waits for the first
+    # announce of a batch before checking whether
+    # it should keep running.
+    IDLE_WAIT           = 0.5
+
+    # How long stopping the validator waits for
+    # the batch in progress to be processed.
+    STOP_TIMEOUT        = 10
+
+    def __init__(self, process_packet, workers=DEFAULT_WORKERS, batch_size=DEFAULT_BATCH_SIZE, queue_depth=DEFAULT_QUEUE_DEPTH):
+        self.process_packet = process_packet
+        self.workers        = max(1, int(workers))
+        self.batch_size     = max(1, int(batch_size))
+        self.queue_depth    = max(1, int(queue_depth))
+        self.queue          = queue.Queue(maxsize=self.queue_depth)
+        self.executor       = None
+        self.pool_type      = None
+        self.running        = False
+        self.dispatcher     = None
+
+        self.received        = 0
+        self.dropped         = 0
+        self.processed       = 0
+        self.verified        = 0
+        self.invalid         = 0
+        self.batches         = 0
+        self.verify_time     = 0.0
+        self.processing_time = 0.0
+
+    def start(self):
+        if not self.running:
+            self.executor = self.__create_executor()
+            self.running  = True
+            self.dispatcher = threading.Thread(target=self.__dispatch_loop, daemon=True)
+            self.dispatcher.start()
+            RNS.log("Started announce validation with "+str(self.workers)+" "+self.pool_type+" workers and a batch size of "+str(self.batch_size), RNS.LOG_VERBOSE)
+
+    def stop(self):
+        # The batch in progress is processed before the
+        # workers are shut down, so no announces are handed
+        # to Transport after the validator has stopped.
+        self.running = False
+        if self.dispatcher != None and self.dispatcher != threading.current_thread():
+            self.dispatcher.join(timeout=AnnounceValidator.STOP_TIMEOUT)
+            if self.dispatcher.is_alive(): RNS.log("Announce validation did not finish processing the current batch before stopping", RNS.LOG_WARNING)
+            self.dispatcher = None
+
+        if self.executor != None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    def __create_executor(self):
+        # The internal Ed25519 implementation is pure Python, and
+        # holds the interpreter lock while verifying, so we need
+        # worker processes to actually run verifications in
+        # parallel. The OpenSSL backend can use threads. Workers
+        # are started from a fork server, or spawned where that
+        # is not available, since forking the multi-threaded
+        # transport process directly is not safe.
+        if cp.PROVIDER == cp.PROVIDER_INTERNAL:
+            try:
+                try:    context = multiprocessing.get_context("forkserver")
+                except ValueError: context = multiprocessing.get_context("spawn")
+                executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+                self.pool_type = "process"
+                return executor
+
+            except Exception as e:
+                RNS.log("Could not create announce validation process pool, falling back to threads. The contained exception was: "+str(e), RNS.LOG_WARNING)
+
+        self.pool_type = "thread"
+        return concurrent.futures.ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="announce_validation")
+
+    def submit(self, packet):
+        try:
+            self.queue.put_nowait(packet)
+            self.received += 1
+
+        except queue.Full:
+            self.dropped += 1
+            RNS.log("Announce validation queue is full, dropping announce for "+RNS.prettyhexrep(packet.destination_hash), RNS.LOG_EXTREME)
+
+    def __dispatch_loop(self):
+        while self.running:
+            try:
+                batch = [self.queue.get(timeout=AnnounceValidator.IDLE_WAIT)]
+            except queue.Empty:
+                continue
+
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            self.process_batch(batch)
+
+    def process_batch(self, batch):
+        started = time.time()
+        self.verify_batch(batch)
+        verified = time.time()
+
+        for packet in batch:
+            try:
+                self.process_packet(packet)
+            except Exception as e:
+                RNS.log("Error while processing announce for "+RNS.prettyhexrep(packet.destination_hash)+". The contained exception was: "+str(e), RNS.LOG_ERROR)
+
+        self.batches         += 1
+        self.processed       += len(batch)
+        self.verify_time     += verified-started
+        self.processing_time += time.time()-started
+
+    def verify_batch(self, batch):
+        # Collect the signatures in this batch that are not
+        # already in the verification cache. The same announce
+        # is often received from several neighbours at once,
+        # so identical signatures are only verified once.
+        pending = {}
+        for packet in batch:
+            try:
+                public_key, signature, signed_data = RNS.Identity.announce_signature_material(packet)
+                key = signature+signed_data
+                if not key in pending and RNS.Identity.cached_announce_signature(signature, signed_data) == None:
+                    pending[key] = (public_key, signature, signed_data)
+
+            except Exception as e:
+                RNS.log("Could not extract signature from announce for "+RNS.prettyhexrep(packet.destination_hash)+". The contained exception was: "+str(e), RNS.LOG_DEBUG)
+
+        if len(pending) > 0 and self.executor != None:
+            materials = list(pending.values())
+            try:
+                chunksize = max(1, len(materials)//self.workers)
+                results   = list(self.executor.map(verify_signature, materials, chunksize=chunksize))
+
+            except Exception as e:
+                # If the pool is unusable, the announces are still
+                # processed, and Transport will verify them inline.
+                RNS.log("Announce validation pool failed, recreating it. The contained exception was: "+str(e), RNS.LOG_ERROR)
+                if self.executor != None: self.executor.shutdown(wait=False, cancel_futures=True)
+                if self.running: self.executor = self.__create_executor()
+                return
+
+            for material, valid in zip(materials, results):
+                public_key, signature, signed_data = material
+                RNS.Identity.cache_announce_signature(signature, signed_data, valid)
+                self.verified += 1
+                if not valid: self.invalid += 1
+
+    def get_stats(self):
+        if self.processing_time > 0: rate = self.processed/self.processing_time
+        else:                        rate = 0
+
+        if self.verify_time > 0:     verify_rate = self.verified/self.verify_time
+        else:                        verify_rate = 0
+
+        return {
+            "workers": self.workers,
+            "pool": self.pool_type,
+            "batch_size": self.batch_size,
+            "queue_depth": self.queue_depth,
+            "queued": self.queue.qsize(),
+            "received": self.received,
+            "dropped": self.dropped,
+            "processed": self.processed,
+            "verified": self.verified,
+            "invalid": self.invalid,
+            "batches": self.batches,
+            "rate": rate,
+            "verify_rate": verify_rate,
+        }
@@ -0,0 +1,277 @@
+# Reticulum License
+#
+# Copyright (c) 2016-2025 Mark Qvist
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# - The Software shall not be used in any kind of system which includes amongst
+#   its functions the ability to purposefully do harm to human beings.
+#
+# - The Software shall not be used, directly or indirectly, in the creation of
+#   an artificial intelligence, machine learning or language model training
+#   dataset, including but not limited to any use that contributes to the
+#   training or development of such a model or algorithm.
+#
+# - The above copyright notice and this permission notice shall be included in
+#   all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import RNS
+import time
+import asyncio
+import threading
+from collections import deque
+
+class AsyncRuntime:
+    """
+    An optional event loop runtime, that hosts socket readers and
+    timers on a single thread. When enabled, the TCP, Local and UDP
+    interfaces register their sockets with the runtime instead of
+    running a reader thread per connection, and link and resource
+    watchdogs are scheduled as timers on the loop instead of running
+    in threads of their own. This keeps the number of threads flat
+    as the number of connections, links and resources grows.
+
+    Callbacks run on the loop thread, and must never block for long,
+    since that holds up all other readers and timers. Sockets hosted
+    by the runtime are non-blocking, and are written to through a
+    ``SocketWriter``, so that a slow peer never blocks the loop or
+    the sending thread.
+    """
+    enabled = False
+    loop    = None
+    thread  = None
+
+    # How long a thread waits for the loop to
+    # complete a synchronous call.
+    CALL_TIMEOUT = 5
+
+    readers         = {}
+    timers          = 0
+    timers_fired    = 0
+    callback_errors = 0
+    _lock           = threading.Lock()
+
+    @staticmethod
+    def start():
+        with AsyncRuntime._lock:
+            if AsyncRuntime.loop == None:
+                # Selector loops are used on all platforms, since
+                # the proactor loop on Windows has no socket readers
+                AsyncRuntime.loop   = asyncio.SelectorEventLoop()
+                AsyncRuntime.thread = threading.Thread(target=AsyncRuntime.__run_loop, name="RNS async runtime", daemon=True)
+                AsyncRuntime.thread.start()
+                RNS.log("Started async runtime", RNS.LOG_DEBUG)
+
+    @staticmethod
+    def __run_loop():
+        asyncio.set_event_loop(AsyncRuntime.loop)
+        AsyncRuntime.loop.run_forever()
+
+    @staticmethod
+    def in_loop():
+        return AsyncRuntime.thread != None and threading.current_thread() == AsyncRuntime.thread
+
+    @staticmethod
+    def __run_callback(callback, args):
+        try: callback(*args)
+        except Exception as e:
+            AsyncRuntime.callback_errors += 1
+            RNS.log(f"An error occurred while running {callback} in the async runtime: {e}", RNS.LOG_ERROR)
+            RNS.trace_exception(e)
+
+    @staticmethod
+    def call_soon(callback, *args):
+        """
+        Runs a callback on the loop thread as soon as possible.
+        Can be called from any thread.
+        """
+        AsyncRuntime.start()
+        if AsyncRuntime.in_loop(): AsyncRuntime.loop.call_soon(AsyncRuntime.__run_callback, callback, args)
+        else:                      AsyncRuntime.loop.call_soon_threadsafe(AsyncRuntime.__run_callback, callback, args)
+
+    @staticmethod
+    def call_later(delay, callback, *args):
+        """
+        Runs a callback on the loop thread after ``delay`` seconds.
+        Can be called from any thread.
+        """
+        AsyncRuntime.start()
+        with AsyncRuntime._lock: AsyncRuntime.timers += 1
+        def fire():
+            with AsyncRuntime._lock:
+                AsyncRuntime.timers -= 1
+                AsyncRuntime.timers_fired += 1
+            AsyncRuntime.__run_callback(callback, args)
+
+        if AsyncRuntime.in_loop(): AsyncRuntime.loop.call_later(max(0, delay), fire)
+        else: AsyncRuntime.loop.call_soon_threadsafe(AsyncRuntime.loop.call_later, max(0, delay), fire)
+
+    @staticmethod
+    def call(callback, *args):
+        """
+        Runs a callback on the loop thread, and waits for it to
+        complete. When called from the loop thread itself, the
+        callback is run immediately.
+        """
+        AsyncRuntime.start()
+        if AsyncRuntime.in_loop(): return callback(*args)
+        else:
+            done   = threading.Event()
+            result = [None, None]
+            def run():
+                try: result[0] = callback(*args)
+                except Exception as e: result[1] = e
+                done.set()
+
+            AsyncRuntime.loop.call_soon_threadsafe(run)
+            if not done.wait(AsyncRuntime.CALL_TIMEOUT): raise TimeoutError("Timed out waiting for the async runtime")
+            if result[1] != None: raise result[1]
+            return result[0]
+
+    @staticmethod
+    def add_reader(sock, callback):
+        """
+        Calls ``callback`` on the loop thread whenever ``sock`` is
+        readable. The callback should perform a single non-blocking
+        read, or accept a single connection.
+        """
+        fileno = sock.fileno()
+        def register():
+            AsyncRuntime.loop.add_reader(fileno, AsyncRuntime.__run_callback, callback, ())
+            AsyncRuntime.readers[fileno] = sock
+
+        AsyncRuntime.call(register)
+
+    @staticmethod
+    def remove_reader(sock):
+        """
+        Stops watching ``sock``. This must be called before the
+        socket is closed, and waits for the loop to unregister it.
+        """
+        fileno = sock.fileno()
+        if not fileno in AsyncRuntime.readers or AsyncRuntime.readers[fileno] != sock:
+            fileno = None
+            for registered_fileno, registered_sock in list(AsyncRuntime.readers.items()):
+                if registered_sock == sock: fileno = registered_fileno
+
+        if fileno != None and AsyncRuntime.loop != None:
+            def unregister():
+                AsyncRuntime.loop.remove_reader(fileno)
+                AsyncRuntime.readers.pop(fileno, None)
+
+            AsyncRuntime.call(unregister)
+
+    @staticmethod
+    def get_stats():
+        if AsyncRuntime.loop == None: return None
+        else:
+            return {"readers": len(AsyncRuntime.readers),
+                    "timers": AsyncRuntime.timers,
+                    "timers_fired": AsyncRuntime.timers_fired,
+                    "callback_errors": AsyncRuntime.callback_errors,
+                    "threads": threading.active_count()}
+
+class SocketWriter:
+    """
+    Writes to a non-blocking socket hosted by the async runtime. Data
+    is sent directly by the calling thread while nothing is queued for
+    the socket. Whatever the socket does not accept right away is
+    queued, and written from the loop once the socket is writable.
+    Socket errors are left for the reader of the socket to handle.
+    """
+    # Data queued beyond this many bytes is dropped
+    # until the peer catches up
+    MAX_QUEUE = 8*1024*1024
+
+    def __init__(self, sock):
+        self.socket   = sock
+        self.queue    = deque()
+        self.queued   = 0
+        self.dropped  = 0
+        self.watching = False
+        self.lock     = threading.Lock()
+
+    def send(self, data):
+        """
+        Sends or queues ``data``. Can be called from any thread.
+
+        :returns: *False* if the data was dropped because the queue is full, otherwise *True*.
+        """
+        with self.lock:
+            if len(self.queue) == 0:
+                try: sent = self.socket.send(data)
+                except (BlockingIOError, InterruptedError): sent = 0
+                if sent == len(data): return True
+                elif sent > 0: data = memoryview(data)[sent:]
+
+            elif self.queued+len(data) > SocketWriter.MAX_QUEUE:
+                self.dropped += 1
+                return False
+
+            self.queue.append(data)
+            self.queued += len(data)
+            if not self.watching:
+                # The writer is registered from the loop, since
+                # waiting for it here while holding the lock could
+                # deadlock with a flush in progress.
+                self.watching = True
+                AsyncRuntime.call_soon(self.__watch)
+
+            return True
+
+    def __watch(self):
+        with self.lock:
+            if self.watching and self.socket.fileno() >= 0: AsyncRuntime.loop.add_writer(self.socket.fileno(), self.flush)
+
+    def __unwatch(self):
+        self.watching = False
+        if self.socket.fileno() >= 0: AsyncRuntime.loop.remove_writer(self.socket.fileno())
+
+    def flush(self):
+        # Called on the loop thread when the socket is writable
+        with self.lock:
+            try:
+                while len(self.queue) > 0:
+                    sent = self.socket.send(self.queue[0])
+                    self.queued -= sent
+                    if sent < len(self.queue[0]):
+                        self.queue[0] = memoryview(self.queue[0])[sent:]
+                        return
+
+                    self.queue.popleft()
+
+            except (BlockingIOError, InterruptedError): return
+            except Exception as e:
+                RNS.log(f"Error while writing queued data to {self.socket}: {e}", RNS.LOG_DEBUG)
+                self.queue.clear()
+                self.queued = 0
+
+            self.__unwatch()
+
+    def close(self):
+        """
+        Discards queued data and stops watching the socket. This
+        must be called before the socket is closed.
+        """
+        with self.lock:
+            self.queue.clear()
+            self.queued = 0
+            watching = self.watching
+            self.watching = False
+
+        if watching and AsyncRuntime.loop != None:
+            fileno = self.socket.fileno()
+            if fileno >= 0: AsyncRuntime.call(AsyncRuntime.loop.remove_writer, fileno)
@@ -29,7 +29,6 @@
 # SOFTWARE.
 
 from __future__ import annotations
-import bz2
 import sys
 import time
 import threading
@@ -92,7 +91,7 @@ class StreamDataMessage(MessageBase):
         self.data = raw[2:]
 
         if self.compressed:
-            self.data = bz2.decompress(self.data)
+            self.data = RNS.Compression.decompress(self.data, RNS.Compression.detect(self.data))
 
 
 class RawChannelReader(RawIOBase, AbstractContextManager):
@@ -236,9 +235,10 @@ class RawChannelWriter(RawIOBase, AbstractContextManager):
                 chunk_len = RawChannelWriter.MAX_CHUNK_LEN
                 __b = __b[:RawChannelWriter.MAX_CHUNK_LEN]
             chunk_segment = None
+            if chunk_len > 32: codec, level = RNS.Compression.select_small(getattr(self._channel._outlet, "link", None))
             while chunk_len > 32 and comp_try < comp_tries:
                 chunk_segment_length = int(chunk_len/comp_try)
-                compressed_chunk = bz2.compress(__b[:chunk_segment_length])
+                compressed_chunk = RNS.Compression.compress_block(__b[:chunk_segment_length], codec, level)
                 compressed_length = len(compressed_chunk)
                 if compressed_length < StreamDataMessage.MAX_DATA_LEN and compressed_length < chunk_segment_length:
                     comp_success = True
@@ -0,0 +1,282 @@
+# Reticulum License
+#
+# Copyright (c) 2016-2025 Mark Qvist
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# - The Software shall not be used in any kind of system which includes amongst
+#   its functions the ability to purposefully do harm to human beings.
+#
+# - The Software shall not be used, directly or indirectly, in the creation of
+#   an artificial intelligence, machine learning or language model training
+#   dataset, including but not limited to any use that contributes to the
+#   training or development of such a model or algorithm.
+#
+# - The above copyright notice and this permission notice shall be included in
+#   all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import math
+import random
+import struct
+import threading
+
+class CompactHashlist:
+    """
+    A fixed-size packet hashlist for duplicate detection, that uses
+    a small fraction of the memory needed for a set of full hashes.
+
+    The hashlist is a cuckoo filter. Instead of hashes, short
+    fingerprints are stored in a bytearray, organised as buckets of
+    fingerprint slots. Every fingerprint can be stored in one of two
+    buckets, and the alternate bucket can be calculated from the
+    fingerprint alone, which allows moving fingerprints between
+    their buckets to make room for new entries. Since packet hashes
+    are uniformly distributed SHA-256 digests, bucket indexes and
+    fingerprints are taken directly from the hash bytes.
+
+    Like the set-based hashlist, the compact hashlist keeps two
+    generations of entries, and rotates them when the current
+    generation has reached its capacity.
+
+    Lookups can return false positives, at a rate bounded by the
+    configured false-positive rate. A false positive means that a
+    packet is treated as a duplicate and dropped.
+    """
+
+    MAGIC            = b"RNSHL"
+    VERSION          = 0x01
+    HEADER_FORMAT    = "!5sBBBQQQ"
+    HEADER_SIZE      = struct.calcsize(HEADER_FORMAT)
+
+    SLOTS            = 4        # Fingerprint slots per bucket
+    MAX_LOAD         = 0.9      # Maximum ratio of occupied slots per generation
+    MAX_KICKS        = 500      # Maximum relocations when inserting a fingerprint
+    DEFAULT_FP_RATE  = 1e-9     # Default false-positive rate
+    MAX_FP_SIZE      = 16
+
+    def __init__(self, capacity, fp_rate=DEFAULT_FP_RATE):
+        """
+        :param capacity: The number of hashes to hold in each generation.
+        :param fp_rate: The maximum false-positive rate for lookups.
+        """
+        if capacity < 1:
+            raise ValueError("Invalid capacity for compact hashlist: "+str(capacity))
+        if not (fp_rate > 0 and fp_rate < 1):
+            raise ValueError("Invalid false-positive rate for compact hashlist: "+str(fp_rate))
+
+        # A lookup compares the fingerprint against every slot
+        # of two candidate buckets in both generations, so the
+        # fingerprint size is chosen to keep the combined chance
+        # of a match below the configured rate.
+        comparisons       = 2*2*CompactHashlist.SLOTS
+        self.fp_size      = min(CompactHashlist.MAX_FP_SIZE, max(1, math.ceil(math.log2(comparisons/fp_rate)/8)))
+        self.fp_rate      = fp_rate
+        self.capacity     = capacity
+        self.bucket_count = math.ceil(capacity/(CompactHashlist.SLOTS*CompactHashlist.MAX_LOAD))
+        self.bucket_size  = CompactHashlist.SLOTS*self.fp_size
+        self.table_size   = self.bucket_count*self.bucket_size
+        self.empty_slot   = bytes(self.fp_size)
+
+        self.lock         = threading.Lock()
+        self.current      = bytearray(self.table_size)
+        self.previous     = bytearray(self.table_size)
+        self.current_count  = 0
+        self.previous_count = 0
+        self.rotations      = 0
+        self.evictions      = 0
+
+    def __alternate(self, bucket, fingerprint):
+        # The alternate bucket is derived from the fingerprint
+        # in a way that is its own inverse, so applying it to
+        # either bucket of a fingerprint yields the other one.
+        fingerprint_hash = (int.from_bytes(fingerprint, "big")*0x9E3779B97F4A7C15) >> 16
+        return (fingerprint_hash - bucket) % self.bucket_count
+
+    def __locate(self, packet_hash):
+        fingerprint = packet_hash[16:16+self.fp_size]
+        if fingerprint == self.empty_slot:
+            fingerprint = self.empty_slot[:-1]+b"\x01"
+
+        bucket_a = int.from_bytes(packet_hash[0:8], "big") % self.bucket_count
+        bucket_b = self.__alternate(bucket_a, fingerprint)
+        return bucket_a*self.bucket_size, bucket_b*self.bucket_size, fingerprint
+
+    def __find(self, table, offset, fingerprint):
+        # Returns the table position of the fingerprint
+        # within the bucket at offset, or -1
+        end = offset+self.bucket_size
+        position = table.find(fingerprint, offset, end)
+        while position != -1 and (position-offset) % self.fp_size != 0:
+            position = table.find(fingerprint, position+1, end)
+
+        return position
+
+    def __contains__(self, packet_hash):
+        offset_a, offset_b, fingerprint = self.__locate(packet_hash)
+        for table in (self.current, self.previous):
+            if self.__find(table, offset_a, fingerprint) != -1 or self.__find(table, offset_b, fingerprint) != -1:
+                return True
+
+        return False
+
+    def __len__(self):
+        return self.current_count+self.previous_count
+
+    def add(self, packet_hash):
+        offset_a, offset_b, fingerprint = self.__locate(packet_hash)
+        with self.lock:
+            table = self.current
+            if self.__find(table, offset_a, fingerprint) != -1 or self.__find(table, offset_b, fingerprint) != -1:
+                return
+
+            self.current_count += 1
+            if not self.__insert(table, offset_a, offset_b, fingerprint):
+                # No room could be made for the fingerprint within
+                # the allowed relocations, which is very unlikely
+                # below the maximum load. This only means that one
+                # hash can no longer be detected as a duplicate.
+                self.current_count -= 1
+                self.evictions += 1
+
+            if self.current_count >= self.capacity:
+                self.__rotate()
+
+    def __insert(self, table, offset_a, offset_b, fingerprint):
+        position = self.__find(table, offset_a, self.empty_slot)
+        if position == -1: position = self.__find(table, offset_b, self.empty_slot)
+        if position != -1:
+            table[position:position+self.fp_size] = fingerprint
+            return True
+
+        # Both buckets are full, so move fingerprints to their
+        # alternate buckets until a free slot is found
+        offset = random.choice((offset_a, offset_b))
+        for kick in range(CompactHashlist.MAX_KICKS):
+            position = offset+random.randrange(CompactHashlist.SLOTS)*self.fp_size
+            evicted = bytes(table[position:position+self.fp_size])
+            table[position:position+self.fp_size] = fingerprint
+            fingerprint = evicted
+
+            offset = self.__alternate(offset//self.bucket_size, fingerprint)*self.bucket_size
+            position = self.__find(table, offset, self.empty_slot)
+            if position != -1:
+                table[position:position+self.fp_size] = fingerprint
+                return True
+
+        return False
+
+    def discard(self, packet_hash):
+        offset_a, offset_b, fingerprint = self.__locate(packet_hash)
+        removed = False
+        with self.lock:
+            for table in (self.current, self.previous):
+                for offset in (offset_a, offset_b):
+                    position = self.__find(table, offset, fingerprint)
+                    if position != -1:
+                        table[position:position+self.fp_size] = self.empty_slot
+                        if table is self.current: self.current_count -= 1
+                        else:                     self.previous_count -= 1
+                        removed = True
+
+        return removed
+
+    def remove(self, packet_hash):
+        if not self.discard(packet_hash):
+            raise KeyError(packet_hash)
+
+    def __rotate(self):
+        self.previous       = self.current
+        self.previous_count = self.current_count
+        self.current        = bytearray(self.table_size)
+        self.current_count  = 0
+        self.rotations     += 1
+
+    def rotate(self):
+        """
+        Moves the current generation of hashes to the previous
+        generation, and starts a new, empty generation.
+        """
+        with self.lock:
+            self.__rotate()
+
+    def clear(self):
+        with self.lock:
+            self.current        = bytearray(self.table_size)
+            self.previous       = bytearray(self.table_size)
+            self.current_count  = 0
+            self.previous_count = 0
+
+    def memory_usage(self):
+        """
+        :returns: The number of bytes used for storing both generations of fingerprints.
+        """
+        return len(self.current)+len(self.previous)
+
+    def get_stats(self):
+        return {
+            "compact": True,
+            "entries": len(self),
+            "capacity": self.capacity*2,
+            "memory": self.memory_usage(),
+            "fp_rate": self.fp_rate,
+            "fp_size": self.fp_size,
+            "rotations": self.rotations,
+            "evictions": self.evictions,
+        }
+
+    def to_file(self, path):
+        """
+        Writes both generations to a file. The fingerprint tables
+        are written as-is, so no serialisation is needed.
+        """
+        with self.lock:
+            header = struct.pack(CompactHashlist.HEADER_FORMAT, CompactHashlist.MAGIC, CompactHashlist.VERSION,
+                                 self.fp_size, CompactHashlist.SLOTS, self.bucket_count, self.current_count, self.previous_count)
+            with open(path, "wb") as file:
+                file.write(header)
+                file.write(self.current)
+                file.write(self.previous)
+
+    def load(self, data):
+        """
+        Loads both generations from data previously written by
+        *to_file*.
+
+        :returns: True if the data was loaded, False if it was written with different parameters.
+        :raises: *ValueError* if the data is not a compact hashlist.
+        """
+        if not CompactHashlist.is_compact_hashlist(data) or len(data) < CompactHashlist.HEADER_SIZE:
+            raise ValueError("Data is not a compact hashlist")
+
+        magic, version, fp_size, slots, bucket_count, current_count, previous_count = struct.unpack(CompactHashlist.HEADER_FORMAT, data[:CompactHashlist.HEADER_SIZE])
+        if version != CompactHashlist.VERSION or fp_size != self.fp_size or slots != CompactHashlist.SLOTS or bucket_count != self.bucket_count:
+            return False
+
+        if len(data) != CompactHashlist.HEADER_SIZE+2*self.table_size:
+            raise ValueError("Invalid length for compact hashlist data")
+
+        with self.lock:
+            tables = memoryview(data)[CompactHashlist.HEADER_SIZE:]
+            self.current        = bytearray(tables[:self.table_size])
+            self.previous       = bytearray(tables[self.table_size:])
+            self.current_count  = current_count
+            self.previous_count = previous_count
+
+        return True
+
+    @staticmethod
+    def is_compact_hashlist(data):
+        return data[:len(CompactHashlist.MAGIC)] == CompactHashlist.MAGIC
@@ -0,0 +1,254 @@
+# Reticulum License
+#
+# Copyright (c) 2016-2025 Mark Qvist
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# - The Software shall not be used in any kind of system which includes amongst
+#   its functions the ability to purposefully do harm to human beings.
+#
+# - The Software shall not be used, directly or indirectly, in the creation of
+#   an artificial intelligence, machine learning or language model training
+#   dataset, including but not limited to any use that contributes to the
+#   training or development of such a model or algorithm.
+#
+# - The above copyright notice and this permission notice shall be included in
+#   all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import os
+import bz2
+import lzma
+import zlib
+import threading
+import concurrent.futures
+import RNS
+
+class Compression:
+    """
+    Compression codecs for resources and buffers. Data can be compressed
+    with bz2, zlib or lzma at a chosen level, and codecs can be selected
+    automatically from the expected rate of the link the data is sent on,
+    so fast links are not held up by slow compression.
+
+    Peers running older versions of Reticulum can only decompress bz2,
+    which is why it is used unless another codec is configured.
+    """
+    BZ2  = 0x00
+    ZLIB = 0x01
+    LZMA = 0x02
+
+    CODECS = [BZ2, ZLIB, LZMA]
+    NAMES  = {BZ2: "bz2", ZLIB: "zlib", LZMA: "lzma"}
+    LEVELS = {BZ2: 9, ZLIB: 6, LZMA: 6}
+
+    # When automatic selection is enabled, the first
+    # codec in this list whose minimum link rate in
+    # bits per second is met by the link is used.
+    AUTO_CODECS = [
+        [25*1000*1000, ZLIB, 1],
+        [ 2*1000*1000, BZ2,  9],
+        [           0, LZMA, 6],
+    ]
+
+    # Can be None for automatic selection, or one of
+    # the codecs. The level can be set to override the
+    # default level for the selected codec.
+    codec = BZ2
+    level = None
+
+    # Data larger than this is probed for compressibility
+    # before it is compressed in full, by compressing a
+    # number of evenly spaced samples. If the samples do
+    # not shrink below the probe ratio, the data is sent
+    # uncompressed.
+    PROBE_MIN_SIZE    = 256*1024
+    PROBE_SAMPLES     = 4
+    PROBE_SAMPLE_SIZE = 16*1024
+    PROBE_RATIO       = 0.97
+
+    # Data of at least two blocks is compressed one block
+    # at a time on a shared pool of worker threads, which
+    # run in parallel since the compression libraries
+    # release the interpreter lock. The compressed blocks
+    # are concatenated as independent streams. The number
+    # of workers defaults to the number of CPUs, up to a
+    # maximum of four.
+    BLOCK_SIZE = 256*1024
+    WORKERS    = None
+    executor   = None
+    lock       = threading.Lock()
+
+    @staticmethod
+    def select(link=None):
+        """
+        :returns: The codec and level to compress data sent on ``link`` with.
+        """
+        codec = Compression.codec
+        level = Compression.level
+
+        if codec == None:
+            rate = None
+            if link != None:
+                try:
+                    rate = link.get_expected_rate()
+                    if rate == None: rate = link.get_establishment_rate()
+                except Exception as e: rate = None
+
+            if rate == None: codec = Compression.BZ2
+            else:
+                for min_rate, auto_codec, auto_level in Compression.AUTO_CODECS:
+                    if rate >= min_rate:
+                        codec = auto_codec
+                        if level == None: level = auto_level
+                        break
+
+            if codec == None: codec = Compression.BZ2
+
+        if level == None: level = Compression.LEVELS[codec]
+        return codec, level
+
+    @staticmethod
+    def select_small(link=None):
+        """
+        :returns: The codec and level to compress data that must fit in a single packet on ``link`` with.
+        """
+        codec, level = Compression.select(link)
+        if Compression.codec == Compression.BZ2: return codec, level
+        else:
+            # For data this small, zlib has the least
+            # overhead of the codecs, so it is used
+            # whenever peers are not limited to bz2.
+            if codec != Compression.ZLIB: level = Compression.LEVELS[Compression.ZLIB] if Compression.level == None else Compression.level
+            return Compression.ZLIB, level
+
+    @staticmethod
+    def detect(data):
+        """
+        :returns: The codec ``data`` was compressed with, from its stream header.
+        """
+        if   data[:3] == b"BZh":               return Compression.BZ2
+        elif data[:6] == b"\xfd7zXZ\x00":      return Compression.LZMA
+        elif len(data) >= 2 and data[0] & 0x0f == 8 and (data[0] << 8 | data[1]) % 31 == 0: return Compression.ZLIB
+        else: raise ValueError("Unknown compression codec in stream header")
+
+    @staticmethod
+    def compress(data, codec=BZ2, level=None):
+        """
+        Compresses ``data``, in parallel blocks if it is large enough.
+
+        :returns: The compressed data.
+        """
+        if level == None: level = Compression.LEVELS[codec]
+        executor = Compression.get_executor() if len(data) >= 2*Compression.BLOCK_SIZE else None
+        if executor == None: return Compression.compress_block(data, codec, level)
+        else:
+            blocks = [data[start:start+Compression.BLOCK_SIZE] for start in range(0, len(data), Compression.BLOCK_SIZE)]
+            return b"".join(executor.map(Compression.compress_block, blocks, [codec]*len(blocks), [level]*len(blocks)))
+
+    @staticmethod
+    def compress_block(data, codec, level):
+        if   codec == Compression.BZ2:  return bz2.compress(data, max(1, min(9, level)))
+        elif codec == Compression.ZLIB: return zlib.compress(data, max(0, min(9, level)))
+        elif codec == Compression.LZMA: return lzma.compress(data, preset=max(0, min(9, level)))
+        else: raise ValueError("Unknown compression codec "+str(codec))
+
+    @staticmethod
+    def is_compressible(data, codec=BZ2, level=None):
+        """
+        Estimates whether compressing ``data`` is worthwhile, by compressing
+        evenly spaced samples of it. Data smaller than the probe size is
+        always considered compressible.
+
+        :returns: True or False.
+        """
+        if len(data) < Compression.PROBE_MIN_SIZE: return True
+        if level == None: level = Compression.LEVELS[codec]
+
+        sample_size = Compression.PROBE_SAMPLE_SIZE
+        spacing     = (len(data)-sample_size)//max(1, Compression.PROBE_SAMPLES-1)
+        sampled     = 0
+        compressed  = 0
+        for sample in range(Compression.PROBE_SAMPLES):
+            start       = sample*spacing
+            sampled    += sample_size
+            compressed += len(Compression.compress_block(data[start:start+sample_size], codec, level))
+
+        return compressed < sampled*Compression.PROBE_RATIO
+
+    @staticmethod
+    def decompressor(codec):
+        if   codec == Compression.BZ2:  return bz2.BZ2Decompressor()
+        elif codec == Compression.ZLIB: return zlib.decompressobj()
+        elif codec == Compression.LZMA: return lzma.LZMADecompressor()
+        else: raise ValueError("Unknown compression codec "+str(codec))
+
+    @staticmethod
+    def decompress(data, codec=BZ2):
+        """
+        Decompresses ``data``, which can consist of several concatenated
+        compressed streams.
+
+        :returns: The decompressed data.
+        """
+        return b"".join(Compression.decompress_stream([data], codec))
+
+    @staticmethod
+    def decompress_stream(chunks, codec=BZ2, max_length=-1):
+        """
+        Decompresses an iterable of compressed chunks, which can consist
+        of several concatenated compressed streams, yielding decompressed
+        chunks of at most ``max_length`` bytes.
+        """
+        decompressor = Compression.decompressor(codec)
+        for chunk in chunks:
+            while True:
+                if decompressor.eof:
+                    # Start decompressing the next stream in
+                    # the data, if there is one
+                    chunk = decompressor.unused_data+chunk
+                    if len(chunk) == 0: break
+                    decompressor = Compression.decompressor(codec)
+
+                if codec == Compression.ZLIB:
+                    # At the end of a stream, zlib leaves any
+                    # remaining input in both unused_data and
+                    # unconsumed_tail, so only one is kept.
+                    output = decompressor.decompress(chunk, max(0, max_length))
+                    chunk  = b"" if decompressor.eof else decompressor.unconsumed_tail
+                    more   = len(chunk) > 0
+                else:
+                    output = decompressor.decompress(chunk, max_length)
+                    chunk  = b""
+                    more   = not decompressor.eof and not decompressor.needs_input
+
+                if len(output) > 0: yield output
+                if not more and not (decompressor.eof and len(decompressor.unused_data) > 0): break
+
+        if codec == Compression.ZLIB and not decompressor.eof:
+            output = decompressor.flush()
+            if len(output) > 0: yield output
+
+        if not decompressor.eof: raise ValueError("Compressed data ended before the end-of-stream marker was reached")
+
+    @staticmethod
+    def get_executor():
+        with Compression.lock:
+            if Compression.WORKERS == None: Compression.WORKERS = min(4, os.cpu_count() or 1)
+            if Compression.WORKERS < 2: return None
+            if Compression.executor == None:
+                Compression.executor = concurrent.futures.ThreadPoolExecutor(max_workers=Compression.WORKERS, thread_name_prefix="RNS compression")
+
+            return Compression.executor
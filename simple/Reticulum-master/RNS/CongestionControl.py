@@ -0,0 +1,333 @@
+# Reticulum License
+#
+# Copyright (c) 2016-2025 Mark Qvist
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# - The Software shall not be used in any kind of system which includes amongst
+#   its functions the ability to purposefully do harm to human beings.
+#
+# - The Software shall not be used, directly or indirectly, in the creation of
+#   an artificial intelligence, machine learning or language model training
+#   dataset, including but not limited to any use that contributes to the
+#   training or development of such a model or algorithm.
+#
+# - The above copyright notice and this permission notice shall be included in
+#   all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import math
+import time
+import RNS
+
+class CongestionControl:
+    """
+    Sets the window of resource transfers, and the rate parts are paced
+    out at, from the round trip times and data rates measured for each
+    request round. Algorithms are selected by name, and subclasses can
+    be added to ``ALGORITHMS`` to make them available.
+
+    On the receiving end of a resource, the controller sets the window
+    of parts requested in each round. On the sending end, it estimates
+    the delivery rate from the interval between requests, and sets the
+    rate requested parts are paced out at.
+
+    Windows are counted in parts and rates in bytes per second. The
+    controller updates the ``window`` and ``window_max`` attributes of
+    its resource directly.
+    """
+
+    # The algorithm used for new resources
+    algorithm = "legacy"
+
+    def __init__(self, resource, window_limit):
+        self.resource     = resource
+        self.window_limit = window_limit
+        self.clock        = time.time
+
+    @staticmethod
+    def create(resource, window_limit=None):
+        """
+        :returns: A controller of the configured algorithm for ``resource``.
+        """
+        if window_limit == None: window_limit = RNS.Resource.WINDOW_MAX_FAST
+        return CongestionControl.ALGORITHMS[CongestionControl.algorithm](resource, window_limit)
+
+    def part_size(self):
+        return self.resource.sdu
+
+    def clamp(self, window):
+        return max(RNS.Resource.WINDOW_MIN, min(self.window_limit, int(window)))
+
+    def response_received(self, rtt, rate):
+        """
+        Called when the first part requested in a round arrives.
+        """
+        pass
+
+    def round_completed(self, rtt, rate):
+        """
+        Called when all parts requested in a round have arrived, or on
+        the sending end when the next request arrives. The rate can be
+        None if it could not be measured.
+        """
+        pass
+
+    def parts_lost(self):
+        """
+        Called when requested parts timed out, or on the sending end
+        when parts that were already sent are requested again.
+        """
+        pass
+
+    def get_pacing_rate(self):
+        """
+        :returns: The rate in bytes per second to pace parts out at, or None to send them immediately.
+        """
+        return None
+
+
+class LegacyControl(CongestionControl):
+    """
+    The original fixed-threshold window sizing. The window grows by one
+    part per round up to a maximum, which is raised to the fast link
+    maximum once the measured rate has stayed above ``RATE_FAST`` for a
+    number of rounds, and lowered to the very slow maximum if it stays
+    below ``RATE_VERY_SLOW``. Timeouts shrink the window by one part.
+    """
+    def __init__(self, resource, window_limit):
+        super().__init__(resource, min(window_limit, RNS.Resource.WINDOW_MAX_FAST))
+        self.fast_rate_rounds      = 0
+        self.very_slow_rate_rounds = 0
+
+    def response_received(self, rtt, rate):
+        if rate > RNS.Resource.RATE_FAST and self.fast_rate_rounds < RNS.Resource.FAST_RATE_THRESHOLD:
+            self.fast_rate_rounds += 1
+
+            if self.fast_rate_rounds == RNS.Resource.FAST_RATE_THRESHOLD:
+                self.resource.window_max = self.window_limit
+
+    def round_completed(self, rtt, rate):
+        resource = self.resource
+        if resource.window < resource.window_max:
+            resource.window += 1
+            if (resource.window - resource.window_min) > (resource.window_flexibility-1):
+                resource.window_min += 1
+
+        if rate != None:
+            if rate > RNS.Resource.RATE_FAST and self.fast_rate_rounds < RNS.Resource.FAST_RATE_THRESHOLD:
+                self.fast_rate_rounds += 1
+
+                if self.fast_rate_rounds == RNS.Resource.FAST_RATE_THRESHOLD:
+                    resource.window_max = self.window_limit
+
+            if self.fast_rate_rounds == 0 and rate < RNS.Resource.RATE_VERY_SLOW and self.very_slow_rate_rounds < RNS.Resource.VERY_SLOW_RATE_THRESHOLD:
+                self.very_slow_rate_rounds += 1
+
+                if self.very_slow_rate_rounds == RNS.Resource.VERY_SLOW_RATE_THRESHOLD:
+                    resource.window_max = RNS.Resource.WINDOW_MAX_VERY_SLOW
+
+    def parts_lost(self):
+        resource = self.resource
+        if resource.window > resource.window_min:
+            resource.window -= 1
+            if resource.window_max > resource.window_min:
+                resource.window_max -= 1
+                if (resource.window_max - resource.window) > (resource.window_flexibility-1):
+                    resource.window_max -= 1
+
+
+class BBRControl(CongestionControl):
+    """
+    Model-based window sizing after BBR. The bottleneck bandwidth is
+    estimated as the highest delivery rate over recent rounds, and the
+    propagation delay as the lowest round trip time to the first part
+    of a round. The window is a multiple of the product of the two,
+    scaled by a gain that doubles it each round during startup, drains
+    the queue built up by startup, and then cycles to probe for more
+    bandwidth and for a lower round trip time.
+
+    Since requests are only sent once the previous round has completed,
+    a round takes one round trip time plus the time to deliver the
+    window, and the window needs to be several times the bandwidth
+    delay product to keep the link busy.
+
+    Lost parts lower a cap on the window, which is raised again when
+    probing for bandwidth succeeds without loss.
+    """
+    STARTUP     = 0x00
+    DRAIN       = 0x01
+    PROBE_BW    = 0x02
+
+    STARTUP_GAIN     = 2/math.log(2)
+    DRAIN_GAIN       = 1/STARTUP_GAIN
+    PROBE_GAINS      = [1.25, 0.75, 1, 1, 1, 1, 1, 1]
+    WINDOW_GAIN      = 4
+    BW_ROUNDS        = 10
+    RTT_EXPIRY       = 10
+    FULL_BW_GROWTH   = 1.25
+    FULL_BW_ROUNDS   = 3
+    LOSS_BETA        = 0.7
+
+    def __init__(self, resource, window_limit):
+        super().__init__(resource, window_limit)
+        self.state          = BBRControl.STARTUP
+        self.bw_samples     = []
+        self.btl_bw         = None
+        self.min_rtt        = None
+        self.min_rtt_stamp  = None
+        self.full_bw        = 0
+        self.full_bw_rounds = 0
+        self.cycle_index    = 0
+        self.window_cap     = None
+        self.lost           = False
+        self.pacing_gain    = BBRControl.STARTUP_GAIN
+
+    def update_rtt(self, rtt):
+        now = self.clock()
+        if self.min_rtt == None or rtt <= self.min_rtt or now-self.min_rtt_stamp > BBRControl.RTT_EXPIRY:
+            self.min_rtt       = rtt
+            self.min_rtt_stamp = now
+
+    def response_received(self, rtt, rate):
+        if rtt > 0: self.update_rtt(rtt)
+
+    def round_completed(self, rtt, rate):
+        if rate != None and rate > 0:
+            self.bw_samples.append(rate)
+            if len(self.bw_samples) > BBRControl.BW_ROUNDS: self.bw_samples.pop(0)
+            self.btl_bw = max(self.bw_samples)
+
+        if rtt != None and rtt > 0 and self.min_rtt == None: self.update_rtt(rtt)
+
+        if self.state == BBRControl.STARTUP:
+            if self.btl_bw != None and self.btl_bw >= self.full_bw*BBRControl.FULL_BW_GROWTH:
+                self.full_bw        = self.btl_bw
+                self.full_bw_rounds = 0
+            else:
+                self.full_bw_rounds += 1
+                if self.full_bw_rounds >= BBRControl.FULL_BW_ROUNDS: self.state = BBRControl.DRAIN
+
+        elif self.state == BBRControl.DRAIN: self.state = BBRControl.PROBE_BW
+        elif self.state == BBRControl.PROBE_BW:
+            # Probing upwards without loss raises the window cap
+            if self.window_cap != None and self.pacing_gain > 1 and not self.lost:
+                self.window_cap = self.window_cap+max(1, self.window_cap//4)
+            self.cycle_index = (self.cycle_index+1) % len(BBRControl.PROBE_GAINS)
+
+        self.lost = False
+        self.update_window()
+
+    def parts_lost(self):
+        self.lost       = True
+        self.window_cap = self.clamp(self.resource.window*BBRControl.LOSS_BETA)
+        if self.state == BBRControl.STARTUP: self.state = BBRControl.DRAIN
+        self.update_window()
+
+    def update_window(self):
+        if   self.state == BBRControl.STARTUP: self.pacing_gain = BBRControl.STARTUP_GAIN
+        elif self.state == BBRControl.DRAIN:   self.pacing_gain = BBRControl.DRAIN_GAIN
+        else:                                  self.pacing_gain = BBRControl.PROBE_GAINS[self.cycle_index]
+
+        if self.btl_bw == None or self.min_rtt == None:
+            if self.state == BBRControl.STARTUP: window = self.resource.window*2
+            else: window = self.resource.window
+        else:
+            bdp = self.btl_bw*self.min_rtt/self.part_size()
+            if self.state == BBRControl.STARTUP: window = max(self.resource.window*2, bdp*BBRControl.WINDOW_GAIN)
+            else: window = math.ceil(bdp*BBRControl.WINDOW_GAIN*self.pacing_gain)
+
+        if self.window_cap != None: window = min(window, self.window_cap)
+        self.resource.window     = self.clamp(window)
+        self.resource.window_max = self.window_limit
+
+    def get_pacing_rate(self):
+        if self.btl_bw == None: return None
+        else: return self.btl_bw*self.pacing_gain
+
+
+class CubicControl(CongestionControl):
+    """
+    Loss-based window sizing after CUBIC. The window doubles each round
+    until parts are lost, and is then reduced and grows along a cubic
+    function of the time since the loss, which approaches the window
+    the loss occurred at slowly, and probes beyond it increasingly fast.
+    The window never grows slower than it would with linear increases.
+    """
+    C              = 0.4
+    BETA           = 0.7
+    RTT_SMOOTHING  = 0.125
+    SLOW_START_PACING_GAIN = 2
+    PACING_GAIN    = 1.2
+
+    def __init__(self, resource, window_limit):
+        super().__init__(resource, window_limit)
+        self.cwnd        = float(resource.window)
+        self.ssthresh    = float(window_limit)
+        self.w_max       = 0.0
+        self.epoch_start = None
+        self.origin      = 0.0
+        self.k           = 0.0
+        self.srtt        = None
+
+    def round_completed(self, rtt, rate):
+        if rtt != None and rtt > 0:
+            if self.srtt == None: self.srtt = rtt
+            else: self.srtt += (rtt-self.srtt)*CubicControl.RTT_SMOOTHING
+
+        if self.cwnd < self.ssthresh: self.cwnd = min(self.cwnd*2, self.ssthresh)
+        elif self.srtt != None:
+            now = self.clock()
+            if self.epoch_start == None:
+                self.epoch_start = now
+                if self.cwnd < self.w_max:
+                    self.k      = ((self.w_max-self.cwnd)/CubicControl.C)**(1/3)
+                    self.origin = self.w_max
+                else:
+                    self.k      = 0.0
+                    self.origin = self.cwnd
+
+            t      = now-self.epoch_start+self.srtt
+            target = self.origin+CubicControl.C*(t-self.k)**3
+            linear = self.w_max*CubicControl.BETA + (3*(1-CubicControl.BETA)/(1+CubicControl.BETA))*(t/self.srtt)
+            self.cwnd = min(max(target, linear, self.cwnd), self.cwnd*1.5)
+
+        self.cwnd = float(self.clamp(self.cwnd))
+        self.resource.window     = int(self.cwnd)
+        self.resource.window_max = self.window_limit
+
+    def parts_lost(self):
+        # With fast convergence, a loss below the previous
+        # maximum releases bandwidth to competing flows
+        if self.cwnd < self.w_max: self.w_max = self.cwnd*(1+CubicControl.BETA)/2
+        else: self.w_max = self.cwnd
+
+        self.cwnd        = float(self.clamp(self.cwnd*CubicControl.BETA))
+        self.ssthresh    = self.cwnd
+        self.epoch_start = None
+        self.resource.window     = int(self.cwnd)
+        self.resource.window_max = self.window_limit
+
+    def get_pacing_rate(self):
+        if self.srtt == None: return None
+        gain = CubicControl.SLOW_START_PACING_GAIN if self.cwnd < self.ssthresh else CubicControl.PACING_GAIN
+        return gain*self.cwnd*self.part_size()/self.srtt
+
+
+CongestionControl.ALGORITHMS = {
+    "legacy": LegacyControl,
+    "bbr":    BBRControl,
+    "cubic":  CubicControl,
+}
@@ -32,31 +32,56 @@ import hashlib
 from math import ceil
 from RNS.Cryptography import HMAC
 
-def hkdf(length=None, derive_from=None, salt=None, context=None):
-    hash_len = 32
+HASH_LENGTH = 32
 
-    def hmac_sha256(key, data):
-        return HMAC.new(key, data).digest()
+class SaltedHKDF:
+    """
+    HKDF with a fixed salt. The HMAC state for the salt is
+    computed once, and copied for every subsequent key
+    derivation, which saves rehashing the salt when many
+    keys are derived with it, such as for interface access
+    codes.
+    """
+    def __init__(self, salt=None):
+        if salt == None or len(salt) == 0:
+            salt = bytes([0] * HASH_LENGTH)
 
-    if length == None or length < 1:
-        raise ValueError("Invalid output key length")
+        self.extractor = HMAC.new(salt)
 
-    if derive_from == None or derive_from == "":
-        raise ValueError("Cannot derive key from empty input material")
+    def derive(self, length=None, derive_from=None, context=None):
+        if length == None or length < 1:
+            raise ValueError("Invalid output key length")
+
+        if derive_from == None or derive_from == "":
+            raise ValueError("Cannot derive key from empty input material")
+
+        if context == None:
+            context = b""
 
-    if salt == None or len(salt) == 0:
-        salt = bytes([0] * hash_len)
+        extractor = self.extractor.copy()
+        extractor.update(derive_from)
+        pseudorandom_key = extractor.digest()
 
-    if context == None:
-        context = b""
+        # Every block of the expansion is keyed with the same
+        # pseudorandom key, so the keyed state is copied per
+        # block instead of being set up from scratch.
+        expander = HMAC.new(pseudorandom_key)
+        block = b""
+        blocks = []
 
-    pseudorandom_key = hmac_sha256(salt, derive_from)
+        for i in range(ceil(length / HASH_LENGTH)):
+            block_hmac = expander.copy()
+            block_hmac.update(block + context + bytes([(i + 1)%(0xFF+1)]))
+            block = block_hmac.digest()
+            blocks.append(block)
 
-    block = b""
-    derived = b""
+        return b"".join(blocks)[:length]
 
-    for i in range(ceil(length / hash_len)):
-        block = hmac_sha256(pseudorandom_key, block + context + bytes([(i + 1)%(0xFF+1)]))
-        derived += block
+def hkdf(length=None, derive_from=None, salt=None, context=None):
+    if length == None or length < 1:
+        raise ValueError("Invalid output key length")
+
+    if derive_from == None or derive_from == "":
+        raise ValueError("Cannot derive key from empty input material")
 
-    return derived[:length]
+    return SaltedHKDF(salt).derive(length=length, derive_from=derive_from, context=context)
@@ -41,8 +41,10 @@ else:
 
 if hasattr(hashlib, "sha256"):
     from hashlib import sha256 as ext_sha256
+    ext_sha256_buffers = True
 else:
     from .SHA256 import sha256 as ext_sha256
+    ext_sha256_buffers = False
 
 """
 The SHA primitives are abstracted here to allow platform-
@@ -57,6 +59,27 @@ def sha256(data):
 
     return digest.digest()
 
+def sha256_parts(*parts):
+    """
+    Hashes the concatenation of all passed parts. Parts can be
+    memoryviews into larger buffers, and are hashed in place
+    without being joined into a new object first.
+    """
+    digest = ext_sha256()
+    for part in parts:
+        if not ext_sha256_buffers and type(part) is not bytes: part = bytes(part)
+        digest.update(part)
+
+    return digest.digest()
+
+def sha256_stream():
+    """
+    Returns an incremental SHA-256 digest object, for hashing
+    data that is processed in pieces. Call update() with each
+    piece, and digest() once all data has been added.
+    """
+    return ext_sha256()
+
 def sha512(data):
     digest = ext_sha512()
     digest.update(data)
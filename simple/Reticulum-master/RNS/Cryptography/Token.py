@@ -49,6 +49,9 @@ class Token():
     """
     TOKEN_OVERHEAD  = 48 # Bytes
 
+    # Default chunk size for streaming decryption
+    STREAM_CHUNK_SIZE = 256*1024
+
     @staticmethod
     def generate_key(mode=AES_256_CBC):
         if   mode == AES_128_CBC: return os.urandom(32)
@@ -112,3 +115,32 @@ class Token():
                     iv = iv))
 
         except Exception as e: raise ValueError(f"Could not decrypt token: {e}")
+
+    def decrypt_stream(self, token = None, chunk_size = None):
+        """
+        Decrypts a token held in any buffer that can be sliced, such as
+        a memory-mapped file, and yields the plaintext in chunks. The
+        HMAC is verified over the entire token before any plaintext is
+        returned, and memory use is bounded by the chunk size.
+        """
+        if chunk_size == None: chunk_size = Token.STREAM_CHUNK_SIZE
+        chunk_size = max(16, chunk_size - chunk_size % 16)
+        if len(token) <= Token.TOKEN_OVERHEAD: raise ValueError("Cannot decrypt token of only "+str(len(token))+" bytes")
+
+        signed_end    = len(token)-32
+        expected_hmac = HMAC.new(self._signing_key)
+        for offset in range(0, signed_end, chunk_size): expected_hmac.update(bytes(token[offset:min(offset+chunk_size, signed_end)]))
+        if bytes(token[signed_end:]) != expected_hmac.digest(): raise ValueError("Token HMAC was invalid")
+        if (signed_end-16) % 16 != 0: raise ValueError("Token ciphertext length is not a multiple of the block size")
+
+        iv = bytes(token[:16])
+        for offset in range(16, signed_end, chunk_size):
+            ciphertext = bytes(token[offset:min(offset+chunk_size, signed_end)])
+            try:
+                plaintext = self.mode.decrypt(ciphertext = ciphertext, key = self._encryption_key, iv = iv)
+                if offset+chunk_size >= signed_end: plaintext = PKCS7.unpad(plaintext)
+
+            except Exception as e: raise ValueError(f"Could not decrypt token: {e}")
+
+            iv = ciphertext[-16:]
+            yield plaintext
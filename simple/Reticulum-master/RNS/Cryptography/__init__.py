@@ -32,8 +32,10 @@ import os
 import glob
 
 from .Hashes import sha256
+from .Hashes import sha256_parts
 from .Hashes import sha512
 from .HKDF import hkdf
+from .HKDF import SaltedHKDF
 from .PKCS7 import PKCS7
 from .Token import Token
 from .Provider import backend
@@ -165,6 +165,7 @@ class Destination:
         self.retained_ratchets = Destination.RATCHET_COUNT
         self.latest_ratchet_time = None
         self.latest_ratchet_id = None
+        self.ratchet_keyring = None
         self.__enforce_ratchets = False
         self.mtu = 0
 
@@ -615,6 +616,27 @@ class Destination:
             else:
                 raise ValueError("No private key held by GROUP destination. Did you create or load one?")
 
+    def _get_ratchet_keyring(self):
+        ratchets = self.ratchets
+        if self.ratchet_keyring == None:
+            self.ratchet_keyring = RNS.RatchetKeyring.RatchetKeyring(ratchets)
+        elif not self.ratchet_keyring.is_current(ratchets):
+            self.ratchet_keyring.update(ratchets)
+
+        return self.ratchet_keyring
+
+    def get_ratchet_stats(self):
+        """
+        Returns statistics on how many ratchet keys had to be tried when
+        decrypting packets for this destination.
+
+        :returns: A dictionary with the number of retained ratchets, successful ratchet decryptions, packets no ratchet could decrypt, total, mean and maximum trials, and ephemeral key cache hits, or *None* if ratchets are not in use.
+        """
+        if self.ratchet_keyring != None:
+            return self.ratchet_keyring.get_stats()
+        else:
+            return None
+
     def decrypt(self, ciphertext):
         """
         Decrypts information for ``RNS.Destination.SINGLE`` or ``RNS.Destination.GROUP`` type destination.
@@ -629,7 +651,7 @@ class Destination:
             if self.ratchets:
                 decrypted = None
                 try:
-                    decrypted = self.identity.decrypt(ciphertext, ratchets=self.ratchets, enforce_ratchets=self.__enforce_ratchets, ratchet_id_receiver=self)
+                    decrypted = self.identity.decrypt(ciphertext, ratchets=self._get_ratchet_keyring(), enforce_ratchets=self.__enforce_ratchets, ratchet_id_receiver=self)
                 except:
                     decrypted = None
 
@@ -637,7 +659,7 @@ class Destination:
                     try:
                         RNS.log(f"Decryption with ratchets failed on {self}, reloading ratchets from storage and retrying", RNS.LOG_ERROR)
                         self._reload_ratchets(self.ratchets_path)
-                        decrypted = self.identity.decrypt(ciphertext, ratchets=self.ratchets, enforce_ratchets=self.__enforce_ratchets, ratchet_id_receiver=self)
+                        decrypted = self.identity.decrypt(ciphertext, ratchets=self._get_ratchet_keyring(), enforce_ratchets=self.__enforce_ratchets, ratchet_id_receiver=self)
                     except Exception as e:
                         RNS.log(f"Decryption still failing after ratchet reload. The contained exception was: {e}", RNS.LOG_ERROR)
                         raise e
@@ -0,0 +1,153 @@
+# Reticulum License
+#
+# Copyright (c) 2016-2025 Mark Qvist
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# - The Software shall not be used in any kind of system which includes amongst
+#   its functions the ability to purposefully do harm to human beings.
+#
+# - The Software shall not be used, directly or indirectly, in the creation of
+#   an artificial intelligence, machine learning or language model training
+#   dataset, including but not limited to any use that contributes to the
+#   training or development of such a model or algorithm.
+#
+# - The above copyright notice and this permission notice shall be included in
+#   all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import gc
+import RNS
+import threading
+import importlib.util
+
+if importlib.util.find_spec("sqlite3") != None:
+    import sqlite3
+else:
+    sqlite3 = None
+
+class StoredDestination(list):
+    """
+    A known destinations entry loaded from a :py:class:`DestinationStore`.
+    It behaves like the regular ``[timestamp, packet_hash, public_key,
+    app_data]`` entry list, but app_data is only read from the store
+    the first time it is accessed.
+    """
+    __slots__ = ("store", "destination_hash")
+
+    def __init__(self, store, destination_hash, timestamp, packet_hash, public_key):
+        super().__init__((timestamp, packet_hash, public_key, None))
+        self.store            = store
+        self.destination_hash = destination_hash
+
+    def __load_app_data(self):
+        store = self.store
+        if store != None:
+            self.store = None
+            list.__setitem__(self, 3, store.get_app_data(self.destination_hash))
+
+    def __getitem__(self, index):
+        if self.store != None and (isinstance(index, slice) or index == 3 or index == -1):
+            self.__load_app_data()
+        return list.__getitem__(self, index)
+
+    def __setitem__(self, index, value):
+        if self.store != None and (isinstance(index, slice) or index == 3 or index == -1):
+            self.__load_app_data()
+        list.__setitem__(self, index, value)
+
+    def __iter__(self):
+        self.__load_app_data()
+        return list.__iter__(self)
+
+class DestinationStore:
+    """
+    Persistent storage of known destinations in an SQLite database.
+    Only changed entries are written on each save, each save is a
+    single transaction, and app_data is loaded lazily.
+    """
+    FILENAME = "known_destinations.db"
+
+    @staticmethod
+    def available():
+        return sqlite3 != None
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.db   = sqlite3.connect(path, check_same_thread=False)
+        with self.lock:
+            # Write-ahead logging keeps the database consistent if
+            # the process is interrupted while saving, and lets
+            # other processes read while we write.
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.execute("CREATE TABLE IF NOT EXISTS destinations (destination_hash BLOB PRIMARY KEY, timestamp REAL, packet_hash BLOB, public_key BLOB, app_data BLOB) WITHOUT ROWID")
+            self.db.commit()
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM destinations").fetchone()[0]
+
+    def load(self):
+        known_destinations = {}
+        hash_length = RNS.Reticulum.TRUNCATED_HASHLENGTH//8
+
+        # Creating a large number of entries triggers many
+        # needless garbage collection passes, so collection
+        # is paused while the table is loaded.
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            with self.lock:
+                for destination_hash, timestamp, packet_hash, public_key in self.db.execute("SELECT destination_hash, timestamp, packet_hash, public_key FROM destinations"):
+                    if len(destination_hash) == hash_length:
+                        known_destinations[destination_hash] = StoredDestination(self, destination_hash, timestamp, packet_hash, public_key)
+
+        finally:
+            if gc_enabled: gc.enable()
+
+        return known_destinations
+
+    def get_app_data(self, destination_hash):
+        with self.lock:
+            row = self.db.execute("SELECT app_data FROM destinations WHERE destination_hash = ?", (destination_hash,)).fetchone()
+
+        if row == None: return None
+        else:           return row[0]
+
+    def write(self, entries):
+        """
+        Writes entries from a dict of destination hashes to known
+        destination entries in a single transaction.
+        """
+        rows = []
+        for destination_hash in entries:
+            entry = entries[destination_hash]
+            rows.append((destination_hash, entry[0], entry[1], entry[2], entry[3]))
+
+        # Inserting in key order is considerably faster
+        # for large writes, such as the initial import
+        rows.sort()
+
+        with self.lock:
+            with self.db:
+                self.db.executemany("INSERT OR REPLACE INTO destinations VALUES (?, ?, ?, ?, ?)", rows)
+
+        return len(rows)
+
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -31,15 +31,20 @@
 import math
 import os
 import RNS
+import copy
 import time
 import atexit
 import hashlib
 import threading
+from collections import OrderedDict
 
 from .vendor import umsgpack as umsgpack
 
 from RNS.Cryptography import X25519PrivateKey, X25519PublicKey, Ed25519PrivateKey, Ed25519PublicKey
 from RNS.Cryptography import Token
+from RNS.DestinationStore import DestinationStore
+from RNS.RatchetKeyring import RatchetKeyring
+from RNS.RatchetStore import SQLiteRatchetStore, FileRatchetStore
 
 
 class Identity:
@@ -89,18 +94,101 @@ class Identity:
     DERIVED_KEY_LENGTH        = 512//8
     DERIVED_KEY_LENGTH_LEGACY = 256//8
 
+    # Number of announce signature verification results to cache
+    ANNOUNCE_CACHE_SIZE       = 8192
+
+    # Number of parsed identities to keep for recall
+    RECALL_CACHE_SIZE         = 1024
+
+    # How long to remember that no ratchet is stored
+    # for a destination, and how many such entries
+    # to keep at most
+    RATCHET_NEGATIVE_TTL      = 60
+    RATCHET_NEGATIVE_MAX      = 65536
+
     # Storage
     known_destinations = {}
+    known_destinations_changed = set()
+    known_destinations_changed_lock = threading.Lock()
+    known_destinations_store = None
+    known_identities = None
+    recall_cache = OrderedDict()
+    recall_cache_lock = threading.Lock()
     known_ratchets = {}
 
+    # Announce signature verification cache
+    announce_cache        = OrderedDict()
+    announce_cache_lock   = threading.Lock()
+    announce_cache_hits   = 0
+    announce_cache_misses = 0
+
     ratchet_persist_lock = threading.Lock()
+    ratchet_store = None
+    ratchet_negative_cache = OrderedDict()
+    ratchet_negative_lock = threading.Lock()
 
     @staticmethod
     def remember(packet_hash, destination_hash, public_key, app_data = None):
         if len(public_key) != Identity.KEYSIZE//8:
             raise TypeError("Can't remember "+RNS.prettyhexrep(destination_hash)+", the public key size of "+str(len(public_key))+" is not valid.", RNS.LOG_ERROR)
         else:
+            previous_entry = Identity.known_destinations.get(destination_hash)
             Identity.known_destinations[destination_hash] = [time.time(), packet_hash, public_key, app_data]
+            with Identity.known_destinations_changed_lock: Identity.known_destinations_changed.add(destination_hash)
+
+            if previous_entry != None and previous_entry[2] != public_key:
+                with Identity.recall_cache_lock: Identity.recall_cache.pop(destination_hash, None)
+
+            known_identities = Identity.known_identities
+            if known_identities != None:
+                if previous_entry != None and previous_entry[2] != public_key:
+                    previous_hashes = known_identities.get(Identity.truncated_hash(previous_entry[2]))
+                    if previous_hashes != None and destination_hash in previous_hashes:
+                        previous_hashes.remove(destination_hash)
+
+                identity_hash = Identity.truncated_hash(public_key)
+                destination_hashes = known_identities.get(identity_hash)
+                if destination_hashes == None:
+                    known_identities[identity_hash] = [destination_hash]
+                elif not destination_hash in destination_hashes:
+                    destination_hashes.append(destination_hash)
+
+    @staticmethod
+    def _recall_identity(destination_hash, identity_data):
+        # Parsing public keys is relatively expensive, so parsed
+        # identities are kept in a bounded cache. Each caller gets
+        # a copy, since app_data is set per recall.
+        with Identity.recall_cache_lock:
+            cached_identity = Identity.recall_cache.get(destination_hash)
+            if cached_identity != None:
+                Identity.recall_cache.move_to_end(destination_hash)
+
+        if cached_identity == None:
+            cached_identity = Identity(create_keys=False)
+            cached_identity.load_public_key(identity_data[2])
+            with Identity.recall_cache_lock:
+                Identity.recall_cache[destination_hash] = cached_identity
+                while len(Identity.recall_cache) > Identity.RECALL_CACHE_SIZE:
+                    Identity.recall_cache.popitem(last=False)
+
+        identity = copy.copy(cached_identity)
+        identity.app_data = identity_data[3]
+        return identity
+
+    @staticmethod
+    def _index_known_identities():
+        # Builds the index of identity hashes to the known
+        # destination hashes for each identity. This is done
+        # lazily on first use, to keep startup cheap.
+        known_identities = {}
+        for destination_hash, entry in list(Identity.known_destinations.items()):
+            identity_hash = Identity.truncated_hash(entry[2])
+            destination_hashes = known_identities.get(identity_hash)
+            if destination_hashes == None: known_identities[identity_hash] = [destination_hash]
+            else:                          destination_hashes.append(destination_hash)
+
+        Identity.known_identities = known_identities
+        return known_identities
 
 
     @staticmethod
@@ -118,30 +206,27 @@ class Identity:
         :returns: An :ref:`RNS.Identity<api-identity>` instance that can be used to create an outgoing :ref:`RNS.Destination<api-destination>`, or *None* if the destination is unknown.
         """
         if from_identity_hash:
-            for destination_hash in Identity.known_destinations:
-                if target_hash == Identity.truncated_hash(Identity.known_destinations[destination_hash][2]):
-                    identity_data = Identity.known_destinations[destination_hash]
-                    identity = Identity(create_keys=False)
-                    identity.load_public_key(identity_data[2])
-                    identity.app_data = identity_data[3]
-                    return identity
+            known_identities = Identity.known_identities
+            if known_identities == None: known_identities = Identity._index_known_identities()
+
+            for destination_hash in known_identities.get(target_hash, []):
+                identity_data = Identity.known_destinations.get(destination_hash)
+                if identity_data != None:
+                    return Identity._recall_identity(destination_hash, identity_data)
 
             return None
 
         else:
-            if target_hash in Identity.known_destinations:
-                identity_data = Identity.known_destinations[target_hash]
-                identity = Identity(create_keys=False)
-                identity.load_public_key(identity_data[2])
-                identity.app_data = identity_data[3]
-                return identity
+            identity_data = Identity.known_destinations.get(target_hash)
+            if identity_data != None:
+                return Identity._recall_identity(target_hash, identity_data)
             else:
-                for registered_destination in RNS.Transport.destinations:
-                    if target_hash == registered_destination.hash:
-                        identity = Identity(create_keys=False)
-                        identity.load_public_key(registered_destination.identity.get_public_key())
-                        identity.app_data = None
-                        return identity
+                registered_destination = RNS.Transport.destinations_map.get(target_hash)
+                if registered_destination != None:
+                    identity = Identity(create_keys=False)
+                    identity.load_public_key(registered_destination.identity.get_public_key())
+                    identity.app_data = None
+                    return identity
 
                 return None
 
@@ -161,12 +246,6 @@ class Identity:
 
     @staticmethod
     def save_known_destinations():
-        # TODO: Improve the storage method so we don't have to
-        # deserialize and serialize the entire table on every
-        # save, but the only changes. It might be possible to
-        # simply overwrite on exit now that every local client
-        # disconnect triggers a data persist.
-        
         try:
             if hasattr(Identity, "saving_known_destinations"):
                 wait_interval = 0.2
@@ -181,26 +260,52 @@ class Identity:
             Identity.saving_known_destinations = True
             save_start = time.time()
 
-            storage_known_destinations = {}
-            if os.path.isfile(RNS.Reticulum.storagepath+"/known_destinations"):
+            if Identity.known_destinations_store != None:
+                # Only entries that changed since the last save
+                # are written to the store
+                with Identity.known_destinations_changed_lock:
+                    changed = Identity.known_destinations_changed
+                    Identity.known_destinations_changed = set()
+                entries = {}
+                for destination_hash in changed:
+                    entry = Identity.known_destinations.get(destination_hash)
+                    if entry != None: entries[destination_hash] = entry
+
                 try:
-                    with open(RNS.Reticulum.storagepath+"/known_destinations","rb") as file:
-                        storage_known_destinations = umsgpack.load(file)
- 
-                except:
-                    pass
+                    RNS.log("Saving "+str(len(entries))+" changed known destinations to storage...", RNS.LOG_DEBUG)
+                    Identity.known_destinations_store.write(entries)
+                except Exception as e:
+                    with Identity.known_destinations_changed_lock: Identity.known_destinations_changed |= changed
+                    raise e
 
-            try:
-                for destination_hash in storage_known_destinations:
-                    if not destination_hash in Identity.known_destinations:
-                        Identity.known_destinations[destination_hash] = storage_known_destinations[destination_hash]
-            except Exception as e:
-                RNS.log("Skipped recombining known destinations from disk, since an error occurred: "+str(e), RNS.LOG_WARNING)
+            else:
+                storage_known_destinations = {}
+                if os.path.isfile(RNS.Reticulum.storagepath+"/known_destinations"):
+                    try:
+                        with open(RNS.Reticulum.storagepath+"/known_destinations","rb") as file:
+                            storage_known_destinations = umsgpack.load(file)
 
-            RNS.log("Saving "+str(len(Identity.known_destinations))+" known destinations to storage...", RNS.LOG_DEBUG)
-            with open(RNS.Reticulum.storagepath+"/known_destinations","wb") as file:
-                umsgpack.dump(Identity.known_destinations, file)
-            
+                    except:
+                        pass
+
+                try:
+                    for destination_hash in storage_known_destinations:
+                        if not destination_hash in Identity.known_destinations:
+                            Identity.known_destinations[destination_hash] = storage_known_destinations[destination_hash]
+                            Identity.known_identities = None
+                except Exception as e:
+                    RNS.log("Skipped recombining known destinations from disk, since an error occurred: "+str(e), RNS.LOG_WARNING)
+
+                # Write to a temporary file and move it in place,
+                # so an interrupted save can't corrupt the table
+                RNS.log("Saving "+str(len(Identity.known_destinations))+" known destinations to storage...", RNS.LOG_DEBUG)
+                temp_path = RNS.Reticulum.storagepath+"/known_destinations.tmp"
+                with open(temp_path,"wb") as file:
+                    umsgpack.dump(Identity.known_destinations, file)
+                    file.flush()
+                    os.fsync(file.fileno())
+                os.replace(temp_path, RNS.Reticulum.storagepath+"/known_destinations")
+                with Identity.known_destinations_changed_lock: Identity.known_destinations_changed = set()
 
             save_time = time.time() - save_start
             if save_time < 1:
@@ -218,12 +323,48 @@ class Identity:
 
     @staticmethod
     def load_known_destinations():
-        if os.path.isfile(RNS.Reticulum.storagepath+"/known_destinations"):
+        legacy_path = RNS.Reticulum.storagepath+"/known_destinations"
+        if DestinationStore.available():
+            try:
+                if Identity.known_destinations_store != None:
+                    Identity.known_destinations_store.close()
+
+                store_path = RNS.Reticulum.storagepath+"/"+DestinationStore.FILENAME
+                Identity.known_destinations_store = DestinationStore(store_path)
+
+                # Import destinations from the previous storage
+                # format the first time the store is opened
+                if len(Identity.known_destinations_store) == 0 and os.path.isfile(legacy_path):
+                    with open(legacy_path,"rb") as file:
+                        legacy_known_destinations = umsgpack.load(file)
+
+                    imported = {}
+                    for known_destination in legacy_known_destinations:
+                        if len(known_destination) == RNS.Reticulum.TRUNCATED_HASHLENGTH//8:
+                            imported[known_destination] = legacy_known_destinations[known_destination]
+
+                    Identity.known_destinations_store.write(imported)
+                    RNS.log("Imported "+str(len(imported))+" known destinations into "+str(store_path), RNS.LOG_NOTICE)
+
+                Identity.known_destinations = Identity.known_destinations_store.load()
+                with Identity.known_destinations_changed_lock: Identity.known_destinations_changed = set()
+                Identity.known_identities = None
+                with Identity.recall_cache_lock: Identity.recall_cache.clear()
+                RNS.log("Loaded "+str(len(Identity.known_destinations))+" known destination from storage", RNS.LOG_VERBOSE)
+                return
+
+            except Exception as e:
+                RNS.log("Error opening known destinations store, falling back to file storage. The contained exception was: "+str(e), RNS.LOG_ERROR)
+                Identity.known_destinations_store = None
+
+        if os.path.isfile(legacy_path):
             try:
-                with open(RNS.Reticulum.storagepath+"/known_destinations","rb") as file:
+                with open(legacy_path,"rb") as file:
                     loaded_known_destinations = umsgpack.load(file)
 
                 Identity.known_destinations = {}
+                Identity.known_identities = None
+                with Identity.recall_cache_lock: Identity.recall_cache.clear()
                 for known_destination in loaded_known_destinations:
                     if len(known_destination) == RNS.Reticulum.TRUNCATED_HASHLENGTH//8:
                         Identity.known_destinations[known_destination] = loaded_known_destinations[known_destination]
@@ -293,6 +434,28 @@ class Identity:
         ratchet_pub = ratchet_prv.public_key()
         return ratchet_prv.private_bytes()
 
+    @staticmethod
+    def _get_ratchet_store():
+        with Identity.ratchet_persist_lock:
+            if Identity.ratchet_store == None:
+                ratchetdir = RNS.Reticulum.storagepath+"/ratchets"
+                if SQLiteRatchetStore.available():
+                    store_path = RNS.Reticulum.storagepath+"/"+SQLiteRatchetStore.FILENAME
+                    Identity.ratchet_store = SQLiteRatchetStore(store_path)
+
+                    # Import ratchets from the previous storage format,
+                    # unless they belong to a shared instance we are
+                    # connected to.
+                    owner = getattr(RNS.Transport, "owner", None)
+                    if os.path.isdir(ratchetdir) and not (owner != None and owner.is_connected_to_shared_instance):
+                        imported = Identity.ratchet_store.import_files(ratchetdir)
+                        if imported > 0: RNS.log("Imported "+str(imported)+" ratchets into "+str(store_path), RNS.LOG_NOTICE)
+
+                else:
+                    Identity.ratchet_store = FileRatchetStore(ratchetdir)
+
+            return Identity.ratchet_store
+
     @staticmethod
     def _remember_ratchet(destination_hash, ratchet):
         try:
@@ -304,25 +467,9 @@ class Identity:
             if not ratchet_exists:
                 RNS.log(f"Remembering ratchet {RNS.prettyhexrep(Identity._get_ratchet_id(ratchet))} for {RNS.prettyhexrep(destination_hash)}", RNS.LOG_EXTREME)
                 Identity.known_ratchets[destination_hash] = ratchet
+                with Identity.ratchet_negative_lock: Identity.ratchet_negative_cache.pop(destination_hash, None)
                 if not RNS.Transport.owner.is_connected_to_shared_instance:
-                    def persist_job():
-                        with Identity.ratchet_persist_lock:
-                            hexhash = RNS.hexrep(destination_hash, delimit=False)
-                            ratchet_data = {"ratchet": ratchet, "received": time.time()}
-
-                            ratchetdir = RNS.Reticulum.storagepath+"/ratchets"
-                            
-                            if not os.path.isdir(ratchetdir):
-                                os.makedirs(ratchetdir)
-
-                            outpath   = f"{ratchetdir}/{hexhash}.out"
-                            finalpath = f"{ratchetdir}/{hexhash}"
-                            with open(outpath, "wb") as ratchet_file:
-                                ratchet_file.write(umsgpack.packb(ratchet_data))
-                            os.replace(outpath, finalpath)
-
-                    
-                    threading.Thread(target=persist_job, daemon=True).start()
+                    Identity._get_ratchet_store().persist(destination_hash, ratchet, time.time())
 
         except Exception as e:
             RNS.log(f"Could not persist ratchet for {RNS.prettyhexrep(destination_hash)} to storage.", RNS.LOG_ERROR)
@@ -333,30 +480,8 @@ class Identity:
     def _clean_ratchets():
         RNS.log("Cleaning ratchets...", RNS.LOG_DEBUG)
         try:
-            now = time.time()
-            ratchetdir = RNS.Reticulum.storagepath+"/ratchets"
-            if os.path.isdir(ratchetdir):
-                for filename in os.listdir(ratchetdir):
-                    try:
-                        expired = False
-                        corrupted = False
-                        with open(f"{ratchetdir}/{filename}", "rb") as rf:
-                            # TODO: Remove individual ratchet file if corrupt
-                            try:
-                                ratchet_data = umsgpack.unpackb(rf.read())
-                                if now > ratchet_data["received"]+Identity.RATCHET_EXPIRY:
-                                    expired = True
-
-                            except Exception as e:
-                                RNS.log(f"Corrupted ratchet data while reading {ratchetdir}/{filename}, removing file", RNS.LOG_ERROR)
-                                corrupted = True
-
-                        if expired or corrupted:
-                            os.unlink(f"{ratchetdir}/{filename}")
-
-                    except Exception as e:
-                        RNS.log(f"An error occurred while cleaning ratchets, in the processing of {ratchetdir}/{filename}.", RNS.LOG_ERROR)
-                        RNS.log(f"The contained exception was: {e}", RNS.LOG_ERROR)
+            removed = Identity._get_ratchet_store().clean(Identity.RATCHET_EXPIRY)
+            if removed > 0: RNS.log("Removed "+str(removed)+" expired ratchets", RNS.LOG_DEBUG)
 
         except Exception as e:
             RNS.log(f"An error occurred while cleaning ratchets. The contained exception was: {e}", RNS.LOG_ERROR)
@@ -364,78 +489,149 @@ class Identity:
     @staticmethod
     def get_ratchet(destination_hash):
         if not destination_hash in Identity.known_ratchets:
-            ratchetdir = RNS.Reticulum.storagepath+"/ratchets"
-            hexhash = RNS.hexrep(destination_hash, delimit=False)
-            ratchet_path = f"{ratchetdir}/{hexhash}"
-            if os.path.isfile(ratchet_path):
-                try:
-                    with open(ratchet_path, "rb") as ratchet_file:
-                        ratchet_data = umsgpack.unpackb(ratchet_file.read())
-                        if time.time() < ratchet_data["received"]+Identity.RATCHET_EXPIRY and len(ratchet_data["ratchet"]) == Identity.RATCHETSIZE//8:
-                            Identity.known_ratchets[destination_hash] = ratchet_data["ratchet"]
-                        else:
-                            return None
-                
-                except Exception as e:
-                    RNS.log(f"An error occurred while loading ratchet data for {RNS.prettyhexrep(destination_hash)} from storage.", RNS.LOG_ERROR)
-                    RNS.log(f"The contained exception was: {e}", RNS.LOG_ERROR)
-                    return None
+            # Don't probe storage again for destinations we
+            # recently found to have no stored ratchet
+            negative_expiry = Identity.ratchet_negative_cache.get(destination_hash)
+            if negative_expiry != None and time.time() < negative_expiry:
+                return None
+
+            try:
+                ratchet_entry = Identity._get_ratchet_store().get(destination_hash)
+                if ratchet_entry != None:
+                    ratchet, received = ratchet_entry
+                    if time.time() < received+Identity.RATCHET_EXPIRY and len(ratchet) == Identity.RATCHETSIZE//8:
+                        Identity.known_ratchets[destination_hash] = ratchet
+                    else:
+                        return None
+
+            except Exception as e:
+                RNS.log(f"An error occurred while loading ratchet data for {RNS.prettyhexrep(destination_hash)} from storage.", RNS.LOG_ERROR)
+                RNS.log(f"The contained exception was: {e}", RNS.LOG_ERROR)
+                return None
 
         if destination_hash in Identity.known_ratchets:
             return Identity.known_ratchets[destination_hash]
         else:
             RNS.log(f"Could not load ratchet for {RNS.prettyhexrep(destination_hash)}", RNS.LOG_DEBUG)
+            with Identity.ratchet_negative_lock:
+                Identity.ratchet_negative_cache[destination_hash] = time.time()+Identity.RATCHET_NEGATIVE_TTL
+                Identity.ratchet_negative_cache.move_to_end(destination_hash)
+                while len(Identity.ratchet_negative_cache) > Identity.RATCHET_NEGATIVE_MAX:
+                    Identity.ratchet_negative_cache.popitem(last=False)
+
             return None
 
+    @staticmethod
+    def validate_announce_signature(public_key, signature, signed_data):
+        # The same announce is often received several times,
+        # via different neighbours, and is validated more than
+        # once during inbound processing. Since the result of
+        # signature verification only depends on the signature
+        # and the signed data, which includes the public key,
+        # results are cached in a bounded LRU cache.
+        valid = Identity.cached_announce_signature(signature, signed_data)
+        if valid != None:
+            return valid
+
+        valid = Identity.verify_announce_signature(public_key, signature, signed_data)
+        Identity.cache_announce_signature(signature, signed_data, valid)
+        return valid
+
+    @staticmethod
+    def verify_announce_signature(public_key, signature, signed_data):
+        announced_identity = Identity(create_keys=False)
+        announced_identity.load_public_key(public_key)
+        return announced_identity.pub != None and announced_identity.validate(signature, signed_data)
+
+    @staticmethod
+    def cached_announce_signature(signature, signed_data):
+        cache_key = Identity.full_hash(signature+signed_data)
+        with Identity.announce_cache_lock:
+            valid = Identity.announce_cache.get(cache_key)
+            if valid != None:
+                Identity.announce_cache.move_to_end(cache_key)
+                Identity.announce_cache_hits += 1
+            else:
+                Identity.announce_cache_misses += 1
+
+            return valid
+
+    @staticmethod
+    def cache_announce_signature(signature, signed_data, valid):
+        cache_key = Identity.full_hash(signature+signed_data)
+        with Identity.announce_cache_lock:
+            Identity.announce_cache[cache_key] = valid
+            Identity.announce_cache.move_to_end(cache_key)
+            while len(Identity.announce_cache) > Identity.ANNOUNCE_CACHE_SIZE:
+                Identity.announce_cache.popitem(last=False)
+
+    @staticmethod
+    def get_announce_cache_stats():
+        return {
+            "entries": len(Identity.announce_cache),
+            "hits": Identity.announce_cache_hits,
+            "misses": Identity.announce_cache_misses,
+        }
+
+    @staticmethod
+    def _unpack_announce(packet):
+        keysize       = Identity.KEYSIZE//8
+        ratchetsize   = Identity.RATCHETSIZE//8
+        name_hash_len = Identity.NAME_HASH_LENGTH//8
+        sig_len       = Identity.SIGLENGTH//8
+
+        # Get public key bytes from announce
+        public_key = packet.data[:keysize]
+
+        # If the packet context flag is set,
+        # this announce contains a new ratchet
+        if packet.context_flag == RNS.Packet.FLAG_SET:
+            name_hash   = packet.data[keysize:keysize+name_hash_len ]
+            random_hash = packet.data[keysize+name_hash_len:keysize+name_hash_len+10]
+            ratchet     = packet.data[keysize+name_hash_len+10:keysize+name_hash_len+10+ratchetsize]
+            signature   = packet.data[keysize+name_hash_len+10+ratchetsize:keysize+name_hash_len+10+ratchetsize+sig_len]
+            app_data    = b""
+            if len(packet.data) > keysize+name_hash_len+10+sig_len+ratchetsize:
+                app_data = packet.data[keysize+name_hash_len+10+sig_len+ratchetsize:]
+
+        # If the packet context flag is not set,
+        # this announce does not contain a ratchet
+        else:
+            ratchet     = b""
+            name_hash   = packet.data[keysize:keysize+name_hash_len]
+            random_hash = packet.data[keysize+name_hash_len:keysize+name_hash_len+10]
+            signature   = packet.data[keysize+name_hash_len+10:keysize+name_hash_len+10+sig_len]
+            app_data    = b""
+            if len(packet.data) > keysize+name_hash_len+10+sig_len:
+                app_data = packet.data[keysize+name_hash_len+10+sig_len:]
+
+        return public_key, name_hash, random_hash, ratchet, signature, app_data
+
+    @staticmethod
+    def announce_signature_material(packet):
+        """
+        :returns: A tuple of public key, signature and signed data for an announce packet, suitable for :py:meth:`verify_announce_signature`.
+        """
+        public_key, name_hash, random_hash, ratchet, signature, app_data = Identity._unpack_announce(packet)
+        signed_data = packet.destination_hash+public_key+name_hash+random_hash+ratchet+app_data
+        return public_key, signature, signed_data
+
     @staticmethod
     def validate_announce(packet, only_validate_signature=False):
         try:
             if packet.packet_type == RNS.Packet.ANNOUNCE:
-                keysize       = Identity.KEYSIZE//8
-                ratchetsize   = Identity.RATCHETSIZE//8
-                name_hash_len = Identity.NAME_HASH_LENGTH//8
-                sig_len       = Identity.SIGLENGTH//8
                 destination_hash = packet.destination_hash
-
-                # Get public key bytes from announce
-                public_key = packet.data[:keysize]
-
-                # If the packet context flag is set,
-                # this announce contains a new ratchet
-                if packet.context_flag == RNS.Packet.FLAG_SET:
-                    name_hash   = packet.data[keysize:keysize+name_hash_len ]
-                    random_hash = packet.data[keysize+name_hash_len:keysize+name_hash_len+10]
-                    ratchet     = packet.data[keysize+name_hash_len+10:keysize+name_hash_len+10+ratchetsize]
-                    signature   = packet.data[keysize+name_hash_len+10+ratchetsize:keysize+name_hash_len+10+ratchetsize+sig_len]
-                    app_data    = b""
-                    if len(packet.data) > keysize+name_hash_len+10+sig_len+ratchetsize:
-                        app_data = packet.data[keysize+name_hash_len+10+sig_len+ratchetsize:]
-
-                # If the packet context flag is not set,
-                # this announce does not contain a ratchet
-                else:
-                    ratchet     = b""
-                    name_hash   = packet.data[keysize:keysize+name_hash_len]
-                    random_hash = packet.data[keysize+name_hash_len:keysize+name_hash_len+10]
-                    signature   = packet.data[keysize+name_hash_len+10:keysize+name_hash_len+10+sig_len]
-                    app_data    = b""
-                    if len(packet.data) > keysize+name_hash_len+10+sig_len:
-                        app_data = packet.data[keysize+name_hash_len+10+sig_len:]
-
+                public_key, name_hash, random_hash, ratchet, signature, app_data = Identity._unpack_announce(packet)
                 signed_data = destination_hash+public_key+name_hash+random_hash+ratchet+app_data
 
                 if not len(packet.data) > Identity.KEYSIZE//8+Identity.NAME_HASH_LENGTH//8+10+Identity.SIGLENGTH//8:
                     app_data = None
 
-                announced_identity = Identity(create_keys=False)
-                announced_identity.load_public_key(public_key)
-
-                if announced_identity.pub != None and announced_identity.validate(signature, signed_data):
+                if Identity.validate_announce_signature(public_key, signature, signed_data):
                     if only_validate_signature:
-                        del announced_identity
                         return True
 
-                    hash_material = name_hash+announced_identity.hash
+                    hash_material = name_hash+Identity.truncated_hash(public_key)
                     expected_hash = RNS.Identity.full_hash(hash_material)[:RNS.Reticulum.TRUNCATED_HASHLENGTH//8]
 
                     if destination_hash == expected_hash:
@@ -450,7 +646,6 @@ class Identity:
                                 return False
 
                         RNS.Identity.remember(packet.get_hash(), destination_hash, public_key, app_data)
-                        del announced_identity
 
                         if packet.rssi != None or packet.snr != None:
                             signal_str = " ["
@@ -480,7 +675,6 @@ class Identity:
 
                 else:
                     RNS.log("Received invalid announce for "+RNS.prettyhexrep(destination_hash)+": Invalid signature.", RNS.LOG_DEBUG)
-                    del announced_identity
                     return False
         
         except Exception as e:
@@ -491,6 +685,11 @@ class Identity:
     def persist_data():
         if not RNS.Transport.owner.is_connected_to_shared_instance:
             Identity.save_known_destinations()
+            if Identity.ratchet_store != None:
+                try:
+                    Identity.ratchet_store.flush()
+                except Exception as e:
+                    RNS.log("Could not persist ratchets to storage. The contained exception was: "+str(e), RNS.LOG_ERROR)
 
     @staticmethod
     def exit_handler():
@@ -722,15 +921,19 @@ class Identity:
                     peer_pub = X25519PublicKey.from_public_bytes(peer_pub_bytes)
                     ciphertext = ciphertext_token[Identity.KEYSIZE//8//2:]
 
-                    if ratchets:
+                    if isinstance(ratchets, RatchetKeyring):
+                        plaintext, ratchet_id = ratchets.decrypt(peer_pub_bytes, peer_pub, ciphertext, self.__decrypt)
+                        if plaintext != None and ratchet_id_receiver:
+                            ratchet_id_receiver.latest_ratchet_id = ratchet_id
+
+                    elif ratchets:
                         for ratchet in ratchets:
                             try:
                                 ratchet_prv = X25519PrivateKey.from_private_bytes(ratchet)
-                                ratchet_id = Identity._get_ratchet_id(ratchet_prv.public_key().public_bytes())
                                 shared_key = ratchet_prv.exchange(peer_pub)
                                 plaintext = self.__decrypt(shared_key, ciphertext)
                                 if ratchet_id_receiver:
-                                    ratchet_id_receiver.latest_ratchet_id = ratchet_id
+                                    ratchet_id_receiver.latest_ratchet_id = Identity._get_ratchet_id(ratchet_prv.public_key().public_bytes())
                                 
                                 break
                             
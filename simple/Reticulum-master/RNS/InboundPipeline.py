@@ -0,0 +1,204 @@
+# Reticulum License
+#
+# Copyright (c) 2016-2025 Mark Qvist
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# - The Software shall not be used in any kind of system which includes amongst
+#   its functions the ability to purposefully do harm to human beings.
+#
+# - The Software shall not be used, directly or indirectly, in the creation of
+#   an artificial intelligence, machine learning or language model training
+#   dataset, including but not limited to any use that contributes to the
+#   training or development of such a model or algorithm.
+#
+# - The above copyright notice and this permission notice shall be included in
+#   all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import RNS
+import time
+import threading
+from collections import deque
+
+class InboundPipeline:
+    """
+    A processing stage between the interfaces and Transport. When
+    enabled, interface reader threads, such as the Backbone I/O
+    loop, only queue received packets, and a set of worker threads
+    runs them through Transport. Packets are assigned to workers by
+    their receiving interface, so packets from any one interface
+    are always processed in the order they arrived.
+
+    Each worker has two bounded queues. Announces go in a low
+    priority queue, and everything else in a high priority queue
+    that is always served first, except for one announce after
+    every ``ANNOUNCE_INTERVAL`` other packets, so announces are
+    never starved completely. When a queue is full, newly arriving
+    packets for it are dropped. Packets on interfaces with access
+    codes enabled can not be classified before they are unmasked,
+    and always use the high priority queue.
+    """
+    DEFAULT_WORKERS              = 1
+    DEFAULT_QUEUE_DEPTH          = 8192
+    DEFAULT_ANNOUNCE_QUEUE_DEPTH = 2048
+    ANNOUNCE_INTERVAL            = 16
+
+    # How long an idle worker waits for packets
+    # before checking whether it should keep running.
+    IDLE_WAIT                    = 0.5
+
+    def __init__(self, process_packet, workers=DEFAULT_WORKERS, queue_depth=DEFAULT_QUEUE_DEPTH, announce_queue_depth=DEFAULT_ANNOUNCE_QUEUE_DEPTH):
+        self.process_packet       = process_packet
+        self.queue_depth          = max(1, int(queue_depth))
+        self.announce_queue_depth = max(1, int(announce_queue_depth))
+        self.workers              = [InboundWorker(self) for i in range(max(1, int(workers)))]
+        self.worker_threads       = set()
+        self.running              = False
+
+    def start(self):
+        if not self.running:
+            self.running = True
+            for worker in self.workers:
+                threading.Thread(target=worker.run, daemon=True).start()
+
+            RNS.log("Started inbound pipeline with "+str(len(self.workers))+" workers", RNS.LOG_VERBOSE)
+
+    def stop(self):
+        self.running = False
+        for worker in self.workers:
+            with worker.available: worker.available.notify()
+
+    def in_worker(self):
+        return threading.get_ident() in self.worker_threads
+
+    def submit(self, raw, interface=None):
+        if len(self.workers) == 1: worker = self.workers[0]
+        else:                      worker = self.workers[hash(interface) % len(self.workers)]
+
+        announce = len(raw) > 2 and raw[0] & 0x80 == 0 and raw[0] & 0x03 == RNS.Packet.ANNOUNCE
+        worker.enqueue(raw, interface, announce)
+
+    def get_stats(self):
+        stats = {
+            "workers": len(self.workers),
+            "queue_depth": self.queue_depth,
+            "announce_queue_depth": self.announce_queue_depth,
+            "queued": 0, "announces_queued": 0,
+            "max_queued": 0, "max_announces_queued": 0,
+            "received": 0, "dropped": 0, "announces_dropped": 0, "processed": 0,
+            "wait_time": 0.0, "max_wait_time": 0.0,
+            "processing_time": 0.0, "max_processing_time": 0.0,
+        }
+
+        for worker in self.workers:
+            stats["queued"]               += len(worker.queue)
+            stats["announces_queued"]     += len(worker.announce_queue)
+            stats["max_queued"]            = max(stats["max_queued"], worker.max_queued)
+            stats["max_announces_queued"]  = max(stats["max_announces_queued"], worker.max_announces_queued)
+            stats["received"]             += worker.received
+            stats["dropped"]              += worker.dropped
+            stats["announces_dropped"]    += worker.announces_dropped
+            stats["processed"]            += worker.processed
+            stats["wait_time"]            += worker.wait_time
+            stats["max_wait_time"]         = max(stats["max_wait_time"], worker.max_wait_time)
+            stats["processing_time"]      += worker.processing_time
+            stats["max_processing_time"]   = max(stats["max_processing_time"], worker.max_processing_time)
+
+        if stats["processed"] > 0:
+            stats["avg_wait_time"]       = stats["wait_time"]/stats["processed"]
+            stats["avg_processing_time"] = stats["processing_time"]/stats["processed"]
+        else:
+            stats["avg_wait_time"]       = 0
+            stats["avg_processing_time"] = 0
+
+        return stats
+
+class InboundWorker:
+    def __init__(self, pipeline):
+        self.pipeline       = pipeline
+        self.queue          = deque()
+        self.announce_queue = deque()
+        self.available      = threading.Condition()
+        self.since_announce = 0
+
+        self.received             = 0
+        self.dropped              = 0
+        self.announces_dropped    = 0
+        self.processed            = 0
+        self.max_queued           = 0
+        self.max_announces_queued = 0
+        self.wait_time            = 0.0
+        self.max_wait_time        = 0.0
+        self.processing_time      = 0.0
+        self.max_processing_time  = 0.0
+
+    def enqueue(self, raw, interface, announce):
+        with self.available:
+            self.received += 1
+            if announce:
+                if len(self.announce_queue) >= self.pipeline.announce_queue_depth:
+                    self.announces_dropped += 1
+                    return
+                self.announce_queue.append((raw, interface, time.time()))
+                if len(self.announce_queue) > self.max_announces_queued: self.max_announces_queued = len(self.announce_queue)
+
+            else:
+                if len(self.queue) >= self.pipeline.queue_depth:
+                    self.dropped += 1
+                    return
+                self.queue.append((raw, interface, time.time()))
+                if len(self.queue) > self.max_queued: self.max_queued = len(self.queue)
+
+            self.available.notify()
+
+    def next_entry(self):
+        # Serve the high priority queue first, but let
+        # an announce through at regular intervals
+        if len(self.announce_queue) > 0 and (len(self.queue) == 0 or self.since_announce >= InboundPipeline.ANNOUNCE_INTERVAL):
+            self.since_announce = 0
+            return self.announce_queue.popleft()
+        elif len(self.queue) > 0:
+            self.since_announce += 1
+            return self.queue.popleft()
+        else:
+            return None
+
+    def run(self):
+        self.pipeline.worker_threads.add(threading.get_ident())
+        while self.pipeline.running:
+            with self.available:
+                entry = self.next_entry()
+                if entry == None:
+                    self.available.wait(InboundPipeline.IDLE_WAIT)
+                    continue
+
+            raw, interface, enqueued = entry
+            started = time.time()
+            try:
+                self.pipeline.process_packet(raw, interface)
+            except Exception as e:
+                RNS.log("Error while processing inbound packet from "+str(interface)+". The contained exception was: "+str(e), RNS.LOG_ERROR)
+                RNS.trace_exception(e)
+
+            processed = time.time()
+            wait_time = started-enqueued
+            processing_time = processed-started
+
+            self.processed += 1
+            self.wait_time += wait_time
+            self.processing_time += processing_time
+            if wait_time > self.max_wait_time: self.max_wait_time = wait_time
+            if processing_time > self.max_processing_time: self.max_processing_time = processing_time
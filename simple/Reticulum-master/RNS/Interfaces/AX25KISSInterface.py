@@ -34,6 +34,7 @@ import sys
 import threading
 import time
 import RNS
+from RNS.Interfaces.util.framing import KISSDeframer
 
 class KISS():
     FEND              = 0xC0
@@ -315,50 +316,22 @@ class AX25KISSInterface(Interface):
 
     def readLoop(self):
         try:
-            in_frame = False
-            escape = False
-            command = KISS.CMD_UNKNOWN
-            data_buffer = b""
+            deframer = KISSDeframer(max_size=self.HW_MTU+AX25.HEADER_SIZE)
             last_read_ms = int(time.time()*1000)
 
             while self.serial.is_open:
                 if self.serial.in_waiting:
-                    byte = ord(self.serial.read(1))
+                    data_in = self.serial.read(self.serial.in_waiting)
                     last_read_ms = int(time.time()*1000)
-
-                    if (in_frame and byte == KISS.FEND and command == KISS.CMD_DATA):
-                        in_frame = False
-                        self.process_incoming(data_buffer)
-                    elif (byte == KISS.FEND):
-                        in_frame = True
-                        command = KISS.CMD_UNKNOWN
-                        data_buffer = b""
-                    elif (in_frame and len(data_buffer) < self.HW_MTU+AX25.HEADER_SIZE):
-                        if (len(data_buffer) == 0 and command == KISS.CMD_UNKNOWN):
-                            # We only support one HDLC port for now, so
-                            # strip off the port nibble
-                            byte = byte & 0x0F
-                            command = byte
-                        elif (command == KISS.CMD_DATA):
-                            if (byte == KISS.FESC):
-                                escape = True
-                            else:
-                                if (escape):
-                                    if (byte == KISS.TFEND):
-                                        byte = KISS.FEND
-                                    if (byte == KISS.TFESC):
-                                        byte = KISS.FESC
-                                    escape = False
-                                data_buffer = data_buffer+bytes([byte])
-                        elif (command == KISS.CMD_READY):
+                    for command, frame in deframer.feed(data_in):
+                        if command == KISS.CMD_DATA:
+                            self.process_incoming(frame)
+                        elif command == KISS.CMD_READY:
                             self.process_queue()
                 else:
                     time_since_last = int(time.time()*1000) - last_read_ms
-                    if len(data_buffer) > 0 and time_since_last > self.timeout:
-                        data_buffer = b""
-                        in_frame = False
-                        command = KISS.CMD_UNKNOWN
-                        escape = False
+                    if deframer.buffered() > 1 and time_since_last > self.timeout:
+                        deframer.reset()
                     sleep(0.05)
 
                     if self.flow_control:
@@ -34,6 +34,7 @@ import sys
 import threading
 import time
 import RNS
+from RNS.Interfaces.util.framing import HDLCDeframer
 
 class HDLC():
     # The Serial Interface packetizes data using
@@ -208,42 +209,21 @@ class SerialInterface(Interface):
 
     def readLoop(self):
         try:
-            in_frame = False
-            escape = False
-            data_buffer = b""
+            deframer = HDLCDeframer(max_size=self.HW_MTU)
             last_read_ms = int(time.time()*1000)
 
             while self.serial.is_open:
                 serial_bytes = self.serial.read()
                 got = len(serial_bytes)
 
-                for byte in serial_bytes:
+                if got > 0:
                     last_read_ms = int(time.time()*1000)
-
-                    if (in_frame and byte == HDLC.FLAG):
-                        in_frame = False
-                        self.process_incoming(data_buffer)
-                    elif (byte == HDLC.FLAG):
-                        in_frame = True
-                        data_buffer = b""
-                    elif (in_frame and len(data_buffer) < self.HW_MTU):
-                        if (byte == HDLC.ESC):
-                            escape = True
-                        else:
-                            if (escape):
-                                if (byte == HDLC.FLAG ^ HDLC.ESC_MASK):
-                                    byte = HDLC.FLAG
-                                if (byte == HDLC.ESC  ^ HDLC.ESC_MASK):
-                                    byte = HDLC.ESC
-                                escape = False
-                            data_buffer = data_buffer+bytes([byte])
+                    for frame in deframer.feed(serial_bytes): self.process_incoming(frame)
                         
                 if got == 0:
                     time_since_last = int(time.time()*1000) - last_read_ms
-                    if len(data_buffer) > 0 and time_since_last > self.timeout:
-                        data_buffer = b""
-                        in_frame = False
-                        escape = False
+                    if deframer.buffered() > 1 and time_since_last > self.timeout:
+                        deframer.reset()
                     # sleep(0.08)
                     
         except Exception as e:
@@ -36,6 +36,8 @@ import time
 import sys
 import os
 import RNS
+from collections import deque
+from RNS.Interfaces.util.framing import HDLCDeframer
 
 class HDLC():
     FLAG              = 0x7E
@@ -54,13 +56,34 @@ class BackboneInterface(Interface):
     DEFAULT_IFAC_SIZE = 16
     AUTOCONFIGURE_MTU = True
 
+    # Client sockets are edge-triggered, and are drained
+    # of all available data on every readiness event
+    EPOLL_IN          = select.EPOLLIN | select.EPOLLET
+    EPOLL_INOUT       = select.EPOLLIN | select.EPOLLOUT | select.EPOLLET
+
+    POLL_TIMEOUT      = 1
+    POLL_MAX_EVENTS   = 256
+    READ_SIZE         = 65536
+    READ_BUDGET       = 16
+    WRITE_BATCH       = 64
+
+    # Upper bounds in seconds of the buckets in the
+    # I/O loop latency histogram. The last bucket
+    # holds all iterations slower than this.
+    LATENCY_BUCKETS   = [0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1]
+
     epoll = None
     listener_filenos = {}
     spawned_interface_filenos = {}
-    epoll = None
+    pending_reads = set()
     _job_active = False
     _job_lock = threading.Lock()
 
+    loop_iterations   = 0
+    loop_events       = 0
+    loop_latency_max  = 0
+    loop_latency      = [0]*(len(LATENCY_BUCKETS)+1)
+
     @staticmethod
     def get_address_for_if(name, bind_port, prefer_ipv6=False):
         from RNS.Interfaces import netinfo
@@ -188,17 +211,19 @@ class BackboneInterface(Interface):
     @staticmethod
     def add_client_socket(client_socket, interface):
         BackboneInterface.ensure_epoll()
-        BackboneInterface.spawned_interface_filenos[client_socket.fileno()] = interface
-        BackboneInterface.register_in(client_socket.fileno())
+        client_socket.setblocking(False)
+        with interface.transmit_lock:
+            BackboneInterface.spawned_interface_filenos[client_socket.fileno()] = interface
+            BackboneInterface.register_in(client_socket.fileno(), writable=len(interface.transmit_queue) > 0)
         BackboneInterface.start()
 
     @staticmethod
-    def register_in(fileno):
+    def register_in(fileno, writable=False):
         if fileno < 0:
             RNS.log(f"Attempt to register invalid file descriptor {fileno}", RNS.LOG_ERROR)
             return
 
-        try: BackboneInterface.epoll.register(fileno, select.EPOLLIN)
+        try: BackboneInterface.epoll.register(fileno, BackboneInterface.EPOLL_INOUT if writable else BackboneInterface.EPOLL_IN)
         except Exception as e:
             RNS.log(f"An error occurred while registering EPOLL_IN for file descriptor {fileno}: {e}", RNS.LOG_ERROR)
 
@@ -224,14 +249,146 @@ class BackboneInterface(Interface):
 
     @staticmethod
     def tx_ready(interface):
+        # Must be called with the transmit lock of the
+        # interface held, when its queue is no longer empty
         if interface.socket:
             fileno = interface.socket.fileno()
             if fileno in BackboneInterface.spawned_interface_filenos:
                 try:
-                    BackboneInterface.epoll.modify(interface.socket.fileno(), select.EPOLLOUT)
+                    BackboneInterface.epoll.modify(fileno, BackboneInterface.EPOLL_INOUT)
                 except Exception as e:
                     RNS.trace_exception(e)
 
+    @staticmethod
+    def transmit(interface, frame):
+        # Frames are written directly when nothing is queued for
+        # the interface, so frames produced while the I/O loop is
+        # handling other events are not held back until the next
+        # writability event. Only the part of a frame that the
+        # socket does not accept right away is queued, and write
+        # errors are left for the I/O loop to handle.
+        written = 0
+        with interface.transmit_lock:
+            if len(interface.transmit_queue) == 0:
+                try: written = interface.socket.send(frame)
+                except Exception as e: written = 0
+
+            elif interface.transmit_queued+len(frame) > interface.MAX_TRANSMIT_QUEUE:
+                interface.transmit_dropped += 1
+                RNS.log("Transmit queue full on "+str(interface)+", dropped outgoing frame", RNS.LOG_EXTREME)
+                return
+
+            if written < len(frame):
+                interface.transmit_queue.append(memoryview(frame)[written:] if written > 0 else frame)
+                interface.transmit_queued += len(frame)-written
+                if len(interface.transmit_queue) == 1: BackboneInterface.tx_ready(interface)
+
+        interface.txb += written
+        if interface.parent_interface: interface.parent_interface.txb += written
+
+    @staticmethod
+    def close_client(fileno, spawned_interface):
+        BackboneInterface.deregister_fileno(fileno)
+        BackboneInterface.pending_reads.discard(fileno)
+        try:
+            if fileno in BackboneInterface.spawned_interface_filenos: BackboneInterface.spawned_interface_filenos.pop(fileno)
+        except Exception as e: RNS.log(f"Error while removing spawned interface file descriptor from BackboneInterface I/O handler: {e}", RNS.LOG_ERROR)
+
+        pif = spawned_interface.parent_interface
+        try:
+            if pif and pif.spawned_interfaces != None:
+                while spawned_interface in pif.spawned_interfaces: pif.spawned_interfaces.remove(spawned_interface)
+        except Exception as e: RNS.log(f"Error while removing spawned interface from {pif}: {e}", RNS.LOG_ERROR)
+
+        try:
+            if spawned_interface.socket: spawned_interface.socket.close()
+        except Exception as e: RNS.log(f"Error while closing socket for {spawned_interface}: {e}", RNS.LOG_ERROR)
+        spawned_interface.receive(b"")
+
+    @staticmethod
+    def read_client(fileno, spawned_interface, client_socket, read_view):
+        # Since readiness is edge-triggered, the socket must be
+        # read until it has no more data. Sockets that still hold
+        # data when the read budget is spent are revisited in the
+        # next loop iteration, so a single busy peer can not
+        # starve the others.
+        for i in range(BackboneInterface.READ_BUDGET):
+            try: received = client_socket.recv_into(read_view)
+            except (BlockingIOError, InterruptedError): return
+            except Exception as e:
+                RNS.log(f"Error while reading from {spawned_interface}: {e}", RNS.LOG_DEBUG)
+                received = 0
+
+            if received == 0:
+                BackboneInterface.close_client(fileno, spawned_interface)
+                return
+
+            spawned_interface.receive(read_view[:received])
+
+            # A short read on a stream socket means that
+            # all currently available data was consumed
+            if received < len(read_view): return
+
+        BackboneInterface.pending_reads.add(fileno)
+
+    @staticmethod
+    def write_client(fileno, spawned_interface, client_socket):
+        failed = False
+        with spawned_interface.transmit_lock:
+            queue = spawned_interface.transmit_queue
+            written = 0
+            while len(queue) > 0:
+                buffers = [queue[i] for i in range(min(len(queue), BackboneInterface.WRITE_BATCH))]
+                try: sent = client_socket.sendmsg(buffers)
+                except (BlockingIOError, InterruptedError): break
+                except Exception as e:
+                    if not spawned_interface.detached: RNS.log(f"Error while writing to {spawned_interface}: {e}", RNS.LOG_DEBUG)
+                    failed = True
+                    break
+
+                written += sent
+                spawned_interface.transmit_queued -= sent
+                socket_full = sent < sum([len(b) for b in buffers])
+                while sent > 0:
+                    if len(queue[0]) <= sent: sent -= len(queue.popleft())
+                    else:
+                        queue[0] = memoryview(queue[0])[sent:]
+                        sent = 0
+
+                if socket_full: break
+
+            if not failed and len(queue) == 0:
+                try: BackboneInterface.epoll.modify(fileno, BackboneInterface.EPOLL_IN)
+                except Exception as e: RNS.log(f"Error while modifying events for {spawned_interface}: {e}", RNS.LOG_ERROR)
+
+        spawned_interface.txb += written
+        if spawned_interface.parent_interface: spawned_interface.parent_interface.txb += written
+        if failed: BackboneInterface.close_client(fileno, spawned_interface)
+
+    @staticmethod
+    def record_loop_latency(latency, events):
+        BackboneInterface.loop_iterations += 1
+        BackboneInterface.loop_events += events
+        if latency > BackboneInterface.loop_latency_max: BackboneInterface.loop_latency_max = latency
+        bucket = 0
+        for bound in BackboneInterface.LATENCY_BUCKETS:
+            if latency <= bound: break
+            bucket += 1
+        BackboneInterface.loop_latency[bucket] += 1
+
+    @staticmethod
+    def get_loop_stats():
+        if not BackboneInterface._job_active: return None
+        else:
+            return {
+                "iterations": BackboneInterface.loop_iterations,
+                "events": BackboneInterface.loop_events,
+                "clients": len(BackboneInterface.spawned_interface_filenos),
+                "latency_max": BackboneInterface.loop_latency_max,
+                "latency_buckets": BackboneInterface.LATENCY_BUCKETS.copy(),
+                "latency_histogram": BackboneInterface.loop_latency.copy(),
+            }
+
     @staticmethod
     def __job():
         with BackboneInterface._job_lock:
@@ -239,79 +396,34 @@ class BackboneInterface(Interface):
             else:
                 BackboneInterface._job_active = True
                 BackboneInterface.ensure_epoll()
+                read_buffer = bytearray(BackboneInterface.READ_SIZE)
+                read_view   = memoryview(read_buffer)
                 try:
                     while True:
-                        events = BackboneInterface.epoll.poll(1)
-                        for fileno, event in BackboneInterface.epoll.poll(1):
+                        timeout = 0 if len(BackboneInterface.pending_reads) > 0 else BackboneInterface.POLL_TIMEOUT
+                        events  = BackboneInterface.epoll.poll(timeout, BackboneInterface.POLL_MAX_EVENTS)
+                        started = time.time()
+
+                        if len(BackboneInterface.pending_reads) > 0:
+                            ready = set([fileno for fileno, event in events])
+                            for fileno in BackboneInterface.pending_reads:
+                                if not fileno in ready: events.append((fileno, select.EPOLLIN))
+                            BackboneInterface.pending_reads.clear()
+
+                        for fileno, event in events:
                             if fileno in BackboneInterface.spawned_interface_filenos:
                                 spawned_interface = BackboneInterface.spawned_interface_filenos[fileno]
                                 client_socket = spawned_interface.socket
-                                if client_socket and fileno == client_socket.fileno() and (event & select.EPOLLIN):
-                                    try: received_bytes = client_socket.recv(spawned_interface.HW_MTU)
-                                    except Exception as e:
-                                        RNS.log(f"Error while reading from {spawned_interface}: {e}", RNS.LOG_DEBUG)
-                                        received_bytes = b""
-
-                                    if len(received_bytes): spawned_interface.receive(received_bytes)
-                                    else:
-                                        BackboneInterface.deregister_fileno(fileno); client_socket.close()
-                                        try:
-                                            if fileno in BackboneInterface.spawned_interface_filenos: BackboneInterface.spawned_interface_filenos.pop(fileno)
-                                        except Exception as e: RNS.log(f"Error while removing spawned interface file descriptor from BackboneInterface I/O handler: {e}", RNS.LOG_ERROR)
-
-                                        try:
-                                            if spawned_interface.parent_interface:
-                                                pif = spawned_interface.parent_interface
-                                                if pif.spawned_interfaces != None:
-                                                    while spawned_interface in pif.spawned_interfaces: pif.spawned_interfaces.remove(spawned_interface)
-                                        except Exception as e: RNS.log(f"Error while removing spawned interface from {pif}: {e}", RNS.LOG_ERROR)
-
-                                        spawned_interface.receive(received_bytes)
-                                
-                                elif client_socket and fileno == client_socket.fileno() and (event & select.EPOLLOUT):
-                                    try:
-                                        written = client_socket.send(spawned_interface.transmit_buffer)
-                                    except Exception as e:
-                                        written = 0
-                                        if not spawned_interface.detached: RNS.log(f"Error while writing to {spawned_interface}: {e}", RNS.LOG_DEBUG)
-                                        BackboneInterface.deregister_fileno(fileno)
-
-                                        try:
-                                            if fileno in BackboneInterface.spawned_interface_filenos: BackboneInterface.spawned_interface_filenos.pop(fileno)
-                                        except Exception as e: RNS.log(f"Error while removing spawned interface file descriptor from BackboneInterface I/O handler: {e}", RNS.LOG_ERROR)
-                                        
-                                        try:
-                                            if spawned_interface.parent_interface:
-                                                pif = spawned_interface.parent_interface
-                                                if pif.spawned_interfaces != None:
-                                                    while spawned_interface in pif.spawned_interfaces: pif.spawned_interfaces.remove(spawned_interface)
-                                        except Exception as e: RNS.log(f"Error while removing spawned interface from {pif}: {e}", RNS.LOG_ERROR)
+                                if not client_socket or fileno != client_socket.fileno(): continue
 
-                                        try: client_socket.close()
-                                        except Exception as e: RNS.log(f"Error while closing socket for {spawned_interface}: {e}", RNS.LOG_ERROR)
-                                        spawned_interface.receive(b"")
+                                if event & select.EPOLLIN:
+                                    BackboneInterface.read_client(fileno, spawned_interface, client_socket, read_view)
 
-                                    spawned_interface.transmit_buffer = spawned_interface.transmit_buffer[written:]
-                                    if len(spawned_interface.transmit_buffer) == 0: BackboneInterface.epoll.modify(fileno, select.EPOLLIN)
-                                    spawned_interface.txb += written
-                                    if spawned_interface.parent_interface: spawned_interface.parent_interface.txb += written
-                                
-                                elif client_socket and fileno == client_socket.fileno() and event & (select.EPOLLHUP):
-                                    BackboneInterface.deregister_fileno(fileno)
-                                    try:
-                                        if fileno in BackboneInterface.spawned_interface_filenos: BackboneInterface.spawned_interface_filenos.pop(fileno)
-                                    except Exception as e: RNS.log(f"Error while removing spawned interface file descriptor from BackboneInterface I/O handler: {e}", RNS.LOG_ERROR)
-
-                                    try:
-                                        if spawned_interface.parent_interface:
-                                            pif = spawned_interface.parent_interface
-                                            if pif.spawned_interfaces != None:
-                                                while spawned_interface in pif.spawned_interfaces: pif.spawned_interfaces.remove(spawned_interface)
-                                    except Exception as e: RNS.log(f"Error while removing spawned interface from {pif}: {e}", RNS.LOG_ERROR)
-
-                                    try: client_socket.close()
-                                    except Exception as e: RNS.log(f"Error while closing socket for {spawned_interface}: {e}", RNS.LOG_ERROR)
-                                    spawned_interface.receive(b"")
+                                if event & select.EPOLLOUT and fileno in BackboneInterface.spawned_interface_filenos:
+                                    BackboneInterface.write_client(fileno, spawned_interface, client_socket)
+
+                                if event & (select.EPOLLHUP | select.EPOLLERR) and fileno in BackboneInterface.spawned_interface_filenos:
+                                    BackboneInterface.close_client(fileno, spawned_interface)
 
                             elif fileno in BackboneInterface.listener_filenos:
                                 owner_interface, server_socket = BackboneInterface.listener_filenos[fileno]
@@ -329,6 +441,8 @@ class BackboneInterface(Interface):
                                     try: server_socket.close()
                                     except Exception as e: RNS.log(f"Error while closing listener socket for {server_socket}: {e}", RNS.LOG_ERROR)
 
+                        if len(events) > 0: BackboneInterface.record_loop_latency(time.time()-started, len(events))
+
                 except Exception as e:
                     RNS.log(f"BackboneInterface error: {e}", RNS.LOG_ERROR)
                     RNS.trace_exception(e)
@@ -435,6 +549,10 @@ class BackboneClientInterface(Interface):
     INITIAL_CONNECT_TIMEOUT = 5
     SYNCHRONOUS_START = True
 
+    # Frames queued for transmission beyond this many
+    # bytes are dropped until the peer catches up
+    MAX_TRANSMIT_QUEUE = 8*1024*1024
+
     def __init__(self, owner, configuration, connected_socket=None):
         super().__init__()
 
@@ -463,8 +581,11 @@ class BackboneClientInterface(Interface):
         self.i2p_tunneled     = i2p_tunneled
         self.mode             = RNS.Interfaces.Interface.Interface.MODE_FULL
         self.bitrate          = BackboneClientInterface.BITRATE_GUESS
-        self.frame_buffer     = b""
-        self.transmit_buffer  = b""
+        self.deframer         = HDLCDeframer(min_size=RNS.Reticulum.HEADER_MINSIZE)
+        self.transmit_queue   = deque()
+        self.transmit_queued  = 0
+        self.transmit_dropped = 0
+        self.transmit_lock    = threading.Lock()
         
         if max_reconnect_tries == None:
             self.max_reconnect_tries = BackboneClientInterface.RECONNECT_MAX_TRIES
@@ -550,7 +671,6 @@ class BackboneClientInterface(Interface):
             self.socket.settimeout(BackboneClientInterface.INITIAL_CONNECT_TIMEOUT)
             self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
             self.socket.connect(target_address)
-            self.socket.settimeout(None)
 
             BackboneInterface.add_client_socket(self.socket, self)
             self.online  = True
@@ -613,8 +733,7 @@ class BackboneClientInterface(Interface):
     def process_outgoing(self, data):
         if self.online and not self.detached:
             try:
-                self.transmit_buffer += bytes([HDLC.FLAG])+HDLC.escape(data)+bytes([HDLC.FLAG])
-                BackboneInterface.tx_ready(self)
+                BackboneInterface.transmit(self, bytes([HDLC.FLAG])+HDLC.escape(data)+bytes([HDLC.FLAG]))
 
             except Exception as e:
                 RNS.log("Exception occurred while transmitting via "+str(self)+", tearing down interface", RNS.LOG_ERROR)
@@ -624,23 +743,7 @@ class BackboneClientInterface(Interface):
     def receive(self, data_in):
         try:
             if len(data_in) > 0:
-                self.frame_buffer += data_in
-                flags_remaining = True
-                while flags_remaining:
-                    frame_start = self.frame_buffer.find(HDLC.FLAG)
-                    if frame_start != -1:
-                        frame_end = self.frame_buffer.find(HDLC.FLAG, frame_start+1)
-                        if frame_end != -1:
-                            frame = self.frame_buffer[frame_start+1:frame_end]
-                            frame = frame.replace(bytes([HDLC.ESC, HDLC.FLAG ^ HDLC.ESC_MASK]), bytes([HDLC.FLAG]))
-                            frame = frame.replace(bytes([HDLC.ESC, HDLC.ESC  ^ HDLC.ESC_MASK]), bytes([HDLC.ESC]))
-                            if len(frame) > RNS.Reticulum.HEADER_MINSIZE:
-                                self.process_incoming(frame)
-                            self.frame_buffer = self.frame_buffer[frame_end:]
-                        else:
-                            flags_remaining = False
-                    else:
-                        flags_remaining = False
+                for frame in self.deframer.feed(data_in): self.process_incoming(frame)
 
             else:
                 self.online = False
@@ -37,6 +37,7 @@ import time
 import sys
 import os
 import RNS
+from RNS.Interfaces.util.framing import HDLCDeframer, KISSDeframer
 import asyncio
 
 class HDLC():
@@ -722,66 +723,21 @@ class I2PInterfacePeer(Interface):
 
             wd_thread = threading.Thread(target=self.read_watchdog, daemon=True).start()
 
-            in_frame = False
-            escape = False
-            data_buffer = b""
-            command = KISS.CMD_UNKNOWN
+            if self.kiss_framing: deframer = KISSDeframer(max_size=self.HW_MTU)
+            else:                 deframer = HDLCDeframer(max_size=self.HW_MTU)
 
             while True:
                 data_in = self.socket.recv(4096)
                 if len(data_in) > 0:
-                    pointer = 0
                     self.last_read = time.time()
-                    while pointer < len(data_in):
-                        byte = data_in[pointer]
-                        pointer += 1
-
-                        if self.kiss_framing:
-                            # Read loop for KISS framing
-                            if (in_frame and byte == KISS.FEND and command == KISS.CMD_DATA):
-                                in_frame = False
-                                self.process_incoming(data_buffer)
-                            elif (byte == KISS.FEND):
-                                in_frame = True
-                                command = KISS.CMD_UNKNOWN
-                                data_buffer = b""
-                            elif (in_frame and len(data_buffer) < self.HW_MTU):
-                                if (len(data_buffer) == 0 and command == KISS.CMD_UNKNOWN):
-                                    # We only support one HDLC port for now, so
-                                    # strip off the port nibble
-                                    byte = byte & 0x0F
-                                    command = byte
-                                elif (command == KISS.CMD_DATA):
-                                    if (byte == KISS.FESC):
-                                        escape = True
-                                    else:
-                                        if (escape):
-                                            if (byte == KISS.TFEND):
-                                                byte = KISS.FEND
-                                            if (byte == KISS.TFESC):
-                                                byte = KISS.FESC
-                                            escape = False
-                                        data_buffer = data_buffer+bytes([byte])
+                    if self.kiss_framing:
+                        # Read loop for KISS framing
+                        for command, frame in deframer.feed(data_in):
+                            if command == KISS.CMD_DATA: self.process_incoming(frame)
 
-                        else:
-                            # Read loop for HDLC framing
-                            if (in_frame and byte == HDLC.FLAG):
-                                in_frame = False
-                                self.process_incoming(data_buffer)
-                            elif (byte == HDLC.FLAG):
-                                in_frame = True
-                                data_buffer = b""
-                            elif (in_frame and len(data_buffer) < self.HW_MTU):
-                                if (byte == HDLC.ESC):
-                                    escape = True
-                                else:
-                                    if (escape):
-                                        if (byte == HDLC.FLAG ^ HDLC.ESC_MASK):
-                                            byte = HDLC.FLAG
-                                        if (byte == HDLC.ESC  ^ HDLC.ESC_MASK):
-                                            byte = HDLC.ESC
-                                        escape = False
-                                    data_buffer = data_buffer+bytes([byte])
+                    else:
+                        # Read loop for HDLC framing
+                        for frame in deframer.feed(data_in): self.process_incoming(frame)
                 else:
                     self.online = False
 
@@ -34,6 +34,86 @@ import threading
 from collections import deque
 from RNS.vendor.configobj import ConfigObj
 
+class IFACEngine:
+    """
+    Authenticates and masks packets with the interface access
+    code of an interface. Key material that is identical for
+    every packet is prepared once, and the time spent on IFAC
+    processing is accounted per interface.
+    """
+    def __init__(self, ifac_identity, ifac_key, ifac_size):
+        self.ifac_identity = ifac_identity
+        self.ifac_key      = ifac_key
+        self.ifac_size     = ifac_size
+        self.mask_hkdf     = RNS.Cryptography.SaltedHKDF(salt=ifac_key)
+
+        self.masked_packets   = 0
+        self.unmasked_packets = 0
+        self.dropped_packets  = 0
+        self.mask_time        = 0.0
+        self.unmask_time      = 0.0
+
+    def matches(self, interface):
+        return interface.ifac_identity == self.ifac_identity and interface.ifac_key == self.ifac_key and interface.ifac_size == self.ifac_size
+
+    def mask(self, raw):
+        started = time.perf_counter()
+
+        # Packets forwarded by transport can be passed
+        # in as bytearrays, so make sure we sign bytes
+        if type(raw) is not bytes: raw = bytes(raw)
+
+        # Calculate packet access code
+        ifac = self.ifac_identity.sign(raw)[-self.ifac_size:]
+
+        # Generate mask
+        mask = self.mask_hkdf.derive(length=len(raw)+self.ifac_size, derive_from=ifac)
+
+        # Set IFAC flag
+        new_header = bytes([raw[0] | 0x80, raw[1]])
+
+        # Assemble new payload with IFAC
+        new_raw    = new_header+ifac+raw[2:]
+
+        # Mask header and payload, but make sure
+        # the IFAC flag is still set
+        masked_raw = RNS.Transport.ifac_mask(new_raw, mask, self.ifac_size)
+        masked_raw = bytes([masked_raw[0] | 0x80])+masked_raw[1:]
+
+        self.masked_packets += 1
+        self.mask_time += time.perf_counter()-started
+        return masked_raw
+
+    def unmask(self, raw):
+        started = time.perf_counter()
+
+        # Extract IFAC
+        ifac = raw[2:2+self.ifac_size]
+
+        # Generate mask
+        mask = self.mask_hkdf.derive(length=len(raw), derive_from=ifac)
+
+        # Unmask header bytes and payload
+        raw = RNS.Transport.ifac_mask(raw, mask, self.ifac_size)
+
+        # Unset IFAC flag
+        new_header = bytes([raw[0] & 0x7f, raw[1]])
+
+        # Re-assemble packet
+        new_raw = new_header+raw[2+self.ifac_size:]
+
+        # Calculate expected IFAC
+        expected_ifac = self.ifac_identity.sign(new_raw)[-self.ifac_size:]
+
+        # Check it
+        self.unmask_time += time.perf_counter()-started
+        if ifac == expected_ifac:
+            self.unmasked_packets += 1
+            return new_raw
+        else:
+            self.dropped_packets += 1
+            return None
+
 class Interface:
     IN  = False
     OUT = False
@@ -106,6 +186,18 @@ class Interface:
     def get_hash(self):
         return RNS.Identity.full_hash(str(self).encode("utf-8"))
 
+    # Returns the IFAC engine for this interface, creating
+    # it on first use. Since IFAC parameters are set on the
+    # interface after instantiation, and in several places,
+    # the engine is replaced if they are changed.
+    def get_ifac_engine(self):
+        engine = getattr(self, "ifac_engine", None)
+        if engine == None or not engine.matches(self):
+            engine = IFACEngine(self.ifac_identity, self.ifac_key, self.ifac_size)
+            self.ifac_engine = engine
+
+        return engine
+
     # This is a generic function for determining when an interface
     # should activate ingress limiting. Since this can vary for
     # different interface types, this function should be overwritten
@@ -30,6 +30,7 @@
 
 from RNS.Interfaces.Interface import Interface
 from RNS.Interfaces.BackboneInterface import BackboneInterface
+from RNS.AsyncRuntime import SocketWriter
 import socketserver
 import threading
 import socket
@@ -37,7 +38,9 @@ import time
 import sys
 import os
 import RNS
+from RNS.Interfaces.util.framing import HDLCDeframer
 from threading import Lock
+from collections import deque
 
 class HDLC():
     FLAG              = 0x7E
@@ -63,10 +66,18 @@ class LocalClientInterface(Interface):
     RECONNECT_WAIT = 8
     AUTOCONFIGURE_MTU = True
 
+    # Frames queued for transmission beyond this many bytes
+    # are dropped until the connected program catches up
+    MAX_TRANSMIT_QUEUE = 8*1024*1024
+
+    # Used when reading from sockets hosted by the async runtime
+    READ_SIZE    = 65536
+
     def __init__(self, owner, name, target_port = None, connected_socket=None, socket_path=None):
         super().__init__()
 
         self.epoll_backend    = False
+        self.async_backend    = False
         self.HW_MTU           = 262144
         self.online           = False
         
@@ -76,17 +87,23 @@ class LocalClientInterface(Interface):
         self.IN               = True
         self.OUT              = False
         self.socket           = None
+        self.writer           = None
         self.parent_interface = None
         self.reconnecting     = False
         self.never_connected  = True
         self.detached         = False
         self.name             = name
         self.mode             = RNS.Interfaces.Interface.Interface.MODE_FULL
-        self.frame_buffer     = b""
-        self.transmit_buffer  = b""
+        self.deframer         = HDLCDeframer(min_size=RNS.Reticulum.HEADER_MINSIZE)
+        self.transmit_queue   = deque()
+        self.transmit_queued  = 0
+        self.transmit_dropped = 0
+        self.transmit_lock    = threading.Lock()
 
         if RNS.vendor.platformutils.use_epoll():
             self.epoll_backend = True
+        elif RNS.AsyncRuntime.enabled:
+            self.async_backend = True
 
         if connected_socket != None:
             self.receives    = True
@@ -123,10 +140,7 @@ class LocalClientInterface(Interface):
         self.announce_rate_penalty = None
 
         if connected_socket == None:
-            if not self.epoll_backend:
-                thread = threading.Thread(target=self.read_loop)
-                thread.daemon = True
-                thread.start()
+            if not self.epoll_backend: self.start_reading()
 
     def should_ingress_limit(self):
         return False
@@ -170,10 +184,7 @@ class LocalClientInterface(Interface):
                     RNS.log("Reconnected socket for "+str(self)+".", RNS.LOG_INFO)
 
                 self.reconnecting = False
-                if not self.epoll_backend:
-                    thread = threading.Thread(target=self.read_loop)
-                    thread.daemon = True
-                    thread.start()
+                if not self.epoll_backend: self.start_reading()
 
                 def job():
                     time.sleep(LocalClientInterface.RECONNECT_WAIT+2)
@@ -199,8 +210,7 @@ class LocalClientInterface(Interface):
         if self.online:
             try:
                 if self.epoll_backend:
-                    self.transmit_buffer += bytes([HDLC.FLAG])+HDLC.escape(data)+bytes([HDLC.FLAG])
-                    BackboneInterface.tx_ready(self)
+                    BackboneInterface.transmit(self, bytes([HDLC.FLAG])+HDLC.escape(data)+bytes([HDLC.FLAG]))
 
                 else:
                     self.writing = True
@@ -215,7 +225,15 @@ class LocalClientInterface(Interface):
                             time.sleep(s)
 
                     data = bytes([HDLC.FLAG])+HDLC.escape(data)+bytes([HDLC.FLAG])
-                    self.socket.sendall(data)
+
+                    # Sockets hosted by the async runtime are written
+                    # to without blocking, through their socket writer
+                    writer = self.writer
+                    if writer != None and writer.socket == self.socket:
+                        if not writer.send(data):
+                            self.transmit_dropped += 1
+                            RNS.log("Transmit queue full on "+str(self)+", dropped outgoing frame", RNS.LOG_EXTREME)
+                    else: self.socket.sendall(data)
                     self.writing = False
                     self.txb += len(data)
                     if hasattr(self, "parent_interface") and self.parent_interface != None:
@@ -228,23 +246,7 @@ class LocalClientInterface(Interface):
                 self.teardown()
 
     def handle_hdlc(self, data_in):
-        self.frame_buffer += data_in
-        flags_remaining = True
-        while flags_remaining:
-            frame_start = self.frame_buffer.find(HDLC.FLAG)
-            if frame_start != -1:
-                frame_end = self.frame_buffer.find(HDLC.FLAG, frame_start+1)
-                if frame_end != -1:
-                    frame = self.frame_buffer[frame_start+1:frame_end]
-                    frame = frame.replace(bytes([HDLC.ESC, HDLC.FLAG ^ HDLC.ESC_MASK]), bytes([HDLC.FLAG]))
-                    frame = frame.replace(bytes([HDLC.ESC, HDLC.ESC  ^ HDLC.ESC_MASK]), bytes([HDLC.ESC]))
-                    if len(frame) > RNS.Reticulum.HEADER_MINSIZE:
-                        self.process_incoming(frame)
-                    self.frame_buffer = self.frame_buffer[frame_end:]
-                else:
-                    flags_remaining = False
-            else:
-                flags_remaining = False
+        for frame in self.deframer.feed(data_in): self.process_incoming(frame)
 
     def receive(self, data_in):
         try:
@@ -267,9 +269,45 @@ class LocalClientInterface(Interface):
             RNS.log("Tearing down "+str(self), RNS.LOG_ERROR)
             self.teardown()
 
+    def start_reading(self):
+        if self.async_backend:
+            self.deframer.reset()
+            self.socket.setblocking(False)
+            self.writer = SocketWriter(self.socket)
+            RNS.AsyncRuntime.add_reader(self.socket, self.read_ready)
+        else:
+            thread = threading.Thread(target=self.read_loop)
+            thread.daemon = True
+            thread.start()
+
+    def read_ready(self):
+        # Called by the async runtime when the socket is readable
+        try: data_in = self.socket.recv(LocalClientInterface.READ_SIZE)
+        except (BlockingIOError, InterruptedError): return
+        except Exception as e:
+            self.stop_reading()
+            self.online = False
+            RNS.log("An interface error occurred, the contained exception was: "+str(e), RNS.LOG_ERROR)
+            RNS.log("Tearing down "+str(self), RNS.LOG_ERROR)
+            self.teardown()
+            return
+
+        if len(data_in) > 0: self.receive(data_in)
+        else:
+            # Reconnecting waits between attempts, so
+            # it must happen outside of the event loop
+            self.stop_reading()
+            threading.Thread(target=self.receive, args=(data_in,), daemon=True).start()
+
+    def stop_reading(self):
+        if self.writer != None:
+            self.writer.close()
+            self.writer = None
+        if self.socket != None: RNS.AsyncRuntime.remove_reader(self.socket)
+
     def read_loop(self):
         try:
-            self.frame_buffer = b""
+            self.deframer.reset()
             data_in = b""
             while True:
                 data_in = self.socket.recv(4096)
@@ -300,7 +338,10 @@ class LocalClientInterface(Interface):
                 if callable(self.socket.close):
                     RNS.log("Detaching "+str(self), RNS.LOG_DEBUG)
                     self.detached = True
-                    
+                    if self.async_backend:
+                        try: self.stop_reading()
+                        except Exception as e: RNS.log("Error while removing async reader for "+str(self)+": "+str(e))
+
                     try:
                         if self.socket != None:
                             self.socket.shutdown(socket.SHUT_RDWR)
@@ -353,6 +394,7 @@ class LocalServerInterface(Interface):
     def __init__(self, owner, bindport=None, socket_path=None):
         super().__init__()
         self.epoll_backend = False
+        self.server_socket = None
         self.online = False
         self.clients = 0
         
@@ -386,6 +428,13 @@ class LocalServerInterface(Interface):
 
             address = (self.bind_ip, self.bind_port)
             if self.epoll_backend: BackboneInterface.add_listener(self, address)
+            elif RNS.AsyncRuntime.enabled:
+                self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                self.server_socket.bind(address)
+                self.server_socket.listen(socketserver.TCPServer.request_queue_size)
+                self.server_socket.setblocking(False)
+                RNS.AsyncRuntime.add_reader(self.server_socket, self.accept_ready)
             else:
                 def handlerFactory(callback):
                     def createHandler(*args, **keys):
@@ -437,20 +486,39 @@ class LocalServerInterface(Interface):
             return True
 
         else:
-            interface_name = str(str(handler.client_address[1]))
-            spawned_interface = LocalClientInterface(self.owner, name=interface_name, connected_socket=handler.request)
-            spawned_interface.OUT = self.OUT
-            spawned_interface.IN  = self.IN
-            spawned_interface.target_ip = handler.client_address[0]
-            spawned_interface.target_port = str(handler.client_address[1])
-            spawned_interface.parent_interface = self
-            spawned_interface.bitrate = self.bitrate
-            if hasattr(self, "_force_bitrate"): spawned_interface._force_bitrate = self._force_bitrate
-            RNS.Transport.interfaces.append(spawned_interface)
-            RNS.Transport.local_client_interfaces.append(spawned_interface)
-            self.clients += 1
+            spawned_interface = self.spawn_client(handler.request, handler.client_address)
             spawned_interface.read_loop()
 
+    def accept_ready(self):
+        # Called by the async runtime when a connection is pending
+        try: client_socket, client_address = self.server_socket.accept()
+        except (BlockingIOError, InterruptedError): return
+        except Exception as e:
+            RNS.log("Error while accepting connection on "+str(self)+": "+str(e), RNS.LOG_ERROR)
+            return
+
+        try:
+            spawned_interface = self.spawn_client(client_socket, client_address)
+            spawned_interface.start_reading()
+        except Exception as e:
+            RNS.log("Error while setting up incoming connection on "+str(self)+": "+str(e), RNS.LOG_ERROR)
+            client_socket.close()
+
+    def spawn_client(self, client_socket, client_address):
+        interface_name = str(str(client_address[1]))
+        spawned_interface = LocalClientInterface(self.owner, name=interface_name, connected_socket=client_socket)
+        spawned_interface.OUT = self.OUT
+        spawned_interface.IN  = self.IN
+        spawned_interface.target_ip = client_address[0]
+        spawned_interface.target_port = str(client_address[1])
+        spawned_interface.parent_interface = self
+        spawned_interface.bitrate = self.bitrate
+        if hasattr(self, "_force_bitrate"): spawned_interface._force_bitrate = self._force_bitrate
+        RNS.Transport.interfaces.append(spawned_interface)
+        RNS.Transport.local_client_interfaces.append(spawned_interface)
+        self.clients += 1
+        return spawned_interface
+
     def process_outgoing(self, data):
         pass
 
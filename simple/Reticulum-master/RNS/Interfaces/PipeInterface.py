@@ -34,6 +34,7 @@ import sys
 import threading
 import time
 import RNS
+from RNS.Interfaces.util.framing import HDLCDeframer
 
 import subprocess
 import shlex
@@ -135,37 +136,17 @@ class PipeInterface(Interface):
 
     def readLoop(self):
         try:
-            in_frame = False
-            escape = False
-            data_buffer = b""
+            deframer = HDLCDeframer(max_size=self.HW_MTU)
             last_read_ms = int(time.time()*1000)
 
             while True:
-                process_output = self.process.stdout.read(1)
+                process_output = self.process.stdout.read1(4096)
                 if len(process_output) == 0 and self.process.poll() is not None:
                     break
 
                 else:
-                    byte = ord(process_output)
                     last_read_ms = int(time.time()*1000)
-
-                    if (in_frame and byte == HDLC.FLAG):
-                        in_frame = False
-                        self.process_incoming(data_buffer)
-                    elif (byte == HDLC.FLAG):
-                        in_frame = True
-                        data_buffer = b""
-                    elif (in_frame and len(data_buffer) < self.HW_MTU):
-                        if (byte == HDLC.ESC):
-                            escape = True
-                        else:
-                            if (escape):
-                                if (byte == HDLC.FLAG ^ HDLC.ESC_MASK):
-                                    byte = HDLC.FLAG
-                                if (byte == HDLC.ESC  ^ HDLC.ESC_MASK):
-                                    byte = HDLC.ESC
-                                escape = False
-                            data_buffer = data_buffer+bytes([byte])
+                    for frame in deframer.feed(process_output): self.process_incoming(frame)
 
             RNS.log("Subprocess terminated on "+str(self))
             self.process.kill()
@@ -37,6 +37,8 @@ import time
 import sys
 import os
 import RNS
+from RNS.Interfaces.util.framing import HDLCDeframer, KISSDeframer
+from RNS.AsyncRuntime import SocketWriter
 
 class TCPInterface():
     HW_MTU            = 262144
@@ -94,6 +96,9 @@ class TCPClientInterface(Interface):
     I2P_PROBE_INTERVAL = 9
     I2P_PROBES = 5
 
+    # Used when reading from sockets hosted by the async runtime
+    READ_SIZE    = 65536
+
     def __init__(self, owner, configuration, connected_socket=None):
         super().__init__()
 
@@ -112,6 +117,7 @@ class TCPClientInterface(Interface):
         self.IN               = True
         self.OUT              = False
         self.socket           = None
+        self.writer           = None
         self.parent_interface = None
         self.name             = name
         self.initiator        = False
@@ -168,9 +174,7 @@ class TCPClientInterface(Interface):
             thread.daemon = True
             thread.start()
         else:
-            thread = threading.Thread(target=self.read_loop)
-            thread.daemon = True
-            thread.start()
+            self.start_reading()
             if not self.kiss_framing:
                 self.wants_tunnel = True
 
@@ -208,7 +212,10 @@ class TCPClientInterface(Interface):
             if hasattr(self.socket, "close"):
                 if callable(self.socket.close):
                     self.detached = True
-                    
+                    if RNS.AsyncRuntime.enabled:
+                        try: self.stop_reading()
+                        except Exception as e: RNS.log("Error while removing async reader for "+str(self)+": "+str(e))
+
                     try:
                         if self.socket != None:
                             self.socket.shutdown(socket.SHUT_RDWR)
@@ -287,9 +294,7 @@ class TCPClientInterface(Interface):
                     RNS.log("Reconnected socket for "+str(self)+".", RNS.LOG_INFO)
 
                 self.reconnecting = False
-                thread = threading.Thread(target=self.read_loop)
-                thread.daemon = True
-                thread.start()
+                self.start_reading()
                 if not self.kiss_framing:
                     RNS.Transport.synthesize_tunnel(self)
 
@@ -318,7 +323,12 @@ class TCPClientInterface(Interface):
                 else:
                     data = bytes([HDLC.FLAG])+HDLC.escape(data)+bytes([HDLC.FLAG])
 
-                self.socket.sendall(data)
+                # Sockets hosted by the async runtime are written
+                # to without blocking, through their socket writer
+                writer = self.writer
+                if writer != None and writer.socket == self.socket:
+                    if not writer.send(data): RNS.log("Transmit queue full on "+str(self)+", dropped outgoing frame", RNS.LOG_EXTREME)
+                else: self.socket.sendall(data)
                 self.writing = False
                 self.txb += len(data)
                 if hasattr(self, "parent_interface") and self.parent_interface != None:
@@ -330,69 +340,74 @@ class TCPClientInterface(Interface):
                 self.teardown()
 
 
+    def new_deframer(self):
+        if self.kiss_framing: return KISSDeframer(max_size=self.HW_MTU)
+        else:                 return HDLCDeframer(min_size=RNS.Reticulum.HEADER_MINSIZE)
+
+    def receive(self, data_in):
+        if self.kiss_framing:
+            # Read loop for KISS framing
+            for command, frame in self.deframer.feed(data_in):
+                if command == KISS.CMD_DATA: self.process_incoming(frame)
+
+        else:
+            # Read loop for standard HDLC framing
+            for frame in self.deframer.feed(data_in): self.process_incoming(frame)
+
+    def start_reading(self):
+        if RNS.AsyncRuntime.enabled:
+            self.deframer = self.new_deframer()
+            self.socket.setblocking(False)
+            self.writer = SocketWriter(self.socket)
+            RNS.AsyncRuntime.add_reader(self.socket, self.read_ready)
+        else:
+            thread = threading.Thread(target=self.read_loop)
+            thread.daemon = True
+            thread.start()
+
+    def read_ready(self):
+        # Called by the async runtime when the socket is readable
+        try:
+            if self.socket: data_in = self.socket.recv(TCPClientInterface.READ_SIZE)
+            else: data_in = b""
+            if len(data_in) > 0: self.receive(data_in)
+            else:
+                self.stop_reading()
+                self.online = False
+                if self.initiator and not self.detached:
+                    RNS.log("The socket for "+str(self)+" was closed, attempting to reconnect...", RNS.LOG_WARNING)
+                    threading.Thread(target=self.reconnect, daemon=True).start()
+                else:
+                    RNS.log("The socket for remote client "+str(self)+" was closed.", RNS.LOG_VERBOSE)
+                    self.teardown()
+
+        except (BlockingIOError, InterruptedError): pass
+        except Exception as e:
+            self.stop_reading()
+            self.online = False
+            RNS.log("An interface error occurred for "+str(self)+", the contained exception was: "+str(e), RNS.LOG_WARNING)
+
+            if self.initiator:
+                RNS.log("Attempting to reconnect...", RNS.LOG_WARNING)
+                threading.Thread(target=self.reconnect, daemon=True).start()
+            else:
+                self.teardown()
+
+    def stop_reading(self):
+        if self.writer != None:
+            self.writer.close()
+            self.writer = None
+        if self.socket != None: RNS.AsyncRuntime.remove_reader(self.socket)
+
     def read_loop(self):
         try:
-            in_frame = False
-            escape = False
-            frame_buffer = b""
+            self.deframer = self.new_deframer()
             data_in = b""
-            data_buffer = b""
 
             while True:
                 if self.socket: data_in = self.socket.recv(4096)
                 else: data_in = b""
-                if len(data_in) > 0:
-                    if self.kiss_framing:
-                        # Read loop for KISS framing
-                        pointer = 0
-                        while pointer < len(data_in):
-                            byte = data_in[pointer]
-                            pointer += 1
-                            if (in_frame and byte == KISS.FEND and command == KISS.CMD_DATA):
-                                in_frame = False
-                                self.process_incoming(data_buffer)
-                            elif (byte == KISS.FEND):
-                                in_frame = True
-                                command = KISS.CMD_UNKNOWN
-                                data_buffer = b""
-                            elif (in_frame and len(data_buffer) < self.HW_MTU):
-                                if (len(data_buffer) == 0 and command == KISS.CMD_UNKNOWN):
-                                    # We only support one HDLC port for now, so
-                                    # strip off the port nibble
-                                    byte = byte & 0x0F
-                                    command = byte
-                                elif (command == KISS.CMD_DATA):
-                                    if (byte == KISS.FESC):
-                                        escape = True
-                                    else:
-                                        if (escape):
-                                            if (byte == KISS.TFEND):
-                                                byte = KISS.FEND
-                                            if (byte == KISS.TFESC):
-                                                byte = KISS.FESC
-                                            escape = False
-                                        data_buffer = data_buffer+bytes([byte])
-
-                    else:
-                        # Read loop for standard HDLC framing
-                        frame_buffer += data_in
-                        flags_remaining = True
-                        while flags_remaining:
-                            frame_start = frame_buffer.find(HDLC.FLAG)
-                            if frame_start != -1:
-                                frame_end = frame_buffer.find(HDLC.FLAG, frame_start+1)
-                                if frame_end != -1:
-                                    frame = frame_buffer[frame_start+1:frame_end]
-                                    frame = frame.replace(bytes([HDLC.ESC, HDLC.FLAG ^ HDLC.ESC_MASK]), bytes([HDLC.FLAG]))
-                                    frame = frame.replace(bytes([HDLC.ESC, HDLC.ESC  ^ HDLC.ESC_MASK]), bytes([HDLC.ESC]))
-                                    if len(frame) > RNS.Reticulum.HEADER_MINSIZE:
-                                        self.process_incoming(frame)
-                                    frame_buffer = frame_buffer[frame_end:]
-                                else:
-                                    flags_remaining = False
-                            else:
-                                flags_remaining = False
-
+                if len(data_in) > 0: self.receive(data_in)
                 else:
                     self.online = False
                     if self.initiator and not self.detached:
@@ -544,8 +559,22 @@ class TCPServerInterface(Interface):
                 return createHandler
 
             self.owner = owner
+            self.server = None
+            self.server_socket = None
 
-            if len(bind_address) == 4:
+            if RNS.AsyncRuntime.enabled:
+                family = socket.AF_INET6 if len(bind_address) == 4 else socket.AF_INET
+                try:
+                    self.server_socket = socket.socket(family, socket.SOCK_STREAM)
+                    self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                    self.server_socket.bind(bind_address)
+                    self.server_socket.listen(socketserver.TCPServer.request_queue_size)
+                    self.server_socket.setblocking(False)
+                except Exception as e:
+                    RNS.log(f"Error while binding socket for interface, the contained exception was: {e}", RNS.LOG_ERROR)
+                    raise SystemError("Could not bind socket for interface. Please check the specified \"listen_ip\" configuration option")
+
+            elif len(bind_address) == 4:
                 try:
                     ThreadingTCP6Server.allow_reuse_address = True
                     self.server = ThreadingTCP6Server(bind_address, handlerFactory(self.incoming_connection))
@@ -559,9 +588,11 @@ class TCPServerInterface(Interface):
 
             self.bitrate = TCPServerInterface.BITRATE_GUESS
 
-            thread = threading.Thread(target=self.server.serve_forever)
-            thread.daemon = True
-            thread.start()
+            if self.server_socket != None: RNS.AsyncRuntime.add_reader(self.server_socket, self.accept_ready)
+            else:
+                thread = threading.Thread(target=self.server.serve_forever)
+                thread.daemon = True
+                thread.start()
 
             self.online = True
 
@@ -569,13 +600,32 @@ class TCPServerInterface(Interface):
             raise SystemError("Insufficient parameters to create TCP listener")
 
     def incoming_connection(self, handler):
+        spawned_interface = self.spawn_client(handler.request, handler.client_address)
+        spawned_interface.read_loop()
+
+    def accept_ready(self):
+        # Called by the async runtime when a connection is pending
+        try: client_socket, client_address = self.server_socket.accept()
+        except (BlockingIOError, InterruptedError): return
+        except Exception as e:
+            RNS.log("Error while accepting connection on "+str(self)+": "+str(e), RNS.LOG_ERROR)
+            return
+
+        try:
+            spawned_interface = self.spawn_client(client_socket, client_address)
+            spawned_interface.start_reading()
+        except Exception as e:
+            RNS.log("Error while setting up incoming connection on "+str(self)+": "+str(e), RNS.LOG_ERROR)
+            client_socket.close()
+
+    def spawn_client(self, client_socket, client_address):
         RNS.log("Accepting incoming TCP connection", RNS.LOG_VERBOSE)
         spawned_configuration = {"name": "Client on "+self.name, "target_host": None, "target_port": None, "i2p_tunneled": self.i2p_tunneled}
-        spawned_interface = TCPClientInterface(self.owner, spawned_configuration, connected_socket=handler.request)
+        spawned_interface = TCPClientInterface(self.owner, spawned_configuration, connected_socket=client_socket)
         spawned_interface.OUT = self.OUT
         spawned_interface.IN  = self.IN
-        spawned_interface.target_ip = handler.client_address[0]
-        spawned_interface.target_port = str(handler.client_address[1])
+        spawned_interface.target_ip = client_address[0]
+        spawned_interface.target_port = str(client_address[1])
         spawned_interface.parent_interface = self
         spawned_interface.bitrate = self.bitrate
         spawned_interface.optimise_mtu()
@@ -611,7 +661,7 @@ class TCPServerInterface(Interface):
         while spawned_interface in self.spawned_interfaces:
             self.spawned_interfaces.remove(spawned_interface)
         self.spawned_interfaces.append(spawned_interface)
-        spawned_interface.read_loop()
+        return spawned_interface
 
     def received_announce(self, from_spawned=False):
         if from_spawned: self.ia_freq_deque.append(time.time())
@@ -625,6 +675,16 @@ class TCPServerInterface(Interface):
     def detach(self):
         self.detached = True
         self.online = False
+        if self.server_socket != None:
+            try:
+                RNS.log("Detaching "+str(self), RNS.LOG_DEBUG)
+                RNS.AsyncRuntime.remove_reader(self.server_socket)
+                self.server_socket.close()
+                self.server_socket = None
+
+            except Exception as e:
+                RNS.log("Error while closing listening socket for "+str(self)+": "+str(e))
+
         if self.server != None:
             if hasattr(self.server, "shutdown"):
                 if callable(self.server.shutdown):
@@ -41,6 +41,11 @@ class UDPInterface(Interface):
     BITRATE_GUESS = 10*1000*1000
     DEFAULT_IFAC_SIZE = 16
 
+    # When hosted by the async runtime, at most this many
+    # datagrams are read each time the socket is readable,
+    # so other sockets on the loop are not held up.
+    READ_BUDGET = 64
+
     @staticmethod
     def get_address_for_if(name):
         from RNS.Interfaces import netinfo
@@ -98,12 +103,20 @@ class UDPInterface(Interface):
 
             self.owner = owner
             address = (self.bind_ip, self.bind_port)
-            socketserver.UDPServer.address_family = socket.AF_INET
-            self.server = socketserver.UDPServer(address, handlerFactory(self.process_incoming))
+            if RNS.AsyncRuntime.enabled:
+                self.server = None
+                self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                self.server_socket.bind(address)
+                self.server_socket.setblocking(False)
+                RNS.AsyncRuntime.add_reader(self.server_socket, self.read_ready)
+
+            else:
+                socketserver.UDPServer.address_family = socket.AF_INET
+                self.server = socketserver.UDPServer(address, handlerFactory(self.process_incoming))
 
-            thread = threading.Thread(target=self.server.serve_forever)
-            thread.daemon = True
-            thread.start()
+                thread = threading.Thread(target=self.server.serve_forever)
+                thread.daemon = True
+                thread.start()
 
             self.online = True
 
@@ -113,6 +126,17 @@ class UDPInterface(Interface):
             self.forward_port = forwardport
 
 
+    def read_ready(self):
+        # Called by the async runtime when datagrams are waiting
+        for i in range(UDPInterface.READ_BUDGET):
+            try: data, address = self.server_socket.recvfrom(socketserver.UDPServer.max_packet_size)
+            except (BlockingIOError, InterruptedError): break
+            except Exception as e:
+                RNS.log("Error while receiving on "+str(self)+": "+str(e), RNS.LOG_ERROR)
+                break
+
+            self.process_incoming(data)
+
     def process_incoming(self, data):
         self.rxb += len(data)
         self.owner.inbound(data, self)
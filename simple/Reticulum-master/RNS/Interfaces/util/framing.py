@@ -0,0 +1,180 @@
+# Reticulum License
+#
+# Copyright (c) 2016-2025 Mark Qvist
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# - The Software shall not be used in any kind of system which includes amongst
+#   its functions the ability to purposefully do harm to human beings.
+#
+# - The Software shall not be used, directly or indirectly, in the creation of
+#   an artificial intelligence, machine learning or language model training
+#   dataset, including but not limited to any use that contributes to the
+#   training or development of such a model or algorithm.
+#
+# - The above copyright notice and this permission notice shall be included in
+#   all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+class HDLCDeframer():
+    """
+    Splits a stream of HDLC-framed data into frames. Received data is
+    appended to a reusable buffer, and all complete frames in it are
+    split out in one pass, and unescaped with bulk replacements. Any
+    incomplete frame is kept in the buffer until more data arrives.
+    """
+    FLAG              = 0x7E
+    ESC               = 0x7D
+    ESC_MASK          = 0x20
+
+    FLAG_BYTES        = bytes([FLAG])
+    ESC_BYTES         = bytes([ESC])
+    ESCAPED_FLAG      = bytes([ESC, FLAG^ESC_MASK])
+    ESCAPED_ESC       = bytes([ESC, ESC^ESC_MASK])
+
+    def __init__(self, max_size=None, min_size=0):
+        """
+        :param max_size: Frames longer than this are dropped. If *None*, frames of any length are accepted.
+        :param min_size: Only frames longer than this are returned.
+        """
+        self.buffer   = bytearray()
+        self.max_size = max_size
+        self.min_size = min_size
+
+    def feed(self, data):
+        """
+        Adds received data to the buffer.
+
+        :returns: A list of all frames completed by the data, as *bytes*.
+        """
+        buffer = self.buffer
+        buffer += data
+        frames = []
+
+        # Everything up to the last flag can be split into frames,
+        # and the last flag might start a frame that is still
+        # being received.
+        frame_end = buffer.rfind(HDLCDeframer.FLAG)
+        if frame_end == -1:
+            # Without any flag in the buffer, no frame can
+            # have started yet, so nothing needs to be kept
+            buffer.clear()
+            return frames
+
+        frame_start = buffer.find(HDLCDeframer.FLAG)
+        if frame_end > frame_start:
+            for frame in bytes(memoryview(buffer)[frame_start+1:frame_end]).split(HDLCDeframer.FLAG_BYTES):
+                if HDLCDeframer.ESC in frame:
+                    frame = frame.replace(HDLCDeframer.ESCAPED_FLAG, HDLCDeframer.FLAG_BYTES)
+                    frame = frame.replace(HDLCDeframer.ESCAPED_ESC, HDLCDeframer.ESC_BYTES)
+                if len(frame) > self.min_size and (self.max_size == None or len(frame) <= self.max_size):
+                    frames.append(frame)
+
+        del buffer[:frame_end]
+
+        # Discard incomplete frames that can no longer be
+        # valid, even when every byte would be escaped
+        if self.max_size != None and len(buffer) > 2*self.max_size+1:
+            buffer.clear()
+
+        return frames
+
+    def buffered(self):
+        """
+        :returns: The number of bytes of incomplete frames held in the buffer.
+        """
+        return len(self.buffer)
+
+    def reset(self):
+        """
+        Discards any incomplete frame held in the buffer.
+        """
+        self.buffer.clear()
+
+class KISSDeframer():
+    """
+    Splits a stream of KISS-framed data into commands and their
+    payloads, in the same way as the HDLC deframer.
+    The port nibble of the command byte is stripped, since only a
+    single port is supported.
+    """
+    FEND              = 0xC0
+    FESC              = 0xDB
+    TFEND             = 0xDC
+    TFESC             = 0xDD
+    CMD_DATA          = 0x00
+
+    FEND_BYTES        = bytes([FEND])
+    FESC_BYTES        = bytes([FESC])
+    ESCAPED_FEND      = bytes([FESC, TFEND])
+    ESCAPED_FESC      = bytes([FESC, TFESC])
+
+    def __init__(self, max_size=None, min_size=0):
+        """
+        :param max_size: Data frames with a payload longer than this are dropped. If *None*, payloads of any length are accepted.
+        :param min_size: Only data frames with a payload longer than this are returned.
+        """
+        self.buffer   = bytearray()
+        self.max_size = max_size
+        self.min_size = min_size
+
+    def feed(self, data):
+        """
+        Adds received data to the buffer.
+
+        :returns: A list of *(command, payload)* tuples for all frames completed by the data.
+        """
+        buffer = self.buffer
+        buffer += data
+        frames = []
+
+        frame_end = buffer.rfind(KISSDeframer.FEND)
+        if frame_end == -1:
+            buffer.clear()
+            return frames
+
+        frame_start = buffer.find(KISSDeframer.FEND)
+        if frame_end > frame_start:
+            for frame in bytes(memoryview(buffer)[frame_start+1:frame_end]).split(KISSDeframer.FEND_BYTES):
+                if len(frame) > 0:
+                    command = frame[0] & 0x0F
+                    payload = frame[1:]
+                    if KISSDeframer.FESC in payload:
+                        payload = payload.replace(KISSDeframer.ESCAPED_FEND, KISSDeframer.FEND_BYTES)
+                        payload = payload.replace(KISSDeframer.ESCAPED_FESC, KISSDeframer.FESC_BYTES)
+
+                    if command != KISSDeframer.CMD_DATA:
+                        frames.append((command, payload))
+                    elif len(payload) > self.min_size and (self.max_size == None or len(payload) <= self.max_size):
+                        frames.append((command, payload))
+
+        del buffer[:frame_end]
+
+        if self.max_size != None and len(buffer) > 2*self.max_size+2:
+            buffer.clear()
+
+        return frames
+
+    def buffered(self):
+        """
+        :returns: The number of bytes of incomplete frames held in the buffer.
+        """
+        return len(self.buffer)
+
+    def reset(self):
+        """
+        Discards any incomplete frame held in the buffer.
+        """
+        self.buffer.clear()
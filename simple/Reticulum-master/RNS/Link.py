@@ -748,86 +748,100 @@ class Link:
 
 
     def start_watchdog(self):
-        thread = threading.Thread(target=self.__watchdog_job)
-        thread.daemon = True
-        thread.start()
-
-    def __watchdog_job(self):
-        while not self.status == Link.CLOSED:
-            while (self.watchdog_lock):
-                rtt_wait = 0.025
-                if hasattr(self, "rtt") and self.rtt:
-                    rtt_wait = self.rtt
-
-                sleep(max(rtt_wait, 0.025))
-
-            if not self.status == Link.CLOSED:
-                # Link was initiated, but no response
-                # from destination yet
-                if self.status == Link.PENDING:
-                    next_check = self.request_time + self.establishment_timeout
-                    sleep_time = next_check - time.time()
-                    if time.time() >= self.request_time + self.establishment_timeout:
-                        RNS.log("Link establishment timed out", RNS.LOG_VERBOSE)
-                        self.status = Link.CLOSED
-                        self.teardown_reason = Link.TIMEOUT
-                        self.link_closed()
-                        sleep_time = 0.001
-
-                elif self.status == Link.HANDSHAKE:
-                    next_check = self.request_time + self.establishment_timeout
-                    sleep_time = next_check - time.time()
-                    if time.time() >= self.request_time + self.establishment_timeout:
-                        self.status = Link.CLOSED
-                        self.teardown_reason = Link.TIMEOUT
-                        self.link_closed()
-                        sleep_time = 0.001
-
-                        if self.initiator:
-                            RNS.log("Timeout waiting for link request proof", RNS.LOG_DEBUG)
-                        else:
-                            RNS.log("Timeout waiting for RTT packet from link initiator", RNS.LOG_DEBUG)
+        # Watchdogs for all links run as timers, either on
+        # the async runtime if enabled, or on the scheduler
+        if RNS.AsyncRuntime.enabled: self.__watchdog_scheduler = RNS.AsyncRuntime
+        else:                        self.__watchdog_scheduler = RNS.Scheduler
+        self.__watchdog_scheduler.call_soon(self.__watchdog_timer)
+
+    def __watchdog_timer(self):
+        sleep_time = self.__watchdog_step()
+        if sleep_time != None: self.__watchdog_scheduler.call_later(sleep_time, self.__watchdog_timer)
+
+    def __watchdog_closed(self):
+        # Closed callbacks can run application code, so they
+        # run on the shared scheduler worker, to avoid holding
+        # up the watchdogs of all other links.
+        RNS.Scheduler.call_in_worker(self.link_closed)
+
+    def __watchdog_step(self):
+        # Runs a single watchdog check, and returns the time
+        # until the next one, or None once the link is closed
+        if self.status == Link.CLOSED: return None
+
+        if not self.__track_phy_stats:
+            self.rssi = None
+            self.snr  = None
+            self.q    = None
+
+        if self.watchdog_lock:
+            rtt_wait = 0.025
+            if hasattr(self, "rtt") and self.rtt:
+                rtt_wait = self.rtt
+
+            return max(rtt_wait, 0.025)
+
+        sleep_time = None
+        # Link was initiated, but no response
+        # from destination yet
+        if self.status == Link.PENDING:
+            next_check = self.request_time + self.establishment_timeout
+            sleep_time = next_check - time.time()
+            if time.time() >= self.request_time + self.establishment_timeout:
+                RNS.log("Link establishment timed out", RNS.LOG_VERBOSE)
+                self.status = Link.CLOSED
+                self.teardown_reason = Link.TIMEOUT
+                self.__watchdog_closed()
+                sleep_time = 0.001
+
+        elif self.status == Link.HANDSHAKE:
+            next_check = self.request_time + self.establishment_timeout
+            sleep_time = next_check - time.time()
+            if time.time() >= self.request_time + self.establishment_timeout:
+                self.status = Link.CLOSED
+                self.teardown_reason = Link.TIMEOUT
+                self.__watchdog_closed()
+                sleep_time = 0.001
 
-                elif self.status == Link.ACTIVE:
-                    activated_at = self.activated_at if self.activated_at != None else 0
-                    last_inbound = max(max(self.last_inbound, self.last_proof), activated_at)
-                    now = time.time()
+                if self.initiator:
+                    RNS.log("Timeout waiting for link request proof", RNS.LOG_DEBUG)
+                else:
+                    RNS.log("Timeout waiting for RTT packet from link initiator", RNS.LOG_DEBUG)
 
-                    if now >= last_inbound + self.keepalive:
-                        if self.initiator and now >= self.last_keepalive + self.keepalive:
-                            self.send_keepalive()
+        elif self.status == Link.ACTIVE:
+            activated_at = self.activated_at if self.activated_at != None else 0
+            last_inbound = max(max(self.last_inbound, self.last_proof), activated_at)
+            now = time.time()
 
-                        if time.time() >= last_inbound + self.stale_time:
-                            sleep_time = self.rtt * self.keepalive_timeout_factor + Link.STALE_GRACE
-                            self.status = Link.STALE
-                        else:
-                            sleep_time = self.keepalive
-                    
-                    else:
-                        sleep_time = (last_inbound + self.keepalive) - time.time()
+            if now >= last_inbound + self.keepalive:
+                if self.initiator and now >= self.last_keepalive + self.keepalive:
+                    self.send_keepalive()
 
-                elif self.status == Link.STALE:
-                    sleep_time = 0.001
-                    self.__teardown_packet()
-                    self.status = Link.CLOSED
-                    self.teardown_reason = Link.TIMEOUT
-                    self.link_closed()
+                if time.time() >= last_inbound + self.stale_time:
+                    sleep_time = self.rtt * self.keepalive_timeout_factor + Link.STALE_GRACE
+                    self.status = Link.STALE
+                else:
+                    sleep_time = self.keepalive
+            
+            else:
+                sleep_time = (last_inbound + self.keepalive) - time.time()
 
+        elif self.status == Link.STALE:
+            sleep_time = 0.001
+            self.__teardown_packet()
+            self.status = Link.CLOSED
+            self.teardown_reason = Link.TIMEOUT
+            self.__watchdog_closed()
 
-                if sleep_time == 0:
-                    RNS.log("Warning! Link watchdog sleep time of 0!", RNS.LOG_ERROR)
-                if sleep_time == None or sleep_time < 0:
-                    RNS.log("Timing error! Tearing down link "+str(self)+" now.", RNS.LOG_ERROR)
-                    self.teardown()
-                    sleep_time = 0.1
 
-                sleep_time = min(sleep_time, Link.WATCHDOG_MAX_SLEEP)
-                sleep(sleep_time)
+        if sleep_time == 0:
+            RNS.log("Warning! Link watchdog sleep time of 0!", RNS.LOG_ERROR)
+        if sleep_time == None or sleep_time < 0:
+            RNS.log("Timing error! Tearing down link "+str(self)+" now.", RNS.LOG_ERROR)
+            self.teardown()
+            sleep_time = 0.1
 
-                if not self.__track_phy_stats:
-                    self.rssi = None
-                    self.snr  = None
-                    self.q    = None
+        return min(sleep_time, Link.WATCHDOG_MAX_SLEEP)
 
 
     def __update_phy_stats(self, packet, query_shared = True, force_update = False):
@@ -1105,10 +1119,8 @@ class Link:
                         plaintext = self.decrypt(packet.data)
                         if plaintext != None:
                             self.__update_phy_stats(packet, query_shared=True)
-                            if ord(plaintext[:1]) == RNS.Resource.HASHMAP_IS_EXHAUSTED:
-                                resource_hash = plaintext[1+RNS.Resource.MAPHASH_LEN:RNS.Identity.HASHLENGTH//8+1+RNS.Resource.MAPHASH_LEN]
-                            else:
-                                resource_hash = plaintext[1:RNS.Identity.HASHLENGTH//8+1]
+                            pad = RNS.Resource.request_header_size(plaintext)
+                            resource_hash = plaintext[pad:pad+RNS.Identity.HASHLENGTH//8]
 
                             for resource in self.outgoing_resources:
                                 if resource.hash == resource_hash:
@@ -1212,6 +1224,15 @@ class Link:
             return None
 
 
+    def decrypt_stream(self, ciphertext, chunk_size=None):
+        """
+        Decrypts a large ciphertext held in a sliceable buffer, and
+        yields the plaintext in chunks. Unlike :code:`decrypt`, errors
+        are raised to the caller while iterating.
+        """
+        if not self.token: self.token = Token(self.derived_key)
+        return self.token.decrypt_stream(ciphertext, chunk_size)
+
     def sign(self, message):
         return self.sig_prv.sign(message)
 
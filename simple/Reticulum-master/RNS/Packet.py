@@ -115,8 +115,8 @@ class Packet:
     TIMEOUT_PER_HOP = RNS.Reticulum.DEFAULT_PER_HOP_TIMEOUT
 
     __slots__  = "hops", "header", "header_type", "packet_type", "transport_type", "context", "context_flag", "destination"
-    __slots__ += "transport_id", "data", "flags", "raw", "packed", "sent", "create_receipt", "receipt", "fromPacked", "MTU"
-    __slots__ += "sent_at", "packet_hash", "ratchet_id", "attached_interface", "receiving_interface", "rssi", "snr", "q"
+    __slots__ += "transport_id", "_data", "data_offset", "flags", "raw", "packed", "sent", "create_receipt", "receipt", "fromPacked", "MTU"
+    __slots__ += "sent_at", "_packet_hash", "ratchet_id", "attached_interface", "receiving_interface", "rssi", "snr", "q"
     __slots__ += "ciphertext", "plaintext", "destination_hash", "destination_type", "link", "map_hash"
 
     def __init__(self, destination, data, packet_type = DATA, context = NONE, transport_type = RNS.Transport.BROADCAST,
@@ -146,6 +146,7 @@ class Packet:
             self.fromPacked     = False
         else:
             self.raw            = data
+            self.data           = None
             self.packed         = True
             self.fromPacked     = True
             self.create_receipt = False
@@ -254,16 +255,21 @@ class Packet:
             if self.header_type == Packet.HEADER_2:
                 self.transport_id = self.raw[2:DST_LEN+2]
                 self.destination_hash = self.raw[DST_LEN+2:2*DST_LEN+2]
-                self.context = ord(self.raw[2*DST_LEN+2:2*DST_LEN+3])
-                self.data = self.raw[2*DST_LEN+3:]
+                self.context = self.raw[2*DST_LEN+2]
+                self.data_offset = 2*DST_LEN+3
             else:
                 self.transport_id = None
                 self.destination_hash = self.raw[2:DST_LEN+2]
-                self.context = ord(self.raw[DST_LEN+2:DST_LEN+3])
-                self.data = self.raw[DST_LEN+3:]
-
+                self.context = self.raw[DST_LEN+2]
+                self.data_offset = DST_LEN+3
+
+            # The packet data and hash are only
+            # extracted from raw once they are used,
+            # since packets in transport often never
+            # need them.
+            self._data = None
+            self._packet_hash = None
             self.packed = False
-            self.update_hash()
             return True
 
         except Exception as e:
@@ -344,23 +350,49 @@ class Packet:
     def validate_proof(self, proof):
         return self.receipt.validate_proof(proof)
 
+    @property
+    def data(self):
+        if self.data_offset != None:
+            self._data = self.raw[self.data_offset:]
+            self.data_offset = None
+
+        return self._data
+
+    @data.setter
+    def data(self, data):
+        self._data = data
+        self.data_offset = None
+
+    @property
+    def packet_hash(self):
+        if self._packet_hash == None and self.fromPacked and not self.packed:
+            self._packet_hash = self.get_hash()
+
+        return self._packet_hash
+
+    @packet_hash.setter
+    def packet_hash(self, packet_hash):
+        self._packet_hash = packet_hash
+
     def update_hash(self):
         self.packet_hash = self.get_hash()
 
     def get_hash(self):
-        return RNS.Identity.full_hash(self.get_hashable_part())
+        # Hash the hashable part directly from a view
+        # of the raw packet, instead of copying it out
+        return RNS.Cryptography.sha256_parts(bytes([self.raw[0] & 0b00001111]), memoryview(self.raw)[self.get_hashable_offset():])
 
     def getTruncatedHash(self):
-        return RNS.Identity.truncated_hash(self.get_hashable_part())
+        return self.get_hash()[:RNS.Identity.TRUNCATED_HASHLENGTH//8]
 
-    def get_hashable_part(self):
-        hashable_part = bytes([self.raw[0] & 0b00001111])
+    def get_hashable_offset(self):
         if self.header_type == Packet.HEADER_2:
-            hashable_part += self.raw[(RNS.Identity.TRUNCATED_HASHLENGTH//8)+2:]
+            return (RNS.Identity.TRUNCATED_HASHLENGTH//8)+2
         else:
-            hashable_part += self.raw[2:]
+            return 2
 
-        return hashable_part
+    def get_hashable_part(self):
+        return bytes([self.raw[0] & 0b00001111]) + self.raw[self.get_hashable_offset():]
 
     def get_rssi(self):
         """
@@ -580,6 +612,7 @@ class PacketReceipt:
         :param timeout: The timeout in seconds.
         """
         self.timeout = float(timeout)
+        RNS.Transport.schedule_receipt_timeout(self)
 
     def set_delivery_callback(self, callback):
         """
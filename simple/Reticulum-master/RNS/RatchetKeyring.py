@@ -0,0 +1,170 @@
+# Reticulum License
+#
+# Copyright (c) 2016-2025 Mark Qvist
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# - The Software shall not be used in any kind of system which includes amongst
+#   its functions the ability to purposefully do harm to human beings.
+#
+# - The Software shall not be used, directly or indirectly, in the creation of
+#   an artificial intelligence, machine learning or language model training
+#   dataset, including but not limited to any use that contributes to the
+#   training or development of such a model or algorithm.
+#
+# - The above copyright notice and this permission notice shall be included in
+#   all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import RNS
+import threading
+from collections import OrderedDict
+from RNS.Cryptography import X25519PrivateKey
+
+class RatchetKey:
+    __slots__ = ("ratchet", "prv", "ratchet_id", "successes")
+
+    def __init__(self, ratchet):
+        self.ratchet    = ratchet
+        self.prv        = X25519PrivateKey.from_private_bytes(ratchet)
+        self.ratchet_id = None
+        self.successes  = 0
+
+    def get_ratchet_id(self):
+        # Deriving the public key needs a scalar multiplication,
+        # so the ratchet ID is only computed once, and only for
+        # ratchets that have actually been used by senders.
+        if self.ratchet_id == None:
+            self.ratchet_id = RNS.Identity._get_ratchet_id(self.prv.public_key().public_bytes())
+        return self.ratchet_id
+
+class RatchetKeyring:
+    """
+    Holds the parsed ratchet keys of a destination for decryption.
+    Instead of trying every retained ratchet in order of creation,
+    ratchets are tried in order of most recent successful use, and
+    ratchets that decrypted a packet are remembered for the sender's
+    ephemeral key, so retransmitted packets are resolved directly.
+    """
+    EPHEMERAL_CACHE_SIZE = 256
+
+    def __init__(self, ratchets=None):
+        self.lock            = threading.Lock()
+        self.ratchets        = None
+        self.newest          = None
+        self.keys            = {}
+        self.order           = []
+        self.ephemeral_cache = OrderedDict()
+
+        self.decryptions     = 0
+        self.trials          = 0
+        self.max_trials      = 0
+        self.cache_hits      = 0
+        self.unmatched       = 0
+
+        if ratchets != None:
+            self.update(ratchets)
+
+    def is_current(self, ratchets):
+        return ratchets is self.ratchets and len(ratchets) == len(self.order) and (len(ratchets) == 0 or ratchets[0] == self.newest)
+
+    def update(self, ratchets):
+        """
+        Synchronises the keyring with a list of ratchets, newest first.
+        Keys are reused for ratchets already in the keyring, and new
+        ratchets are placed first, since senders will start using them
+        as soon as they hear the next announce.
+        """
+        with self.lock:
+            keys      = {}
+            new_keys  = []
+            for ratchet in ratchets:
+                key = self.keys.get(ratchet)
+                if key == None:
+                    key = RatchetKey(ratchet)
+                    new_keys.append(key)
+                keys[ratchet] = key
+
+            self.order    = new_keys+[key for key in self.order if key.ratchet in keys]
+            self.keys     = keys
+            self.ratchets = ratchets
+            if len(ratchets) > 0: self.newest = ratchets[0]
+            else:                 self.newest = None
+
+            for peer_pub_bytes in list(self.ephemeral_cache.keys()):
+                if not self.ephemeral_cache[peer_pub_bytes].ratchet in keys:
+                    self.ephemeral_cache.pop(peer_pub_bytes)
+
+    def decrypt(self, peer_pub_bytes, peer_pub, ciphertext, decrypt_with):
+        """
+        Tries the ratchets in the keyring for decrypting a ciphertext.
+
+        :returns: A tuple of plaintext and ratchet ID, or *(None, None)* if no ratchet could decrypt the ciphertext.
+        """
+        with self.lock:
+            cached_key = self.ephemeral_cache.get(peer_pub_bytes)
+            if cached_key != None: candidates = [cached_key]+[key for key in self.order if not key is cached_key]
+            else:                  candidates = list(self.order)
+
+        trials = 0
+        for key in candidates:
+            trials += 1
+            try:
+                shared_key = key.prv.exchange(peer_pub)
+                plaintext  = decrypt_with(shared_key, ciphertext)
+            except Exception as e:
+                continue
+
+            ratchet_id = key.get_ratchet_id()
+            with self.lock:
+                key.successes   += 1
+                self.decryptions += 1
+                self.trials      += trials
+                self.max_trials   = max(self.max_trials, trials)
+                if key is cached_key: self.cache_hits += 1
+
+                # Move the ratchet to the front of the trial order
+                if len(self.order) > 0 and not self.order[0] is key and key in self.order:
+                    self.order.remove(key)
+                    self.order.insert(0, key)
+
+                self.ephemeral_cache[peer_pub_bytes] = key
+                self.ephemeral_cache.move_to_end(peer_pub_bytes)
+                while len(self.ephemeral_cache) > RatchetKeyring.EPHEMERAL_CACHE_SIZE:
+                    self.ephemeral_cache.popitem(last=False)
+
+            return plaintext, ratchet_id
+
+        with self.lock:
+            self.unmatched  += 1
+            self.trials     += trials
+            self.max_trials  = max(self.max_trials, trials)
+
+        return None, None
+
+    def get_stats(self):
+        attempts = self.decryptions+self.unmatched
+        if attempts > 0: mean_trials = self.trials/attempts
+        else:            mean_trials = 0
+
+        return {
+            "ratchets": len(self.order),
+            "decryptions": self.decryptions,
+            "unmatched": self.unmatched,
+            "trials": self.trials,
+            "mean_trials": mean_trials,
+            "max_trials": self.max_trials,
+            "cache_hits": self.cache_hits,
+        }
@@ -0,0 +1,265 @@
+# Reticulum License
+#
+# Copyright (c) 2016-2025 Mark Qvist
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# - The Software shall not be used in any kind of system which includes amongst
+#   its functions the ability to purposefully do harm to human beings.
+#
+# - The Software shall not be used, directly or indirectly, in the creation of
+#   an artificial intelligence, machine learning or language model training
+#   dataset, including but not limited to any use that contributes to the
+#   training or development of such a model or algorithm.
+#
+# - The above copyright notice and this permission notice shall be included in
+#   all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import os
+import RNS
+import time
+import threading
+import importlib.util
+from abc import ABC, abstractmethod
+from .vendor import umsgpack as umsgpack
+
+if importlib.util.find_spec("sqlite3") != None:
+    import sqlite3
+else:
+    sqlite3 = None
+
+class RatchetStore(ABC):
+    """
+    Base class for persistent storage of received ratchets. Ratchets
+    to persist are queued, and written by a single background writer.
+    Repeated updates for the same destination before a write are
+    coalesced into one, and all queued ratchets are written together.
+    """
+    # How long the writer waits for more ratchets
+    # to arrive before writing a batch to storage.
+    WRITE_DELAY = 0.5
+
+    def __init__(self):
+        self.pending       = {}
+        self.pending_lock  = threading.Lock()
+        self.write_lock    = threading.Lock()
+        self.write_event   = threading.Event()
+        self.writer        = None
+        self.queued        = 0
+        self.written       = 0
+        self.batches       = 0
+
+    def persist(self, destination_hash, ratchet, received):
+        with self.pending_lock:
+            self.pending[destination_hash] = (ratchet, received)
+            self.queued += 1
+            if self.writer == None:
+                self.writer = threading.Thread(target=self.__write_loop, daemon=True)
+                self.writer.start()
+
+        self.write_event.set()
+
+    def get(self, destination_hash):
+        """
+        :returns: A tuple of ratchet and time of reception for a destination hash, or *None* if no ratchet is stored.
+        """
+        with self.pending_lock:
+            pending_entry = self.pending.get(destination_hash)
+
+        if pending_entry != None: return pending_entry
+        else:                     return self.read(destination_hash)
+
+    def flush(self):
+        with self.write_lock:
+            with self.pending_lock:
+                entries = self.pending
+                self.pending = {}
+
+            if len(entries) > 0:
+                try:
+                    self.write(entries)
+                    self.written += len(entries)
+                    self.batches += 1
+
+                except Exception as e:
+                    # Requeue the entries, unless they were
+                    # replaced by newer ones in the meantime
+                    with self.pending_lock:
+                        for destination_hash in entries:
+                            if not destination_hash in self.pending:
+                                self.pending[destination_hash] = entries[destination_hash]
+                    raise e
+
+    def __write_loop(self):
+        while True:
+            self.write_event.wait()
+            time.sleep(RatchetStore.WRITE_DELAY)
+            self.write_event.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                RNS.log("Could not persist ratchets to storage. The contained exception was: "+str(e), RNS.LOG_ERROR)
+                time.sleep(RatchetStore.WRITE_DELAY)
+
+    def get_stats(self):
+        return {"queued": self.queued, "written": self.written, "batches": self.batches, "pending": len(self.pending)}
+
+    @abstractmethod
+    def read(self, destination_hash):
+        raise NotImplementedError()
+
+    @abstractmethod
+    def write(self, entries):
+        raise NotImplementedError()
+
+    @abstractmethod
+    def clean(self, expiry):
+        raise NotImplementedError()
+
+class SQLiteRatchetStore(RatchetStore):
+    """
+    Stores all received ratchets in a single SQLite database.
+    """
+    FILENAME = "ratchets.db"
+
+    @staticmethod
+    def available():
+        return sqlite3 != None
+
+    def __init__(self, path):
+        super().__init__()
+        self.path    = path
+        self.db_lock = threading.Lock()
+        self.db      = sqlite3.connect(path, check_same_thread=False)
+        with self.db_lock:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.execute("CREATE TABLE IF NOT EXISTS ratchets (destination_hash BLOB PRIMARY KEY, ratchet BLOB, received REAL) WITHOUT ROWID")
+            self.db.commit()
+
+    def read(self, destination_hash):
+        with self.db_lock:
+            row = self.db.execute("SELECT ratchet, received FROM ratchets WHERE destination_hash = ?", (destination_hash,)).fetchone()
+
+        if row == None: return None
+        else:           return (row[0], row[1])
+
+    def write(self, entries):
+        rows = []
+        for destination_hash in entries:
+            ratchet, received = entries[destination_hash]
+            rows.append((destination_hash, ratchet, received))
+
+        with self.db_lock:
+            with self.db:
+                self.db.executemany("INSERT OR REPLACE INTO ratchets VALUES (?, ?, ?)", rows)
+
+    def clean(self, expiry):
+        with self.db_lock:
+            with self.db:
+                removed = self.db.execute("DELETE FROM ratchets WHERE received < ?", (time.time()-expiry,)).rowcount
+
+        return removed
+
+    def import_files(self, ratchetdir):
+        """
+        Imports ratchets stored as individual files in the previous
+        storage format, removing the files once they are imported.
+        """
+        entries = {}
+        imported_files = []
+        for filename in os.listdir(ratchetdir):
+            try:
+                destination_hash = bytes.fromhex(filename)
+                with open(ratchetdir+"/"+filename, "rb") as ratchet_file:
+                    ratchet_data = umsgpack.unpackb(ratchet_file.read())
+                    entries[destination_hash] = (ratchet_data["ratchet"], ratchet_data["received"])
+
+            except Exception as e:
+                RNS.log("Could not import ratchet file "+str(filename)+", the contained exception was: "+str(e), RNS.LOG_DEBUG)
+
+            imported_files.append(filename)
+
+        if len(entries) > 0:
+            self.write(entries)
+
+        for filename in imported_files:
+            os.unlink(ratchetdir+"/"+filename)
+
+        return len(entries)
+
+    def close(self):
+        with self.db_lock:
+            self.db.close()
+
+class FileRatchetStore(RatchetStore):
+    """
+    Stores each received ratchet in an individual file. Used when
+    SQLite is not available on the system.
+    """
+    def __init__(self, ratchetdir):
+        super().__init__()
+        self.ratchetdir = ratchetdir
+
+    def read(self, destination_hash):
+        ratchet_path = self.ratchetdir+"/"+RNS.hexrep(destination_hash, delimit=False)
+        if os.path.isfile(ratchet_path):
+            with open(ratchet_path, "rb") as ratchet_file:
+                ratchet_data = umsgpack.unpackb(ratchet_file.read())
+                return (ratchet_data["ratchet"], ratchet_data["received"])
+        else:
+            return None
+
+    def write(self, entries):
+        if not os.path.isdir(self.ratchetdir):
+            os.makedirs(self.ratchetdir)
+
+        for destination_hash in entries:
+            ratchet, received = entries[destination_hash]
+            hexhash   = RNS.hexrep(destination_hash, delimit=False)
+            outpath   = f"{self.ratchetdir}/{hexhash}.out"
+            finalpath = f"{self.ratchetdir}/{hexhash}"
+            with open(outpath, "wb") as ratchet_file:
+                ratchet_file.write(umsgpack.packb({"ratchet": ratchet, "received": received}))
+            os.replace(outpath, finalpath)
+
+    def clean(self, expiry):
+        removed = 0
+        now = time.time()
+        if os.path.isdir(self.ratchetdir):
+            for filename in os.listdir(self.ratchetdir):
+                try:
+                    expired = False
+                    corrupted = False
+                    with open(f"{self.ratchetdir}/{filename}", "rb") as rf:
+                        try:
+                            ratchet_data = umsgpack.unpackb(rf.read())
+                            if now > ratchet_data["received"]+expiry:
+                                expired = True
+
+                        except Exception as e:
+                            RNS.log(f"Corrupted ratchet data while reading {self.ratchetdir}/{filename}, removing file", RNS.LOG_ERROR)
+                            corrupted = True
+
+                    if expired or corrupted:
+                        os.unlink(f"{self.ratchetdir}/{filename}")
+                        removed += 1
+
+                except Exception as e:
+                    RNS.log(f"An error occurred while cleaning ratchets, in the processing of {self.ratchetdir}/{filename}.", RNS.LOG_ERROR)
+                    RNS.log(f"The contained exception was: {e}", RNS.LOG_ERROR)
+
+        return removed
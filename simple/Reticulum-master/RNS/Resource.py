@@ -30,10 +30,10 @@
 
 import RNS
 import os
-import bz2
 import math
 import time
 import struct
+import mmap
 import tempfile
 import threading
 from threading import Lock
@@ -70,8 +70,12 @@ class Resource:
     WINDOW_MAX_FAST      = 75
     
     # For calculating maps and guard segments, this
-    # must be set to the global maximum window.
-    WINDOW_MAX           = WINDOW_MAX_FAST
+    # must be set to the global maximum window. It is
+    # larger than the fast link window, so senders can
+    # serve receivers using windows of up to this many
+    # parts. Parts are looked up by map hash, so a
+    # large guard range does not slow down requests.
+    WINDOW_MAX           = 512
     
     # If the fast rate is sustained for this many request
     # rounds, the fast link window size will be allowed.
@@ -119,10 +123,18 @@ class Resource:
     # Max metadata size is 16777215 (0xFFFFFF) bytes
     METADATA_MAX_SIZE       = 16 * 1024 * 1024 - 1
     
-    # The maximum size to auto-compress with
-    # bz2 before sending.
+    # The maximum size to auto-compress before
+    # sending. The codec is chosen by RNS.Compression.
     AUTO_COMPRESS_MAX_SIZE = 64 * 1024 * 1024
 
+    # Received segments larger than this are spooled
+    # to a temporary file as parts arrive, instead of
+    # being held in memory, and are then decrypted,
+    # decompressed and hashed in chunks of at most
+    # STREAM_CHUNK_SIZE bytes during assembly.
+    SPOOL_MIN_SIZE    = 256 * 1024
+    STREAM_CHUNK_SIZE = 256 * 1024
+
     PART_TIMEOUT_FACTOR           = 4
     PART_TIMEOUT_FACTOR_AFTER_RTT = 2
     PROOF_TIMEOUT_FACTOR          = 3
@@ -138,6 +150,18 @@ class Resource:
     HASHMAP_IS_NOT_EXHAUSTED = 0x00
     HASHMAP_IS_EXHAUSTED = 0xFF
 
+    # Receivers can ask senders that support wide
+    # windows for up to this many hashmap segments
+    # in one request, so the hashmap does not limit
+    # each round to a single segment of new parts.
+    HASHMAP_IS_EXHAUSTED_WIDE = 0xFE
+    HMU_SEGMENTS_MAX          = 4
+
+    # Parts are paced out in bursts that take
+    # this long at the pacing rate set by the
+    # congestion controller of the resource.
+    PACING_QUANTUM = 0.01
+
     # Status constants
     NONE            = 0x00
     QUEUED          = 0x01
@@ -164,6 +188,7 @@ class Resource:
 
     @staticmethod
     def accept(advertisement_packet, callback=None, progress_callback = None, request_id = None):
+        resource = None
         try:
             adv = ResourceAdvertisement.unpack(advertisement_packet.plaintext)
 
@@ -180,6 +205,7 @@ class Resource:
             resource.hashmap_raw          = adv.m
             resource.encrypted            = True if resource.flags & 0x01 else False
             resource.compressed           = True if resource.flags >> 1 & 0x01 else False
+            resource.codec                = adv.z
             resource.initiator            = False
             resource.callback             = callback
             resource.__progress_callback  = progress_callback
@@ -187,6 +213,9 @@ class Resource:
             resource.received_count       = 0
             resource.outstanding_parts    = 0
             resource.parts                = [None] * resource.total_parts
+            # One byte per part, so missing parts can be
+            # found with bytearray.find instead of a loop
+            resource.received_bitmap      = bytearray(resource.total_parts)
             resource.window               = Resource.WINDOW
             resource.window_max           = Resource.WINDOW_MAX_SLOW
             resource.window_min           = Resource.WINDOW_MIN
@@ -199,6 +228,11 @@ class Resource:
             resource.segment_index        = adv.i
             resource.total_segments       = adv.l
             
+            if resource.compressed and not resource.codec in RNS.Compression.CODECS:
+                RNS.log(f"Rejecting resource advertisement for {RNS.prettyhexrep(resource.hash)}, unsupported compression codec {resource.codec}", RNS.LOG_DEBUG)
+                Resource.reject(advertisement_packet)
+                return None
+
             if adv.l > 1: resource.split = True
             else: resource.split = False
 
@@ -206,6 +240,7 @@ class Resource:
             else:     resource.has_metadata = False
 
             resource.hashmap = [None] * resource.total_parts
+            resource.hashmap_index = {}
             resource.hashmap_height = 0
             resource.waiting_for_hmu = False
             resource.receiving_part = False
@@ -217,8 +252,21 @@ class Resource:
                 resource.window = previous_window
             if previous_eifr:
                 resource.previous_eifr = previous_eifr
+
+            # Senders that support wide windows serve windows
+            # up to WINDOW_MAX, and several hashmap segments
+            # per request.
+            resource.wide_hmu   = adv.w
+            resource.congestion = RNS.CongestionControl.create(resource, Resource.WINDOW_MAX if adv.w else Resource.WINDOW_MAX_FAST)
             
             if not resource.link.has_incoming_resource(resource):
+                # The spool is only created for resources that are
+                # actually accepted, so advertisement retries and
+                # rejections don't leave temporary files open.
+                if resource.size > Resource.SPOOL_MIN_SIZE:
+                    resource.spool = tempfile.TemporaryFile(dir=RNS.Reticulum.resourcepath)
+                    resource.spool.truncate(resource.size)
+
                 resource.link.register_incoming_resource(resource)
 
                 RNS.log(f"Accepting resource advertisement for {RNS.prettyhexrep(resource.hash)}. Transfer size is {RNS.prettysize(resource.size)} in {resource.total_parts} parts.", RNS.LOG_DEBUG)
@@ -238,6 +286,7 @@ class Resource:
 
         except Exception as e:
             RNS.log("Could not decode resource advertisement, dropping resource", RNS.LOG_DEBUG)
+            if resource != None: resource.__close_spool()
             return None
 
     # Create a resource for transmission to a remote destination
@@ -249,6 +298,9 @@ class Resource:
         data_size = None
         resource_data = None
         self.assembly_lock = False
+        self.spool = None
+        self.proof = None
+        self.codec = RNS.Compression.BZ2
         self.preparing_next_segment = False
         self.next_segment = None
         self.metadata = None
@@ -354,8 +406,12 @@ class Resource:
         self.req_data_rtt_rate = 0
         self.eifr = None
         self.previous_eifr = None
-        self.fast_rate_rounds = 0
-        self.very_slow_rate_rounds = 0
+        self.congestion = None
+        self.wide_hmu = False
+        self.hmu_target = None
+        self.last_request = None
+        self.round_bytes = 0
+        self.pacing_round = 0
         self.request_id = request_id
         self.started_transferring = None
         self.is_response = is_response
@@ -384,11 +440,14 @@ class Resource:
             self.uncompressed_data = data
 
             compression_began = time.time()
-            if self.auto_compress and data_size <= self.auto_compress_limit:
-                RNS.log("Compressing resource data...", RNS.LOG_EXTREME)
-                self.compressed_data   = bz2.compress(self.uncompressed_data)
+            codec, level      = RNS.Compression.select(self.link)
+            if self.auto_compress and data_size <= self.auto_compress_limit and RNS.Compression.is_compressible(self.uncompressed_data, codec, level):
+                RNS.log("Compressing resource data with "+RNS.Compression.NAMES[codec]+" at level "+str(level)+"...", RNS.LOG_EXTREME)
+                self.compressed_data   = RNS.Compression.compress(self.uncompressed_data, codec, level)
                 RNS.log("Compression completed in "+str(round(time.time()-compression_began, 3))+" seconds", RNS.LOG_EXTREME)
             else:
+                if self.auto_compress and data_size <= self.auto_compress_limit:
+                    RNS.log("Resource data sample did not compress, skipping compression", RNS.LOG_EXTREME)
                 self.compressed_data   = self.uncompressed_data
 
             self.uncompressed_size = len(self.uncompressed_data)
@@ -403,6 +462,7 @@ class Resource:
                 self.data += self.compressed_data
                 
                 self.compressed = True
+                self.codec      = codec
 
             else:
                 self.data  = b""
@@ -444,39 +504,66 @@ class Resource:
                 else:
                     self.original_hash = original_hash
 
-                self.parts  = []
-                self.hashmap = b""
-                collision_guard_list = []
-                for i in range(0,hashmap_entries):
-                    data = self.data[i*self.sdu:(i+1)*self.sdu]
-                    map_hash = self.get_map_hash(data)
+                self.hashmap = Resource.compute_hashmap(self.data, self.sdu, self.random_hash)
 
-                    if map_hash in collision_guard_list:
+                # Map hashes must be unique within the collision
+                # guard distance, since receivers match incoming
+                # parts by map hash within that range.
+                hashmap_ok = True
+                self.hashmap_index = {}
+                for i in range(0,hashmap_entries):
+                    map_hash = self.hashmap[i*Resource.MAPHASH_LEN:(i+1)*Resource.MAPHASH_LEN]
+                    indices  = self.hashmap_index.get(map_hash)
+                    if indices == None: self.hashmap_index[map_hash] = [i]
+                    elif i-indices[-1] <= ResourceAdvertisement.COLLISION_GUARD_SIZE:
                         RNS.log("Found hash collision in resource map, remapping...", RNS.LOG_DEBUG)
                         hashmap_ok = False
                         break
                     else:
-                        hashmap_ok = True
-                        collision_guard_list.append(map_hash)
-                        if len(collision_guard_list) > ResourceAdvertisement.COLLISION_GUARD_SIZE:
-                            collision_guard_list.pop(0)
-
-                        part = RNS.Packet(link, data, context=RNS.Packet.RESOURCE)
-                        part.pack()
-                        part.map_hash = map_hash
-
-                        self.hashmap += part.map_hash
-                        self.parts.append(part)
+                        indices.append(i)
 
                 RNS.log("Hashmap computation concluded in "+str(round(time.time()-hashmap_computation_began, 3))+" seconds", RNS.LOG_EXTREME)
 
-            self.data = None
+            # Part packets are built from the encrypted
+            # data when each part is first requested
+            self.parts = [None] * hashmap_entries
+
+            self.window             = Resource.WINDOW
+            self.window_max         = Resource.WINDOW_MAX_SLOW
+            self.window_min         = Resource.WINDOW_MIN
+            self.window_flexibility = Resource.WINDOW_FLEXIBILITY
+            self.congestion         = RNS.CongestionControl.create(self, Resource.WINDOW_MAX)
             if advertise:
                 self.advertise()
         else:
             self.receive_lock = Lock()
             
 
+    @staticmethod
+    def compute_hashmap(data, sdu, random_hash):
+        map_hash_len = Resource.MAPHASH_LEN
+        map_hashes   = []
+        for offset in range(0, len(data), sdu):
+            map_hashes.append(RNS.Identity.full_hash(data[offset:offset+sdu]+random_hash)[:map_hash_len])
+
+        return b"".join(map_hashes)
+
+    def get_part(self, index):
+        part = self.parts[index]
+        if part == None:
+            part = RNS.Packet(self.link, self.data[index*self.sdu:(index+1)*self.sdu], context=RNS.Packet.RESOURCE)
+            part.pack()
+            part.map_hash = self.hashmap[index*Resource.MAPHASH_LEN:(index+1)*Resource.MAPHASH_LEN]
+            self.parts[index] = part
+
+        return part
+
+    def find_parts(self, map_hash, start, end):
+        """
+        :returns: The indices of parts from ``start`` up to ``end`` with the map hash ``map_hash``, in ascending order.
+        """
+        return [i for i in self.hashmap_index.get(map_hash, []) if i >= start and i < end]
+
     def hashmap_update_packet(self, plaintext):
         if not self.status == Resource.FAILED:
             self.last_activity = time.time()
@@ -492,12 +579,18 @@ class Resource:
             seg_len = ResourceAdvertisement.HASHMAP_MAX_LEN
             hashes = len(hashmap)//Resource.MAPHASH_LEN
             for i in range(0,hashes):
+                map_hash = hashmap[i*Resource.MAPHASH_LEN:(i+1)*Resource.MAPHASH_LEN]
                 if self.hashmap[i+segment*seg_len] == None:
                     self.hashmap_height += 1
-                self.hashmap[i+segment*seg_len] = hashmap[i*Resource.MAPHASH_LEN:(i+1)*Resource.MAPHASH_LEN]
+                    self.hashmap_index.setdefault(map_hash, []).append(i+segment*seg_len)
+                self.hashmap[i+segment*seg_len] = map_hash
 
-            self.waiting_for_hmu = False
-            self.request_next()
+            # When several segments were requested, the next
+            # request is sent once all of them have arrived
+            if self.hmu_target == None or self.hashmap_height >= self.hmu_target:
+                self.hmu_target = None
+                self.waiting_for_hmu = False
+                self.request_next()
 
     def get_map_hash(self, data):
         return RNS.Identity.full_hash(data+self.random_hash)[:Resource.MAPHASH_LEN]
@@ -555,160 +648,137 @@ class Resource:
         if self.link: self.link.expected_rate = self.eifr
 
     def watchdog_job(self):
-        thread = threading.Thread(target=self.__watchdog_job, daemon=True)
-        thread.start()
-
-    def __watchdog_job(self):
         self.__watchdog_job_id += 1
         this_job_id = self.__watchdog_job_id
-
-        while self.status < Resource.ASSEMBLING and this_job_id == self.__watchdog_job_id:
-            while self.watchdog_lock:
-                sleep(0.025)
-
-            sleep_time = None
-            if self.status == Resource.ADVERTISED:
-                sleep_time = (self.adv_sent+self.timeout+Resource.PROCESSING_GRACE)-time.time()
-                if sleep_time < 0:
-                    if self.retries_left <= 0:
-                        RNS.log("Resource transfer timeout after sending advertisement", RNS.LOG_DEBUG)
-                        self.cancel()
+        if RNS.AsyncRuntime.enabled: RNS.AsyncRuntime.call_soon(self.__watchdog_timer, this_job_id)
+        else:
+            thread = threading.Thread(target=self.__watchdog_job, args=(this_job_id,), daemon=True)
+            thread.start()
+
+    def __watchdog_job(self, job_id):
+        sleep_time = self.__watchdog_step(job_id)
+        while sleep_time != None:
+            sleep(sleep_time)
+            sleep_time = self.__watchdog_step(job_id)
+
+    def __watchdog_timer(self, job_id):
+        sleep_time = self.__watchdog_step(job_id)
+        if sleep_time != None: RNS.AsyncRuntime.call_later(sleep_time, self.__watchdog_timer, job_id)
+
+    def __watchdog_step(self, job_id):
+        # Runs a single watchdog check, and returns the time until
+        # the next one, or None once the watchdog should stop
+        if not (self.status < Resource.ASSEMBLING and job_id == self.__watchdog_job_id): return None
+        if self.watchdog_lock: return 0.025
+
+        sleep_time = None
+        if self.status == Resource.ADVERTISED:
+            sleep_time = (self.adv_sent+self.timeout+Resource.PROCESSING_GRACE)-time.time()
+            if sleep_time < 0:
+                if self.retries_left <= 0:
+                    RNS.log("Resource transfer timeout after sending advertisement", RNS.LOG_DEBUG)
+                    self.cancel()
+                    sleep_time = 0.001
+                else:
+                    try:
+                        RNS.log("No part requests received, retrying resource advertisement...", RNS.LOG_DEBUG)
+                        self.retries_left -= 1
+                        self.advertisement_packet = RNS.Packet(self.link, ResourceAdvertisement(self).pack(), context=RNS.Packet.RESOURCE_ADV)
+                        self.advertisement_packet.send()
+                        self.last_activity = time.time()
+                        self.adv_sent = self.last_activity
                         sleep_time = 0.001
-                    else:
-                        try:
-                            RNS.log("No part requests received, retrying resource advertisement...", RNS.LOG_DEBUG)
-                            self.retries_left -= 1
-                            self.advertisement_packet = RNS.Packet(self.link, ResourceAdvertisement(self).pack(), context=RNS.Packet.RESOURCE_ADV)
-                            self.advertisement_packet.send()
-                            self.last_activity = time.time()
-                            self.adv_sent = self.last_activity
-                            sleep_time = 0.001
-                        except Exception as e:
-                            RNS.log("Could not resend advertisement packet, cancelling resource. The contained exception was: "+str(e), RNS.LOG_VERBOSE)
-                            self.cancel()
-                    
+                    except Exception as e:
+                        RNS.log("Could not resend advertisement packet, cancelling resource. The contained exception was: "+str(e), RNS.LOG_VERBOSE)
+                        self.cancel()
+                
 
-            elif self.status == Resource.TRANSFERRING:
-                if not self.initiator:
-                    retries_used = self.max_retries - self.retries_left
-                    extra_wait = retries_used * Resource.PER_RETRY_DELAY
+        elif self.status == Resource.TRANSFERRING:
+            if not self.initiator:
+                retries_used = self.max_retries - self.retries_left
+                extra_wait = retries_used * Resource.PER_RETRY_DELAY
 
-                    self.update_eifr()
-                    expected_tof_remaining = (self.outstanding_parts*self.sdu*8)/self.eifr
+                self.update_eifr()
+                expected_tof_remaining = (self.outstanding_parts*self.sdu*8)/self.eifr
 
-                    if self.req_resp_rtt_rate != 0:
-                        sleep_time = self.last_activity + self.part_timeout_factor*expected_tof_remaining + Resource.RETRY_GRACE_TIME + extra_wait - time.time()
-                    else:
-                        sleep_time = self.last_activity + self.part_timeout_factor*((3*self.sdu)/self.eifr) + Resource.RETRY_GRACE_TIME + extra_wait - time.time()
-                    
-                    # TODO: Remove debug at some point
-                    # RNS.log(f"EIFR {RNS.prettyspeed(self.eifr)}, ETOF {RNS.prettyshorttime(expected_tof_remaining)} ", RNS.LOG_DEBUG, pt=True)
-                    # RNS.log(f"Resource ST {RNS.prettyshorttime(sleep_time)}, RTT {RNS.prettyshorttime(self.rtt or self.link.rtt)}, {self.outstanding_parts} left", RNS.LOG_DEBUG, pt=True)
-                    
-                    if sleep_time < 0:
-                        if self.retries_left > 0:
-                            ms = "" if self.outstanding_parts == 1 else "s"
-                            RNS.log("Timed out waiting for "+str(self.outstanding_parts)+" part"+ms+", requesting retry", RNS.LOG_DEBUG)
-                            if self.window > self.window_min:
-                                self.window -= 1
-                                if self.window_max > self.window_min:
-                                    self.window_max -= 1
-                                    if (self.window_max - self.window) > (self.window_flexibility-1):
-                                        self.window_max -= 1
-
-                            sleep_time = 0.001
-                            self.retries_left -= 1
-                            self.waiting_for_hmu = False
-                            self.request_next()
-                        else:
-                            self.cancel()
-                            sleep_time = 0.001
+                if self.req_resp_rtt_rate != 0:
+                    sleep_time = self.last_activity + self.part_timeout_factor*expected_tof_remaining + Resource.RETRY_GRACE_TIME + extra_wait - time.time()
                 else:
-                    max_extra_wait = sum([(r+1) * Resource.PER_RETRY_DELAY for r in range(self.MAX_RETRIES)])
-                    max_wait = self.rtt * self.timeout_factor * self.max_retries + self.sender_grace_time + max_extra_wait
-                    sleep_time = self.last_activity + max_wait - time.time()
-                    if sleep_time < 0:
-                        RNS.log("Resource timed out waiting for part requests", RNS.LOG_DEBUG)
-                        self.cancel()
-                        sleep_time = 0.001
-
-            elif self.status == Resource.AWAITING_PROOF:
-                # Decrease timeout factor since proof packets are
-                # significantly smaller than full req/resp roundtrip
-                self.timeout_factor = Resource.PROOF_TIMEOUT_FACTOR
-
-                sleep_time = self.last_part_sent + (self.rtt*self.timeout_factor+self.sender_grace_time) - time.time()
+                    sleep_time = self.last_activity + self.part_timeout_factor*((3*self.sdu)/self.eifr) + Resource.RETRY_GRACE_TIME + extra_wait - time.time()
+                
+                # TODO: Remove debug at some point
+                # RNS.log(f"EIFR {RNS.prettyspeed(self.eifr)}, ETOF {RNS.prettyshorttime(expected_tof_remaining)} ", RNS.LOG_DEBUG, pt=True)
+                # RNS.log(f"Resource ST {RNS.prettyshorttime(sleep_time)}, RTT {RNS.prettyshorttime(self.rtt or self.link.rtt)}, {self.outstanding_parts} left", RNS.LOG_DEBUG, pt=True)
+                
                 if sleep_time < 0:
-                    if self.retries_left <= 0:
-                        RNS.log("Resource timed out waiting for proof", RNS.LOG_DEBUG)
-                        self.cancel()
+                    if self.retries_left > 0:
+                        ms = "" if self.outstanding_parts == 1 else "s"
+                        RNS.log("Timed out waiting for "+str(self.outstanding_parts)+" part"+ms+", requesting retry", RNS.LOG_DEBUG)
+                        self.congestion.parts_lost()
+
                         sleep_time = 0.001
-                    else:
-                        RNS.log("All parts sent, but no resource proof received, querying network cache...", RNS.LOG_DEBUG)
                         self.retries_left -= 1
-                        expected_data = self.hash + self.expected_proof
-                        expected_proof_packet = RNS.Packet(self.link, expected_data, packet_type=RNS.Packet.PROOF, context=RNS.Packet.RESOURCE_PRF)
-                        expected_proof_packet.pack()
-                        RNS.Transport.cache_request(expected_proof_packet.packet_hash, self.link)
-                        self.last_part_sent = time.time()
+                        self.waiting_for_hmu = False
+                        self.request_next()
+                    else:
+                        self.cancel()
                         sleep_time = 0.001
+            else:
+                max_extra_wait = sum([(r+1) * Resource.PER_RETRY_DELAY for r in range(self.MAX_RETRIES)])
+                max_wait = self.rtt * self.timeout_factor * self.max_retries + self.sender_grace_time + max_extra_wait
+                sleep_time = self.last_activity + max_wait - time.time()
+                if sleep_time < 0:
+                    RNS.log("Resource timed out waiting for part requests", RNS.LOG_DEBUG)
+                    self.cancel()
+                    sleep_time = 0.001
 
-            elif self.status == Resource.REJECTED:
-                sleep_time = 0.001
+        elif self.status == Resource.AWAITING_PROOF:
+            # Decrease timeout factor since proof packets are
+            # significantly smaller than full req/resp roundtrip
+            self.timeout_factor = Resource.PROOF_TIMEOUT_FACTOR
 
-            if sleep_time == 0:
-                RNS.log("Warning! Link watchdog sleep time of 0!", RNS.LOG_DEBUG)
-            if sleep_time == None or sleep_time < 0:
-                RNS.log("Timing error, cancelling resource transfer.", RNS.LOG_ERROR)
-                self.cancel()
-            
-            if sleep_time != None:
-                sleep(min(sleep_time, Resource.WATCHDOG_MAX_SLEEP))
+            sleep_time = self.last_part_sent + (self.rtt*self.timeout_factor+self.sender_grace_time) - time.time()
+            if sleep_time < 0:
+                if self.retries_left <= 0:
+                    RNS.log("Resource timed out waiting for proof", RNS.LOG_DEBUG)
+                    self.cancel()
+                    sleep_time = 0.001
+                else:
+                    RNS.log("All parts sent, but no resource proof received, querying network cache...", RNS.LOG_DEBUG)
+                    self.retries_left -= 1
+                    expected_data = self.hash + self.expected_proof
+                    expected_proof_packet = RNS.Packet(self.link, expected_data, packet_type=RNS.Packet.PROOF, context=RNS.Packet.RESOURCE_PRF)
+                    expected_proof_packet.pack()
+                    RNS.Transport.cache_request(expected_proof_packet.packet_hash, self.link)
+                    self.last_part_sent = time.time()
+                    sleep_time = 0.001
+
+        elif self.status == Resource.REJECTED:
+            sleep_time = 0.001
+
+        if sleep_time == 0:
+            RNS.log("Warning! Link watchdog sleep time of 0!", RNS.LOG_DEBUG)
+        if sleep_time == None or sleep_time < 0:
+            RNS.log("Timing error, cancelling resource transfer.", RNS.LOG_ERROR)
+            self.cancel()
+            return None
+        
+        return min(sleep_time, Resource.WATCHDOG_MAX_SLEEP)
 
     def assemble(self):
         if not self.status == Resource.FAILED:
             try:
                 self.status = Resource.ASSEMBLING
-                stream = b"".join(self.parts)
-
-                if self.encrypted: data = self.link.decrypt(stream)
-                else: data = stream
-
-                # Strip off random hash
-                data = data[Resource.RANDOM_HASH_SIZE:]
-
-                if self.compressed: self.data = bz2.decompress(data)
-                else: self.data = data
-
-                calculated_hash = RNS.Identity.full_hash(self.data+self.random_hash)
-                if calculated_hash == self.hash:
-                    if self.has_metadata and self.segment_index == 1:
-                        # TODO: Add early metadata_ready callback
-                        metadata_size = self.data[0] << 16 | self.data[1] << 8 | self.data[2]
-                        packed_metadata = self.data[3:3+metadata_size]
-                        metadata_file = open(self.meta_storagepath, "wb")
-                        metadata_file.write(packed_metadata)
-                        metadata_file.close()
-                        del packed_metadata
-                        data = self.data[3+metadata_size:]
-                    else:
-                        data = self.data
-
-                    self.file = open(self.storagepath, "ab")
-                    self.file.write(data)
-                    self.file.close()
-                    self.status = Resource.COMPLETE
-                    del data
-                    self.prove()
-                
-                else: self.status = Resource.CORRUPT
-
+                if self.spool != None: self.__assemble_spooled()
+                else: self.__assemble_parts()
 
             except Exception as e:
                 RNS.log("Error while assembling received resource.", RNS.LOG_ERROR)
                 RNS.log("The contained exception was: "+str(e), RNS.LOG_ERROR)
                 self.status = Resource.CORRUPT
 
+            finally: self.__close_spool()
+
             self.link.resource_concluded(self)
 
             if self.segment_index == self.total_segments:
@@ -737,11 +807,134 @@ class Resource:
             else:
                 RNS.log("Resource segment "+str(self.segment_index)+" of "+str(self.total_segments)+" received, waiting for next segment to be announced", RNS.LOG_DEBUG)
 
+    def __assemble_parts(self):
+        stream = b"".join(self.parts)
+
+        if self.encrypted: data = self.link.decrypt(stream)
+        else: data = stream
+
+        # Strip off random hash
+        data = data[Resource.RANDOM_HASH_SIZE:]
+
+        if self.compressed: self.data = RNS.Compression.decompress(data, self.codec)
+        else: self.data = data
+
+        calculated_hash = RNS.Identity.full_hash(self.data+self.random_hash)
+        if calculated_hash == self.hash:
+            if self.has_metadata and self.segment_index == 1:
+                # TODO: Add early metadata_ready callback
+                metadata_size = self.data[0] << 16 | self.data[1] << 8 | self.data[2]
+                packed_metadata = self.data[3:3+metadata_size]
+                metadata_file = open(self.meta_storagepath, "wb")
+                metadata_file.write(packed_metadata)
+                metadata_file.close()
+                del packed_metadata
+                data = self.data[3+metadata_size:]
+            else:
+                data = self.data
+
+            self.file = open(self.storagepath, "ab")
+            self.file.write(data)
+            self.file.close()
+            self.status = Resource.COMPLETE
+            del data
+            self.prove()
+        
+        else: self.status = Resource.CORRUPT
+
+    def __assemble_spooled(self):
+        # Decrypts, decompresses and hashes the spooled segment as a
+        # stream of chunks, appending the data directly to the storage
+        # file, so memory use stays bounded regardless of segment size.
+        self.spool.flush()
+        storage_file  = open(self.storagepath, "ab")
+        storage_start = storage_file.tell()
+        verified      = False
+
+        try:
+            with mmap.mmap(self.spool.fileno(), 0, access=mmap.ACCESS_READ) as stream:
+                if self.encrypted: chunks = self.link.decrypt_stream(stream, Resource.STREAM_CHUNK_SIZE)
+                else: chunks = (stream[offset:offset+Resource.STREAM_CHUNK_SIZE] for offset in range(0, len(stream), Resource.STREAM_CHUNK_SIZE))
+
+                # Strip off random hash
+                chunks = Resource.__skip_stream(chunks, Resource.RANDOM_HASH_SIZE)
+                if self.compressed: chunks = RNS.Compression.decompress_stream(chunks, self.codec, Resource.STREAM_CHUNK_SIZE)
+
+                data_hash  = RNS.Cryptography.Hashes.sha256_stream()
+                proof_hash = RNS.Cryptography.Hashes.sha256_stream()
+                reading_metadata = self.has_metadata and self.segment_index == 1
+                metadata_buffer  = bytearray(); packed_metadata = None
+                for chunk in chunks:
+                    data_hash.update(chunk)
+                    proof_hash.update(chunk)
+
+                    if reading_metadata:
+                        metadata_buffer += chunk
+                        if len(metadata_buffer) < 3: continue
+                        metadata_size = metadata_buffer[0] << 16 | metadata_buffer[1] << 8 | metadata_buffer[2]
+                        if len(metadata_buffer) < 3+metadata_size: continue
+                        packed_metadata  = bytes(metadata_buffer[3:3+metadata_size])
+                        chunk            = bytes(metadata_buffer[3+metadata_size:])
+                        reading_metadata = False; metadata_buffer = None
+
+                    storage_file.write(chunk)
+
+            data_hash.update(self.random_hash)
+            if data_hash.digest() == self.hash and not reading_metadata:
+                if packed_metadata != None:
+                    metadata_file = open(self.meta_storagepath, "wb")
+                    metadata_file.write(packed_metadata)
+                    metadata_file.close()
+
+                proof_hash.update(self.hash)
+                self.proof  = proof_hash.digest()
+                self.status = Resource.COMPLETE
+                verified    = True
+                self.prove()
+
+            else: self.status = Resource.CORRUPT
+
+        finally:
+            # Data from segments that failed verification
+            # is removed from the storage file again
+            if not verified: storage_file.truncate(storage_start)
+            storage_file.close()
+
+    @staticmethod
+    def __skip_stream(chunks, skip):
+        for chunk in chunks:
+            if skip > 0:
+                skipped = min(skip, len(chunk))
+                chunk   = chunk[skipped:]
+                skip   -= skipped
+            if len(chunk) > 0: yield chunk
+
+    def __spool_part(self, index, part_data):
+        try:
+            self.spool.seek(index*self.sdu)
+            self.spool.write(part_data)
+            return True
+
+        except Exception as e:
+            # The spool may have been closed by a
+            # concurrent cancellation of the transfer
+            RNS.log(f"Could not spool part for {self}: {e}", RNS.LOG_DEBUG)
+            return False
+
+    def __close_spool(self):
+        spool = self.spool
+        self.spool = None
+        if spool != None:
+            try: spool.close()
+            except Exception as e: RNS.log(f"Error while closing resource spool file: {e}", RNS.LOG_ERROR)
 
     def prove(self):
         if not self.status == Resource.FAILED:
             try:
-                proof = RNS.Identity.full_hash(self.data+self.hash)
+                # Spooled segments have their proof calculated
+                # while being streamed through assembly
+                if self.proof != None: proof = self.proof
+                else: proof = RNS.Identity.full_hash(self.data+self.hash)
                 proof_data = self.hash+proof
                 proof_packet = RNS.Packet(self.link, proof_data, packet_type=RNS.Packet.PROOF, context=RNS.Packet.RESOURCE_PRF)
                 proof_packet.send()
@@ -773,6 +966,7 @@ class Resource:
             if len(proof_data) == RNS.Identity.HASHLENGTH//8*2:
                 if proof_data[RNS.Identity.HASHLENGTH//8:] == self.expected_proof:
                     self.status = Resource.COMPLETE
+                    self.data = None
                     self.link.resource_concluded(self)
                     if self.segment_index == self.total_segments:
                         # If all segments were processed, we'll
@@ -837,12 +1031,7 @@ class Resource:
                 if rtt > 0:
                     req_resp_cost = len(packet.raw)+self.req_sent_bytes
                     self.req_resp_rtt_rate = req_resp_cost / rtt
-
-                    if self.req_resp_rtt_rate > Resource.RATE_FAST and self.fast_rate_rounds < Resource.FAST_RATE_THRESHOLD:
-                        self.fast_rate_rounds += 1
-
-                        if self.fast_rate_rounds == Resource.FAST_RATE_THRESHOLD:
-                            self.window_max = Resource.WINDOW_MAX_FAST
+                    self.congestion.response_received(rtt, self.req_resp_rtt_rate)
 
             if not self.status == Resource.FAILED:
                 self.status = Resource.TRANSFERRING
@@ -850,33 +1039,29 @@ class Resource:
                 part_hash = self.get_map_hash(part_data)
 
                 consecutive_index = self.consecutive_completed_height if self.consecutive_completed_height >= 0 else 0
-                i = consecutive_index
-                for map_hash in self.hashmap[consecutive_index:consecutive_index+self.window]:
-                    if map_hash == part_hash:
-                        if self.parts[i] == None:
-
-                            # Insert data into parts list
-                            self.parts[i] = part_data
-                            self.rtt_rxd_bytes += len(part_data)
-                            self.received_count += 1
-                            self.outstanding_parts -= 1
-
-                            # Update consecutive completed pointer
-                            if i == self.consecutive_completed_height + 1:
-                                self.consecutive_completed_height = i
-                            
-                            cp = self.consecutive_completed_height + 1
-                            while cp < len(self.parts) and self.parts[cp] != None:
-                                self.consecutive_completed_height = cp
-                                cp += 1
-
-                            if self.__progress_callback != None:
-                                try:
-                                    self.__progress_callback(self)
-                                except Exception as e:
-                                    RNS.log("Error while executing progress callback from "+str(self)+". The contained exception was: "+str(e), RNS.LOG_ERROR)
+                for i in self.find_parts(part_hash, consecutive_index, consecutive_index+self.window):
+                    if not self.received_bitmap[i]:
 
-                    i += 1
+                        # Insert data into parts list. Spooled
+                        # parts are written to the spool file
+                        # instead.
+                        if self.spool == None: self.parts[i] = part_data
+                        elif not self.__spool_part(i, part_data): break
+
+                        self.received_bitmap[i] = 1
+                        self.rtt_rxd_bytes += len(part_data)
+                        self.received_count += 1
+                        self.outstanding_parts -= 1
+
+                        # Update consecutive completed pointer
+                        cp = self.received_bitmap.find(0, self.consecutive_completed_height+1)
+                        self.consecutive_completed_height = (len(self.received_bitmap) if cp == -1 else cp)-1
+
+                        if self.__progress_callback != None:
+                            try:
+                                self.__progress_callback(self)
+                            except Exception as e:
+                                RNS.log("Error while executing progress callback from "+str(self)+". The contained exception was: "+str(e), RNS.LOG_ERROR)
 
                 self.receiving_part = False
 
@@ -884,13 +1069,7 @@ class Resource:
                     self.assembly_lock = True
                     self.assemble()
                 elif self.outstanding_parts == 0:
-                    # TODO: Figure out if there is a mathematically
-                    # optimal way to adjust windows
-                    if self.window < self.window_max:
-                        self.window += 1
-                        if (self.window - self.window_min) > (self.window_flexibility-1):
-                            self.window_min += 1
-
+                    rtt = None; rate = None
                     if self.req_sent != 0:
                         rtt = time.time()-self.req_sent
                         req_transferred = self.rtt_rxd_bytes - self.rtt_rxd_bytes_at_part_req
@@ -899,19 +1078,9 @@ class Resource:
                             self.req_data_rtt_rate = req_transferred/rtt
                             self.update_eifr()
                             self.rtt_rxd_bytes_at_part_req = self.rtt_rxd_bytes
+                            rate = self.req_data_rtt_rate
 
-                            if self.req_data_rtt_rate > Resource.RATE_FAST and self.fast_rate_rounds < Resource.FAST_RATE_THRESHOLD:
-                                self.fast_rate_rounds += 1
-
-                                if self.fast_rate_rounds == Resource.FAST_RATE_THRESHOLD:
-                                    self.window_max = Resource.WINDOW_MAX_FAST
-
-                            if self.fast_rate_rounds == 0 and self.req_data_rtt_rate < Resource.RATE_VERY_SLOW and self.very_slow_rate_rounds < Resource.VERY_SLOW_RATE_THRESHOLD:
-                                self.very_slow_rate_rounds += 1
-
-                                if self.very_slow_rate_rounds == Resource.VERY_SLOW_RATE_THRESHOLD:
-                                    self.window_max = Resource.WINDOW_MAX_VERY_SLOW
-
+                    self.congestion.round_completed(rtt, rate)
                     self.request_next()
             else:
                 self.receiving_part = False
@@ -924,31 +1093,42 @@ class Resource:
         if not self.status == Resource.FAILED:
             if not self.waiting_for_hmu:
                 self.outstanding_parts = 0
+                self.hmu_target = None
                 hashmap_exhausted = Resource.HASHMAP_IS_NOT_EXHAUSTED
                 requested_hashes = b""
 
-                i = 0; pn = self.consecutive_completed_height+1
-                search_start = pn
-                search_size = self.window
-                
-                for part in self.parts[search_start:search_start+search_size]:
-                    if part == None:
-                        part_hash = self.hashmap[pn]
-                        if part_hash != None:
-                            requested_hashes += part_hash
-                            self.outstanding_parts += 1
-                            i += 1
-                        else:
-                            hashmap_exhausted = Resource.HASHMAP_IS_EXHAUSTED
+                i = 0
+                search_start = self.consecutive_completed_height+1
+                search_end   = search_start+self.window
+
+                # Request the missing parts in the window
+                pn = self.received_bitmap.find(0, search_start, search_end)
+                while pn != -1:
+                    part_hash = self.hashmap[pn]
+                    if part_hash != None:
+                        requested_hashes += part_hash
+                        self.outstanding_parts += 1
+                        i += 1
+                    else:
+                        hashmap_exhausted = Resource.HASHMAP_IS_EXHAUSTED
 
-                    pn += 1
                     if i >= self.window or hashmap_exhausted == Resource.HASHMAP_IS_EXHAUSTED:
                         break
 
+                    pn = self.received_bitmap.find(0, pn+1, search_end)
+
                 hmu_part = bytes([hashmap_exhausted])
                 if hashmap_exhausted == Resource.HASHMAP_IS_EXHAUSTED:
                     last_map_hash = self.hashmap[self.hashmap_height-1]
-                    hmu_part += last_map_hash
+                    if not self.wide_hmu: hmu_part += last_map_hash
+                    else:
+                        # Ask for enough segments to cover the window
+                        seg_len   = ResourceAdvertisement.HASHMAP_MAX_LEN
+                        remaining = math.ceil((self.total_parts-self.hashmap_height)/seg_len)
+                        segments  = max(1, min(math.ceil((search_end-self.hashmap_height)/seg_len), remaining, Resource.HMU_SEGMENTS_MAX))
+                        hmu_part  = bytes([Resource.HASHMAP_IS_EXHAUSTED_WIDE])+last_map_hash+bytes([segments])
+                        self.hmu_target = min(self.total_parts, self.hashmap_height+segments*seg_len)
+
                     self.waiting_for_hmu = True
 
                 request_data = hmu_part + self.hash + requested_hashes
@@ -979,8 +1159,8 @@ class Resource:
 
             self.retries_left = self.max_retries
 
-            wants_more_hashmap = True if request_data[0] == Resource.HASHMAP_IS_EXHAUSTED else False
-            pad = 1+Resource.MAPHASH_LEN if wants_more_hashmap else 1
+            wants_more_hashmap = request_data[0] == Resource.HASHMAP_IS_EXHAUSTED or request_data[0] == Resource.HASHMAP_IS_EXHAUSTED_WIDE
+            pad = Resource.request_header_size(request_data)
 
             requested_hashes = request_data[pad+RNS.Identity.HASHLENGTH//8:]
 
@@ -988,40 +1168,37 @@ class Resource:
             search_start = self.receiver_min_consecutive_height
             search_end   = self.receiver_min_consecutive_height+ResourceAdvertisement.COLLISION_GUARD_SIZE
 
-            map_hashes = []
+            map_hashes = set()
             for i in range(0,len(requested_hashes)//Resource.MAPHASH_LEN):
                 map_hash = requested_hashes[i*Resource.MAPHASH_LEN:(i+1)*Resource.MAPHASH_LEN]
-                map_hashes.append(map_hash)
-
-            search_scope = self.parts[search_start:search_end]
-            requested_parts = list(filter(lambda part: part.map_hash in map_hashes, search_scope))
-
-            for part in requested_parts:
-                try:
-                    if not part.sent:
-                        part.send()
-                        self.sent_parts += 1
-                    else:
-                        part.resend()
-
-                    self.last_activity = time.time()
-                    self.last_part_sent = self.last_activity
-
-                except Exception as e:
-                    RNS.log("Resource could not send parts, cancelling transfer!", RNS.LOG_DEBUG)
-                    RNS.log("The contained exception was: "+str(e), RNS.LOG_DEBUG)
-                    self.cancel()
-            
+                map_hashes.add(map_hash)
+
+            requested_indices = []
+            for map_hash in map_hashes: requested_indices.extend(self.find_parts(map_hash, search_start, search_end))
+            requested_parts = [self.get_part(i) for i in sorted(requested_indices)]
+
+            # Each request concludes the previous round, and
+            # requests for parts that were already sent means
+            # some were lost.
+            now = time.time()
+            if self.last_request != None:
+                interval = now-self.last_request
+                if any(part.sent for part in requested_parts): self.congestion.parts_lost()
+                if interval > 0: self.congestion.round_completed(interval, self.round_bytes/interval)
+            self.last_request = now
+            self.round_bytes  = sum(len(part.raw) for part in requested_parts)
+
+            hmu_packets = []
             if wants_more_hashmap:
                 last_map_hash = request_data[1:Resource.MAPHASH_LEN+1]
+                hmu_segments  = 1
+                if request_data[0] == Resource.HASHMAP_IS_EXHAUSTED_WIDE: hmu_segments = max(1, min(request_data[1+Resource.MAPHASH_LEN], Resource.HMU_SEGMENTS_MAX))
                 
-                part_index   = self.receiver_min_consecutive_height
-                search_start = part_index
+                search_start = self.receiver_min_consecutive_height
                 search_end   = self.receiver_min_consecutive_height+ResourceAdvertisement.COLLISION_GUARD_SIZE
-                for part in self.parts[search_start:search_end]:
-                    part_index += 1
-                    if part.map_hash == last_map_hash:
-                        break
+                last_indices = self.find_parts(last_map_hash, search_start, search_end)
+                if len(last_indices) > 0: part_index = last_indices[0]+1
+                else: part_index = max(search_start, min(search_end, len(self.parts)))
 
                 self.receiver_min_consecutive_height = max(part_index-1-Resource.WINDOW_MAX, 0)
 
@@ -1032,28 +1209,36 @@ class Resource:
                 else:
                     segment = part_index // ResourceAdvertisement.HASHMAP_MAX_LEN
 
-                
-                hashmap_start = segment*ResourceAdvertisement.HASHMAP_MAX_LEN
-                hashmap_end   = min((segment+1)*ResourceAdvertisement.HASHMAP_MAX_LEN, len(self.parts))
-
-                hashmap = b""
-                for i in range(hashmap_start,hashmap_end):
-                    hashmap += self.hashmap[i*Resource.MAPHASH_LEN:(i+1)*Resource.MAPHASH_LEN]
-
-                hmu = self.hash+umsgpack.packb([segment, hashmap])
-                hmu_packet = RNS.Packet(self.link, hmu, context = RNS.Packet.RESOURCE_HMU)
-
-                try:
-                    hmu_packet.send()
-                    self.last_activity = time.time()
-                except Exception as e:
-                    RNS.log("Could not send resource HMU packet, cancelling resource", RNS.LOG_DEBUG)
-                    RNS.log("The contained exception was: "+str(e), RNS.LOG_DEBUG)
-                    self.cancel()
-
-            if self.sent_parts == len(self.parts):
-                self.status = Resource.AWAITING_PROOF
-                self.retries_left = 3
+                for segment in range(segment, segment+hmu_segments):
+                    hashmap_start = segment*ResourceAdvertisement.HASHMAP_MAX_LEN
+                    hashmap_end   = min((segment+1)*ResourceAdvertisement.HASHMAP_MAX_LEN, len(self.parts))
+                    if hashmap_start >= hashmap_end: break
+
+                    hashmap = self.hashmap[hashmap_start*Resource.MAPHASH_LEN:hashmap_end*Resource.MAPHASH_LEN]
+                    hmu = self.hash+umsgpack.packb([segment, hashmap])
+                    hmu_packets.append(RNS.Packet(self.link, hmu, context = RNS.Packet.RESOURCE_HMU))
+
+            # Parts are paced out in bursts when the congestion
+            # controller sets a pacing rate, and the requested
+            # parts take longer than a burst to send at it.
+            # Hashmap updates are sent after the last burst.
+            self.pacing_round += 1
+            pacing_rate = self.congestion.get_pacing_rate()
+            if pacing_rate == None or self.round_bytes <= pacing_rate*Resource.PACING_QUANTUM:
+                self.__send_parts(requested_parts, hmu_packets, self.pacing_round)
+            else:
+                burst_bytes = pacing_rate*Resource.PACING_QUANTUM
+                bursts = [[]]; filled = 0
+                for part in requested_parts:
+                    if filled >= burst_bytes:
+                        bursts.append([]); filled = 0
+                    bursts[-1].append(part); filled += len(part.raw)
+
+                scheduler = RNS.AsyncRuntime if RNS.AsyncRuntime.enabled else RNS.Scheduler
+                for burst_index in range(1, len(bursts)):
+                    last = burst_index == len(bursts)-1
+                    scheduler.call_later(burst_index*Resource.PACING_QUANTUM, self.__send_parts, bursts[burst_index], hmu_packets if last else [], self.pacing_round)
+                self.__send_parts(bursts[0], hmu_packets if len(bursts) == 1 else [], self.pacing_round)
 
             if self.__progress_callback != None:
                 try:
@@ -1061,12 +1246,58 @@ class Resource:
                 except Exception as e:
                     RNS.log("Error while executing progress callback from "+str(self)+". The contained exception was: "+str(e), RNS.LOG_ERROR)
 
+    @staticmethod
+    def request_header_size(request_data):
+        """
+        :returns: The size of the part request header before the resource hash.
+        """
+        if   request_data[0] == Resource.HASHMAP_IS_EXHAUSTED:      return 1+Resource.MAPHASH_LEN
+        elif request_data[0] == Resource.HASHMAP_IS_EXHAUSTED_WIDE: return 1+Resource.MAPHASH_LEN+1
+        else:                                                       return 1
+
+    def __send_parts(self, parts, hmu_packets, pacing_round):
+        # Parts from rounds that a newer request has
+        # superseded are not sent anymore
+        if self.status == Resource.FAILED or pacing_round != self.pacing_round: return
+
+        for part in parts:
+            try:
+                if not part.sent:
+                    part.send()
+                    self.sent_parts += 1
+                else:
+                    part.resend()
+
+                self.last_activity = time.time()
+                self.last_part_sent = self.last_activity
+
+            except Exception as e:
+                RNS.log("Resource could not send parts, cancelling transfer!", RNS.LOG_DEBUG)
+                RNS.log("The contained exception was: "+str(e), RNS.LOG_DEBUG)
+                self.cancel()
+                return
+
+        for hmu_packet in hmu_packets:
+            try:
+                hmu_packet.send()
+                self.last_activity = time.time()
+            except Exception as e:
+                RNS.log("Could not send resource HMU packet, cancelling resource", RNS.LOG_DEBUG)
+                RNS.log("The contained exception was: "+str(e), RNS.LOG_DEBUG)
+                self.cancel()
+                return
+
+        if self.sent_parts == len(self.parts) and self.status == Resource.TRANSFERRING:
+            self.status = Resource.AWAITING_PROOF
+            self.retries_left = 3
+
     def cancel(self):
         """
         Cancels transferring the resource.
         """
         if self.status < Resource.COMPLETE:
             self.status = Resource.FAILED
+            self.__close_spool()
             if self.initiator:
                 if self.link.status == RNS.Link.ACTIVE:
                     try:
@@ -1266,6 +1497,7 @@ class ResourceAdvertisement:
             self.o = resource.original_hash     # First-segment hash
             self.m = resource.hashmap           # Resource hashmap
             self.c = resource.compressed        # Compression flag
+            self.z = resource.codec             # Compression codec
             self.e = resource.encrypted         # Encryption flag
             self.s = resource.split             # Split flag
             self.x = resource.has_metadata      # Metadata flag
@@ -1274,6 +1506,7 @@ class ResourceAdvertisement:
             self.q = resource.request_id        # ID of associated request
             self.u = False                      # Is request flag
             self.p = False                      # Is response flag
+            self.w = True                       # Wide window support flag
 
             if self.q != None:
                 if not resource.is_response:
@@ -1284,7 +1517,7 @@ class ResourceAdvertisement:
                     self.p = True
 
             # Flags
-            self.f = 0x00 | self.x << 5 | self.p << 4 | self.u << 3 | self.s << 2 | self.c << 1 | self.e
+            self.f = 0x00 | self.w << 8 | self.z << 6 | self.x << 5 | self.p << 4 | self.u << 3 | self.s << 2 | self.c << 1 | self.e
 
     def get_transfer_size(self):
         return self.t
@@ -1304,6 +1537,9 @@ class ResourceAdvertisement:
     def is_compressed(self):
         return self.c
 
+    def get_codec(self):
+        return self.z
+
     def has_metadata(self):
         return self.x
 
@@ -1357,5 +1593,7 @@ class ResourceAdvertisement:
         adv.u = True if ((adv.f >> 3) & 0x01) == 0x01 else False
         adv.p = True if ((adv.f >> 4) & 0x01) == 0x01 else False
         adv.x = True if ((adv.f >> 5) & 0x01) == 0x01 else False
+        adv.z = (adv.f >> 6) & 0x03
+        adv.w = True if ((adv.f >> 8) & 0x01) == 0x01 else False
 
         return adv
\ No newline at end of file
@@ -517,6 +517,64 @@ class Reticulum:
                         Reticulum.__use_implicit_proof = True
                     if v == False:
                         Reticulum.__use_implicit_proof = False
+                if option == "compact_packet_hashlist":
+                    v = self.config["reticulum"].as_bool(option)
+                    if v == True:
+                        RNS.Transport.hashlist_compact = True
+                if option == "packet_hashlist_fp_rate":
+                    v = self.config["reticulum"].as_float(option)
+                    if not (v > 0 and v < 1):
+                        raise ValueError("Invalid packet hashlist false-positive rate "+str(v)+", must be between 0 and 1")
+                    RNS.Transport.hashlist_fp_rate = v
+                if option == "announce_validation_workers":
+                    v = self.config["reticulum"].as_int(option)
+                    if v < 0:
+                        raise ValueError("Invalid announce validation worker count "+str(v))
+                    RNS.Transport.announce_validation_workers = v
+                if option == "announce_validation_batch_size":
+                    v = self.config["reticulum"].as_int(option)
+                    if v < 1:
+                        raise ValueError("Invalid announce validation batch size "+str(v))
+                    RNS.Transport.announce_validation_batch = v
+                if option == "announce_validation_queue_depth":
+                    v = self.config["reticulum"].as_int(option)
+                    if v < 1:
+                        raise ValueError("Invalid announce validation queue depth "+str(v))
+                    RNS.Transport.announce_validation_queue = v
+                if option == "inbound_workers":
+                    v = self.config["reticulum"].as_int(option)
+                    if v < 0:
+                        raise ValueError("Invalid inbound worker count "+str(v))
+                    RNS.Transport.inbound_workers = v
+                if option == "inbound_queue_depth":
+                    v = self.config["reticulum"].as_int(option)
+                    if v < 1:
+                        raise ValueError("Invalid inbound queue depth "+str(v))
+                    RNS.Transport.inbound_queue_depth = v
+                if option == "inbound_announce_queue_depth":
+                    v = self.config["reticulum"].as_int(option)
+                    if v < 1:
+                        raise ValueError("Invalid inbound announce queue depth "+str(v))
+                    RNS.Transport.inbound_announce_queue = v
+                if option == "async_runtime":
+                    v = self.config["reticulum"].as_bool(option)
+                    RNS.AsyncRuntime.enabled = v
+                if option == "compression_codec":
+                    v = self.config["reticulum"][option].lower()
+                    codecs = {name: codec for codec, name in RNS.Compression.NAMES.items()}
+                    if v == "auto": RNS.Compression.codec = None
+                    elif v in codecs: RNS.Compression.codec = codecs[v]
+                    else: raise ValueError("Invalid compression codec "+str(v)+", must be one of auto, "+", ".join(codecs))
+                if option == "compression_level":
+                    v = self.config["reticulum"].as_int(option)
+                    if v < 0 or v > 9:
+                        raise ValueError("Invalid compression level "+str(v)+", must be between 0 and 9")
+                    RNS.Compression.level = v
+                if option == "congestion_control":
+                    v = self.config["reticulum"][option].lower()
+                    if not v in RNS.CongestionControl.ALGORITHMS:
+                        raise ValueError("Invalid congestion control algorithm "+str(v)+", must be one of "+", ".join(RNS.CongestionControl.ALGORITHMS))
+                    RNS.CongestionControl.algorithm = v
 
         if RNS.compiled: RNS.log("Reticulum running in compiled mode", RNS.LOG_DEBUG)
         else: RNS.log("Reticulum running in interpreted mode", RNS.LOG_DEBUG)
@@ -1066,6 +1124,23 @@ class Reticulum:
                     ifstats["ifac_size"] = None
                     ifstats["ifac_netname"] = None
 
+                if getattr(interface, "ifac_engine", None) != None:
+                    ifstats["ifac_masked"] = interface.ifac_engine.masked_packets
+                    ifstats["ifac_unmasked"] = interface.ifac_engine.unmasked_packets
+                    ifstats["ifac_dropped"] = interface.ifac_engine.dropped_packets
+                    ifstats["ifac_mask_time"] = interface.ifac_engine.mask_time
+                    ifstats["ifac_unmask_time"] = interface.ifac_engine.unmask_time
+                else:
+                    ifstats["ifac_masked"] = None
+                    ifstats["ifac_unmasked"] = None
+                    ifstats["ifac_dropped"] = None
+                    ifstats["ifac_mask_time"] = None
+                    ifstats["ifac_unmask_time"] = None
+
+                if hasattr(interface, "transmit_queue"):
+                    ifstats["transmit_queued"] = interface.transmit_queued
+                    ifstats["transmit_dropped"] = interface.transmit_dropped
+
                 if hasattr(interface, "announce_queue"):
                     if interface.announce_queue != None:
                         ifstats["announce_queue"] = len(interface.announce_queue)
@@ -1092,6 +1167,13 @@ class Reticulum:
             stats["txb"] = RNS.Transport.traffic_txb
             stats["rxs"] = RNS.Transport.speed_rx
             stats["txs"] = RNS.Transport.speed_tx
+            stats["packet_hashlist"] = RNS.Transport.get_packet_hashlist_stats()
+            stats["announce_cache"] = RNS.Identity.get_announce_cache_stats()
+            stats["announce_validation"] = RNS.Transport.get_announce_validation_stats()
+            stats["inbound_pipeline"] = RNS.Transport.get_inbound_pipeline_stats()
+            stats["backbone_loop"] = BackboneInterface.BackboneInterface.get_loop_stats()
+            stats["async_runtime"] = RNS.AsyncRuntime.get_stats()
+            stats["scheduler"] = RNS.Scheduler.get_stats()
             if Reticulum.transport_enabled():
                 stats["transport_id"] = RNS.Transport.identity.hash
                 stats["transport_uptime"] = time.time()-RNS.Transport.start_time
@@ -1118,16 +1200,17 @@ class Reticulum:
 
         else:
             path_table = []
-            for dst_hash in RNS.Transport.path_table:
-                path_hops = RNS.Transport.path_table[dst_hash][2]
+            with RNS.Transport.path_table_lock: path_entries = RNS.Transport.path_table.copy()
+            for dst_hash, path_entry in path_entries.items():
+                path_hops = path_entry[2]
                 if max_hops == None or path_hops <= max_hops:
                     entry = {
                         "hash": dst_hash,
-                        "timestamp": RNS.Transport.path_table[dst_hash][0],
-                        "via": RNS.Transport.path_table[dst_hash][1],
+                        "timestamp": path_entry[0],
+                        "via": path_entry[1],
                         "hops": path_hops,
-                        "expires": RNS.Transport.path_table[dst_hash][3],
-                        "interface": str(RNS.Transport.path_table[dst_hash][5]),
+                        "expires": path_entry[3],
+                        "interface": str(path_entry[5]),
                     }
                     path_table.append(entry)
 
@@ -1173,8 +1256,9 @@ class Reticulum:
 
         else:
             dropped_count = 0
-            for destination_hash in RNS.Transport.path_table:
-                if RNS.Transport.path_table[destination_hash][1] == transport_hash:
+            with RNS.Transport.path_table_lock: path_entries = RNS.Transport.path_table.copy()
+            for destination_hash, path_entry in path_entries.items():
+                if path_entry[1] == transport_hash:
                     RNS.Transport.expire_path(destination_hash)
                     dropped_count += 1
 
@@ -0,0 +1,162 @@
+# Reticulum License
+#
+# Copyright (c) 2016-2025 Mark Qvist
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# - The Software shall not be used in any kind of system which includes amongst
+#   its functions the ability to purposefully do harm to human beings.
+#
+# - The Software shall not be used, directly or indirectly, in the creation of
+#   an artificial intelligence, machine learning or language model training
+#   dataset, including but not limited to any use that contributes to the
+#   training or development of such a model or algorithm.
+#
+# - The above copyright notice and this permission notice shall be included in
+#   all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import RNS
+import time
+import heapq
+import threading
+from collections import deque
+
+class Scheduler:
+    """
+    A single thread that runs timed callbacks in order of their due
+    time, from a heap of pending timers. It drives the watchdogs for
+    all links, so the number of threads does not grow with the number
+    of links.
+
+    Callbacks run on the scheduler thread, and must not block, since
+    that delays every other timer. How late timers run compared to
+    when they were due is tracked as the scheduler lag. Callbacks that
+    run application code, and may block, are instead handed to a
+    single shared worker thread with ``call_in_worker``.
+    """
+    # How long an idle scheduler waits before
+    # checking for new timers again.
+    IDLE_WAIT = 5
+
+    heap            = []
+    sequence        = 0
+    thread          = None
+    available       = threading.Condition()
+
+    timers_fired    = 0
+    callback_errors = 0
+    lag_total       = 0
+    lag_max         = 0
+
+    worker          = None
+    worker_queue    = deque()
+    worker_ready    = threading.Condition()
+    worker_calls    = 0
+
+    @staticmethod
+    def start():
+        with Scheduler.available:
+            if Scheduler.thread == None:
+                Scheduler.thread = threading.Thread(target=Scheduler.__run, name="RNS scheduler", daemon=True)
+                Scheduler.thread.start()
+
+    @staticmethod
+    def call_later(delay, callback, *args):
+        """
+        Runs a callback on the scheduler thread after ``delay`` seconds.
+        Timers due at the same time run in the order they were added.
+        Can be called from any thread.
+        """
+        if Scheduler.thread == None: Scheduler.start()
+        with Scheduler.available:
+            due = time.monotonic()+max(0, delay)
+            Scheduler.sequence += 1
+            heapq.heappush(Scheduler.heap, (due, Scheduler.sequence, callback, args))
+            if Scheduler.heap[0][1] == Scheduler.sequence: Scheduler.available.notify()
+
+    @staticmethod
+    def call_soon(callback, *args):
+        Scheduler.call_later(0, callback, *args)
+
+    @staticmethod
+    def call_in_worker(callback, *args):
+        """
+        Runs a callback on the shared worker thread, in the order
+        callbacks were handed to it. Can be called from any thread.
+        """
+        with Scheduler.worker_ready:
+            if Scheduler.worker == None:
+                Scheduler.worker = threading.Thread(target=Scheduler.__run_worker, name="RNS scheduler worker", daemon=True)
+                Scheduler.worker.start()
+
+            Scheduler.worker_queue.append((callback, args))
+            Scheduler.worker_ready.notify()
+
+    @staticmethod
+    def __run_worker():
+        while True:
+            with Scheduler.worker_ready:
+                while len(Scheduler.worker_queue) == 0: Scheduler.worker_ready.wait(Scheduler.IDLE_WAIT)
+                callback, args = Scheduler.worker_queue.popleft()
+
+            Scheduler.worker_calls += 1
+            try: callback(*args)
+            except Exception as e:
+                Scheduler.callback_errors += 1
+                RNS.log(f"An error occurred while running {callback} in the scheduler worker: {e}", RNS.LOG_ERROR)
+                RNS.trace_exception(e)
+
+    @staticmethod
+    def __run():
+        while True:
+            with Scheduler.available:
+                now = time.monotonic()
+                while len(Scheduler.heap) == 0 or Scheduler.heap[0][0] > now:
+                    if len(Scheduler.heap) == 0: Scheduler.available.wait(Scheduler.IDLE_WAIT)
+                    else:                        Scheduler.available.wait(Scheduler.heap[0][0]-now)
+                    now = time.monotonic()
+
+                due, sequence, callback, args = heapq.heappop(Scheduler.heap)
+
+            lag = now-due
+            Scheduler.timers_fired += 1
+            Scheduler.lag_total    += lag
+            if lag > Scheduler.lag_max: Scheduler.lag_max = lag
+
+            try: callback(*args)
+            except Exception as e:
+                Scheduler.callback_errors += 1
+                RNS.log(f"An error occurred while running scheduled {callback}: {e}", RNS.LOG_ERROR)
+                RNS.trace_exception(e)
+
+    @staticmethod
+    def get_stats():
+        if Scheduler.thread == None: return None
+        else:
+            with Scheduler.available:
+                timers = len(Scheduler.heap)
+                if timers > 0: lag = max(0, time.monotonic()-Scheduler.heap[0][0])
+                else:          lag = 0
+
+            fired = Scheduler.timers_fired
+            return {"timers": timers,
+                    "timers_fired": fired,
+                    "callback_errors": Scheduler.callback_errors,
+                    "worker_queued": len(Scheduler.worker_queue),
+                    "worker_calls": Scheduler.worker_calls,
+                    "lag": lag,
+                    "avg_lag": Scheduler.lag_total/fired if fired > 0 else 0,
+                    "max_lag": Scheduler.lag_max}
@@ -30,15 +30,123 @@
 
 import os
 import gc
+import sys
 import RNS
 import time
 import math
+import heapq
 import struct
 import inspect
+import itertools
 import threading
+from collections import OrderedDict
 from time import sleep
 from .vendor import umsgpack as umsgpack
 from RNS.Interfaces.BackboneInterface import BackboneInterface
+from RNS.CompactHashlist import CompactHashlist
+from RNS.AnnounceValidator import AnnounceValidator
+from RNS.InboundPipeline import InboundPipeline
+
+class AnnounceDestination:
+    """
+    A minimal stand-in for the destination of a received announce,
+    with only what is needed to pack and send the announce again.
+    Rebroadcasts don't need to recall the announced identity and
+    construct a full destination from it.
+    """
+    __slots__ = ("hash", "hexhash", "type")
+
+    def __init__(self, destination_hash):
+        self.hash    = destination_hash
+        self.hexhash = destination_hash.hex()
+        self.type    = RNS.Destination.SINGLE
+
+    def __str__(self):
+        return "<"+self.hexhash+">"
+
+class InboundPacket:
+    """
+    A compact record of a received packet, holding only the decoded
+    header and the raw packet. Transport routes received packets as
+    records, and only constructs a full :ref:`RNS.Packet<api-packet>`
+    once a packet is delivered locally, or is an announce or proof.
+    Packets that are only forwarded or filtered never need one.
+    """
+    __slots__  = ("raw", "flags", "hops", "header_type", "context_flag", "transport_type", "destination_type", "packet_type")
+    __slots__ += ("transport_id", "destination_hash", "context", "data_offset", "_packet_hash", "receiving_interface", "rssi", "snr", "q")
+
+    def __init__(self, raw):
+        self.raw                 = raw
+        self._packet_hash        = None
+        self.receiving_interface = None
+        self.rssi                = None
+        self.snr                 = None
+        self.q                   = None
+
+    def unpack(self):
+        try:
+            self.flags = self.raw[0]
+            self.hops  = self.raw[1]
+
+            self.header_type      = (self.flags & 0b01000000) >> 6
+            self.context_flag     = (self.flags & 0b00100000) >> 5
+            self.transport_type   = (self.flags & 0b00010000) >> 4
+            self.destination_type = (self.flags & 0b00001100) >> 2
+            self.packet_type      = (self.flags & 0b00000011)
+
+            DST_LEN = RNS.Reticulum.TRUNCATED_HASHLENGTH//8
+
+            if self.header_type == RNS.Packet.HEADER_2:
+                self.transport_id = self.raw[2:DST_LEN+2]
+                self.destination_hash = self.raw[DST_LEN+2:2*DST_LEN+2]
+                self.context = self.raw[2*DST_LEN+2]
+                self.data_offset = 2*DST_LEN+3
+            else:
+                self.transport_id = None
+                self.destination_hash = self.raw[2:DST_LEN+2]
+                self.context = self.raw[DST_LEN+2]
+                self.data_offset = DST_LEN+3
+
+            return True
+
+        except Exception as e:
+            RNS.log("Received malformed packet, dropping it. The contained exception was: "+str(e), RNS.LOG_EXTREME)
+            return False
+
+    @property
+    def data(self):
+        return self.raw[self.data_offset:]
+
+    @property
+    def packet_hash(self):
+        if self._packet_hash == None: self._packet_hash = self.get_hash()
+        return self._packet_hash
+
+    def get_hashable_offset(self):
+        if self.header_type == RNS.Packet.HEADER_2: return (RNS.Identity.TRUNCATED_HASHLENGTH//8)+2
+        else:                                       return 2
+
+    def get_hashable_part(self):
+        return bytes([self.raw[0] & 0b00001111]) + self.raw[self.get_hashable_offset():]
+
+    def get_hash(self):
+        return RNS.Cryptography.sha256_parts(bytes([self.raw[0] & 0b00001111]), memoryview(self.raw)[self.get_hashable_offset():])
+
+    def get_packet(self):
+        """
+        :returns: A full :ref:`RNS.Packet<api-packet>` for this received packet.
+        """
+        packet = RNS.Packet(None, self.raw)
+        packet.unpack()
+        packet.hops                = self.hops
+        packet.transport_id        = self.transport_id
+        packet.receiving_interface = self.receiving_interface
+        packet.rssi                = self.rssi
+        packet.snr                 = self.snr
+        packet.q                   = self.q
+        if self._packet_hash != None: packet.packet_hash = self._packet_hash
+
+        return packet
 
 class Transport:
     """
@@ -95,9 +203,14 @@ class Transport:
     destinations                = []           # All active destinations
     pending_links               = []           # Links that are being established
     active_links                = []           # Links that are active
+    destinations_map            = {}           # Active destinations indexed by hash
+    pending_links_map           = {}           # Pending links indexed by link ID
+    active_links_map            = {}           # Active links indexed by link ID
     packet_hashlist             = set()        # A list of packet hashes for duplicate detection
     packet_hashlist_prev        = set()
-    receipts                    = []           # Receipts of all outgoing packets for proof processing
+    receipts                    = OrderedDict() # Receipts of outgoing packets awaiting proof, indexed by truncated packet hash
+    receipt_timeouts            = []           # A heap of receipt timeout deadlines
+    receipt_sequence            = itertools.count()
 
     # Notes on memory usage: 1 megabyte of memory can store approximately
     # 55.100 path table entries or approximately 22.300 link table entries.
@@ -135,9 +248,20 @@ class Transport:
 
     pending_local_path_requests = {}
 
+    # The routing tables are each guarded by their own lock.
+    # Inbound and outbound processing only take a lock while
+    # mutating a table, and table maintenance in jobs() only
+    # holds one while taking a snapshot or removing culled
+    # entries, so forwarding and maintenance can overlap.
+    # Lookups are plain dictionary reads and take no lock.
+    path_table_lock             = threading.RLock()
+    link_table_lock             = threading.RLock()
+    reverse_table_lock          = threading.RLock()
+    announce_table_lock         = threading.RLock()
+    receipts_lock               = threading.RLock()
+    jobs_lock                   = threading.Lock()
+
     start_time                  = None
-    jobs_locked                 = False
-    jobs_running                = False
     job_interval                = 0.250
     links_last_checked          = 0.0
     links_check_interval        = 1.0
@@ -150,6 +274,14 @@ class Transport:
     cache_last_cleaned          = 0.0
     cache_clean_interval        = 300.0
     hashlist_maxsize            = 1000000
+    hashlist_compact            = False
+    hashlist_fp_rate            = CompactHashlist.DEFAULT_FP_RATE
+    announce_validation_workers = 0
+    announce_validation_batch   = AnnounceValidator.DEFAULT_BATCH_SIZE
+    announce_validation_queue   = AnnounceValidator.DEFAULT_QUEUE_DEPTH
+    inbound_workers             = 0
+    inbound_queue_depth         = InboundPipeline.DEFAULT_QUEUE_DEPTH
+    inbound_announce_queue      = InboundPipeline.DEFAULT_ANNOUNCE_QUEUE_DEPTH
     tables_last_culled          = 0.0
     tables_cull_interval        = 5.0
     interface_last_jobs         = 0.0
@@ -162,10 +294,11 @@ class Transport:
     traffic_captured            = None
 
     identity = None
+    announce_validator = None
+    inbound_pipeline = None
 
     @staticmethod
     def start(reticulum_instance):
-        Transport.jobs_running = True
         Transport.owner = reticulum_instance
 
         if Transport.identity == None:
@@ -182,12 +315,29 @@ class Transport:
 
         packet_hashlist_path = RNS.Reticulum.storagepath+"/packet_hashlist"
         if not Transport.owner.is_connected_to_shared_instance:
+            if Transport.hashlist_compact:
+                Transport.packet_hashlist = CompactHashlist(Transport.hashlist_maxsize//2, fp_rate=Transport.hashlist_fp_rate)
+                Transport.packet_hashlist_prev = set()
+                RNS.log("Using compact packet hashlist with a false-positive rate of "+str(Transport.hashlist_fp_rate)+", "+RNS.prettysize(Transport.packet_hashlist.memory_usage())+" allocated", RNS.LOG_VERBOSE)
+
             if os.path.isfile(packet_hashlist_path):
                 try:
                     file = open(packet_hashlist_path, "rb")
-                    hashlist_data = umsgpack.unpackb(file.read())
-                    Transport.packet_hashlist = set(hashlist_data)
+                    hashlist_data = file.read()
                     file.close()
+
+                    if CompactHashlist.is_compact_hashlist(hashlist_data):
+                        if not Transport.hashlist_compact:
+                            RNS.log("The stored packet hashlist is in compact format, but the compact hashlist is not enabled. Starting with an empty hashlist.", RNS.LOG_NOTICE)
+                        elif not Transport.packet_hashlist.load(hashlist_data):
+                            RNS.log("The stored packet hashlist was saved with different parameters. Starting with an empty hashlist.", RNS.LOG_NOTICE)
+                    else:
+                        hashlist_data = umsgpack.unpackb(hashlist_data)
+                        if Transport.hashlist_compact:
+                            for packet_hash in hashlist_data: Transport.packet_hashlist.add(packet_hash)
+                        else:
+                            Transport.packet_hashlist = set(hashlist_data)
+
                 except Exception as e:
                     RNS.log("Could not load packet hashlist from storage, the contained exception was: "+str(e), RNS.LOG_ERROR)
 
@@ -212,9 +362,18 @@ class Transport:
 
         # Defer cleaning packet cache for 30 seconds
         Transport.cache_last_cleaned = time.time() + 60
+
+        if Transport.announce_validation_workers > 0:
+            Transport.announce_validator = AnnounceValidator(Transport.inbound_packet, workers=Transport.announce_validation_workers,
+                                                             batch_size=Transport.announce_validation_batch, queue_depth=Transport.announce_validation_queue)
+            Transport.announce_validator.start()
+
+        if Transport.inbound_workers > 0:
+            Transport.inbound_pipeline = InboundPipeline(Transport.inbound, workers=Transport.inbound_workers,
+                                                         queue_depth=Transport.inbound_queue_depth, announce_queue_depth=Transport.inbound_announce_queue)
+            Transport.inbound_pipeline.start()
         
         # Start job loops
-        Transport.jobs_running = False
         threading.Thread(target=Transport.jobloop, daemon=True).start()
         threading.Thread(target=Transport.count_traffic_loop, daemon=True).start()
 
@@ -249,7 +408,7 @@ class Transport:
                                 # over an interface. It is cached with it's non-
                                 # increased hop-count.
                                 announce_packet.hops += 1
-                                Transport.path_table[destination_hash] = [timestamp, received_from, hops, expires, random_blobs, receiving_interface, announce_packet.packet_hash]
+                                with Transport.path_table_lock: Transport.path_table[destination_hash] = [timestamp, received_from, hops, expires, random_blobs, receiving_interface, announce_packet.packet_hash]
                                 RNS.log("Loaded path table entry for "+RNS.prettyhexrep(destination_hash)+" from storage", RNS.LOG_DEBUG)
                             else:
                                 RNS.log("Could not reconstruct path table entry from storage for "+RNS.prettyhexrep(destination_hash), RNS.LOG_DEBUG)
@@ -395,16 +554,19 @@ class Transport:
         outgoing = []
         path_requests = {}
         blocked_if = None
-        Transport.jobs_running = True
+
+        # Only a single run of the transport jobs is
+        # allowed to be in progress at any time.
+        jobs_acquired = Transport.jobs_lock.acquire(blocking=False)
 
         try:
-            if not Transport.jobs_locked:
+            if jobs_acquired:
                 should_collect = False
 
                 # Process active and pending link lists
                 if time.time() > Transport.links_last_checked+Transport.links_check_interval:
 
-                    for link in Transport.pending_links:
+                    for link in Transport.pending_links.copy():
                         if link.status == RNS.Link.CLOSED:
                             # If we are not a Transport Instance, finding a pending link
                             # that was never activated will trigger an expiry of the path
@@ -426,35 +588,51 @@ class Transport:
                                             blocked_if = None
                                             path_requests[link.destination.hash] = blocked_if
 
-                            Transport.pending_links.remove(link)
+                            Transport.remove_pending_link(link)
 
-                    for link in Transport.active_links:
+                    for link in Transport.active_links.copy():
                         if link.status == RNS.Link.CLOSED:
-                            Transport.active_links.remove(link)
+                            Transport.remove_active_link(link)
 
                     Transport.links_last_checked = time.time()
 
                 # Process receipts list for timed-out packets
                 if time.time() > Transport.receipts_last_checked+Transport.receipts_check_interval:
-                    while len(Transport.receipts) > Transport.MAX_RECEIPTS:
-                        culled_receipt = Transport.receipts.pop(0)
-                        culled_receipt.timeout = -1
-                        culled_receipt.check_timeout()
-                        should_collect = True
-
-                    for receipt in Transport.receipts:
-                        receipt.check_timeout()
-                        if receipt.status != RNS.PacketReceipt.SENT:
-                            if receipt in Transport.receipts:
-                                Transport.receipts.remove(receipt)
+                    with Transport.receipts_lock:
+                        while len(Transport.receipts) > Transport.MAX_RECEIPTS:
+                            culled_hash, culled_receipt = Transport.receipts.popitem(last=False)
+                            culled_receipt.timeout = -1
+                            culled_receipt.check_timeout()
+                            should_collect = True
+
+                        # Only receipts with a passed deadline are checked.
+                        # Entries for receipts that have since concluded are
+                        # discarded, and receipts that had their timeout
+                        # extended are scheduled again.
+                        now = time.time()
+                        while len(Transport.receipt_timeouts) > 0 and Transport.receipt_timeouts[0][0] <= now:
+                            deadline, sequence, receipt = heapq.heappop(Transport.receipt_timeouts)
+                            if Transport.receipts.get(receipt.truncated_hash) is receipt:
+                                receipt.check_timeout()
+                                if receipt.status != RNS.PacketReceipt.SENT:
+                                    Transport.receipts.pop(receipt.truncated_hash, None)
+                                else:
+                                    Transport.schedule_receipt_timeout(receipt)
+
+                        # Rebuild the deadline heap if it has accumulated
+                        # many entries for receipts that were concluded
+                        # before their deadlines passed.
+                        if len(Transport.receipt_timeouts) > 2*len(Transport.receipts)+Transport.MAX_RECEIPTS:
+                            Transport.receipt_timeouts = [e for e in Transport.receipt_timeouts if Transport.receipts.get(e[2].truncated_hash) is e[2]]
+                            heapq.heapify(Transport.receipt_timeouts)
 
                     Transport.receipts_last_checked = time.time()
 
                 # Process announces needing retransmission
                 if time.time() > Transport.announces_last_checked+Transport.announces_check_interval:
                     completed_announces = []
-                    for destination_hash in Transport.announce_table:
-                        announce_entry = Transport.announce_table[destination_hash]
+                    with Transport.announce_table_lock: announce_table = Transport.announce_table.copy()
+                    for destination_hash, announce_entry in announce_table.items():
                         if announce_entry[IDX_AT_RETRIES] > Transport.PATHFINDER_R:
                             RNS.log("Completed announce processing for "+RNS.prettyhexrep(destination_hash)+", retry limit reached", RNS.LOG_EXTREME)
                             completed_announces.append(destination_hash)
@@ -468,10 +646,7 @@ class Transport:
                                 announce_context = RNS.Packet.NONE
                                 if block_rebroadcasts: announce_context = RNS.Packet.PATH_RESPONSE
                                 announce_data = packet.data
-                                announce_identity = RNS.Identity.recall(packet.destination_hash)
-                                announce_destination = RNS.Destination(announce_identity, RNS.Destination.OUT, RNS.Destination.SINGLE, "unknown", "unknown");
-                                announce_destination.hash = packet.destination_hash
-                                announce_destination.hexhash = announce_destination.hash.hex()
+                                announce_destination = AnnounceDestination(packet.destination_hash)
                                 
                                 new_packet = RNS.Packet(
                                     announce_destination,
@@ -501,18 +676,20 @@ class Transport:
                                 # request has been served to the peer.
                                 if destination_hash in Transport.held_announces:
                                     held_entry = Transport.held_announces.pop(destination_hash)
-                                    Transport.announce_table[destination_hash] = held_entry
+                                    with Transport.announce_table_lock: Transport.announce_table[destination_hash] = held_entry
                                     RNS.log("Reinserting held announce into table", RNS.LOG_DEBUG)
 
-                    for destination_hash in completed_announces:
-                        if destination_hash in Transport.announce_table:
-                            Transport.announce_table.pop(destination_hash)
+                    with Transport.announce_table_lock:
+                        for destination_hash in completed_announces:
+                            if Transport.announce_table.get(destination_hash) is announce_table[destination_hash]:
+                                Transport.announce_table.pop(destination_hash)
 
                     Transport.announces_last_checked = time.time()
 
 
-                # Cull the packet hashlist if it has reached its max size
-                if len(Transport.packet_hashlist) > Transport.hashlist_maxsize//2:
+                # Cull the packet hashlist if it has reached its max size.
+                # The compact hashlist rotates its generations itself.
+                if not Transport.hashlist_compact and len(Transport.packet_hashlist) > Transport.hashlist_maxsize//2:
                     Transport.packet_hashlist_prev = Transport.packet_hashlist
                     Transport.packet_hashlist = set()
 
@@ -529,16 +706,24 @@ class Transport:
                     Transport.discovery_pr_tags = Transport.discovery_pr_tags[len(Transport.discovery_pr_tags)-Transport.max_pr_tags:len(Transport.discovery_pr_tags)-1]
 
                 if time.time() > Transport.tables_last_culled + Transport.tables_cull_interval:
+                    # Take snapshots of the routing tables, so they
+                    # can be scanned without holding the table locks.
+                    # Only the removal of culled entries is done while
+                    # holding the locks, and only for entries that were
+                    # not replaced since the snapshot was taken.
+                    with Transport.path_table_lock:    path_table    = Transport.path_table.copy()
+                    with Transport.reverse_table_lock: reverse_table = Transport.reverse_table.copy()
+                    with Transport.link_table_lock:    link_table    = Transport.link_table.copy()
+
                     # Remove unneeded path state entries
                     stale_path_states = []
-                    for destination_hash in Transport.path_states:
-                        if not destination_hash in Transport.path_table:
+                    for destination_hash in Transport.path_states.copy():
+                        if not destination_hash in path_table:
                             stale_path_states.append(destination_hash)
 
                     # Cull the reverse table according to timeout
                     stale_reverse_entries = []
-                    for truncated_packet_hash in Transport.reverse_table:
-                        reverse_entry = Transport.reverse_table[truncated_packet_hash]
+                    for truncated_packet_hash, reverse_entry in reverse_table.items():
                         if time.time() > reverse_entry[IDX_RT_TIMESTAMP] + Transport.REVERSE_TIMEOUT:
                             stale_reverse_entries.append(truncated_packet_hash)
                         elif not reverse_entry[IDX_RT_OUTB_IF] in Transport.interfaces:
@@ -548,9 +733,7 @@ class Transport:
 
                     # Cull the link table according to timeout
                     stale_links = []
-                    for link_id in Transport.link_table:
-                        link_entry = Transport.link_table[link_id]
-
+                    for link_id, link_entry in link_table.items():
                         if link_entry[IDX_LT_VALIDATED] == True:
                             if time.time() > link_entry[IDX_LT_TIMESTAMP] + Transport.LINK_TIMEOUT:
                                 stale_links.append(link_id)
@@ -632,8 +815,7 @@ class Transport:
 
                     # Cull the path table
                     stale_paths = []
-                    for destination_hash in Transport.path_table:
-                        destination_entry = Transport.path_table[destination_hash]
+                    for destination_hash, destination_entry in path_table.items():
                         attached_interface = destination_entry[IDX_PT_RVCD_IF]
 
                         if attached_interface != None and hasattr(attached_interface, "mode") and attached_interface.mode == RNS.Interfaces.Interface.Interface.MODE_ACCESS_POINT:
@@ -654,8 +836,7 @@ class Transport:
 
                     # Cull the pending discovery path requests table
                     stale_discovery_path_requests = []
-                    for destination_hash in Transport.discovery_path_requests:
-                        entry = Transport.discovery_path_requests[destination_hash]
+                    for destination_hash, entry in Transport.discovery_path_requests.copy().items():
 
                         if time.time() > entry["timeout"]:
                             stale_discovery_path_requests.append(destination_hash)
@@ -664,9 +845,7 @@ class Transport:
 
                     # Cull the tunnel table
                     stale_tunnels = []; ti = 0
-                    for tunnel_id in Transport.tunnels:
-                        tunnel_entry = Transport.tunnels[tunnel_id]
-
+                    for tunnel_id, tunnel_entry in Transport.tunnels.copy().items():
                         expires = tunnel_entry[IDX_TT_EXPIRES]
                         if time.time() > expires:
                             stale_tunnels.append(tunnel_id)
@@ -679,16 +858,14 @@ class Transport:
 
                             stale_tunnel_paths = []
                             tunnel_paths = tunnel_entry[IDX_TT_PATHS]
-                            for tunnel_path in tunnel_paths:
-                                tunnel_path_entry = tunnel_paths[tunnel_path]
-
+                            for tunnel_path, tunnel_path_entry in tunnel_paths.copy().items():
                                 if time.time() > tunnel_path_entry[0] + Transport.DESTINATION_TIMEOUT:
                                     stale_tunnel_paths.append(tunnel_path)
                                     should_collect = True
                                     RNS.log("Tunnel path to "+RNS.prettyhexrep(tunnel_path)+" timed out and was removed", RNS.LOG_EXTREME)
 
                             for tunnel_path in stale_tunnel_paths:
-                                tunnel_paths.pop(tunnel_path)
+                                tunnel_paths.pop(tunnel_path, None)
                                 ti += 1
 
 
@@ -697,27 +874,33 @@ class Transport:
                         else: RNS.log("Removed "+str(ti)+" tunnel paths", RNS.LOG_EXTREME)
 
                     i = 0
-                    for truncated_packet_hash in stale_reverse_entries:
-                        Transport.reverse_table.pop(truncated_packet_hash)
-                        i += 1
+                    with Transport.reverse_table_lock:
+                        for truncated_packet_hash in stale_reverse_entries:
+                            if Transport.reverse_table.get(truncated_packet_hash) is reverse_table[truncated_packet_hash]:
+                                Transport.reverse_table.pop(truncated_packet_hash)
+                                i += 1
 
                     if i > 0:
                         if i == 1: RNS.log("Released "+str(i)+" reverse table entry", RNS.LOG_EXTREME)
                         else: RNS.log("Released "+str(i)+" reverse table entries", RNS.LOG_EXTREME)
 
                     i = 0
-                    for link_id in stale_links:
-                        Transport.link_table.pop(link_id)
-                        i += 1
+                    with Transport.link_table_lock:
+                        for link_id in stale_links:
+                            if Transport.link_table.get(link_id) is link_table[link_id]:
+                                Transport.link_table.pop(link_id)
+                                i += 1
 
                     if i > 0:
                         if i == 1: RNS.log("Released "+str(i)+" link", RNS.LOG_EXTREME)
                         else: RNS.log("Released "+str(i)+" links", RNS.LOG_EXTREME)
 
                     i = 0
-                    for destination_hash in stale_paths:
-                        Transport.path_table.pop(destination_hash)
-                        i += 1
+                    with Transport.path_table_lock:
+                        for destination_hash in stale_paths:
+                            if Transport.path_table.get(destination_hash) is path_table[destination_hash]:
+                                Transport.path_table.pop(destination_hash)
+                                i += 1
 
                     if i > 0:
                         if i == 1: RNS.log("Removed "+str(i)+" path", RNS.LOG_EXTREME)
@@ -725,7 +908,7 @@ class Transport:
 
                     i = 0
                     for destination_hash in stale_discovery_path_requests:
-                        Transport.discovery_path_requests.pop(destination_hash)
+                        Transport.discovery_path_requests.pop(destination_hash, None)
                         i += 1
 
                     if i > 0:
@@ -734,7 +917,7 @@ class Transport:
 
                     i = 0
                     for tunnel_id in stale_tunnels:
-                        Transport.tunnels.pop(tunnel_id)
+                        Transport.tunnels.pop(tunnel_id, None)
                         i += 1
 
                     if i > 0:
@@ -743,7 +926,7 @@ class Transport:
 
                     i = 0
                     for destination_hash in stale_path_states:
-                        Transport.path_states.pop(destination_hash)
+                        Transport.path_states.pop(destination_hash, None)
                         i += 1
 
                     if i > 0:
@@ -766,14 +949,14 @@ class Transport:
                 if should_collect: gc.collect()
 
             else:
-                # Transport jobs were locked, do nothing
+                # Transport jobs are already running, do nothing
                 pass
 
         except Exception as e:
             RNS.log("An exception occurred while running Transport jobs.", RNS.LOG_ERROR)
             RNS.log("The contained exception was: "+str(e), RNS.LOG_ERROR)
 
-        Transport.jobs_running = False
+        if jobs_acquired: Transport.jobs_lock.release()
 
         for packet in outgoing:
             packet.send()
@@ -791,41 +974,31 @@ class Transport:
                         pass
                         # RNS.log("Blocking path request on "+str(interface), RNS.LOG_DEBUG)
 
+    @staticmethod
+    def ifac_mask(raw, mask, ifac_size):
+        """
+        XORs the two header bytes and the payload of a packet
+        with an IFAC mask, leaving the IFAC itself untouched.
+        The operation is its own inverse, so it is used both
+        for masking and unmasking.
+
+        :param raw: Packet bytes, with the IFAC following the header.
+        :param mask: Mask bytes, at least as long as *raw*.
+        :param ifac_size: Length of the IFAC in bytes.
+        :returns: The (un)masked packet bytes.
+        """
+        # XOR the entire packet in one operation, by
+        # treating packet and mask as large integers
+        length = len(raw)
+        masked = (int.from_bytes(raw, "big") ^ int.from_bytes(mask[:length], "big")).to_bytes(length, "big")
+        return masked[:2]+raw[2:2+ifac_size]+masked[2+ifac_size:]
+
     @staticmethod
     def transmit(interface, raw):
         try:
             if hasattr(interface, "ifac_identity") and interface.ifac_identity != None:
-                # Calculate packet access code
-                ifac = interface.ifac_identity.sign(raw)[-interface.ifac_size:]
-
-                # Generate mask
-                mask = RNS.Cryptography.hkdf(
-                    length=len(raw)+interface.ifac_size,
-                    derive_from=ifac,
-                    salt=interface.ifac_key,
-                    context=None,
-                )
-
-                # Set IFAC flag
-                new_header = bytes([raw[0] | 0x80, raw[1]])
-
-                # Assemble new payload with IFAC
-                new_raw    = new_header+ifac+raw[2:]
-                
-                # Mask payload
-                i = 0; masked_raw = b""
-                for byte in new_raw:
-                    if i == 0:
-                        # Mask first header byte, but make sure the
-                        # IFAC flag is still set
-                        masked_raw += bytes([byte ^ mask[i] | 0x80])
-                    elif i == 1 or i > interface.ifac_size+1:
-                        # Mask second header byte and payload
-                        masked_raw += bytes([byte ^ mask[i]])
-                    else:
-                        # Don't mask the IFAC itself
-                        masked_raw += bytes([byte])
-                    i += 1
+                # Add and mask the interface access code
+                masked_raw = interface.get_ifac_engine().mask(raw)
 
                 # Send it
                 interface.process_outgoing(masked_raw)
@@ -838,11 +1011,6 @@ class Transport:
 
     @staticmethod
     def outbound(packet):
-        while (Transport.jobs_running):
-            sleep(0.0005)
-
-        Transport.jobs_locked = True
-
         sent = False
         outbound_time = time.time()
 
@@ -865,31 +1033,32 @@ class Transport:
 
             if generate_receipt:
                 packet.receipt = RNS.PacketReceipt(packet)
-                Transport.receipts.append(packet.receipt)
+                Transport.register_receipt(packet.receipt)
             
             # TODO: Enable when caching has been redesigned
             # Transport.cache(packet)
 
         # Check if we have a known path for the destination in the path table
-        if packet.packet_type != RNS.Packet.ANNOUNCE and packet.destination.type != RNS.Destination.PLAIN and packet.destination.type != RNS.Destination.GROUP and packet.destination_hash in Transport.path_table:
-            outbound_interface = Transport.path_table[packet.destination_hash][IDX_PT_RVCD_IF]
+        path_entry = Transport.path_table.get(packet.destination_hash)
+        if packet.packet_type != RNS.Packet.ANNOUNCE and packet.destination.type != RNS.Destination.PLAIN and packet.destination.type != RNS.Destination.GROUP and path_entry != None:
+            outbound_interface = path_entry[IDX_PT_RVCD_IF]
 
             # If there's more than one hop to the destination, and we know
             # a path, we insert the packet into transport by adding the next
             # transport nodes address to the header, and modifying the flags.
             # This rule applies both for "normal" transport, and when connected
             # to a local shared Reticulum instance.
-            if Transport.path_table[packet.destination_hash][IDX_PT_HOPS] > 1:
+            if path_entry[IDX_PT_HOPS] > 1:
                 if packet.header_type == RNS.Packet.HEADER_1:
                     # Insert packet into transport
                     new_flags = (RNS.Packet.HEADER_2) << 6 | (Transport.TRANSPORT) << 4 | (packet.flags & 0b00001111)
                     new_raw = struct.pack("!B", new_flags)
                     new_raw += packet.raw[1:2]
-                    new_raw += Transport.path_table[packet.destination_hash][IDX_PT_NEXT_HOP]
+                    new_raw += path_entry[IDX_PT_NEXT_HOP]
                     new_raw += packet.raw[2:]
                     packet_sent(packet)
                     Transport.transmit(outbound_interface, new_raw)
-                    Transport.path_table[packet.destination_hash][IDX_PT_TIMESTAMP] = time.time()
+                    path_entry[IDX_PT_TIMESTAMP] = time.time()
                     sent = True
 
             # In the special case where we are connected to a local shared
@@ -899,17 +1068,17 @@ class Transport:
             # one hop away would just be broadcast directly, but since we
             # are "behind" a shared instance, we need to get that instance
             # to transport it onto the network.
-            elif Transport.path_table[packet.destination_hash][IDX_PT_HOPS] == 1 and Transport.owner.is_connected_to_shared_instance:
+            elif path_entry[IDX_PT_HOPS] == 1 and Transport.owner.is_connected_to_shared_instance:
                 if packet.header_type == RNS.Packet.HEADER_1:
                     # Insert packet into transport
                     new_flags = (RNS.Packet.HEADER_2) << 6 | (Transport.TRANSPORT) << 4 | (packet.flags & 0b00001111)
                     new_raw = struct.pack("!B", new_flags)
                     new_raw += packet.raw[1:2]
-                    new_raw += Transport.path_table[packet.destination_hash][IDX_PT_NEXT_HOP]
+                    new_raw += path_entry[IDX_PT_NEXT_HOP]
                     new_raw += packet.raw[2:]
                     packet_sent(packet)
                     Transport.transmit(outbound_interface, new_raw)
-                    Transport.path_table[packet.destination_hash][IDX_PT_TIMESTAMP] = time.time()
+                    path_entry[IDX_PT_TIMESTAMP] = time.time()
                     sent = True
 
             # If none of the above applies, we know the destination is
@@ -946,7 +1115,7 @@ class Transport:
                                 should_transmit = False
 
                             elif interface.mode == RNS.Interfaces.Interface.Interface.MODE_ROAMING:
-                                local_destination = next((d for d in Transport.destinations if d.hash == packet.destination_hash), None)
+                                local_destination = Transport.destinations_map.get(packet.destination_hash)
                                 if local_destination != None:
                                     # RNS.log("Allowing announce broadcast on roaming-mode interface from instance-local destination", RNS.LOG_EXTREME)
                                     pass
@@ -967,7 +1136,7 @@ class Transport:
                                             should_transmit = False
 
                             elif interface.mode == RNS.Interfaces.Interface.Interface.MODE_BOUNDARY:
-                                local_destination = next((d for d in Transport.destinations if d.hash == packet.destination_hash), None)
+                                local_destination = Transport.destinations_map.get(packet.destination_hash)
                                 if local_destination != None:
                                     # RNS.log("Allowing announce broadcast on boundary-mode interface from instance-local destination", RNS.LOG_EXTREME)
                                     pass
@@ -1073,15 +1242,49 @@ class Transport:
                             Transport.add_packet_hash(packet.packet_hash)
                             stored_hash = True
 
+                        # Register the packet as sent before transmitting
+                        # it, so a receipt exists if a proof arrives on
+                        # another thread before transmit returns.
+                        packet_sent(packet)
                         Transport.transmit(interface, packet.raw)
                         if packet.packet_type == RNS.Packet.ANNOUNCE:
                             interface.sent_announce()
-                        packet_sent(packet)
                         sent = True
 
-        Transport.jobs_locked = False
         return sent
 
+    @staticmethod
+    def get_packet_hashlist_stats():
+        if Transport.hashlist_compact:
+            return Transport.packet_hashlist.get_stats()
+        else:
+            # Estimate memory use from the set tables and
+            # the size of the stored hash objects
+            entries = len(Transport.packet_hashlist)+len(Transport.packet_hashlist_prev)
+            memory  = sys.getsizeof(Transport.packet_hashlist)+sys.getsizeof(Transport.packet_hashlist_prev)
+            memory += entries*sys.getsizeof(bytes(RNS.Identity.HASHLENGTH//8))
+            return {
+                "compact": False,
+                "entries": entries,
+                "capacity": Transport.hashlist_maxsize,
+                "memory": memory,
+                "fp_rate": 0,
+            }
+
+    @staticmethod
+    def get_announce_validation_stats():
+        if Transport.announce_validator != None:
+            return Transport.announce_validator.get_stats()
+        else:
+            return None
+
+    @staticmethod
+    def get_inbound_pipeline_stats():
+        if Transport.inbound_pipeline != None:
+            return Transport.inbound_pipeline.get_stats()
+        else:
+            return None
+
     @staticmethod
     def add_packet_hash(packet_hash):
         if not Transport.owner.is_connected_to_shared_instance:
@@ -1134,7 +1337,8 @@ class Transport:
                 RNS.log("Dropped invalid GROUP announce packet", RNS.LOG_DEBUG)
                 return False
 
-        if not packet.packet_hash in Transport.packet_hashlist and not packet.packet_hash in Transport.packet_hashlist_prev:
+        packet_hash = packet.packet_hash
+        if not packet_hash in Transport.packet_hashlist and not packet_hash in Transport.packet_hashlist_prev:
             return True
         else:
             if packet.packet_type == RNS.Packet.ANNOUNCE:
@@ -1149,6 +1353,13 @@ class Transport:
 
     @staticmethod
     def inbound(raw, interface=None):
+        # If the inbound pipeline is enabled, packets received
+        # on interface threads are only queued here, and the
+        # pipeline workers then call back into this method.
+        if Transport.inbound_pipeline != None and not Transport.inbound_pipeline.in_worker():
+            Transport.inbound_pipeline.submit(raw, interface)
+            return
+
         # If interface access codes are enabled,
         # we must authenticate each packet.
         if len(raw) > 2:
@@ -1156,42 +1367,9 @@ class Transport:
                 # Check that IFAC flag is set
                 if raw[0] & 0x80 == 0x80:
                     if len(raw) > 2+interface.ifac_size:
-                        # Extract IFAC
-                        ifac = raw[2:2+interface.ifac_size]
-
-                        # Generate mask
-                        mask = RNS.Cryptography.hkdf(
-                            length=len(raw),
-                            derive_from=ifac,
-                            salt=interface.ifac_key,
-                            context=None,
-                        )
-
-                        # Unmask payload
-                        i = 0; unmasked_raw = b""
-                        for byte in raw:
-                            if i <= 1 or i > interface.ifac_size+1:
-                                # Unmask header bytes and payload
-                                unmasked_raw += bytes([byte ^ mask[i]])
-                            else:
-                                # Don't unmask IFAC itself
-                                unmasked_raw += bytes([byte])
-                            i += 1
-                        raw = unmasked_raw
-
-                        # Unset IFAC flag
-                        new_header = bytes([raw[0] & 0x7f, raw[1]])
-
-                        # Re-assemble packet
-                        new_raw = new_header+raw[2+interface.ifac_size:]
-
-                        # Calculate expected IFAC
-                        expected_ifac = interface.ifac_identity.sign(new_raw)[-interface.ifac_size:]
-
-                        # Check it
-                        if ifac == expected_ifac:
-                            raw = new_raw
-                        else:
+                        # Unmask and authenticate packet
+                        raw = interface.get_ifac_engine().unmask(raw)
+                        if raw == None:
                             return
 
                     else:
@@ -1212,18 +1390,17 @@ class Transport:
         else:
             return
 
-        while (Transport.jobs_running):
-            sleep(0.0005)
-
         if Transport.identity == None:
             return
             
-        Transport.jobs_locked = True
-        
-        packet = RNS.Packet(None, raw)
+        packet = InboundPacket(raw)
         if not packet.unpack():
-            Transport.jobs_locked = False
             return
+
+        # Announces and proofs are always processed in
+        # full, so they are materialised right away
+        if packet.packet_type == RNS.Packet.ANNOUNCE or packet.packet_type == RNS.Packet.PROOF:
+            packet = packet.get_packet()
             
         packet.receiving_interface = interface
         packet.hops += 1
@@ -1257,6 +1434,17 @@ class Transport:
         elif Transport.interface_to_shared_instance(interface):
             packet.hops -= 1
 
+        # If announce validation is enabled, announces are handed
+        # off to the validation stage, which verifies signatures
+        # in batches, and then processes them in order.
+        if Transport.announce_validator != None and packet.packet_type == RNS.Packet.ANNOUNCE:
+            Transport.announce_validator.submit(packet)
+        else:
+            Transport.inbound_packet(packet)
+
+    @staticmethod
+    def inbound_packet(packet):
+        interface = packet.receiving_interface
         if Transport.packet_filter(packet):
             # By default, remember packet hashes to avoid routing
             # loops in the network, using the packet filter.
@@ -1285,11 +1473,14 @@ class Transport:
             
             # Check special conditions for local clients connected
             # through a shared Reticulum instance
+            path_entry                = Transport.path_table.get(packet.destination_hash)
+            link_entry                = Transport.link_table.get(packet.destination_hash)
+            reverse_entry             = Transport.reverse_table.get(packet.destination_hash)
             from_local_client         = (packet.receiving_interface in Transport.local_client_interfaces)
-            for_local_client          = (packet.packet_type != RNS.Packet.ANNOUNCE) and (packet.destination_hash in Transport.path_table and Transport.path_table[packet.destination_hash][IDX_PT_HOPS] == 0)
-            for_local_client_link     = (packet.packet_type != RNS.Packet.ANNOUNCE) and (packet.destination_hash in Transport.link_table and Transport.link_table[packet.destination_hash][IDX_LT_RCVD_IF] in Transport.local_client_interfaces)
-            for_local_client_link    |= (packet.packet_type != RNS.Packet.ANNOUNCE) and (packet.destination_hash in Transport.link_table and Transport.link_table[packet.destination_hash][IDX_LT_NH_IF] in Transport.local_client_interfaces)
-            proof_for_local_client    = (packet.destination_hash in Transport.reverse_table) and (Transport.reverse_table[packet.destination_hash][IDX_RT_RCVD_IF] in Transport.local_client_interfaces)
+            for_local_client          = (packet.packet_type != RNS.Packet.ANNOUNCE) and (path_entry != None and path_entry[IDX_PT_HOPS] == 0)
+            for_local_client_link     = (packet.packet_type != RNS.Packet.ANNOUNCE) and (link_entry != None and link_entry[IDX_LT_RCVD_IF] in Transport.local_client_interfaces)
+            for_local_client_link    |= (packet.packet_type != RNS.Packet.ANNOUNCE) and (link_entry != None and link_entry[IDX_LT_NH_IF] in Transport.local_client_interfaces)
+            proof_for_local_client    = (reverse_entry != None) and (reverse_entry[IDX_RT_RCVD_IF] in Transport.local_client_interfaces)
 
             # Plain broadcast packets from local clients are sent
             # directly on all attached interfaces, since they are
@@ -1328,7 +1519,6 @@ class Transport:
                 # normal processing.
                 if packet.context == RNS.Packet.CACHE_REQUEST:
                     if Transport.cache_request_packet(packet):
-                        Transport.jobs_locked = False
                         return
 
                 # If the packet is in transport, check whether we
@@ -1336,29 +1526,30 @@ class Transport:
                 # accordingly if we are.
                 if packet.transport_id != None and packet.packet_type != RNS.Packet.ANNOUNCE:
                     if packet.transport_id == Transport.identity.hash:
-                        if packet.destination_hash in Transport.path_table:
-                            next_hop = Transport.path_table[packet.destination_hash][IDX_PT_NEXT_HOP]
-                            remaining_hops = Transport.path_table[packet.destination_hash][IDX_PT_HOPS]
+                        if path_entry != None:
+                            next_hop = path_entry[IDX_PT_NEXT_HOP]
+                            remaining_hops = path_entry[IDX_PT_HOPS]
                             
+                            # The outgoing packet is copied once into a
+                            # new buffer, and only the header bytes that
+                            # change are rewritten in place.
                             if remaining_hops > 1:
                                 # Just increase hop count and transmit
-                                new_raw  = packet.raw[0:1]
-                                new_raw += struct.pack("!B", packet.hops)
-                                new_raw += next_hop
-                                new_raw += packet.raw[(RNS.Identity.TRUNCATED_HASHLENGTH//8)+2:]
+                                new_raw = bytearray(packet.raw)
+                                new_raw[1] = packet.hops
+                                new_raw[2:(RNS.Identity.TRUNCATED_HASHLENGTH//8)+2] = next_hop
                             elif remaining_hops == 1:
                                 # Strip transport headers and transmit
                                 new_flags = (RNS.Packet.HEADER_1) << 6 | (Transport.BROADCAST) << 4 | (packet.flags & 0b00001111)
-                                new_raw = struct.pack("!B", new_flags)
-                                new_raw += struct.pack("!B", packet.hops)
-                                new_raw += packet.raw[(RNS.Identity.TRUNCATED_HASHLENGTH//8)+2:]
+                                new_raw = bytearray(memoryview(packet.raw)[RNS.Identity.TRUNCATED_HASHLENGTH//8:])
+                                new_raw[0] = new_flags
+                                new_raw[1] = packet.hops
                             elif remaining_hops == 0:
                                 # Just increase hop count and transmit
-                                new_raw  = packet.raw[0:1]
-                                new_raw += struct.pack("!B", packet.hops)
-                                new_raw += packet.raw[2:]
+                                new_raw = bytearray(packet.raw)
+                                new_raw[1] = packet.hops
 
-                            outbound_interface = Transport.path_table[packet.destination_hash][IDX_PT_RVCD_IF]
+                            outbound_interface = path_entry[IDX_PT_RVCD_IF]
 
                             if packet.packet_type == RNS.Packet.LINKREQUEST:
                                 now = time.time()
@@ -1399,7 +1590,7 @@ class Transport:
                                                 False,                          # 7: Validated
                                                 proof_timeout]                  # 8: Proof timeout timestamp
 
-                                Transport.link_table[RNS.Link.link_id_from_lr_packet(packet)] = link_entry
+                                with Transport.link_table_lock: Transport.link_table[RNS.Link.link_id_from_lr_packet(packet)] = link_entry
 
                             else:
                                 # Entry format is
@@ -1407,10 +1598,10 @@ class Transport:
                                                     outbound_interface,         # 1: Outbound interface
                                                     time.time()]                # 2: Timestamp
 
-                                Transport.reverse_table[packet.getTruncatedHash()] = reverse_entry
+                                with Transport.reverse_table_lock: Transport.reverse_table[packet.packet_hash[:RNS.Identity.TRUNCATED_HASHLENGTH//8]] = reverse_entry
 
                             Transport.transmit(outbound_interface, new_raw)
-                            Transport.path_table[packet.destination_hash][IDX_PT_TIMESTAMP] = time.time()
+                            path_entry[IDX_PT_TIMESTAMP] = time.time()
 
                         else:
                             # TODO: There should probably be some kind of REJECT
@@ -1421,8 +1612,8 @@ class Transport:
                 # Link transport handling. Directs packets according
                 # to entries in the link tables
                 if packet.packet_type != RNS.Packet.ANNOUNCE and packet.packet_type != RNS.Packet.LINKREQUEST and packet.context != RNS.Packet.LRPROOF:
-                    if packet.destination_hash in Transport.link_table:
-                        link_entry = Transport.link_table[packet.destination_hash]
+                    link_entry = Transport.link_table.get(packet.destination_hash)
+                    if link_entry != None:
                         # If receiving and outbound interface is
                         # the same for this link, direction doesn't
                         # matter, and we simply repeat the packet.
@@ -1451,14 +1642,12 @@ class Transport:
                             # to process it.
                             Transport.add_packet_hash(packet.packet_hash)
 
-                            new_raw = packet.raw[0:1]
-                            new_raw += struct.pack("!B", packet.hops)
-                            new_raw += packet.raw[2:]
+                            new_raw = bytearray(packet.raw)
+                            new_raw[1] = packet.hops
                             Transport.transmit(outbound_interface, new_raw)
-                            Transport.link_table[packet.destination_hash][IDX_LT_TIMESTAMP] = time.time()
+                            link_entry[IDX_LT_TIMESTAMP] = time.time()
                         
                         # TODO: Test and possibly enable this at some point
-                        # Transport.jobs_locked = False
                         # return
 
 
@@ -1476,10 +1665,9 @@ class Transport:
                     # by normal announce rate limiting.
                     if interface.should_ingress_limit():
                         interface.hold_announce(packet)
-                        Transport.jobs_locked = False
                         return
 
-                local_destination = next((d for d in Transport.destinations if d.hash == packet.destination_hash), None)
+                local_destination = Transport.destinations_map.get(packet.destination_hash)
                 if local_destination == None and RNS.Identity.validate_announce(packet):
                     if packet.transport_id != None:
                         received_from = packet.transport_id
@@ -1487,23 +1675,20 @@ class Transport:
                         # Check if this is a next retransmission from
                         # another node. If it is, we're removing the
                         # announce in question from our pending table
-                        if RNS.Reticulum.transport_enabled() and packet.destination_hash in Transport.announce_table:
-                            announce_entry = Transport.announce_table[packet.destination_hash]
-                            
+                        announce_entry = Transport.announce_table.get(packet.destination_hash)
+                        if RNS.Reticulum.transport_enabled() and announce_entry != None:
                             if packet.hops-1 == announce_entry[IDX_AT_HOPS]:
                                 RNS.log("Heard a local rebroadcast of announce for "+RNS.prettyhexrep(packet.destination_hash), RNS.LOG_DEBUG)
                                 announce_entry[IDX_AT_LCL_RBRD] += 1
                                 if announce_entry[IDX_AT_LCL_RBRD] >= Transport.LOCAL_REBROADCASTS_MAX:
                                     RNS.log("Max local rebroadcasts of announce for "+RNS.prettyhexrep(packet.destination_hash)+" reached, dropping announce from our table", RNS.LOG_DEBUG)
-                                    if packet.destination_hash in Transport.announce_table:
-                                        Transport.announce_table.pop(packet.destination_hash)
+                                    with Transport.announce_table_lock: Transport.announce_table.pop(packet.destination_hash, None)
 
                             if packet.hops-1 == announce_entry[IDX_AT_HOPS]+1 and announce_entry[IDX_AT_RETRIES] > 0:
                                 now = time.time()
                                 if now < announce_entry[IDX_AT_RTRNS_TMO]:
                                     RNS.log("Rebroadcasted announce for "+RNS.prettyhexrep(packet.destination_hash)+" has been passed on to another node, no further tries needed", RNS.LOG_DEBUG)
-                                    if packet.destination_hash in Transport.announce_table:
-                                        Transport.announce_table.pop(packet.destination_hash)
+                                    with Transport.announce_table_lock: Transport.announce_table.pop(packet.destination_hash, None)
 
                     else:
                         received_from = packet.destination_hash
@@ -1514,18 +1699,19 @@ class Transport:
 
                     # First, check that the announce is not for a destination
                     # local to this system, and that hops are less than the max
-                    if (not any(packet.destination_hash == d.hash for d in Transport.destinations) and packet.hops < Transport.PATHFINDER_M+1):
+                    if (not packet.destination_hash in Transport.destinations_map and packet.hops < Transport.PATHFINDER_M+1):
                         announce_emitted = Transport.announce_emitted(packet)
                         
                         random_blob = packet.data[RNS.Identity.KEYSIZE//8+RNS.Identity.NAME_HASH_LENGTH//8:RNS.Identity.KEYSIZE//8+RNS.Identity.NAME_HASH_LENGTH//8+10]
                         random_blobs = []
-                        if packet.destination_hash in Transport.path_table:
-                            random_blobs = Transport.path_table[packet.destination_hash][IDX_PT_RANDBLOBS]
+                        path_entry = Transport.path_table.get(packet.destination_hash)
+                        if path_entry != None:
+                            random_blobs = path_entry[IDX_PT_RANDBLOBS]
 
                             # If we already have a path to the announced
                             # destination, but the hop count is equal or
                             # less, we'll update our tables.
-                            if packet.hops <= Transport.path_table[packet.destination_hash][IDX_PT_HOPS]:
+                            if packet.hops <= path_entry[IDX_PT_HOPS]:
                                 # Make sure we haven't heard the random
                                 # blob before, so announces can't be
                                 # replayed to forge paths.
@@ -1543,7 +1729,7 @@ class Transport:
                                 # ignore it, unless the path is expired, or
                                 # the emission timestamp is more recent.
                                 now = time.time()
-                                path_expires = Transport.path_table[packet.destination_hash][IDX_PT_EXPIRES]
+                                path_expires = path_entry[IDX_PT_EXPIRES]
                                 
                                 path_announce_emitted = 0
                                 for path_random_blob in random_blobs:
@@ -1659,7 +1845,7 @@ class Transport:
                                         retransmit_timeout = now
                                         retries = Transport.PATHFINDER_R
 
-                                    Transport.announce_table[packet.destination_hash] = [
+                                    with Transport.announce_table_lock: Transport.announce_table[packet.destination_hash] = [
                                         now,                # 0: IDX_AT_TIMESTAMP
                                         retransmit_timeout, # 1: IDX_AT_RTRNS_TMO
                                         retries,            # 2: IDX_AT_RETRIES
@@ -1681,7 +1867,7 @@ class Transport:
                                     retransmit_timeout = now
                                     retries = Transport.PATHFINDER_R
 
-                                    Transport.announce_table[packet.destination_hash] = [
+                                    with Transport.announce_table_lock: Transport.announce_table[packet.destination_hash] = [
                                         now,
                                         retransmit_timeout,
                                         retries,
@@ -1696,10 +1882,7 @@ class Transport:
                             # If we have any local clients connected, we re-
                             # transmit the announce to them immediately
                             if (len(Transport.local_client_interfaces)):
-                                announce_identity = RNS.Identity.recall(packet.destination_hash)
-                                announce_destination = RNS.Destination(announce_identity, RNS.Destination.OUT, RNS.Destination.SINGLE, "unknown", "unknown");
-                                announce_destination.hash = packet.destination_hash
-                                announce_destination.hexhash = announce_destination.hash.hex()
+                                announce_destination = AnnounceDestination(packet.destination_hash)
                                 announce_context = RNS.Packet.NONE
                                 announce_data = packet.data
 
@@ -1750,10 +1933,7 @@ class Transport:
                                 interface_str = " on "+str(attached_interface)
 
                                 RNS.log("Got matching announce, answering waiting discovery path request for "+RNS.prettyhexrep(packet.destination_hash)+interface_str, RNS.LOG_DEBUG)
-                                announce_identity = RNS.Identity.recall(packet.destination_hash)
-                                announce_destination = RNS.Destination(announce_identity, RNS.Destination.OUT, RNS.Destination.SINGLE, "unknown", "unknown");
-                                announce_destination.hash = packet.destination_hash
-                                announce_destination.hexhash = announce_destination.hash.hex()
+                                announce_destination = AnnounceDestination(packet.destination_hash)
                                 announce_context = RNS.Packet.NONE
                                 announce_data = packet.data
 
@@ -1774,7 +1954,7 @@ class Transport:
 
                             if not Transport.owner.is_connected_to_shared_instance: Transport.cache(packet, force_cache=True, packet_type="announce")
                             path_table_entry = [now, received_from, announce_hops, expires, random_blobs, packet.receiving_interface, packet.packet_hash]
-                            Transport.path_table[packet.destination_hash] = path_table_entry
+                            with Transport.path_table_lock: Transport.path_table[packet.destination_hash] = path_table_entry
                             RNS.log("Destination "+RNS.prettyhexrep(packet.destination_hash)+" is now "+str(announce_hops)+" hops away via "+RNS.prettyhexrep(received_from)+" on "+str(packet.receiving_interface), RNS.LOG_DEBUG)
 
                             # If the receiving interface is a tunnel, we add the
@@ -1835,84 +2015,86 @@ class Transport:
             # Handling for link requests to local destinations
             elif packet.packet_type == RNS.Packet.LINKREQUEST:
                 if packet.transport_id == None or packet.transport_id == Transport.identity.hash:
-                    for destination in Transport.destinations:
-                        if destination.hash == packet.destination_hash and destination.type == packet.destination_type:
-                            path_mtu       = RNS.Link.mtu_from_lr_packet(packet)
-                            mode           = RNS.Link.mode_from_lr_packet(packet)
-                            if packet.receiving_interface.AUTOCONFIGURE_MTU or packet.receiving_interface.FIXED_MTU:
-                                nh_mtu     = packet.receiving_interface.HW_MTU
-                            else:
-                                nh_mtu     = RNS.Reticulum.MTU
+                    destination = Transport.destinations_map.get(packet.destination_hash)
+                    if destination != None and destination.type == packet.destination_type:
+                        if isinstance(packet, InboundPacket): packet = packet.get_packet()
+                        path_mtu       = RNS.Link.mtu_from_lr_packet(packet)
+                        mode           = RNS.Link.mode_from_lr_packet(packet)
+                        if packet.receiving_interface.AUTOCONFIGURE_MTU or packet.receiving_interface.FIXED_MTU:
+                            nh_mtu     = packet.receiving_interface.HW_MTU
+                        else:
+                            nh_mtu     = RNS.Reticulum.MTU
 
-                            if path_mtu:
-                                if packet.receiving_interface.HW_MTU == None:
-                                    RNS.log(f"No next-hop HW MTU, disabling link MTU upgrade", RNS.LOG_DEBUG) # TODO: Remove debug
-                                    path_mtu = None
-                                    packet.data  = packet.data[:-RNS.Link.LINK_MTU_SIZE]
-                                else:
-                                    if nh_mtu < path_mtu:
-                                        try:
-                                            path_mtu = nh_mtu
-                                            clamped_mtu = RNS.Link.signalling_bytes(path_mtu, mode)
-                                            RNS.log(f"Clamping link MTU to {RNS.prettysize(nh_mtu)}", RNS.LOG_DEBUG) # TODO: Remove debug
-                                            packet.data  = packet.data[:-RNS.Link.LINK_MTU_SIZE]+clamped_mtu
-                                        except Exception as e:
-                                            RNS.log(f"Dropping link request packet to local destination. The contained exception was: {e}", RNS.LOG_WARNING)
-                                            return
-
-                            packet.destination = destination
-                            destination.receive(packet)
+                        if path_mtu:
+                            if packet.receiving_interface.HW_MTU == None:
+                                RNS.log(f"No next-hop HW MTU, disabling link MTU upgrade", RNS.LOG_DEBUG) # TODO: Remove debug
+                                path_mtu = None
+                                packet.data  = packet.data[:-RNS.Link.LINK_MTU_SIZE]
+                            else:
+                                if nh_mtu < path_mtu:
+                                    try:
+                                        path_mtu = nh_mtu
+                                        clamped_mtu = RNS.Link.signalling_bytes(path_mtu, mode)
+                                        RNS.log(f"Clamping link MTU to {RNS.prettysize(nh_mtu)}", RNS.LOG_DEBUG) # TODO: Remove debug
+                                        packet.data  = packet.data[:-RNS.Link.LINK_MTU_SIZE]+clamped_mtu
+                                    except Exception as e:
+                                        RNS.log(f"Dropping link request packet to local destination. The contained exception was: {e}", RNS.LOG_WARNING)
+                                        return
+
+                        packet.destination = destination
+                        destination.receive(packet)
             
             # Handling for local data packets
             elif packet.packet_type == RNS.Packet.DATA:
                 if packet.destination_type == RNS.Destination.LINK:
-                    for link in Transport.active_links:
-                        if link.link_id == packet.destination_hash:
-                            if link.attached_interface == packet.receiving_interface:
-                                packet.link = link
-                                if packet.context == RNS.Packet.CACHE_REQUEST:
-                                    cached_packet = Transport.get_cached_packet(packet.data)
-                                    if cached_packet != None:
-                                        cached_packet.unpack()
-                                        RNS.Packet(destination=link, data=cached_packet.data,
-                                                   packet_type=cached_packet.packet_type, context=cached_packet.context).send()
-
-                                    Transport.jobs_locked = False
-                                else:
-                                    link.receive(packet)
+                    link = Transport.active_links_map.get(packet.destination_hash)
+                    if link != None:
+                        if link.attached_interface == packet.receiving_interface:
+                            if isinstance(packet, InboundPacket): packet = packet.get_packet()
+                            packet.link = link
+                            if packet.context == RNS.Packet.CACHE_REQUEST:
+                                cached_packet = Transport.get_cached_packet(packet.data)
+                                if cached_packet != None:
+                                    cached_packet.unpack()
+                                    RNS.Packet(destination=link, data=cached_packet.data,
+                                               packet_type=cached_packet.packet_type, context=cached_packet.context).send()
+
                             else:
-                                # In the strange and rare case that an interface
-                                # is partly malfunctioning, and a link-associated
-                                # packet is being received on an interface that
-                                # has failed sending, and transport has failed over
-                                # to another path, we remove this packet hash from
-                                # the filter hashlist so the link can receive the
-                                # packet when it finally arrives over another path.
-                                while packet.packet_hash in Transport.packet_hashlist:
-                                    Transport.packet_hashlist.remove(packet.packet_hash)
+                                link.receive(packet)
+                        else:
+                            # In the strange and rare case that an interface
+                            # is partly malfunctioning, and a link-associated
+                            # packet is being received on an interface that
+                            # has failed sending, and transport has failed over
+                            # to another path, we remove this packet hash from
+                            # the filter hashlist so the link can receive the
+                            # packet when it finally arrives over another path.
+                            while packet.packet_hash in Transport.packet_hashlist:
+                                Transport.packet_hashlist.remove(packet.packet_hash)
                 else:
-                    for destination in Transport.destinations:
-                        if destination.hash == packet.destination_hash and destination.type == packet.destination_type:
-                            packet.destination = destination
-                            if destination.receive(packet):
-                                if destination.proof_strategy == RNS.Destination.PROVE_ALL:
-                                    packet.prove()
-
-                                elif destination.proof_strategy == RNS.Destination.PROVE_APP:
-                                    if destination.callbacks.proof_requested:
-                                        try:
-                                            if destination.callbacks.proof_requested(packet):
-                                                packet.prove()
-                                        except Exception as e:
-                                            RNS.log("Error while executing proof request callback. The contained exception was: "+str(e), RNS.LOG_ERROR)
+                    destination = Transport.destinations_map.get(packet.destination_hash)
+                    if destination != None and destination.type == packet.destination_type:
+                        if isinstance(packet, InboundPacket): packet = packet.get_packet()
+                        packet.destination = destination
+                        if destination.receive(packet):
+                            if destination.proof_strategy == RNS.Destination.PROVE_ALL:
+                                packet.prove()
+
+                            elif destination.proof_strategy == RNS.Destination.PROVE_APP:
+                                if destination.callbacks.proof_requested:
+                                    try:
+                                        if destination.callbacks.proof_requested(packet):
+                                            packet.prove()
+                                    except Exception as e:
+                                        RNS.log("Error while executing proof request callback. The contained exception was: "+str(e), RNS.LOG_ERROR)
 
             # Handling for proofs and link-request proofs
             elif packet.packet_type == RNS.Packet.PROOF:
                 if packet.context == RNS.Packet.LRPROOF:
                     # This is a link request proof, check if it
                     # needs to be transported
-                    if (RNS.Reticulum.transport_enabled() or for_local_client_link or from_local_client) and packet.destination_hash in Transport.link_table:
-                        link_entry = Transport.link_table[packet.destination_hash]
+                    link_entry = Transport.link_table.get(packet.destination_hash)
+                    if (RNS.Reticulum.transport_enabled() or for_local_client_link or from_local_client) and link_entry != None:
                         if packet.hops == link_entry[IDX_LT_REM_HOPS]:
                             if packet.receiving_interface == link_entry[IDX_LT_NH_IF]:
                                 try:
@@ -1930,10 +2112,9 @@ class Transport:
 
                                         if peer_identity.validate(signature, signed_data):
                                             RNS.log("Link request proof validated for transport via "+str(link_entry[IDX_LT_RCVD_IF]), RNS.LOG_EXTREME)
-                                            new_raw = packet.raw[0:1]
-                                            new_raw += struct.pack("!B", packet.hops)
-                                            new_raw += packet.raw[2:]
-                                            Transport.link_table[packet.destination_hash][IDX_LT_VALIDATED] = True
+                                            new_raw = bytearray(packet.raw)
+                                            new_raw[1] = packet.hops
+                                            link_entry[IDX_LT_VALIDATED] = True
                                             Transport.transmit(link_entry[IDX_LT_RCVD_IF], new_raw)
 
                                         else:
@@ -1949,36 +2130,36 @@ class Transport:
                     else:
                         # Check if we can deliver it to a local
                         # pending link
-                        for link in Transport.pending_links:
-                            if link.link_id == packet.destination_hash:
-                                # We need to also allow an expected hops value of
-                                # PATHFINDER_M, since in some cases, the number of hops
-                                # to the destination will be unknown at link creation
-                                # time. The real chance of this occuring is likely to be
-                                # extremely small, and this allowance could probably
-                                # be discarded without major issues, but it is kept
-                                # for now to ensure backwards compatibility.
-
-                                # TODO: Probably reset check back to
-                                # if packet.hops == link.expected_hops:
-                                # within one of the next releases
-
-                                if packet.hops == link.expected_hops or link.expected_hops == RNS.Transport.PATHFINDER_M:
-                                    # Add this packet to the filter hashlist if we
-                                    # have determined that it's actually destined
-                                    # for this system, and then validate the proof
-                                    Transport.add_packet_hash(packet.packet_hash)
-                                    link.validate_proof(packet)
+                        link = Transport.pending_links_map.get(packet.destination_hash)
+                        if link != None:
+                            # We need to also allow an expected hops value of
+                            # PATHFINDER_M, since in some cases, the number of hops
+                            # to the destination will be unknown at link creation
+                            # time. The real chance of this occuring is likely to be
+                            # extremely small, and this allowance could probably
+                            # be discarded without major issues, but it is kept
+                            # for now to ensure backwards compatibility.
+
+                            # TODO: Probably reset check back to
+                            # if packet.hops == link.expected_hops:
+                            # within one of the next releases
+
+                            if packet.hops == link.expected_hops or link.expected_hops == RNS.Transport.PATHFINDER_M:
+                                # Add this packet to the filter hashlist if we
+                                # have determined that it's actually destined
+                                # for this system, and then validate the proof
+                                Transport.add_packet_hash(packet.packet_hash)
+                                link.validate_proof(packet)
 
                 elif packet.context == RNS.Packet.RESOURCE_PRF:
-                    for link in Transport.active_links:
-                        if link.link_id == packet.destination_hash:
-                            link.receive(packet)
+                    link = Transport.active_links_map.get(packet.destination_hash)
+                    if link != None:
+                        link.receive(packet)
                 else:
                     if packet.destination_type == RNS.Destination.LINK:
-                        for link in Transport.active_links:
-                            if link.link_id == packet.destination_hash:
-                                packet.link = link
+                        link = Transport.active_links_map.get(packet.destination_hash)
+                        if link != None:
+                            packet.link = link
                                 
                     if len(packet.data) == RNS.PacketReceipt.EXPL_LENGTH:
                         proof_hash = packet.data[:RNS.Identity.HASHLENGTH//8]
@@ -1986,33 +2167,33 @@ class Transport:
                         proof_hash = None
 
                     # Check if this proof needs to be transported
-                    if (RNS.Reticulum.transport_enabled() or from_local_client or proof_for_local_client) and packet.destination_hash in Transport.reverse_table:
-                        reverse_entry = Transport.reverse_table.pop(packet.destination_hash)
+                    reverse_entry = None
+                    if RNS.Reticulum.transport_enabled() or from_local_client or proof_for_local_client:
+                        with Transport.reverse_table_lock: reverse_entry = Transport.reverse_table.pop(packet.destination_hash, None)
+
+                    if reverse_entry != None:
                         if packet.receiving_interface == reverse_entry[IDX_RT_OUTB_IF]:
                             RNS.log("Proof received on correct interface, transporting it via "+str(reverse_entry[IDX_RT_RCVD_IF]), RNS.LOG_EXTREME)
-                            new_raw = packet.raw[0:1]
-                            new_raw += struct.pack("!B", packet.hops)
-                            new_raw += packet.raw[2:]
+                            new_raw = bytearray(packet.raw)
+                            new_raw[1] = packet.hops
                             Transport.transmit(reverse_entry[IDX_RT_RCVD_IF], new_raw)
                         else:
                             RNS.log("Proof received on wrong interface, not transporting it.", RNS.LOG_DEBUG)
 
-                    for receipt in Transport.receipts:
-                        receipt_validated = False
-                        if proof_hash != None:
-                            # Only test validation if hash matches
-                            if receipt.hash == proof_hash:
-                                receipt_validated = receipt.validate_proof_packet(packet)
-                        else:
-                            # In case of an implicit proof, we have
-                            # to check every single outstanding receipt
-                            receipt_validated = receipt.validate_proof_packet(packet)
-
-                        if receipt_validated:
-                            if receipt in Transport.receipts:
-                                Transport.receipts.remove(receipt)
+                    # Explicit proofs carry the hash of the proved packet.
+                    # Implicit proofs are addressed to the truncated hash
+                    # of the proved packet, so in both cases, at most one
+                    # outstanding receipt needs to be checked.
+                    if proof_hash != None:
+                        receipt = Transport.receipts.get(proof_hash[:RNS.Reticulum.TRUNCATED_HASHLENGTH//8])
+                    else:
+                        receipt = Transport.receipts.get(packet.destination_hash)
 
-        Transport.jobs_locked = False
+                    if receipt != None and (proof_hash == None or receipt.hash == proof_hash):
+                        if receipt.validate_proof_packet(packet):
+                            with Transport.receipts_lock:
+                                if Transport.receipts.get(receipt.truncated_hash) is receipt:
+                                    Transport.receipts.pop(receipt.truncated_hash, None)
 
     @staticmethod
     def synthesize_tunnel(interface):
@@ -2105,7 +2286,7 @@ class Transport:
                     else: RNS.log("Did not restore path to "+RNS.prettyhexrep(destination_hash)+" because it has expired", RNS.LOG_DEBUG)
 
                 if should_add:
-                    Transport.path_table[destination_hash] = new_entry
+                    with Transport.path_table_lock: Transport.path_table[destination_hash] = new_entry
                     RNS.log("Restored path to "+RNS.prettyhexrep(destination_hash)+" is now "+str(announce_hops)+" hops away via "+RNS.prettyhexrep(received_from)+" on "+str(receiving_interface), RNS.LOG_DEBUG)
                 else:
                     deprecated_paths.append(destination_hash)
@@ -2118,11 +2299,11 @@ class Transport:
     def register_destination(destination):
         destination.MTU = RNS.Reticulum.MTU
         if destination.direction == RNS.Destination.IN:
-            for registered_destination in Transport.destinations:
-                if destination.hash == registered_destination.hash:
-                    raise KeyError("Attempt to register an already registered destination.")
+            if destination.hash in Transport.destinations_map:
+                raise KeyError("Attempt to register an already registered destination.")
             
             Transport.destinations.append(destination)
+            Transport.destinations_map[destination.hash] = destination
 
             if Transport.owner.is_connected_to_shared_instance:
                 if destination.type == RNS.Destination.SINGLE:
@@ -2132,27 +2313,66 @@ class Transport:
     def deregister_destination(destination):
         if destination in Transport.destinations:
             Transport.destinations.remove(destination)
+        if Transport.destinations_map.get(destination.hash) is destination:
+            Transport.destinations_map.pop(destination.hash, None)
+
+    @staticmethod
+    def register_receipt(receipt):
+        with Transport.receipts_lock:
+            # Only one receipt is tracked per packet hash. If an
+            # identical packet is sent again before it is proven,
+            # the previous receipt is superseded and culled.
+            superseded_receipt = Transport.receipts.pop(receipt.truncated_hash, None)
+            if superseded_receipt != None and superseded_receipt is not receipt:
+                superseded_receipt.timeout = -1
+                superseded_receipt.check_timeout()
+
+            Transport.receipts[receipt.truncated_hash] = receipt
+            Transport.schedule_receipt_timeout(receipt)
+
+    @staticmethod
+    def schedule_receipt_timeout(receipt):
+        with Transport.receipts_lock:
+            if Transport.receipts.get(receipt.truncated_hash) is receipt:
+                heapq.heappush(Transport.receipt_timeouts, (receipt.sent_at+receipt.timeout, next(Transport.receipt_sequence), receipt))
 
     @staticmethod
     def register_link(link):
         RNS.log("Registering link "+str(link), RNS.LOG_EXTREME)
         if link.initiator:
             Transport.pending_links.append(link)
+            Transport.pending_links_map[link.link_id] = link
         else:
             Transport.active_links.append(link)
+            Transport.active_links_map[link.link_id] = link
 
     @staticmethod
     def activate_link(link):
         RNS.log("Activating link "+str(link), RNS.LOG_EXTREME)
-        if link in Transport.pending_links:
+        if Transport.pending_links_map.get(link.link_id) is link:
             if link.status != RNS.Link.ACTIVE:
                 raise IOError("Invalid link state for link activation: "+str(link.status))
-            Transport.pending_links.remove(link)
+            Transport.remove_pending_link(link)
             Transport.active_links.append(link)
+            Transport.active_links_map[link.link_id] = link
             link.status = RNS.Link.ACTIVE
         else:
             RNS.log("Attempted to activate a link that was not in the pending table", RNS.LOG_ERROR)
 
+    @staticmethod
+    def remove_pending_link(link):
+        if link in Transport.pending_links:
+            Transport.pending_links.remove(link)
+        if Transport.pending_links_map.get(link.link_id) is link:
+            Transport.pending_links_map.pop(link.link_id, None)
+
+    @staticmethod
+    def remove_active_link(link):
+        if link in Transport.active_links:
+            Transport.active_links.remove(link)
+        if Transport.active_links_map.get(link.link_id) is link:
+            Transport.active_links_map.pop(link.link_id, None)
+
     @staticmethod
     def register_announce_handler(handler):
         """
@@ -2205,7 +2425,7 @@ class Transport:
     def clean_announce_cache():
         st = time.time()
         target_path = os.path.join(RNS.Reticulum.cachepath, "announces")
-        active_paths = [Transport.path_table[dst_hash][6] for dst_hash in Transport.path_table]
+        with Transport.path_table_lock: active_paths = [path_entry[IDX_PT_PACKET] for path_entry in Transport.path_table.values()]
         tunnel_paths = list(set([path_dict[dst_hash][6] for path_dict in [Transport.tunnels[tunnel_id][2] for tunnel_id in Transport.tunnels] for dst_hash in path_dict]))
         removed = 0
         for packet_hash in os.listdir(target_path):
@@ -2314,7 +2534,8 @@ class Transport:
         :param destination_hash: A destination hash as *bytes*.
         :returns: The number of hops to the specified destination, or ``RNS.Transport.PATHFINDER_M`` if the number of hops is unknown.
         """
-        if destination_hash in Transport.path_table: return Transport.path_table[destination_hash][IDX_PT_HOPS]
+        path_entry = Transport.path_table.get(destination_hash)
+        if path_entry != None: return path_entry[IDX_PT_HOPS]
         else: return Transport.PATHFINDER_M
 
     @staticmethod
@@ -2323,7 +2544,8 @@ class Transport:
         :param destination_hash: A destination hash as *bytes*.
         :returns: The destination hash as *bytes* for the next hop to the specified destination, or *None* if the next hop is unknown.
         """
-        if destination_hash in Transport.path_table: return Transport.path_table[destination_hash][IDX_PT_NEXT_HOP]
+        path_entry = Transport.path_table.get(destination_hash)
+        if path_entry != None: return path_entry[IDX_PT_NEXT_HOP]
         else: return None
 
     @staticmethod
@@ -2332,7 +2554,8 @@ class Transport:
         :param destination_hash: A destination hash as *bytes*.
         :returns: The interface for the next hop to the specified destination, or *None* if the interface is unknown.
         """
-        if destination_hash in Transport.path_table: return Transport.path_table[destination_hash][IDX_PT_RVCD_IF]
+        path_entry = Transport.path_table.get(destination_hash)
+        if path_entry != None: return path_entry[IDX_PT_RVCD_IF]
         else: return None
 
     @staticmethod
@@ -2375,8 +2598,9 @@ class Transport:
 
     @staticmethod
     def expire_path(destination_hash):
-        if destination_hash in Transport.path_table:
-            Transport.path_table[destination_hash][IDX_PT_TIMESTAMP] = 0
+        path_entry = Transport.path_table.get(destination_hash)
+        if path_entry != None:
+            path_entry[IDX_PT_TIMESTAMP] = 0
             Transport.tables_last_culled = 0
             return True
         else:
@@ -2592,7 +2816,7 @@ class Transport:
                     destination_exists_on_local_client = True
                     Transport.pending_local_path_requests[destination_hash] = attached_interface
         
-        local_destination = next((d for d in Transport.destinations if d.hash == destination_hash), None)
+        local_destination = Transport.destinations_map.get(destination_hash)
         if local_destination != None:
             local_destination.announce(path_response=True, tag=tag, attached_interface=attached_interface)
             RNS.log("Answering path request for "+RNS.prettyhexrep(destination_hash)+interface_str+", destination is local to this system", RNS.LOG_DEBUG)
@@ -2651,11 +2875,12 @@ class Transport:
                     # rebroadcast locally. In such a case the actual announce
                     # is temporarily held, and then reinserted when the path
                     # request has been served to the peer.
-                    if packet.destination_hash in Transport.announce_table:
-                        held_entry = Transport.announce_table[packet.destination_hash]
-                        Transport.held_announces[packet.destination_hash] = held_entry
-                    
-                    Transport.announce_table[packet.destination_hash] = [now, retransmit_timeout, retries, received_from, announce_hops, packet, local_rebroadcasts, block_rebroadcasts, attached_interface]
+                    with Transport.announce_table_lock:
+                        if packet.destination_hash in Transport.announce_table:
+                            held_entry = Transport.announce_table[packet.destination_hash]
+                            Transport.held_announces[packet.destination_hash] = held_entry
+                        
+                        Transport.announce_table[packet.destination_hash] = [now, retransmit_timeout, retries, received_from, announce_hops, packet, local_rebroadcasts, block_rebroadcasts, attached_interface]
 
         elif is_from_local_client:
             # Forward path request on all interfaces
@@ -2774,16 +2999,16 @@ class Transport:
 
     @staticmethod
     def shared_connection_disappeared():
-        for link in Transport.active_links:
+        for link in Transport.active_links.copy():
             link.teardown()
 
-        for link in Transport.pending_links:
+        for link in Transport.pending_links.copy():
             link.teardown()
 
-        Transport.announce_table    = {}
-        Transport.path_table        = {}
-        Transport.reverse_table     = {}
-        Transport.link_table        = {}
+        with Transport.announce_table_lock: Transport.announce_table = {}
+        with Transport.path_table_lock:     Transport.path_table     = {}
+        with Transport.reverse_table_lock:  Transport.reverse_table  = {}
+        with Transport.link_table_lock:     Transport.link_table     = {}
         Transport.held_announces    = {}
         Transport.tunnels           = {}
 
@@ -2845,13 +3070,16 @@ class Transport:
                 Transport.saving_packet_hashlist = True
                 save_start = time.time()
 
-                if not RNS.Reticulum.transport_enabled(): Transport.packet_hashlist = set()
+                if not RNS.Reticulum.transport_enabled(): Transport.packet_hashlist.clear()
                 else: RNS.log("Saving packet hashlist to storage...", RNS.LOG_DEBUG)
 
                 packet_hashlist_path = RNS.Reticulum.storagepath+"/packet_hashlist"
-                file = open(packet_hashlist_path, "wb")
-                file.write(umsgpack.packb(list(Transport.packet_hashlist.copy())))
-                file.close()
+                if Transport.hashlist_compact:
+                    Transport.packet_hashlist.to_file(packet_hashlist_path)
+                else:
+                    file = open(packet_hashlist_path, "wb")
+                    file.write(umsgpack.packb(list(Transport.packet_hashlist.copy())))
+                    file.close()
 
                 save_time = time.time() - save_start
                 if save_time < 1: time_str = str(round(save_time*1000,2))+"ms"
@@ -2884,17 +3112,15 @@ class Transport:
                 RNS.log("Saving path table to storage...", RNS.LOG_DEBUG)
 
                 serialised_destinations = []
-                for destination_hash in Transport.path_table.copy():
+                with Transport.path_table_lock: path_table = Transport.path_table.copy()
+                for destination_hash, de in path_table.items():
                     # Get the destination entry from the destination table
-                    de = Transport.path_table[destination_hash]
                     interface_hash = de[IDX_PT_RVCD_IF].get_hash()
 
                     # Only store destination table entry if the associated
                     # interface is still active
                     interface = Transport.find_interface_from_hash(interface_hash)
                     if interface != None:
-                        # Get the destination entry from the destination table
-                        de = Transport.path_table[destination_hash]
                         timestamp = de[IDX_PT_TIMESTAMP]
                         received_from = de[IDX_PT_NEXT_HOP]
                         hops = de[IDX_PT_HOPS]
@@ -3018,6 +3244,12 @@ class Transport:
 
     @staticmethod
     def exit_handler():
+        if Transport.announce_validator != None:
+            Transport.announce_validator.stop()
+
+        if Transport.inbound_pipeline != None:
+            Transport.inbound_pipeline.stop()
+
         if not Transport.owner.is_connected_to_shared_instance:
             Transport.persist_data()
 
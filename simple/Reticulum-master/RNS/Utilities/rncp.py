@@ -174,10 +174,7 @@ def listen(configdir, verbosity = 0, quietness = 0, allowed = [], display_identi
         else:
             file_path = os.path.abspath(os.path.expanduser(f"{data}"))
 
-        target_link = None
-        for link in RNS.Transport.active_links:
-            if link.link_id == link_id:
-                target_link = link
+        target_link = RNS.Transport.active_links_map.get(link_id)
 
         if not os.path.isfile(file_path):
             RNS.log("Client-requested file not found: "+str(file_path), RNS.LOG_VERBOSE)
@@ -180,6 +180,87 @@ instance_name = default
 # respond_to_probes = No
 
 
+# Transport Instances keep a list of recently seen packet
+# hashes for duplicate detection, which can use a lot of
+# memory on busy nodes. A compact hashlist can be enabled
+# instead, which stores short fingerprints in a fixed-size
+# table, and uses a small fraction of the memory. Lookups
+# in the compact hashlist have a small chance of false
+# positives, which will cause a packet to be dropped as a
+# duplicate. The false-positive rate can be configured,
+# and lower rates use slightly more memory.
+
+# compact_packet_hashlist = No
+# packet_hashlist_fp_rate = 0.000000001
+
+
+# Signatures of incoming announces are normally verified
+# on the interface threads, one at a time. On busy nodes,
+# announces can instead be queued to a validation stage,
+# that verifies signatures in batches on a pool of worker
+# processes or threads, before the announces are processed
+# in the order they were received. Setting a number of
+# workers enables the validation stage. If the queue is
+# full, further announces are dropped until it drains.
+
+# announce_validation_workers = 0
+# announce_validation_batch_size = 32
+# announce_validation_queue_depth = 4096
+
+
+# Received packets are normally processed by Transport on
+# the thread of the interface they arrived on, which for
+# Backbone interfaces is the shared I/O loop for all
+# connected clients. Setting a number of inbound workers
+# instead queues received packets, and processes them on
+# worker threads, so slow processing does not hold up I/O.
+# Announces are queued separately, with lower priority than
+# other traffic. If a queue is full, further packets for it
+# are dropped until it drains.
+
+# inbound_workers = 0
+# inbound_queue_depth = 8192
+# inbound_announce_queue_depth = 2048
+
+
+# By default, TCP, Local and UDP interfaces use a thread
+# for each connection, and every link and resource runs
+# a watchdog thread. With the async runtime enabled, these
+# sockets and watchdogs are instead hosted on a single
+# event loop thread, which keeps the thread count flat on
+# instances with many connected clients and active links.
+
+# async_runtime = No
+
+
+# Resources and buffers are compressed with bz2 by
+# default, which all versions of Reticulum can read.
+# The codec can instead be set to zlib or lzma, or to
+# auto, which picks a codec for each transfer from the
+# expected rate of the link, so fast links are not held
+# up by slow compression. Only use codecs other than bz2
+# when the peers you transfer data with are running a
+# version of Reticulum that supports them. The level
+# from 0 to 9 overrides the default level of the codec.
+
+# compression_codec = bz2
+# compression_level = 9
+
+
+# The window of parts requested in each round of a
+# resource transfer is set by a congestion control
+# algorithm. The legacy algorithm grows the window
+# by one part per round, up to limits that depend on
+# fixed rate thresholds. The bbr algorithm sizes the
+# window from the estimated bottleneck bandwidth and
+# round trip time, and cubic grows it until parts are
+# lost. Both of these can use windows of several
+# hundred parts when the sender supports it, and pace
+# parts out instead of sending each round at once.
+
+# congestion_control = legacy
+
+
 [logging]
 # Valid log levels are 0 through 7:
 #   0: Log only critical information
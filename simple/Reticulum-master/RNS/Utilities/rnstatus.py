@@ -362,10 +362,18 @@ def program_setup(configdir, dispall=False, verbosity=0, name_filter=None, json=
                         if "ifac_signature" in ifstat and ifstat["ifac_signature"] != None:
                             sigstr = "<…"+RNS.hexrep(ifstat["ifac_signature"][-5:], delimit=False)+">"
                             print("    Access    : {nb}-bit IFAC by {sig}".format(nb=ifstat["ifac_size"]*8, sig=sigstr))
+
+                        if astats and "ifac_mask_time" in ifstat and ifstat["ifac_mask_time"] != None:
+                            ifac_time = round(ifstat["ifac_mask_time"]+ifstat["ifac_unmask_time"], 3)
+                            print("    IFAC      : {ms} masked, {us} verified, {ds} dropped, {it}s spent".format(ms=ifstat["ifac_masked"], us=ifstat["ifac_unmasked"], ds=ifstat["ifac_dropped"], it=ifac_time))
                         
                         if "i2p_b32" in ifstat and ifstat["i2p_b32"] != None:
                             print("    I2P B32   : {ep}".format(ep=str(ifstat["i2p_b32"])))
 
+                        if astats and "transmit_queued" in ifstat and ifstat["transmit_queued"] != None:
+                            if ifstat["transmit_queued"] > 0 or ifstat["transmit_dropped"] > 0:
+                                print("    Output    : {qs} queued, {nd} frames dropped".format(qs=RNS.prettysize(ifstat["transmit_queued"]), nd=ifstat["transmit_dropped"]))
+
                         if astats and "announce_queue" in ifstat and ifstat["announce_queue"] != None and ifstat["announce_queue"] > 0:
                             aqn = ifstat["announce_queue"]
                             if aqn == 1:
@@ -431,6 +439,48 @@ def program_setup(configdir, dispall=False, verbosity=0, name_filter=None, json=
             if lstr != "":
                 print(f"\n{lstr}")
 
+        if astats and "packet_hashlist" in stats and stats["packet_hashlist"] != None:
+            hs = stats["packet_hashlist"]
+            hl_type = "Compact packet hashlist" if hs["compact"] else "Packet hashlist"
+            print(f" {hl_type} holds {hs['entries']} hashes in {RNS.prettysize(hs['memory'])}")
+
+        if astats and "announce_cache" in stats and stats["announce_cache"] != None:
+            acs = stats["announce_cache"]
+            print(f" Announce signature cache holds {acs['entries']} entries, {acs['hits']} hits, {acs['misses']} misses")
+
+        if astats and "announce_validation" in stats and stats["announce_validation"] != None:
+            avs = stats["announce_validation"]
+            print(f" Announce validation using {avs['workers']} {avs['pool']} workers, {avs['queued']}/{avs['queue_depth']} queued, {avs['dropped']} dropped")
+            print(f"   Processed {avs['processed']} announces in {avs['batches']} batches at {round(avs['rate'], 1)}/s, verified {avs['verified']} signatures at {round(avs['verify_rate'], 1)}/s, {avs['invalid']} invalid")
+
+        if astats and "inbound_pipeline" in stats and stats["inbound_pipeline"] != None:
+            ips = stats["inbound_pipeline"]
+            print(f" Inbound pipeline using {ips['workers']} workers, {ips['queued']}/{ips['queue_depth']} packets and {ips['announces_queued']}/{ips['announce_queue_depth']} announces queued, peaking at {ips['max_queued']} and {ips['max_announces_queued']}")
+            print(f"   Processed {ips['processed']} packets, dropped {ips['dropped']} packets and {ips['announces_dropped']} announces")
+            print(f"   Queue wait averages {RNS.prettyshorttime(ips['avg_wait_time'])}, max {RNS.prettyshorttime(ips['max_wait_time'])}")
+            print(f"   Processing averages {RNS.prettyshorttime(ips['avg_processing_time'])}, max {RNS.prettyshorttime(ips['max_processing_time'])}")
+
+        if astats and "backbone_loop" in stats and stats["backbone_loop"] != None:
+            bls = stats["backbone_loop"]
+            print(f" Backbone I/O loop serving {bls['clients']} clients ran {bls['iterations']} iterations for {bls['events']} events, slowest took {RNS.prettyshorttime(bls['latency_max'])}")
+            buckets = []
+            for i in range(len(bls["latency_histogram"])):
+                count = bls["latency_histogram"][i]
+                if count > 0:
+                    if i < len(bls["latency_buckets"]): bucket_str = "≤"+RNS.prettyshorttime(bls["latency_buckets"][i], compact=True)
+                    else: bucket_str = ">"+RNS.prettyshorttime(bls["latency_buckets"][-1], compact=True)
+                    buckets.append(f"{bucket_str}: {count}")
+            if len(buckets) > 0: print("   Iteration latency "+", ".join(buckets))
+
+        if astats and "async_runtime" in stats and stats["async_runtime"] != None:
+            ars = stats["async_runtime"]
+            print(f" Async runtime hosting {ars['readers']} sockets and {ars['timers']} pending timers, {ars['timers_fired']} timers fired, {ars['callback_errors']} errors, {ars['threads']} threads running")
+
+        if astats and "scheduler" in stats and stats["scheduler"] != None:
+            ss = stats["scheduler"]
+            print(f" Scheduler has {ss['timers']} pending timers, {ss['timers_fired']} timers fired, {ss['callback_errors']} errors")
+            print(f"   Current lag {RNS.prettyshorttime(ss['lag'])}, average {RNS.prettyshorttime(ss['avg_lag'])}, max {RNS.prettyshorttime(ss['max_lag'])}")
+
         print("")
                 
     else:
@@ -49,6 +49,10 @@ from .Packet import Packet
 from .Packet import PacketReceipt
 from .Resolver import Resolver
 from .Resource import Resource, ResourceAdvertisement
+from .Compression import Compression
+from .CongestionControl import CongestionControl
+from .AsyncRuntime import AsyncRuntime
+from .Scheduler import Scheduler
 from .Cryptography import HKDF
 from .Cryptography import Hashes
 
@@ -5,6 +5,14 @@ from .hashes import TestSHA512
 from .identity import TestIdentity
 from .link import TestLink
 from .channel import TestChannel
+from .transport import TestTransport
+from .framing import TestFraming
+from .backbone import TestBackbone
+from .asyncruntime import TestAsyncRuntime
+from .scheduler import TestScheduler
+from .resource import TestResource
+from .compression import TestCompression
+from .congestion import TestCongestion
 
 if __name__ == '__main__':
     unittest.main(verbosity=2)
\ No newline at end of file
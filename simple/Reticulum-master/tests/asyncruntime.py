@@ -0,0 +1,147 @@
+import unittest
+
+import os
+import time
+import random
+import socket
+import threading
+import RNS
+from RNS.AsyncRuntime import AsyncRuntime, SocketWriter
+from RNS.Interfaces.TCPInterface import TCPServerInterface, TCPClientInterface
+from RNS.Interfaces.UDPInterface import UDPInterface
+from .helpers import TestOwner, wait_for
+
+class TestAsyncRuntime(unittest.TestCase):
+    def setUp(self):
+        print("")
+        self.enabled = AsyncRuntime.enabled
+        AsyncRuntime.enabled = True
+
+    def tearDown(self):
+        AsyncRuntime.enabled = self.enabled
+
+    def test_0_timers_and_readers(self):
+        fired = []
+        started = time.time()
+        for delay in [0.3, 0.1, 0.2]: AsyncRuntime.call_later(delay, lambda d=delay: fired.append((d, time.time()-started)))
+        AsyncRuntime.call_soon(lambda: fired.append((0, time.time()-started)))
+        self.assertTrue(wait_for(lambda: len(fired) == 4))
+        self.assertEqual([d for d, t in fired], [0, 0.1, 0.2, 0.3])
+        for delay, elapsed in fired: self.assertGreaterEqual(elapsed, delay)
+
+        # Errors in callbacks are logged, and do not stop the loop
+        errors = AsyncRuntime.callback_errors
+        AsyncRuntime.call_soon(lambda: 1/0)
+        self.assertEqual(AsyncRuntime.call(lambda: "still running"), "still running")
+        self.assertEqual(AsyncRuntime.callback_errors, errors+1)
+
+        reader, writer = socket.socketpair()
+        received = []
+        AsyncRuntime.add_reader(reader, lambda: received.append(reader.recv(4096)))
+        self.assertIn(reader, AsyncRuntime.readers.values())
+        writer.sendall(b"readable")
+        self.assertTrue(wait_for(lambda: b"".join(received) == b"readable"))
+        AsyncRuntime.remove_reader(reader)
+        self.assertNotIn(reader, AsyncRuntime.readers.values())
+        reader.close(); writer.close()
+
+    def test_0a_socket_writer(self):
+        # A peer that stops reading blocks neither
+        # the sending thread nor the loop
+        local, peer = socket.socketpair()
+        local.setblocking(False)
+        writer = SocketWriter(local)
+        chunks = [os.urandom(65536) for i in range(64)]
+        started = time.time()
+        for chunk in chunks: self.assertTrue(writer.send(chunk))
+        self.assertLess(time.time()-started, 1)
+        self.assertGreater(writer.queued, 0)
+        self.assertEqual(AsyncRuntime.call(lambda: "not blocked"), "not blocked")
+
+        # Queued data is written from the loop once the
+        # peer reads again, in the order it was sent
+        received = bytearray()
+        peer.settimeout(5)
+        while len(received) < len(chunks)*65536: received += peer.recv(65536)
+        self.assertEqual(bytes(received), b"".join(chunks))
+        self.assertTrue(wait_for(lambda: writer.queued == 0 and not writer.watching))
+
+        # Beyond the queue limit, data is dropped
+        limit = SocketWriter.MAX_QUEUE
+        try:
+            SocketWriter.MAX_QUEUE = 256*1024
+            results = [writer.send(chunk) for chunk in chunks]
+            self.assertIn(False, results)
+            self.assertEqual(writer.dropped, results.count(False))
+            self.assertLessEqual(writer.queued, SocketWriter.MAX_QUEUE)
+        finally:
+            SocketWriter.MAX_QUEUE = limit
+            writer.close()
+            local.close(); peer.close()
+
+    def test_1_tcp_interfaces(self):
+        server_owner = TestOwner()
+        server = TCPServerInterface(server_owner, {"name": "Async Server", "listen_ip": "127.0.0.1", "listen_port": 0})
+        server.ifac_size = 16; server.ifac_netname = None; server.ifac_netkey = None
+        server.announce_rate_target = None; server.announce_rate_grace = None; server.announce_rate_penalty = None
+        self.assertEqual(server.server, None)
+        port = server.server_socket.getsockname()[1]
+
+        threads = threading.active_count()
+        client_owner = TestOwner()
+        clients = []
+        synchronous_start = TCPClientInterface.SYNCHRONOUS_START
+        try:
+            TCPClientInterface.SYNCHRONOUS_START = True
+            for i in range(64): clients.append(TCPClientInterface(client_owner, {"name": f"Async Client {i}", "target_host": "127.0.0.1", "target_port": port}))
+            self.assertTrue(wait_for(lambda: len(server.spawned_interfaces) == len(clients)))
+
+            # Neither the connecting nor the accepted
+            # sockets get threads of their own
+            print(f"Connected {len(clients)} clients with {threading.active_count()-threads} additional threads, was {2*len(clients)} before")
+            self.assertEqual(threading.active_count(), threads)
+            self.assertEqual(AsyncRuntime.get_stats()["readers"], 2*len(clients)+1)
+
+            frames = [os.urandom(random.randint(RNS.Reticulum.HEADER_MINSIZE+1, 1000)) for i in range(100)]
+            for frame in frames:
+                for client in clients: client.process_outgoing(frame)
+                for spawned in server.spawned_interfaces: spawned.process_outgoing(frame)
+
+            self.assertTrue(wait_for(lambda: len(server_owner.received) == len(clients)*len(frames) and len(client_owner.received) == len(clients)*len(frames)))
+            self.assertEqual(sorted(server_owner.received), sorted(frames*len(clients)))
+            self.assertEqual(sorted(client_owner.received), sorted(frames*len(clients)))
+
+            # Closed connections are removed from the loop
+            for client in clients: client.detach()
+            self.assertTrue(wait_for(lambda: len(server.spawned_interfaces) == 0))
+            self.assertEqual(AsyncRuntime.get_stats()["readers"], 1)
+
+        finally:
+            TCPClientInterface.SYNCHRONOUS_START = synchronous_start
+            for client in clients: client.detach()
+            server.detach()
+            for interface in RNS.Transport.interfaces.copy():
+                if interface.parent_interface == server if hasattr(interface, "parent_interface") else False: RNS.Transport.interfaces.remove(interface)
+
+        self.assertEqual(server.server_socket, None)
+        self.assertEqual(AsyncRuntime.get_stats()["readers"], 0)
+
+    def test_2_udp_interface(self):
+        owner = TestOwner()
+        probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM); probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]; probe.close()
+
+        interface = UDPInterface(owner, {"name": "Async UDP", "listen_ip": "127.0.0.1", "listen_port": port, "forward_ip": "127.0.0.1", "forward_port": port})
+        try:
+            self.assertIn(interface.server_socket, AsyncRuntime.readers.values())
+            frames = [os.urandom(random.randint(RNS.Reticulum.HEADER_MINSIZE+1, 500)) for i in range(200)]
+            for frame in frames: interface.process_outgoing(frame)
+            self.assertTrue(wait_for(lambda: len(owner.received) == len(frames)))
+            self.assertEqual(owner.received, frames)
+
+        finally:
+            AsyncRuntime.remove_reader(interface.server_socket)
+            interface.server_socket.close()
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,121 @@
+import unittest
+
+import os
+import time
+import random
+import socket
+import RNS
+from RNS.Interfaces.BackboneInterface import BackboneInterface, BackboneClientInterface
+from .helpers import TestOwner, wait_for
+
+class TestBackbone(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server_owner = TestOwner()
+        cls.server = BackboneInterface(cls.server_owner, {"name": "Test Backbone", "listen_ip": "127.0.0.1", "listen_port": 0})
+        cls.server.ifac_size = 16; cls.server.ifac_netname = None; cls.server.ifac_netkey = None
+        cls.server.announce_rate_target = None; cls.server.announce_rate_grace = None; cls.server.announce_rate_penalty = None
+        for fileno in BackboneInterface.listener_filenos:
+            owner_interface, server_socket = BackboneInterface.listener_filenos[fileno]
+            if owner_interface == cls.server: cls.port = server_socket.getsockname()[1]
+
+        cls.client_owner = TestOwner()
+        cls.client = BackboneClientInterface(cls.client_owner, {"name": "Test Client", "target_host": "127.0.0.1", "target_port": cls.port})
+        wait_for(lambda: len(cls.server.spawned_interfaces) > 0)
+        cls.spawned = cls.server.spawned_interfaces[0]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.client.detach()
+        cls.server.detach()
+        while cls.spawned in RNS.Transport.interfaces: RNS.Transport.interfaces.remove(cls.spawned)
+
+    def setUp(self):
+        print("")
+        self.server_owner.received.clear()
+        self.client_owner.received.clear()
+
+    def test_0_transfer(self):
+        frames = [os.urandom(random.randint(RNS.Reticulum.HEADER_MINSIZE+1, 8192)) for i in range(2000)]
+        iterations = BackboneInterface.loop_iterations
+        for frame in frames:
+            self.client.process_outgoing(frame)
+            self.spawned.process_outgoing(frame)
+
+        self.assertTrue(wait_for(lambda: len(self.server_owner.received) == len(frames) and len(self.client_owner.received) == len(frames)))
+        self.assertEqual(self.server_owner.received, frames)
+        self.assertEqual(self.client_owner.received, frames)
+        self.assertEqual(self.client.transmit_queued, 0)
+        self.assertEqual(len(self.client.transmit_queue), 0)
+
+        stats = BackboneInterface.get_loop_stats()
+        self.assertEqual(stats["clients"], 2)
+        self.assertGreater(stats["iterations"], iterations)
+        self.assertEqual(sum(stats["latency_histogram"]), stats["iterations"])
+        self.assertEqual(len(stats["latency_histogram"]), len(stats["latency_buckets"])+1)
+
+    def test_0a_direct_write(self):
+        # Frames sent while nothing is queued are written
+        # right away, without waiting for the I/O loop
+        txb   = self.client.txb
+        frame = os.urandom(512)
+        self.client.process_outgoing(frame)
+        self.assertEqual(len(self.client.transmit_queue), 0)
+        self.assertGreater(self.client.txb, txb)
+        self.assertTrue(wait_for(lambda: self.server_owner.received == [frame]))
+
+    def test_1_transmit_queue_limit(self):
+        # Connect to a peer that never reads, and
+        # check that queued output stays bounded
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.bind(("127.0.0.1", 0))
+        listener.listen(1)
+        stalled_owner = TestOwner()
+        stalled = BackboneClientInterface(stalled_owner, {"name": "Stalled Client", "target_host": "127.0.0.1", "target_port": listener.getsockname()[1]})
+        peer_socket, address = listener.accept()
+
+        limit = BackboneClientInterface.MAX_TRANSMIT_QUEUE
+        try:
+            BackboneClientInterface.MAX_TRANSMIT_QUEUE = 256*1024
+            frame = os.urandom(8192)
+            for i in range(2000): stalled.process_outgoing(frame)
+            self.assertGreater(stalled.transmit_dropped, 0)
+            self.assertLessEqual(stalled.transmit_queued, BackboneClientInterface.MAX_TRANSMIT_QUEUE)
+
+            # Once the peer reads again, the queue drains
+            received = 0
+            peer_socket.settimeout(5)
+            while received == 0 or stalled.transmit_queued > 0 or len(stalled.transmit_queue) > 0:
+                received += len(peer_socket.recv(65536))
+            self.assertEqual(len(stalled.transmit_queue), 0)
+
+        finally:
+            BackboneClientInterface.MAX_TRANSMIT_QUEUE = limit
+            stalled.detach()
+            peer_socket.close()
+            listener.close()
+
+    def test_2_throughput(self):
+        for frame_size in [100, 500, 8192]:
+            # Stay below the transmit queue limit, since
+            # frames are queued faster than they are sent
+            frames = [os.urandom(frame_size) for i in range(min(50000, BackboneClientInterface.MAX_TRANSMIT_QUEUE//2//frame_size))]
+            started = time.time()
+            for frame in frames: self.client.process_outgoing(frame)
+            self.assertTrue(wait_for(lambda: len(self.server_owner.received) == len(frames), timeout=60))
+            elapsed = time.time()-started
+
+            self.assertEqual(self.client.transmit_dropped, 0)
+            rate = len(frames)/elapsed
+            print(f"Transferred {len(frames)} frames of {RNS.prettysize(frame_size)} over loopback at {round(rate)} frames/s, {RNS.prettyspeed(rate*frame_size*8)}")
+            self.server_owner.received.clear()
+
+        stats = BackboneInterface.get_loop_stats()
+        histogram = []
+        for i in range(len(stats["latency_buckets"])):
+            if stats["latency_histogram"][i] > 0: histogram.append("≤"+RNS.prettyshorttime(stats["latency_buckets"][i], compact=True)+": "+str(stats["latency_histogram"][i]))
+        print(f"I/O loop ran {stats['iterations']} iterations for {stats['events']} events, slowest took {RNS.prettyshorttime(stats['latency_max'])}")
+        print("Iteration latency "+", ".join(histogram))
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
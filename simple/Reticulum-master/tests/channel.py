@@ -3,6 +3,7 @@ import threading
 import RNS
 from RNS.Channel import MessageState, ChannelOutletBase, Channel, MessageBase
 import RNS.Buffer
+from RNS.Buffer import StreamDataMessage
 from RNS.vendor import umsgpack
 from typing import Callable
 import contextlib
@@ -383,6 +384,16 @@ class TestChannel(unittest.TestCase):
 
         self.eat_own_dog_food(message, check)
 
+    def test_stream_data_codecs(self):
+        data = ("01234556789"*32).encode("utf-8")
+        for codec in RNS.Compression.CODECS:
+            message = StreamDataMessage(3, RNS.Compression.compress_block(data, codec, 6), eof=True, compressed=True)
+            received = StreamDataMessage()
+            received.unpack(message.pack())
+            self.assertEqual(3, received.stream_id)
+            self.assertTrue(received.eof)
+            self.assertEqual(data, received.data)
+
     def test_buffer_small_bidirectional(self):
         data = "Hello\n"
         with RNS.Buffer.create_bidirectional_buffer(0, 0, self.h.channel) as buffer:
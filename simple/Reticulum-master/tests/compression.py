@@ -0,0 +1,87 @@
+import unittest
+
+import os
+import time
+import RNS
+from RNS.Compression import Compression
+
+class RateLink():
+    def __init__(self, rate):
+        self.rate = rate
+
+    def get_expected_rate(self):
+        return self.rate
+
+    def get_establishment_rate(self):
+        return None
+
+class TestCompression(unittest.TestCase):
+    def setUp(self):
+        print("")
+        self.codec   = Compression.codec
+        self.level   = Compression.level
+        self.workers = Compression.WORKERS
+
+    def tearDown(self):
+        Compression.codec   = self.codec
+        Compression.level   = self.level
+        Compression.WORKERS = self.workers
+        if Compression.executor != None:
+            Compression.executor.shutdown()
+            Compression.executor = None
+
+    def test_0_round_trip(self):
+        with open(RNS.__file__.replace("__init__.py", "Link.py"), "rb") as file: text = file.read()
+        data = (text*((2*1024*1024)//len(text)+1))[:2*1024*1024]
+        for workers in [1, 2]:
+            Compression.WORKERS = workers
+            for codec in Compression.CODECS:
+                started    = time.time()
+                compressed = Compression.compress(data, codec)
+                elapsed    = time.time()-started
+                print(f"{Compression.NAMES[codec]} with {workers} worker(s) compressed {RNS.prettysize(len(data))} to {RNS.prettysize(len(compressed))} in {RNS.prettyshorttime(elapsed)}")
+                self.assertEqual(Compression.detect(compressed), codec)
+                self.assertEqual(Compression.decompress(compressed, codec), data)
+
+                # Data compressed in blocks consists of several
+                # streams, which must all be decompressed, also
+                # when split into arbitrary chunks
+                for chunk_size in [1000, 64*1024]:
+                    chunks = [compressed[offset:offset+chunk_size] for offset in range(0, len(compressed), chunk_size)]
+                    decompressed = list(Compression.decompress_stream(chunks, codec, 32*1024))
+                    self.assertTrue(all(len(chunk) <= 32*1024 for chunk in decompressed))
+                    self.assertEqual(b"".join(decompressed), data)
+
+                with self.assertRaises(Exception): Compression.decompress(compressed[:-16], codec)
+                self.assertEqual(Compression.decompress(Compression.compress(b"", codec), codec), b"")
+
+        with self.assertRaises(ValueError): Compression.detect(os.urandom(2)+b"\x00")
+
+    def test_1_probe(self):
+        self.assertTrue(Compression.is_compressible(os.urandom(1024)))
+        self.assertFalse(Compression.is_compressible(os.urandom(1024*1024)))
+        self.assertTrue(Compression.is_compressible(os.urandom(1024*1024).hex().encode("utf-8")))
+
+    def test_2_select(self):
+        Compression.codec = Compression.BZ2
+        self.assertEqual(Compression.select(RateLink(100*1000*1000)), (Compression.BZ2, 9))
+        self.assertEqual(Compression.select_small(RateLink(100*1000*1000)), (Compression.BZ2, 9))
+
+        Compression.codec = None
+        self.assertEqual(Compression.select(None), (Compression.BZ2, 9))
+        self.assertEqual(Compression.select(RateLink(None)), (Compression.BZ2, 9))
+        self.assertEqual(Compression.select(RateLink(100*1000*1000)), (Compression.ZLIB, 1))
+        self.assertEqual(Compression.select(RateLink(5*1000*1000)), (Compression.BZ2, 9))
+        self.assertEqual(Compression.select(RateLink(10*1000)), (Compression.LZMA, 6))
+        self.assertEqual(Compression.select_small(RateLink(100*1000*1000)), (Compression.ZLIB, 1))
+        self.assertEqual(Compression.select_small(RateLink(10*1000)), (Compression.ZLIB, 6))
+
+        Compression.level = 3
+        self.assertEqual(Compression.select(RateLink(10*1000)), (Compression.LZMA, 3))
+
+        Compression.codec = Compression.LZMA
+        Compression.level = None
+        self.assertEqual(Compression.select(RateLink(100*1000*1000)), (Compression.LZMA, 6))
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,259 @@
+import unittest
+
+import math
+import random
+import collections
+import RNS
+from RNS.CongestionControl import CongestionControl, LegacyControl, BBRControl, CubicControl
+
+# Size of a part on the wire, and of a part
+# request without any requested map hashes
+PART_SIZE    = RNS.Reticulum.MTU
+REQUEST_SIZE = 1+RNS.Resource.MAPHASH_LEN+RNS.Reticulum.HEADER_MAXSIZE+RNS.Identity.HASHLENGTH//8
+
+class Clock():
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class WindowState():
+    # The window attributes of a resource, that
+    # congestion controllers operate on
+    def __init__(self):
+        self.sdu                = RNS.Reticulum.MTU-RNS.Reticulum.HEADER_MAXSIZE-RNS.Reticulum.IFAC_MIN_SIZE
+        self.window             = RNS.Resource.WINDOW
+        self.window_max         = RNS.Resource.WINDOW_MAX_SLOW
+        self.window_min         = RNS.Resource.WINDOW_MIN
+        self.window_flexibility = RNS.Resource.WINDOW_FLEXIBILITY
+
+class Path():
+    # A bottleneck link with a drop-tail queue, a fixed
+    # propagation delay and random loss, in virtual time
+    def __init__(self, rate, delay, queue, loss=0, seed=0):
+        self.rate      = rate
+        self.delay     = delay
+        self.queue     = queue
+        self.loss      = loss
+        self.random    = random.Random(seed)
+        self.departing = collections.deque()
+        self.free_at   = 0.0
+        self.max_delay = 0.0
+
+    def transmit(self, at, size):
+        while len(self.departing) > 0 and self.departing[0] <= at: self.departing.popleft()
+        if len(self.departing) >= self.queue: return None
+
+        started        = max(at, self.free_at)
+        self.free_at   = started+size/self.rate
+        self.max_delay = max(self.max_delay, started-at)
+        self.departing.append(self.free_at)
+        if self.random.random() < self.loss: return None
+        else: return self.free_at+self.delay
+
+def simulate(algorithm, rate, delay, queue, loss=0, parts=2000, seed=0, wide=True):
+    """
+    Simulates a resource transfer of ``parts`` parts over a path with a
+    bottleneck of ``rate`` bytes per second, a one-way delay of ``delay``
+    seconds, a queue of ``queue`` packets and a loss probability of
+    ``loss``, with congestion controllers of ``algorithm`` on both ends.
+    Requests and hashmap updates are not lost. Returns a dict of
+    statistics for the transfer.
+    """
+    algorithm_before = CongestionControl.algorithm
+    CongestionControl.algorithm = algorithm
+    try:
+        clock    = Clock()
+        path     = Path(rate, delay, queue, loss, seed)
+        receiver = WindowState(); sender = WindowState()
+        receiver.congestion = CongestionControl.create(receiver, RNS.Resource.WINDOW_MAX if wide else RNS.Resource.WINDOW_MAX_FAST)
+        sender.congestion   = CongestionControl.create(sender, RNS.Resource.WINDOW_MAX)
+        receiver.congestion.clock = clock; sender.congestion.clock = clock
+    finally:
+        CongestionControl.algorithm = algorithm_before
+
+    segment_length = RNS.ResourceAdvertisement.HASHMAP_MAX_LEN
+    received       = bytearray(parts)
+    sent           = bytearray(parts)
+    frontier       = min(parts, segment_length)
+    consecutive    = -1
+    last_request   = None
+    round_bytes    = 0
+    data_rate      = None
+    retries        = 0
+    stats          = {"rounds": 0, "timeouts": 0, "sent": 0, "lost": 0, "windows": []}
+
+    while consecutive < parts-1:
+        stats["rounds"] += 1
+        if stats["rounds"] > 100000: raise SystemError("Simulated transfer did not complete")
+
+        # The receiver requests the missing parts in its window,
+        # and more of the hashmap if the window extends past it
+        window    = receiver.window
+        start     = consecutive+1
+        requested = [i for i in range(start, min(start+window, frontier)) if not received[i]][:window]
+        if start+window > frontier and frontier < parts:
+            segments = max(1, min(math.ceil((start+window-frontier)/segment_length), RNS.Resource.HMU_SEGMENTS_MAX)) if wide else 1
+            frontier = min(parts, frontier+segments*segment_length)
+        stats["windows"].append(window)
+
+        request_sent = clock.now
+        clock.now   += delay+(REQUEST_SIZE+len(requested)*RNS.Resource.MAPHASH_LEN)/rate
+
+        # The sender concludes the previous round, and sends
+        # the requested parts, paced if it has a pacing rate
+        if last_request != None:
+            interval = clock.now-last_request
+            if any(sent[i] for i in requested): sender.congestion.parts_lost()
+            sender.congestion.round_completed(interval, round_bytes/interval)
+        last_request = clock.now
+        round_bytes  = len(requested)*PART_SIZE
+
+        pacing_rate = sender.congestion.get_pacing_rate()
+        burst_bytes = None if pacing_rate == None else pacing_rate*RNS.Resource.PACING_QUANTUM
+        arrivals = []; burst = 0; filled = 0
+        for i in requested:
+            if burst_bytes != None and filled >= burst_bytes: burst += 1; filled = 0
+            filled += PART_SIZE
+            sent[i] = 1; stats["sent"] += 1
+            arrival = path.transmit(clock.now+burst*RNS.Resource.PACING_QUANTUM, PART_SIZE)
+            if arrival == None: stats["lost"] += 1
+            else: arrivals.append((arrival, i))
+
+        arrivals.sort()
+        if len(arrivals) > 0:
+            first_rtt = arrivals[0][0]-request_sent
+            receiver.congestion.response_received(first_rtt, (REQUEST_SIZE+PART_SIZE)/first_rtt)
+
+        for arrival, i in arrivals: received[i] = 1
+        while consecutive+1 < parts and received[consecutive+1]: consecutive += 1
+
+        if len(arrivals) == len(requested):
+            retries   = 0
+            clock.now = arrivals[-1][0] if len(arrivals) > 0 else clock.now+delay
+            rtt       = clock.now-request_sent
+            data_rate = len(requested)*PART_SIZE/rtt
+            receiver.congestion.round_completed(rtt, data_rate)
+
+        else:
+            # The receiver times out waiting for the lost parts,
+            # the same way the resource watchdog does
+            stats["timeouts"] += 1
+            last_activity = arrivals[-1][0] if len(arrivals) > 0 else request_sent
+            outstanding   = len(requested)-len(arrivals)
+            expected_rate = data_rate or RNS.Link.ECPUBSIZE/(2*delay)
+            timeout = RNS.Resource.PART_TIMEOUT_FACTOR_AFTER_RTT*(outstanding*receiver.sdu/expected_rate)+RNS.Resource.RETRY_GRACE_TIME+retries*RNS.Resource.PER_RETRY_DELAY
+            clock.now = last_activity+timeout
+            retries  += 1
+            receiver.congestion.parts_lost()
+
+    stats["time"]      = clock.now
+    stats["goodput"]   = parts*receiver.sdu/clock.now
+    stats["max_delay"] = path.max_delay
+    return stats
+
+SCENARIOS = {
+    # name:           rate (B/s), one-way delay, queue, loss, parts
+    "LoRa":           [325,       0.5,           32,    0,    100],
+    "Lossy LoRa":     [325,       0.5,           32,    0.02, 100],
+    "WiFi":           [2.5e6,     0.005,         256,   0.005, 2000],
+    "Shallow buffer": [6.25e6,    0.03,          24,    0,    2000],
+    "Backbone":       [125e6,     0.02,          1000,  0,    4000],
+}
+
+def compare(algorithms=["legacy", "bbr", "cubic"], seeds=3):
+    """
+    Runs every scenario with each algorithm, and
+    returns the mean statistics for each pair.
+    """
+    results = {}
+    for name, (rate, delay, queue, loss, parts) in SCENARIOS.items():
+        for algorithm in algorithms:
+            runs = [simulate(algorithm, rate, delay, queue, loss, parts, seed) for seed in range(seeds)]
+            results[(name, algorithm)] = {key: sum(run[key] for run in runs)/len(runs) for key in ["time", "goodput", "sent", "lost", "timeouts", "max_delay"]}
+            results[(name, algorithm)]["parts"] = parts
+            results[(name, algorithm)]["rate"]  = rate
+
+    return results
+
+def print_comparison(results):
+    print(f"{'Scenario':<16}{'Algorithm':<10}{'Time':>12}{'Goodput':>14}{'Utilisation':>13}{'Retransmits':>13}{'Timeouts':>10}{'Queue delay':>13}")
+    for (name, algorithm), r in results.items():
+        print(f"{name:<16}{algorithm:<10}{str(round(r['time'], 2))+'s':>12}{RNS.prettyspeed(r['goodput']*8):>14}{round(100*r['goodput']/r['rate'], 1):>12}%{round(r['sent']-r['parts'], 1):>13}{round(r['timeouts'], 1):>10}{str(round(r['max_delay']*1000, 1))+'ms':>13}")
+
+class TestCongestion(unittest.TestCase):
+    def setUp(self):
+        print("")
+
+    def test_0_legacy(self):
+        # The legacy controller keeps the original thresholds
+        state = WindowState(); control = LegacyControl(state, RNS.Resource.WINDOW_MAX)
+        self.assertEqual(control.window_limit, RNS.Resource.WINDOW_MAX_FAST)
+        for i in range(RNS.Resource.FAST_RATE_THRESHOLD): control.round_completed(0.1, RNS.Resource.RATE_FAST*2)
+        self.assertEqual(state.window_max, RNS.Resource.WINDOW_MAX_FAST)
+        self.assertEqual(state.window, RNS.Resource.WINDOW+RNS.Resource.FAST_RATE_THRESHOLD)
+        control.parts_lost()
+        self.assertEqual(state.window, RNS.Resource.WINDOW+RNS.Resource.FAST_RATE_THRESHOLD-1)
+
+        state = WindowState(); control = LegacyControl(state, RNS.Resource.WINDOW_MAX)
+        for i in range(RNS.Resource.VERY_SLOW_RATE_THRESHOLD): control.round_completed(10, RNS.Resource.RATE_VERY_SLOW/2)
+        self.assertEqual(state.window_max, RNS.Resource.WINDOW_MAX_VERY_SLOW)
+
+    def test_1_bbr(self):
+        state = WindowState(); control = BBRControl(state, RNS.Resource.WINDOW_MAX)
+        control.clock = Clock()
+
+        # The window doubles during startup, and settles at a
+        # multiple of the bandwidth delay product once the
+        # delivery rate stops growing
+        control.response_received(0.1, 2000)
+        control.round_completed(0.1, 1000)
+        self.assertEqual(state.window, 2*RNS.Resource.WINDOW)
+        for i in range(16): control.round_completed(0.2, 100*1000)
+        self.assertEqual(control.state, BBRControl.PROBE_BW)
+        bdp = 100*1000*0.1/state.sdu
+        self.assertLessEqual(abs(state.window-bdp*BBRControl.WINDOW_GAIN), bdp*BBRControl.WINDOW_GAIN*0.25+1)
+        self.assertEqual(state.window_max, RNS.Resource.WINDOW_MAX)
+
+        # Loss caps the window
+        window = state.window
+        control.parts_lost()
+        self.assertLess(state.window, window)
+        self.assertGreater(control.get_pacing_rate(), 0)
+
+    def test_2_cubic(self):
+        state = WindowState(); control = CubicControl(state, RNS.Resource.WINDOW_MAX)
+        control.clock = clock = Clock()
+        control.round_completed(0.1, None)
+        self.assertEqual(state.window, 2*RNS.Resource.WINDOW)
+        for i in range(4): control.round_completed(0.1, None)
+        window = state.window
+        control.parts_lost()
+        self.assertEqual(state.window, int(window*CubicControl.BETA))
+
+        # After a loss, the window grows back towards
+        # and then beyond the window the loss occurred at
+        windows = []
+        for i in range(60):
+            clock.now += 0.1
+            control.round_completed(0.1, None)
+            windows.append(state.window)
+        self.assertEqual(windows, sorted(windows))
+        self.assertGreater(windows[-1], window)
+
+    def test_3_simulation(self):
+        results = compare()
+        print_comparison(results)
+        for (name, algorithm), r in results.items():
+            self.assertGreater(r["goodput"], 0)
+
+        # On fast links, the model based and loss based
+        # algorithms fill the pipe better than fixed limits,
+        # without overshooting on slow links
+        for algorithm in ["bbr", "cubic"]:
+            self.assertGreater(results[("Backbone", algorithm)]["goodput"], 2*results[("Backbone", "legacy")]["goodput"])
+            self.assertLess(results[("LoRa", algorithm)]["time"], 1.25*results[("LoRa", "legacy")]["time"])
+
+if __name__ == '__main__':
+    print_comparison(compare())
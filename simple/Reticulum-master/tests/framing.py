@@ -0,0 +1,196 @@
+import unittest
+
+import os
+import time
+import random
+import RNS
+from RNS.Interfaces.TCPInterface import HDLC, KISS, TCPInterface
+from RNS.Interfaces.BackboneInterface import BackboneClientInterface
+from RNS.Interfaces.util.framing import HDLCDeframer, KISSDeframer
+
+# The original HDLC deframing from the TCP, Backbone and
+# Local interfaces, kept as a reference implementation.
+class LegacyHDLCDeframer():
+    def __init__(self):
+        self.frame_buffer = b""
+
+    def feed(self, data_in):
+        frames = []
+        self.frame_buffer += data_in
+        flags_remaining = True
+        while flags_remaining:
+            frame_start = self.frame_buffer.find(HDLC.FLAG)
+            if frame_start != -1:
+                frame_end = self.frame_buffer.find(HDLC.FLAG, frame_start+1)
+                if frame_end != -1:
+                    frame = self.frame_buffer[frame_start+1:frame_end]
+                    frame = frame.replace(bytes([HDLC.ESC, HDLC.FLAG ^ HDLC.ESC_MASK]), bytes([HDLC.FLAG]))
+                    frame = frame.replace(bytes([HDLC.ESC, HDLC.ESC  ^ HDLC.ESC_MASK]), bytes([HDLC.ESC]))
+                    if len(frame) > RNS.Reticulum.HEADER_MINSIZE:
+                        frames.append(frame)
+                    self.frame_buffer = self.frame_buffer[frame_end:]
+                else:
+                    flags_remaining = False
+            else:
+                flags_remaining = False
+
+        return frames
+
+# The original byte-by-byte KISS deframing from the TCP
+# client interface, kept as a reference implementation.
+class LegacyKISSDeframer():
+    def __init__(self, hw_mtu):
+        self.hw_mtu      = hw_mtu
+        self.in_frame    = False
+        self.escape      = False
+        self.command     = KISS.CMD_UNKNOWN
+        self.data_buffer = b""
+
+    def feed(self, data_in):
+        frames = []
+        for byte in data_in:
+            if (self.in_frame and byte == KISS.FEND and self.command == KISS.CMD_DATA):
+                self.in_frame = False
+                frames.append(self.data_buffer)
+            elif (byte == KISS.FEND):
+                self.in_frame = True
+                self.command = KISS.CMD_UNKNOWN
+                self.data_buffer = b""
+            elif (self.in_frame and len(self.data_buffer) < self.hw_mtu):
+                if (len(self.data_buffer) == 0 and self.command == KISS.CMD_UNKNOWN):
+                    self.command = byte & 0x0F
+                elif (self.command == KISS.CMD_DATA):
+                    if (byte == KISS.FESC):
+                        self.escape = True
+                    else:
+                        if (self.escape):
+                            if (byte == KISS.TFEND):
+                                byte = KISS.FEND
+                            if (byte == KISS.TFESC):
+                                byte = KISS.FESC
+                            self.escape = False
+                        self.data_buffer = self.data_buffer+bytes([byte])
+
+        return frames
+
+def hdlc_frame(data):
+    return bytes([HDLC.FLAG])+HDLC.escape(data)+bytes([HDLC.FLAG])
+
+def kiss_frame(data, command=KISS.CMD_DATA):
+    return bytes([KISS.FEND, command])+KISS.escape(data)+bytes([KISS.FEND])
+
+def random_frames(count, max_size=500):
+    # Include plenty of bytes that need escaping
+    frames = []
+    for i in range(count):
+        frame = bytearray(os.urandom(random.randint(RNS.Reticulum.HEADER_MINSIZE+1, max_size)))
+        for j in range(0, len(frame), 7): frame[j] = random.choice([HDLC.FLAG, HDLC.ESC, KISS.FEND, KISS.FESC])
+        frames.append(bytes(frame))
+
+    return frames
+
+def chunked(stream, chunk_sizes):
+    chunks = []; pointer = 0
+    while pointer < len(stream):
+        size = random.choice(chunk_sizes)
+        chunks.append(stream[pointer:pointer+size])
+        pointer += size
+
+    return chunks
+
+class TestFraming(unittest.TestCase):
+    def setUp(self):
+        print("")
+
+    def test_0_hdlc_deframing(self):
+        frames = random_frames(500)
+        stream = b"leading junk"+b"".join([hdlc_frame(frame) for frame in frames])
+        for chunk_sizes in [[1], [2, 3, 5], [64, 4096], [len(stream)]]:
+            chunks = chunked(stream, chunk_sizes)
+            deframer = HDLCDeframer(min_size=RNS.Reticulum.HEADER_MINSIZE)
+            legacy   = LegacyHDLCDeframer()
+            received = []; legacy_received = []
+            for chunk in chunks:
+                received += deframer.feed(chunk)
+                legacy_received += legacy.feed(chunk)
+
+            self.assertEqual(received, frames)
+            self.assertEqual(received, legacy_received)
+            self.assertEqual(deframer.buffered(), 1)
+
+        # Short and oversized frames are dropped
+        deframer = HDLCDeframer(max_size=100, min_size=RNS.Reticulum.HEADER_MINSIZE)
+        self.assertEqual(deframer.feed(hdlc_frame(b"short")+hdlc_frame(os.urandom(101))+hdlc_frame(frames[0][:100])), [frames[0][:100]])
+
+        # Incomplete frames that can no longer fit are discarded
+        deframer.feed(bytes([HDLC.FLAG])+os.urandom(300).replace(bytes([HDLC.FLAG]), b""))
+        self.assertEqual(deframer.buffered(), 0)
+        deframer.feed(bytes([HDLC.FLAG])+b"partial")
+        deframer.reset()
+        self.assertEqual(deframer.feed(b"frame"+bytes([HDLC.FLAG])), [])
+
+    def test_1_kiss_deframing(self):
+        frames = random_frames(500)
+        stream = b"".join([kiss_frame(frame) for frame in frames])
+        for chunk_sizes in [[1], [2, 3, 5], [64, 4096], [len(stream)]]:
+            chunks = chunked(stream, chunk_sizes)
+            deframer = KISSDeframer(max_size=564)
+            legacy   = LegacyKISSDeframer(564)
+            received = []; legacy_received = []
+            for chunk in chunks:
+                received += [frame for command, frame in deframer.feed(chunk)]
+                legacy_received += legacy.feed(chunk)
+
+            self.assertEqual(received, frames)
+            self.assertEqual(received, legacy_received)
+
+        # Commands are returned with the port nibble stripped
+        deframer = KISSDeframer()
+        self.assertEqual(deframer.feed(bytes([KISS.FEND, 0x1F, 0x01, KISS.FEND])+kiss_frame(frames[0], command=0x10)), [(0x0F, bytes([0x01])), (KISS.CMD_DATA, frames[0])])
+
+    def test_2_backbone_receive(self):
+        interface = BackboneClientInterface.__new__(BackboneClientInterface)
+        interface.deframer = HDLCDeframer(min_size=RNS.Reticulum.HEADER_MINSIZE)
+        received = []
+        interface.process_incoming = lambda frame: received.append(frame)
+
+        frames = random_frames(100)
+        for chunk in chunked(b"".join([hdlc_frame(frame) for frame in frames]), [1, 100, 1000]):
+            interface.receive(chunk)
+
+        self.assertEqual(received, frames)
+
+    def test_3_deframing_performance(self):
+        # Enough data to keep a 1 Gbps link busy for 0.1s
+        target_bytes = 1_000_000_000//8//10
+        for frame_size in [64, 500, 8192]:
+            frames = random_frames(max(1, target_bytes//frame_size), max_size=frame_size)
+            for name, framer, make_deframer, make_legacy in [
+                ["HDLC", hdlc_frame, lambda: HDLCDeframer(min_size=RNS.Reticulum.HEADER_MINSIZE), lambda: LegacyHDLCDeframer()],
+                ["KISS", kiss_frame, lambda: KISSDeframer(), lambda: LegacyKISSDeframer(TCPInterface.HW_MTU)]]:
+
+                stream = b"".join([framer(frame) for frame in frames])
+                chunks = chunked(stream, [65536])
+
+                deframer = make_deframer()
+                started  = time.time()
+                count    = 0
+                for chunk in chunks: count += len(deframer.feed(chunk))
+                elapsed  = time.time()-started
+                self.assertEqual(count, len(frames))
+
+                # The legacy implementations are only timed on a
+                # part of the stream, since they are much slower
+                legacy       = make_legacy()
+                legacy_bytes = 0
+                started      = time.time()
+                for chunk in chunks[:max(1, len(chunks)//20)]:
+                    legacy.feed(chunk)
+                    legacy_bytes += len(chunk)
+                legacy_rate  = legacy_bytes*8/(time.time()-started)
+
+                rate = len(stream)*8/elapsed
+                print(name+" deframing of "+str(len(frames))+" frames up to "+RNS.prettysize(frame_size)+" in 64 KB reads: "+RNS.prettyspeed(rate)+", "+str(round(rate/legacy_rate))+"x faster than before")
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
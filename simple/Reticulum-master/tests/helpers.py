@@ -0,0 +1,15 @@
+import time
+
+class TestOwner():
+    # Stands in for Transport as the owner of
+    # interfaces, and collects inbound data
+    def __init__(self):
+        self.received = []
+
+    def inbound(self, data, interface):
+        self.received.append(data)
+
+def wait_for(condition, timeout=20):
+    started = time.time()
+    while not condition() and time.time() < started+timeout: time.sleep(0.01)
+    return condition()
@@ -3,6 +3,9 @@ import unittest
 import time
 import RNS
 import os
+import tempfile
+import threading
+from RNS.vendor import umsgpack
 
 signed_message = "e51a008b8b8ba855993d8892a40daad84a6fb69a7138e1b5f69b427fe03449826ab6ccb81f0d72b4725e8d55c814d3e8e151b495cf5b59702f197ec366d935ad04a98ca519d6964f96ea09910b020351d1cdff3befbad323a2a28a6ec7ced4d0d67f02c525f93b321d9b076d704408475bd2d123cd51916f7e49039246ac56add37ef87e32d7f9853ac44a7f77d26fedc83e4e67a45742b751c2599309f5eda6efa0dafd957f61af1f0e86c4d6c5052e0e5fa577db99846f2b7a0204c31cef4013ca51cb307506c9209fd18d0195a7c9ae628af1a1d9ee7a4cf30037ed190a9fdcaa4ce5bb7bea19803cb5b5cea8c21fdb98d8f73ff5aaad87f5f6c3b7bcfe8974e5b063cc1113d77b9e96bec1c9d10ed37b780c3f7349a34092bb3968daeced40eb0b5130c0d11595e30b9671896385d04289d067f671599386536eed8430a72e186fb95023d5ac5dd442443bfabfe13a84a38d060af73bf20f921f38a768672fdbcb1dfece7458166e2e15948d6b4fa81f42db48747d283c670f576a0b410b31a70d2594823d0e29135a488cb0408c9e5bc1e197ff99aef471924231ccc8e3eddc82dbcea4801f14c5fc7a389a26a52cc93cfe0770953ef595ff410b7033a6ed5c975dd922b3f48f9dffcfb412eeed5758f3aa51de7eb47cd2cb"
 sig_from_key_0 = "3020ef58f861591826a61c3d2d4a25b949cdb3094085ba6b1177a6f2a05f3cdd24d1095d6fdd078f0b2826e80b261c93c1ff97fbfd4857f25706d57dd073590c"
@@ -247,6 +250,309 @@ class TestIdentity(unittest.TestCase):
         print("    Max deviation from median: "+str(round(d_mpct, 1))+"%")
         print()
 
+    def test_3_known_destinations_store(self):
+        saved = (RNS.Reticulum.storagepath, RNS.Identity.known_destinations, RNS.Identity.known_destinations_store, RNS.Identity.known_destinations_changed)
+        with tempfile.TemporaryDirectory() as storagepath:
+            try:
+                RNS.Reticulum.storagepath = storagepath
+                RNS.Identity.known_destinations_store = None
+
+                # Destinations in the previous file format are
+                # imported when the store is first opened
+                legacy = {}
+                for i in range(64):
+                    legacy[os.urandom(16)] = [time.time(), os.urandom(32), os.urandom(64), os.urandom(32)]
+                legacy[os.urandom(8)] = [time.time(), os.urandom(32), os.urandom(64), None]
+                with open(storagepath+"/known_destinations", "wb") as file:
+                    umsgpack.dump(legacy, file)
+
+                RNS.Identity.load_known_destinations()
+                self.assertNotEqual(RNS.Identity.known_destinations_store, None)
+                self.assertEqual(len(RNS.Identity.known_destinations), 64)
+
+                # App data is only read from the store when used
+                destination_hash = list(legacy.keys())[0]
+                entry = RNS.Identity.known_destinations[destination_hash]
+                self.assertNotEqual(entry.store, None)
+                self.assertEqual(entry[2], legacy[destination_hash][2])
+                self.assertNotEqual(entry.store, None)
+                self.assertEqual(RNS.Identity.recall_app_data(destination_hash), legacy[destination_hash][3])
+                self.assertEqual(entry.store, None)
+                self.assertEqual(list(RNS.Identity.known_destinations[list(legacy.keys())[1]]), legacy[list(legacy.keys())[1]])
+
+                # Only changed entries are written on save
+                identity = RNS.Identity()
+                new_hash = os.urandom(16)
+                RNS.Identity.remember(os.urandom(32), new_hash, identity.get_public_key(), b"new")
+                RNS.Identity.remember(os.urandom(32), destination_hash, legacy[destination_hash][2], b"updated")
+                written = []
+                store_write = RNS.Identity.known_destinations_store.write
+                RNS.Identity.known_destinations_store.write = lambda entries: written.append(set(entries)) or store_write(entries)
+                RNS.Identity.save_known_destinations()
+                self.assertEqual(written, [set([new_hash, destination_hash])])
+                self.assertEqual(len(RNS.Identity.known_destinations_changed), 0)
+
+                # Changes are kept for the next save if writing fails
+                RNS.Identity.remember(os.urandom(32), new_hash, identity.get_public_key(), b"failed")
+                RNS.Identity.known_destinations_store.write = None
+                RNS.Identity.save_known_destinations()
+                self.assertEqual(RNS.Identity.known_destinations_changed, set([new_hash]))
+                RNS.Identity.known_destinations_store.write = store_write
+                RNS.Identity.save_known_destinations()
+
+                RNS.Identity.known_destinations = {}
+                RNS.Identity.load_known_destinations()
+                self.assertEqual(len(RNS.Identity.known_destinations), 65)
+                self.assertEqual(RNS.Identity.recall_app_data(new_hash), b"failed")
+                self.assertEqual(RNS.Identity.recall_app_data(destination_hash), b"updated")
+                self.assertEqual(RNS.Identity.recall(new_hash).hash, identity.hash)
+
+                # Destinations remembered while a save is in
+                # progress are written by that or the next save
+                remembered = [os.urandom(16) for i in range(500)]
+                def remember_all():
+                    for remembered_hash in remembered: RNS.Identity.remember(os.urandom(32), remembered_hash, identity.get_public_key(), None)
+                remember_thread = threading.Thread(target=remember_all, daemon=True)
+                remember_thread.start()
+                while remember_thread.is_alive(): RNS.Identity.save_known_destinations()
+                RNS.Identity.save_known_destinations()
+
+                RNS.Identity.known_destinations = {}
+                RNS.Identity.load_known_destinations()
+                self.assertTrue(all(remembered_hash in RNS.Identity.known_destinations for remembered_hash in remembered))
+                RNS.Identity.known_destinations_store.close()
+
+            finally:
+                RNS.Reticulum.storagepath, RNS.Identity.known_destinations, RNS.Identity.known_destinations_store, RNS.Identity.known_destinations_changed = saved
+
+    def test_4_known_destinations_load(self):
+        print("")
+        with tempfile.TemporaryDirectory() as storagepath:
+            for count in [10_000, 100_000, 1_000_000]:
+                known_destinations = {}
+                for i in range(count):
+                    known_destinations[os.urandom(16)] = [time.time(), os.urandom(32), os.urandom(64), os.urandom(48)]
+
+                store_path = storagepath+"/"+str(count)+".db"
+                store = RNS.DestinationStore.DestinationStore(store_path)
+                store.write(known_destinations)
+                store.close()
+
+                started = time.time()
+                store = RNS.DestinationStore.DestinationStore(store_path)
+                loaded = store.load()
+                store_time = time.time()-started
+                self.assertEqual(len(loaded), count)
+                store.close()
+
+                # Loading the whole table with umsgpack becomes very
+                # slow for large tables, so it is only compared for
+                # the smaller sizes.
+                if count <= 100_000:
+                    legacy_path = storagepath+"/"+str(count)
+                    with open(legacy_path, "wb") as file: umsgpack.dump(known_destinations, file)
+                    started = time.time()
+                    with open(legacy_path, "rb") as file: umsgpack.load(file)
+                    legacy_str = ", umsgpack file: "+str(round(time.time()-started, 3))+"s"
+                else:
+                    legacy_str = ""
+
+                print("Cold-start load of "+str(count)+" known destinations from store: "+str(round(store_time, 3))+"s"+legacy_str)
+
+    def test_5_recall_from_identity_hash(self):
+        saved = (RNS.Identity.known_destinations, RNS.Identity.known_identities)
+        try:
+            count = 100_000
+            RNS.Identity.known_destinations = {}
+            RNS.Identity.known_identities = None
+            for i in range(count):
+                RNS.Identity.known_destinations[os.urandom(16)] = [time.time(), os.urandom(32), os.urandom(64), None]
+
+            # The index is built on the first lookup
+            id1 = RNS.Identity()
+            id2 = RNS.Identity()
+            id1_hashes = [os.urandom(16), os.urandom(16)]
+            RNS.Identity.remember(os.urandom(32), id1_hashes[0], id1.get_public_key(), b"first")
+            self.assertEqual(RNS.Identity.known_identities, None)
+
+            started = time.time()
+            recalled = RNS.Identity.recall(id1.hash, from_identity_hash=True)
+            first_time = time.time()-started
+            self.assertNotEqual(RNS.Identity.known_identities, None)
+            self.assertEqual(recalled.hash, id1.hash)
+            self.assertEqual(recalled.app_data, b"first")
+            self.assertEqual(RNS.Identity.recall(id2.hash, from_identity_hash=True), None)
+
+            # And kept up to date by remember
+            RNS.Identity.remember(os.urandom(32), id1_hashes[1], id1.get_public_key(), b"second")
+            RNS.Identity.remember(os.urandom(32), os.urandom(16), id2.get_public_key())
+            self.assertEqual(RNS.Identity.known_identities[id1.hash], id1_hashes)
+            self.assertEqual(RNS.Identity.recall(id2.hash, from_identity_hash=True).hash, id2.hash)
+
+            RNS.Identity.remember(os.urandom(32), id1_hashes[0], id2.get_public_key())
+            self.assertEqual(RNS.Identity.known_identities[id1.hash], id1_hashes[1:])
+            self.assertEqual(RNS.Identity.recall(id1.hash, from_identity_hash=True).app_data, b"second")
+
+            started = time.time()
+            for i in range(1000): RNS.Identity.recall(id1.hash, from_identity_hash=True)
+            indexed_time = (time.time()-started)/1000
+
+            RNS.Identity.known_destinations.pop(id1_hashes[1])
+            self.assertEqual(RNS.Identity.recall(id1.hash, from_identity_hash=True), None)
+
+            print("")
+            print("Recall from identity hash with "+str(count)+" known destinations takes "+str(round(first_time*1000, 1))+"ms when building the index, "+str(round(indexed_time*1e6, 1))+"µs when indexed")
+
+        finally:
+            RNS.Identity.known_destinations, RNS.Identity.known_identities = saved
+
+    def test_6_recall_cache(self):
+        saved = (RNS.Identity.known_destinations, RNS.Identity.known_identities)
+        try:
+            RNS.Identity.known_destinations = {}
+            RNS.Identity.known_identities = None
+            RNS.Identity.recall_cache.clear()
+
+            id1 = RNS.Identity()
+            id2 = RNS.Identity()
+            destination_hash = os.urandom(16)
+            RNS.Identity.remember(os.urandom(32), destination_hash, id1.get_public_key(), b"first")
+
+            recalled = RNS.Identity.recall(destination_hash)
+            self.assertEqual(recalled.hash, id1.hash)
+            self.assertTrue(destination_hash in RNS.Identity.recall_cache)
+
+            # Each recall gets its own instance, with current app data
+            RNS.Identity.remember(os.urandom(32), destination_hash, id1.get_public_key(), b"second")
+            again = RNS.Identity.recall(destination_hash)
+            self.assertFalse(again is recalled)
+            self.assertEqual(recalled.app_data, b"first")
+            self.assertEqual(again.app_data, b"second")
+            self.assertTrue(again.validate(id1.sign(b"message"), b"message"))
+
+            # Replacing the key invalidates the cached identity
+            RNS.Identity.remember(os.urandom(32), destination_hash, id2.get_public_key(), None)
+            self.assertFalse(destination_hash in RNS.Identity.recall_cache)
+            self.assertEqual(RNS.Identity.recall(destination_hash).hash, id2.hash)
+
+            cache_size = RNS.Identity.RECALL_CACHE_SIZE
+            try:
+                RNS.Identity.RECALL_CACHE_SIZE = 8
+                for i in range(16):
+                    RNS.Identity.remember(os.urandom(32), os.urandom(16), RNS.Identity().get_public_key())
+                for destination_hash in RNS.Identity.known_destinations: RNS.Identity.recall(destination_hash)
+                self.assertEqual(len(RNS.Identity.recall_cache), 8)
+            finally:
+                RNS.Identity.RECALL_CACHE_SIZE = cache_size
+
+            rounds = 1000
+            started = time.time()
+            for i in range(rounds):
+                RNS.Identity.recall_cache.clear()
+                RNS.Identity.recall(destination_hash)
+            uncached_time = (time.time()-started)/rounds
+
+            started = time.time()
+            for i in range(rounds): RNS.Identity.recall(destination_hash)
+            cached_time = (time.time()-started)/rounds
+
+            print("")
+            print("Identity recall takes "+str(round(uncached_time*1e6, 1))+"µs uncached, "+str(round(cached_time*1e6, 1))+"µs cached")
+
+        finally:
+            RNS.Identity.known_destinations, RNS.Identity.known_identities = saved
+            RNS.Identity.recall_cache.clear()
+
+    def test_7_ratchet_store(self):
+        saved = (RNS.Reticulum.storagepath, RNS.Identity.ratchet_store, RNS.Identity.known_ratchets)
+        with tempfile.TemporaryDirectory() as storagepath:
+            try:
+                RNS.Reticulum.storagepath = storagepath
+                RNS.Identity.ratchet_store = None
+                RNS.Identity.known_ratchets = {}
+                RNS.Identity.ratchet_negative_cache.clear()
+
+                # Stores must implement reading, writing and cleaning
+                class PartialStore(RNS.RatchetStore.RatchetStore):
+                    def read(self, destination_hash): return None
+                self.assertRaises(TypeError, PartialStore)
+
+                # Ratchets in the previous file format are
+                # imported when the store is first opened
+                legacy = {}
+                os.makedirs(storagepath+"/ratchets")
+                for i in range(16):
+                    destination_hash = os.urandom(16)
+                    legacy[destination_hash] = RNS.Identity._generate_ratchet()
+                    with open(storagepath+"/ratchets/"+RNS.hexrep(destination_hash, delimit=False), "wb") as file:
+                        file.write(umsgpack.packb({"ratchet": legacy[destination_hash], "received": time.time()}))
+
+                store = RNS.Identity._get_ratchet_store()
+                self.assertEqual(len(os.listdir(storagepath+"/ratchets")), 0)
+                for destination_hash in legacy:
+                    self.assertEqual(RNS.Identity.get_ratchet(destination_hash), legacy[destination_hash])
+
+                # Repeated updates are coalesced and written
+                # together, and can be read before writing
+                destination_hash = os.urandom(16)
+                ratchets = [RNS.Identity._generate_ratchet() for i in range(8)]
+                for ratchet in ratchets: store.persist(destination_hash, ratchet, time.time())
+                for i in range(64): store.persist(os.urandom(16), os.urandom(32), time.time())
+                self.assertEqual(store.get(destination_hash)[0], ratchets[-1])
+                store.flush()
+                stats = store.get_stats()
+                self.assertEqual(stats["queued"], 72)
+                self.assertEqual(stats["written"], 65)
+                self.assertEqual(stats["batches"], 1)
+                self.assertEqual(stats["pending"], 0)
+                self.assertEqual(store.read(destination_hash)[0], ratchets[-1])
+
+                # Queued ratchets are written by the background writer
+                background_hash = os.urandom(16)
+                store.persist(background_hash, ratchets[0], time.time())
+                timeout = time.time()+RNS.RatchetStore.RatchetStore.WRITE_DELAY*10
+                while store.read(background_hash) == None and time.time() < timeout: time.sleep(0.05)
+                self.assertEqual(store.read(background_hash)[0], ratchets[0])
+
+                # Storage is only probed once for unknown destinations
+                reads = []
+                store_read = store.read
+                store.read = lambda destination_hash: reads.append(destination_hash) or store_read(destination_hash)
+                unknown_hash = os.urandom(16)
+                self.assertEqual(RNS.Identity.get_ratchet(unknown_hash), None)
+                self.assertEqual(RNS.Identity.get_ratchet(unknown_hash), None)
+                self.assertEqual(reads, [unknown_hash])
+
+                # Expired ratchets are not used, and are cleaned
+                expired_hash = os.urandom(16)
+                store.persist(expired_hash, ratchets[1], time.time()-RNS.Identity.RATCHET_EXPIRY-1)
+                self.assertEqual(RNS.Identity.get_ratchet(expired_hash), None)
+                store.flush()
+                self.assertEqual(store.clean(RNS.Identity.RATCHET_EXPIRY), 1)
+                self.assertEqual(store_read(expired_hash), None)
+                store.read = store_read
+
+                count = 10_000
+                entries = {}
+                for i in range(count): entries[os.urandom(16)] = (os.urandom(32), time.time())
+                started = time.time()
+                for destination_hash in entries: store.persist(destination_hash, entries[destination_hash][0], entries[destination_hash][1])
+                store.flush()
+                store_time = time.time()-started
+
+                file_store = RNS.RatchetStore.FileRatchetStore(storagepath+"/files")
+                started = time.time()
+                file_store.write(entries)
+                file_time = time.time()-started
+
+                print("")
+                print("Persisting "+str(count)+" ratchets takes "+str(round(store_time*1000, 1))+"ms batched in SQLite, "+str(round(file_time*1000, 1))+"ms as individual files")
+                store.close()
+
+            finally:
+                RNS.Reticulum.storagepath, RNS.Identity.ratchet_store, RNS.Identity.known_ratchets = saved
+                RNS.Identity.ratchet_negative_cache.clear()
+
     def size_str(self, num, suffix='B'):
         units = ['','K','M','G','T','P','E','Z']
         last_unit = 'Y'
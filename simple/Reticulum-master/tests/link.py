@@ -793,6 +793,43 @@ class TestLink(unittest.TestCase):
     def test_13_buffer_round_trip_big_slow(self):
         self.test_12_buffer_round_trip_big(local_bitrate=410)
 
+    @skipIf(os.getenv('SKIP_NORMAL_TESTS') != None, "Skipping")
+    def test_14_async_runtime_watchdogs(self):
+        init_rns(self)
+        print("")
+        print("Async runtime watchdog test")
+
+        id1 = RNS.Identity.from_bytes(bytes.fromhex(fixed_keys[0][0]))
+        dest = RNS.Destination(id1, RNS.Destination.OUT, RNS.Destination.SINGLE, APP_NAME, "link", "establish")
+
+        enabled = RNS.AsyncRuntime.enabled
+        try:
+            RNS.AsyncRuntime.enabled = True
+            RNS.AsyncRuntime.call(lambda: None)
+            threads = threading.active_count()
+            links = [RNS.Link(dest) for i in range(16)]
+            started = time.time()
+            while any([link.status != RNS.Link.ACTIVE for link in links]) and time.time() < started+30: time.sleep(0.05)
+            for link in links: self.assertEqual(link.status, RNS.Link.ACTIVE)
+
+            # Link watchdogs run as timers on the
+            # runtime, not in threads of their own
+            print(f"Established {len(links)} links with {threading.active_count()-threads} additional threads")
+            self.assertLess(threading.active_count(), threads+len(links))
+            self.assertGreaterEqual(RNS.AsyncRuntime.get_stats()["timers"], len(links))
+
+            data = os.urandom(128*1000)
+            resource = RNS.Resource(data, links[0], timeout=120)
+            while resource.status < RNS.Resource.COMPLETE: time.sleep(0.01)
+            self.assertEqual(resource.status, RNS.Resource.COMPLETE)
+
+            for link in links: link.teardown()
+            time.sleep(0.5)
+            for link in links: self.assertEqual(link.status, RNS.Link.CLOSED)
+
+        finally:
+            RNS.AsyncRuntime.enabled = enabled
+
     def size_str(self, num, suffix='B'):
         units = ['','K','M','G','T','P','E','Z']
         last_unit = 'Y'
@@ -0,0 +1,368 @@
+import unittest
+
+import os
+import time
+import math
+import struct
+import tempfile
+import threading
+import tracemalloc
+import RNS
+from RNS.Cryptography.Token import Token
+from RNS.vendor import umsgpack
+
+class BenchmarkLink():
+    # Just enough of a link to build outgoing resources, with
+    # encryption left out, so only resource preparation is timed
+    def __init__(self):
+        self.type    = RNS.Destination.LINK
+        self.hash    = os.urandom(RNS.Reticulum.TRUNCATED_HASHLENGTH//8)
+        self.link_id = self.hash
+        self.mtu     = RNS.Reticulum.MTU
+        self.mdu     = RNS.Link.MDU
+        self.rtt     = 0.05
+        self.traffic_timeout_factor = 6
+
+    def encrypt(self, plaintext):
+        return plaintext
+
+class AcceptingLink(BenchmarkLink):
+    # A link that receives resource advertisements, either
+    # already transferring the advertised resource, or
+    # failing to register it
+    def __init__(self, transferring):
+        super().__init__()
+        self.transferring = transferring
+
+    def get_last_resource_window(self): return None
+    def get_last_resource_eifr(self): return None
+    def has_incoming_resource(self, resource): return self.transferring
+    def register_incoming_resource(self, resource): raise OSError("Registration failed")
+
+class AdvertisementPacket():
+    def __init__(self, resource, link):
+        self.plaintext = RNS.ResourceAdvertisement(resource).pack()
+        self.link      = link
+
+class SentPart():
+    def __init__(self, wire, index, data):
+        self.wire  = wire
+        self.index = index
+        self.data  = data
+        self.raw   = data
+        self.sent  = False
+
+    def send(self):
+        self.sent = True
+        self.wire.append(self)
+
+    def resend(self):
+        self.wire.append(self)
+
+def receiving_resource(resource, window):
+    # Builds the receiving end of an outgoing resource,
+    # with its entire hashmap received, that does not
+    # send requests or assemble the data by itself
+    receiver = RNS.Resource.__new__(RNS.Resource)
+    receiver.link                  = resource.link
+    receiver.status                = RNS.Resource.TRANSFERRING
+    receiver.random_hash           = resource.random_hash
+    receiver.total_parts           = resource.total_parts
+    receiver.parts                 = [None]*receiver.total_parts
+    receiver.received_bitmap       = bytearray(receiver.total_parts)
+    receiver.hashmap               = [None]*receiver.total_parts
+    receiver.hashmap_index         = {}
+    receiver.hashmap_height        = 0
+    receiver.consecutive_completed_height = -1
+    receiver.receive_lock          = threading.Lock()
+    receiver.receiving_part        = False
+    receiver.assembly_lock         = False
+    receiver.spool                 = None
+    receiver.max_retries           = RNS.Resource.MAX_RETRIES
+    receiver.req_resp              = 0
+    receiver.req_sent              = 0
+    receiver.rtt_rxd_bytes         = 0
+    receiver.received_count        = 0
+    receiver.outstanding_parts     = 0
+    receiver.window                = window
+    receiver.window_max            = window
+    receiver.window_min            = window
+    receiver.window_flexibility    = RNS.Resource.WINDOW_FLEXIBILITY
+    receiver._Resource__progress_callback = None
+    receiver.wide_hmu              = True
+    receiver.hmu_target            = None
+    receiver.congestion            = RNS.CongestionControl.create(receiver, RNS.Resource.WINDOW_MAX)
+    receiver.requests              = 0
+    receiver.assembled             = False
+    receiver.request_next          = lambda: setattr(receiver, "requests", receiver.requests+1)
+    receiver.assemble              = lambda: setattr(receiver, "assembled", True)
+
+    segment_length = RNS.ResourceAdvertisement.HASHMAP_MAX_LEN*RNS.Resource.MAPHASH_LEN
+    for segment in range(0, int(math.ceil(len(resource.hashmap)/segment_length))):
+        receiver.hashmap_update(segment, resource.hashmap[segment*segment_length:(segment+1)*segment_length])
+
+    return receiver
+
+class TestLink():
+    def __init__(self):
+        self.token = Token(Token.generate_key())
+
+    def decrypt_stream(self, ciphertext, chunk_size=None):
+        return self.token.decrypt_stream(ciphertext, chunk_size)
+
+    def resource_concluded(self, resource):
+        pass
+
+def spooled_resource(data, metadata=None, encrypted=True, compressed=True, corrupt=False, codec=RNS.Compression.BZ2):
+    # Builds a receiving resource with its segment spooled to
+    # disk, as it would be once all parts have been received
+    storage_dir = tempfile.mkdtemp()
+    link = TestLink()
+    if metadata != None:
+        packed_metadata = umsgpack.packb(metadata)
+        data = struct.pack(">I", len(packed_metadata))[1:]+packed_metadata+data
+
+    random_hash = os.urandom(RNS.Resource.RANDOM_HASH_SIZE)
+    stream = random_hash+(RNS.Compression.compress(data, codec) if compressed else data)
+    if encrypted: stream = link.token.encrypt(stream)
+    if corrupt: stream = stream[:len(stream)//2]+bytes([stream[len(stream)//2]^0xFF])+stream[len(stream)//2+1:]
+
+    resource = RNS.Resource.__new__(RNS.Resource)
+    resource.link             = link
+    resource.status           = RNS.Resource.TRANSFERRING
+    resource.encrypted        = encrypted
+    resource.compressed       = compressed
+    resource.codec            = codec
+    resource.random_hash      = random_hash
+    resource.hash             = RNS.Identity.full_hash(data+random_hash)
+    resource.has_metadata     = metadata != None
+    resource.segment_index    = 1
+    resource.total_segments   = 2
+    resource.storagepath      = storage_dir+"/resource"
+    resource.meta_storagepath = resource.storagepath+".meta"
+    resource.proof            = None
+    resource.callback         = None
+    resource.proven           = False
+    resource.prove            = lambda: setattr(resource, "proven", True)
+    resource.spool            = tempfile.TemporaryFile()
+    resource.spool.write(stream)
+    return resource, data
+
+class TestResource(unittest.TestCase):
+    def setUp(self):
+        print("")
+
+    def test_0_spooled_assembly(self):
+        payload  = os.urandom(32*1024)+bytes(32*1024)
+        metadata = {"text": "Some text", "blob": os.urandom(4096)}
+        for encrypted, compressed, codec in [[True, True, RNS.Compression.BZ2], [True, False, None], [False, True, RNS.Compression.BZ2],
+                                             [True, True, RNS.Compression.ZLIB], [True, True, RNS.Compression.LZMA]]:
+            resource, data = spooled_resource(payload, metadata, encrypted=encrypted, compressed=compressed, codec=codec)
+            with open(resource.storagepath, "wb") as file: file.write(b"previous segment")
+
+            resource.assemble()
+            self.assertEqual(resource.status, RNS.Resource.COMPLETE)
+            self.assertTrue(resource.proven)
+            self.assertEqual(resource.proof, RNS.Identity.full_hash(data+resource.hash))
+            self.assertEqual(resource.spool, None)
+            with open(resource.storagepath, "rb") as file: self.assertEqual(file.read(), b"previous segment"+payload)
+            with open(resource.meta_storagepath, "rb") as file: self.assertEqual(umsgpack.unpackb(file.read()), metadata)
+
+        # Corrupted segments are not appended to the storage file
+        for encrypted in [True, False]:
+            resource, data = spooled_resource(payload, encrypted=encrypted, corrupt=True)
+            with open(resource.storagepath, "wb") as file: file.write(b"previous segment")
+            resource.assemble()
+            self.assertEqual(resource.status, RNS.Resource.CORRUPT)
+            self.assertFalse(resource.proven)
+            with open(resource.storagepath, "rb") as file: self.assertEqual(file.read(), b"previous segment")
+
+    def test_1_spooled_assembly_memory(self):
+        # Assembling a large segment should only need memory
+        # for a few chunks, not for the entire segment
+        payload = (os.urandom(64*1024).hex().encode("utf-8"))*128
+        resource, data = spooled_resource(payload, encrypted=False, compressed=True)
+        del data
+
+        tracemalloc.start()
+        started = time.time()
+        resource.assemble()
+        elapsed = time.time()-started
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        self.assertEqual(resource.status, RNS.Resource.COMPLETE)
+        self.assertEqual(os.path.getsize(resource.storagepath), len(payload))
+        print(f"Assembled {RNS.prettysize(len(payload))} segment in {RNS.prettyshorttime(elapsed)} with a peak of {RNS.prettysize(peak)} allocated")
+        self.assertLess(peak, 8*RNS.Resource.STREAM_CHUNK_SIZE)
+
+    def test_1a_spool_on_accept(self):
+        # Advertisements that are not accepted must not
+        # leave spool files for the advertised size open
+        resource   = RNS.Resource(os.urandom(2*RNS.Resource.SPOOL_MIN_SIZE), BenchmarkLink(), advertise=False, auto_compress=False)
+        opened     = []
+        open_spool = tempfile.TemporaryFile
+        def tracked_spool(*args, **kwargs):
+            spool = open_spool()
+            opened.append(spool)
+            return spool
+
+        resourcepath = getattr(RNS.Reticulum, "resourcepath", None)
+        try:
+            tempfile.TemporaryFile = tracked_spool
+            RNS.Reticulum.resourcepath = tempfile.gettempdir()
+            for transferring, spools in [[True, 0], [False, 1]]:
+                opened.clear()
+                self.assertEqual(RNS.Resource.accept(AdvertisementPacket(resource, AcceptingLink(transferring))), None)
+                self.assertEqual(len(opened), spools)
+                self.assertTrue(all(spool.closed for spool in opened))
+        finally:
+            tempfile.TemporaryFile = open_spool
+            if resourcepath == None: del RNS.Reticulum.resourcepath
+            else: RNS.Reticulum.resourcepath = resourcepath
+
+    def test_2_outgoing_hashmap(self):
+        link = BenchmarkLink()
+        data = os.urandom(RNS.Resource.MAX_EFFICIENT_SIZE)
+        resource = RNS.Resource(data, link, advertise=False, auto_compress=False)
+        self.assertEqual(len(resource.hashmap), resource.total_parts*RNS.Resource.MAPHASH_LEN)
+
+        # Part packets are only built once requested
+        self.assertEqual(resource.parts, [None]*resource.total_parts)
+        for index in [0, resource.total_parts//2, resource.total_parts-1]:
+            part = resource.get_part(index)
+            self.assertEqual(part.data, resource.data[index*resource.sdu:(index+1)*resource.sdu])
+            self.assertEqual(part.map_hash, resource.get_map_hash(part.data))
+            self.assertEqual(resource.get_part(index), part)
+        self.assertEqual(len([part for part in resource.parts if part != None]), 3)
+
+        # The hashmap holds the map hash of every part
+        for index in [0, resource.total_parts-1]:
+            part_data = resource.data[index*resource.sdu:(index+1)*resource.sdu]
+            self.assertEqual(resource.hashmap[index*RNS.Resource.MAPHASH_LEN:(index+1)*RNS.Resource.MAPHASH_LEN], resource.get_map_hash(part_data))
+
+        # Colliding map hashes within the guard distance cause
+        # a remap, but more distant ones are allowed
+        compute_hashmap = RNS.Resource.compute_hashmap
+        guard = RNS.ResourceAdvertisement.COLLISION_GUARD_SIZE
+        for distance, remaps in [[guard, 1], [guard+1, 0]]:
+            calls = []
+            def colliding_hashmap(data, sdu, random_hash):
+                hashmap = bytearray(compute_hashmap(data, sdu, random_hash))
+                if len(calls) == 0: hashmap[distance*RNS.Resource.MAPHASH_LEN:(distance+1)*RNS.Resource.MAPHASH_LEN] = hashmap[:RNS.Resource.MAPHASH_LEN]
+                calls.append(random_hash)
+                return bytes(hashmap)
+
+            try:
+                RNS.Resource.compute_hashmap = staticmethod(colliding_hashmap)
+                resource = RNS.Resource(data, link, advertise=False, auto_compress=False)
+                self.assertEqual(len(calls), 1+remaps)
+                self.assertEqual(resource.random_hash, calls[-1])
+            finally:
+                RNS.Resource.compute_hashmap = staticmethod(compute_hashmap)
+
+    def test_2a_compression_codec(self):
+        link    = BenchmarkLink()
+        payload = os.urandom(64*1024).hex().encode("utf-8")
+        codec   = RNS.Compression.codec
+        try:
+            for sent_codec in RNS.Compression.CODECS:
+                RNS.Compression.codec = sent_codec
+                resource = RNS.Resource(payload, link, advertise=False)
+                self.assertTrue(resource.compressed)
+                self.assertEqual(resource.codec, sent_codec)
+
+                # The codec is carried in the advertisement flags
+                adv = RNS.ResourceAdvertisement.unpack(RNS.ResourceAdvertisement(resource).pack())
+                self.assertTrue(adv.is_compressed())
+                self.assertEqual(adv.get_codec(), sent_codec)
+                self.assertEqual(RNS.Compression.decompress(resource.data[RNS.Resource.RANDOM_HASH_SIZE:], adv.get_codec()), payload)
+
+            # Incompressible data is detected by the probe
+            # and sent without being compressed in full
+            resource = RNS.Resource(os.urandom(512*1024), link, advertise=False)
+            self.assertFalse(resource.compressed)
+            self.assertEqual(RNS.ResourceAdvertisement.unpack(RNS.ResourceAdvertisement(resource).pack()).get_codec(), RNS.Compression.BZ2)
+
+        finally:
+            RNS.Compression.codec = codec
+
+    def test_2b_part_lookup(self):
+        # Transfers the parts of a resource with a large window,
+        # dropping some parts in transit, to exercise the part
+        # indexes and received parts map on both ends
+        resource = RNS.Resource(os.urandom(RNS.Resource.MAX_EFFICIENT_SIZE), BenchmarkLink(), advertise=False, auto_compress=False)
+        resource.status   = RNS.Resource.TRANSFERRING
+        resource.adv_sent = time.time()
+        wire = []; sent_parts = {}
+        def get_part(index):
+            if not index in sent_parts: sent_parts[index] = SentPart(wire, index, resource.data[index*resource.sdu:(index+1)*resource.sdu])
+            return sent_parts[index]
+        resource.get_part = get_part
+
+        window   = 300
+        receiver = receiving_resource(resource, window)
+        self.assertEqual(receiver.hashmap_height, resource.total_parts)
+
+        rounds = 0; received = 0; receive_time = 0
+        while receiver.received_count < receiver.total_parts:
+            rounds += 1
+            self.assertLess(rounds, 32)
+
+            # Request the missing parts in the window, like
+            # the receiver does, and let the sender look
+            # them up from the requested map hashes
+            search_start = receiver.consecutive_completed_height+1
+            missing      = [i for i in range(search_start, min(search_start+window, receiver.total_parts)) if not receiver.received_bitmap[i]]
+            self.assertLessEqual(missing[-1]-resource.receiver_min_consecutive_height, RNS.ResourceAdvertisement.COLLISION_GUARD_SIZE)
+            request_data = bytes([RNS.Resource.HASHMAP_IS_NOT_EXHAUSTED])+resource.hash+b"".join(receiver.hashmap[i] for i in missing)
+            resource.request(request_data)
+            self.assertEqual([part.index for part in wire], missing)
+
+            # Parts arrive in reverse order, and every
+            # fifth part in the first round is lost
+            for part in reversed(wire):
+                if rounds == 1 and part.index % 5 == 0: continue
+                started = time.time()
+                receiver.receive_part(part)
+                receive_time += time.time()-started
+                received += 1
+            wire.clear()
+
+            # Slide the sender search window along as
+            # hashmap updates would
+            resource.receiver_min_consecutive_height = max(receiver.consecutive_completed_height-RNS.Resource.WINDOW_MAX, 0)
+
+        self.assertTrue(receiver.assembled)
+        self.assertEqual(receiver.consecutive_completed_height, receiver.total_parts-1)
+        self.assertEqual(receiver.received_bitmap, bytearray([1])*receiver.total_parts)
+        self.assertEqual(b"".join(receiver.parts), resource.data)
+        print(f"Received {resource.total_parts} parts in {rounds} rounds with a window of {window}, {RNS.prettyshorttime(receive_time/received)} per part")
+
+        # Duplicate parts and parts with unknown map hashes
+        # are ignored
+        receiver.receive_part(sent_parts[0])
+        receiver.receive_part(SentPart(wire, 0, os.urandom(resource.sdu)))
+        self.assertEqual(receiver.received_count, receiver.total_parts)
+
+        # The sender only finds parts within the search range
+        map_hash = resource.hashmap[:RNS.Resource.MAPHASH_LEN]
+        self.assertEqual(resource.find_parts(map_hash, 0, 1), [0])
+        self.assertEqual(resource.find_parts(map_hash, 1, resource.total_parts), [])
+        self.assertEqual(resource.find_parts(os.urandom(RNS.Resource.MAPHASH_LEN), 0, resource.total_parts), [])
+
+    def test_3_time_to_advertisement(self):
+        # Time from creating a resource from a large file until
+        # its first segment is ready to be advertised
+        with tempfile.NamedTemporaryFile() as file:
+            file.write(os.urandom(64*1024*1024))
+            file.flush()
+            for i in range(3):
+                started = time.time()
+                resource = RNS.Resource(open(file.name, "rb"), BenchmarkLink(), advertise=False, auto_compress=False)
+                elapsed = time.time()-started
+                resource.input_file.close()
+                print(f"First of {resource.total_segments} segments ready for advertisement after {RNS.prettyshorttime(elapsed)}, {resource.total_parts} parts")
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,78 @@
+import unittest
+
+import time
+import threading
+import RNS
+from RNS.Scheduler import Scheduler
+from .helpers import wait_for
+
+class TestScheduler(unittest.TestCase):
+    def setUp(self):
+        print("")
+
+    def test_0_ordering(self):
+        fired = []
+        started = time.monotonic()
+        for delay in [0.3, 0.1, 0.2, 0.1]: Scheduler.call_later(delay, lambda d=delay: fired.append((d, time.monotonic()-started)))
+        Scheduler.call_soon(lambda: fired.append((0, time.monotonic()-started)))
+        self.assertTrue(wait_for(lambda: len(fired) == 5))
+        self.assertEqual([d for d, t in fired], [0, 0.1, 0.1, 0.2, 0.3])
+        for delay, elapsed in fired: self.assertGreaterEqual(elapsed, delay)
+
+        # Errors in callbacks do not stop the scheduler
+        errors = Scheduler.callback_errors
+        Scheduler.call_soon(lambda: 1/0)
+        Scheduler.call_soon(lambda: fired.append(None))
+        self.assertTrue(wait_for(lambda: len(fired) == 6))
+        self.assertEqual(Scheduler.callback_errors, errors+1)
+
+    def test_1_many_timers(self):
+        # Simulates the watchdogs of many idle links, each
+        # rescheduling itself like a link watchdog does
+        timer_count = 10000
+        interval    = 0.5
+        runs        = [0]*timer_count
+        stop_at     = time.monotonic()+2
+        def watchdog(i):
+            runs[i] += 1
+            if time.monotonic() < stop_at: Scheduler.call_later(interval, watchdog, i)
+
+        threads = threading.active_count()
+        for i in range(timer_count): Scheduler.call_soon(watchdog, i)
+        stats = Scheduler.get_stats()
+        self.assertGreaterEqual(stats["timers"], 1)
+        self.assertLessEqual(threading.active_count(), threads+1)
+
+        self.assertTrue(wait_for(lambda: Scheduler.get_stats()["timers"] == 0))
+        stats = Scheduler.get_stats()
+        self.assertGreaterEqual(min(runs), 3)
+        print(f"Ran {sum(runs)} watchdog timers for {timer_count} links on one thread, lag averaged {RNS.prettyshorttime(stats['avg_lag'])}, max {RNS.prettyshorttime(stats['max_lag'])}")
+
+    def test_2_worker(self):
+        # Callbacks handed to the worker run in order on a
+        # single thread, and blocking in one of them does not
+        # hold up the timers on the scheduler thread
+        called  = []
+        release = threading.Event()
+        Scheduler.call_in_worker(release.wait, 5)
+        for i in range(1000): Scheduler.call_in_worker(called.append, i)
+        self.assertEqual(Scheduler.worker.name, "RNS scheduler worker")
+
+        fired = threading.Event()
+        Scheduler.call_soon(fired.set)
+        self.assertTrue(fired.wait(1))
+        self.assertEqual(called, [])
+
+        release.set()
+        self.assertTrue(wait_for(lambda: len(called) == 1000))
+        self.assertEqual(called, list(range(1000)))
+        self.assertEqual(Scheduler.get_stats()["worker_queued"], 0)
+
+        errors = Scheduler.callback_errors
+        Scheduler.call_in_worker(lambda: 1/0)
+        Scheduler.call_in_worker(called.append, None)
+        self.assertTrue(wait_for(lambda: len(called) == 1001))
+        self.assertEqual(Scheduler.callback_errors, errors+1)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,1080 @@
+import unittest
+
+import os
+import time
+import tempfile
+import types
+import typing
+import threading
+import contextlib
+import tracemalloc
+import concurrent.futures
+import RNS
+from RNS.Interfaces.Interface import Interface
+from RNS.Packet import PacketReceiptCallbacks
+from RNS.Transport import InboundPacket
+from RNS.InboundPipeline import InboundPipeline
+
+# Transport class attributes that are replaced with fresh
+# containers while a harness is active, and restored
+# afterwards, so tests don't disturb (or get disturbed by)
+# any other RNS instance running in the same process.
+HARNESS_TABLES = [
+    "interfaces", "destinations", "pending_links", "active_links",
+    "receipts", "announce_table", "path_table", "reverse_table",
+    "link_table", "held_announces", "announce_handlers", "tunnels",
+    "announce_rate_table", "path_requests", "path_states",
+    "discovery_path_requests", "discovery_pr_tags", "control_destinations",
+    "control_hashes", "local_client_interfaces", "pending_local_path_requests",
+    "packet_hashlist", "packet_hashlist_prev", "destinations_map",
+    "pending_links_map", "active_links_map", "receipt_timeouts",
+]
+
+# The original byte-by-byte IFAC masking from Transport,
+# kept as a reference for the vectorised implementation.
+def legacy_ifac_mask(new_raw, mask, ifac_size):
+    i = 0; masked_raw = b""
+    for byte in new_raw:
+        if i == 0:
+            masked_raw += bytes([byte ^ mask[i] | 0x80])
+        elif i == 1 or i > ifac_size+1:
+            masked_raw += bytes([byte ^ mask[i]])
+        else:
+            masked_raw += bytes([byte])
+        i += 1
+    return masked_raw
+
+def legacy_ifac_unmask(raw, mask, ifac_size):
+    i = 0; unmasked_raw = b""
+    for byte in raw:
+        if i <= 1 or i > ifac_size+1:
+            unmasked_raw += bytes([byte ^ mask[i]])
+        else:
+            unmasked_raw += bytes([byte])
+        i += 1
+    return unmasked_raw
+
+class TestOwner:
+    def __init__(self):
+        self.is_connected_to_shared_instance = False
+
+class TestInterface(Interface):
+    def __init__(self, name):
+        super().__init__()
+        self.name     = name
+        self.IN       = True
+        self.OUT      = True
+        self.online   = True
+        self.bitrate  = 1_000_000_000
+        self.HW_MTU   = 524288
+        self.mode     = Interface.MODE_FULL
+        self.ingress_control = False
+        self.announce_rate_target = None
+        self.ifac_identity = None
+        self.tx_count = 0
+        self.last_tx  = None
+
+    def enable_ifac(self, ifac_key, ifac_size=16):
+        self.ifac_size      = ifac_size
+        self.ifac_key       = ifac_key
+        self.ifac_identity  = RNS.Identity.from_bytes(self.ifac_key)
+        self.ifac_signature = self.ifac_identity.sign(RNS.Identity.full_hash(self.ifac_key))
+
+    def process_outgoing(self, data):
+        self.txb      += len(data)
+        self.tx_count += 1
+        self.last_tx   = data
+
+    def __str__(self):
+        return "TestInterface["+self.name+"]"
+
+class TestLink:
+    def __init__(self, interface, initiator=False):
+        self.link_id            = RNS.Identity.get_random_hash()[:RNS.Reticulum.TRUNCATED_HASHLENGTH//8]
+        self.initiator          = initiator
+        self.attached_interface = interface
+        self.status             = RNS.Link.PENDING if initiator else RNS.Link.ACTIVE
+        self.rx_count           = 0
+
+    def receive(self, packet):
+        self.rx_count += 1
+
+    def __str__(self):
+        return RNS.prettyhexrep(self.link_id)
+
+class TestReceipt(RNS.PacketReceipt):
+    def __init__(self, timeout):
+        self.hash           = RNS.Identity.get_random_hash()
+        self.truncated_hash = self.hash[:RNS.Reticulum.TRUNCATED_HASHLENGTH//8]
+        self.sent_at        = time.time()
+        self.timeout        = timeout
+        self.status         = RNS.PacketReceipt.SENT
+        self.callbacks      = PacketReceiptCallbacks()
+        self.concluded_at   = None
+        self.proof_packet   = None
+
+    # Proofs are accepted without signature validation,
+    # as long as they are delivered to the right receipt
+    def validate_proof_packet(self, proof_packet):
+        if len(proof_packet.data) == RNS.PacketReceipt.EXPL_LENGTH and proof_packet.data[:len(self.hash)] != self.hash:
+            return False
+        self.status = RNS.PacketReceipt.DELIVERED
+        self.proof_packet = proof_packet
+        return True
+
+class TransportHarness(contextlib.AbstractContextManager):
+    def __init__(self, transport_enabled=True, interface_count=2):
+        self.saved = {}
+        for name in HARNESS_TABLES:
+            self.saved[name] = getattr(RNS.Transport, name)
+            setattr(RNS.Transport, name, type(self.saved[name])())
+
+        self.saved_identity  = RNS.Transport.identity
+        self.saved_owner     = getattr(RNS.Transport, "owner", None)
+        self.saved_transport = getattr(RNS.Reticulum, "_Reticulum__transport_enabled", False)
+        self.saved_cleaned   = RNS.Transport.cache_last_cleaned
+
+        RNS.Transport.identity = RNS.Identity()
+        RNS.Transport.owner    = TestOwner()
+        RNS.Reticulum._Reticulum__transport_enabled = transport_enabled
+
+        # There is no storage behind the harness, so
+        # defer packet cache cleaning while it is active
+        RNS.Transport.cache_last_cleaned = time.time()+3600
+
+        self.interfaces = []
+        for i in range(interface_count):
+            interface = TestInterface(str(i))
+            self.interfaces.append(interface)
+            RNS.Transport.interfaces.append(interface)
+
+    def add_paths(self, count, hops=2, interface=None):
+        if interface == None: interface = self.interfaces[-1]
+        destination_hashes = []
+        now = time.time()
+        for i in range(count):
+            destination_hash = RNS.Identity.get_random_hash()[:RNS.Reticulum.TRUNCATED_HASHLENGTH//8]
+            next_hop = RNS.Identity.get_random_hash()[:RNS.Reticulum.TRUNCATED_HASHLENGTH//8]
+            RNS.Transport.path_table[destination_hash] = [now, next_hop, hops, now+RNS.Transport.PATHFINDER_E, [], interface, None]
+            destination_hashes.append(destination_hash)
+
+        return destination_hashes
+
+    def transport_packet(self, destination_hash, payload, hops=1):
+        flags  = (RNS.Packet.HEADER_2 << 6) | (RNS.Transport.TRANSPORT << 4) | (RNS.Destination.SINGLE << 2) | RNS.Packet.DATA
+        header = bytes([flags, hops]) + RNS.Transport.identity.hash + destination_hash + bytes([RNS.Packet.NONE])
+        return header + payload
+
+    def add_links(self, count, initiator=False, interface=None):
+        if interface == None: interface = self.interfaces[0]
+        links = []
+        for i in range(count):
+            link = TestLink(interface, initiator=initiator)
+            RNS.Transport.register_link(link)
+            links.append(link)
+
+        return links
+
+    def link_packet(self, link_id, payload):
+        flags  = (RNS.Packet.HEADER_1 << 6) | (RNS.Transport.BROADCAST << 4) | (RNS.Destination.LINK << 2) | RNS.Packet.DATA
+        header = bytes([flags, 0]) + link_id + bytes([RNS.Packet.NONE])
+        return header + payload
+
+    def add_receipts(self, count, timeout):
+        receipts = []
+        for i in range(count):
+            receipt = TestReceipt(timeout)
+            RNS.Transport.register_receipt(receipt)
+            receipts.append(receipt)
+
+        return receipts
+
+    def proof_packet(self, receipt, explicit=True):
+        flags  = (RNS.Packet.HEADER_1 << 6) | (RNS.Transport.BROADCAST << 4) | (RNS.Destination.SINGLE << 2) | RNS.Packet.PROOF
+        header = bytes([flags, 0]) + receipt.truncated_hash + bytes([RNS.Packet.NONE])
+        if explicit: return header + receipt.hash + os.urandom(RNS.Identity.SIGLENGTH//8)
+        else:        return header + os.urandom(RNS.Identity.SIGLENGTH//8)
+
+    def announce_packets(self, count, app_data=None):
+        announces = []
+        for i in range(count):
+            destination = RNS.Destination(RNS.Identity(), RNS.Destination.IN, RNS.Destination.SINGLE, "unittest", "announce")
+            packet = destination.announce(app_data=app_data, send=False)
+            packet.pack()
+            RNS.Transport.deregister_destination(destination)
+            announces.append(packet.raw)
+
+        return announces
+
+    def received_announce(self, raw, interface=None):
+        if interface == None: interface = self.interfaces[0]
+        packet = RNS.Packet(None, raw)
+        packet.unpack()
+        packet.receiving_interface = interface
+        packet.hops += 1
+        return packet
+
+    def check_receipts(self):
+        RNS.Transport.receipts_last_checked = 0
+        RNS.Transport.jobs()
+
+    def cleanup(self):
+        for name in self.saved:
+            setattr(RNS.Transport, name, self.saved[name])
+
+        RNS.Transport.identity = self.saved_identity
+        RNS.Transport.owner    = self.saved_owner
+        RNS.Reticulum._Reticulum__transport_enabled = self.saved_transport
+        RNS.Transport.cache_last_cleaned = self.saved_cleaned
+
+    def __exit__(self, __exc_type: typing.Type[BaseException], __exc_value: BaseException,
+                 __traceback: types.TracebackType) -> bool:
+        self.cleanup()
+        return False
+
+
+class TestTransport(unittest.TestCase):
+    def setUp(self):
+        print("")
+
+    def test_00_concurrent_forwarding(self):
+        feeders     = 4
+        per_feeder  = 5000
+        path_count  = 20000
+
+        with TransportHarness(interface_count=feeders+1) as h:
+            destination_hashes = h.add_paths(path_count)
+            outbound_interface = h.interfaces[-1]
+            frames = []
+            for f in range(feeders):
+                frames.append([h.transport_packet(destination_hashes[(f*per_feeder+i)%path_count], os.urandom(64)) for i in range(per_feeder)])
+
+            # Keep the table maintenance loop busy for the
+            # duration of the test, while the feeders push
+            # packets through inbound concurrently.
+            running = True
+            job_runs = 0
+            def job_loop():
+                nonlocal job_runs
+                while running:
+                    RNS.Transport.tables_last_culled = 0
+                    RNS.Transport.jobs()
+                    if RNS.Transport.tables_last_culled != 0: job_runs += 1
+                    time.sleep(0.001)
+
+            def feed(interface, packets):
+                for raw in packets:
+                    RNS.Transport.inbound(raw, interface)
+
+            job_thread = threading.Thread(target=job_loop, daemon=True)
+            job_thread.start()
+
+            feeder_threads = []
+            started = time.time()
+            for f in range(feeders):
+                feeder_threads.append(threading.Thread(target=feed, args=(h.interfaces[f], frames[f]), daemon=True))
+            for thread in feeder_threads: thread.start()
+            for thread in feeder_threads: thread.join()
+            elapsed = time.time() - started
+
+            running = False
+            job_thread.join()
+
+            total = feeders*per_feeder
+            print("Forwarded "+str(outbound_interface.tx_count)+" of "+str(total)+" packets from "+str(feeders)+" interfaces in "+RNS.prettytime(elapsed)+", "+str(round(total/elapsed))+" packets/s, "+str(job_runs)+" table maintenance runs")
+
+            self.assertEqual(outbound_interface.tx_count, total)
+            self.assertEqual(len(RNS.Transport.path_table), path_count)
+            self.assertEqual(len(RNS.Transport.reverse_table), total)
+
+    def test_01_ifac_mask_identity(self):
+        for ifac_size in [1, 8, 16, 64]:
+            for length in [3, 19, 83, 500, 1064, 4096]:
+                raw  = os.urandom(length)
+                mask = os.urandom(length)
+                masked = RNS.Transport.ifac_mask(raw, mask, ifac_size)
+                masked = bytes([masked[0] | 0x80])+masked[1:]
+                self.assertEqual(masked, legacy_ifac_mask(raw, mask, ifac_size))
+                self.assertEqual(RNS.Transport.ifac_mask(raw, mask, ifac_size), legacy_ifac_unmask(raw, mask, ifac_size))
+
+                # Masks longer than the packet must be accepted
+                longer_mask = mask+os.urandom(ifac_size)
+                self.assertEqual(RNS.Transport.ifac_mask(raw, longer_mask, ifac_size), legacy_ifac_unmask(raw, mask, ifac_size))
+
+    def test_02_ifac_round_trip(self):
+        ifac_key = RNS.Cryptography.hkdf(length=64, derive_from=RNS.Identity.full_hash(b"testnetwork"), salt=RNS.Reticulum.IFAC_SALT, context=None)
+        with TransportHarness(interface_count=3) as h:
+            destination_hashes = h.add_paths(8, interface=h.interfaces[2])
+            for interface in h.interfaces: interface.enable_ifac(ifac_key)
+
+            for destination_hash in destination_hashes:
+                raw = h.transport_packet(destination_hash, os.urandom(383))
+                RNS.Transport.transmit(h.interfaces[0], raw)
+                masked = h.interfaces[0].last_tx
+                self.assertEqual(masked[0] & 0x80, 0x80)
+                self.assertEqual(len(masked), len(raw)+h.interfaces[0].ifac_size)
+
+                tx_count = h.interfaces[2].tx_count
+                RNS.Transport.inbound(masked, h.interfaces[1])
+                self.assertEqual(h.interfaces[2].tx_count, tx_count+1)
+
+                # A packet with a corrupted payload must be dropped
+                corrupted = masked[:-1]+bytes([masked[-1] ^ 0x01])
+                RNS.Transport.inbound(corrupted, h.interfaces[1])
+                self.assertEqual(h.interfaces[2].tx_count, tx_count+1)
+
+            engine = h.interfaces[1].ifac_engine
+            self.assertEqual(h.interfaces[0].ifac_engine.masked_packets, len(destination_hashes))
+            self.assertEqual(engine.unmasked_packets, len(destination_hashes))
+            self.assertEqual(engine.dropped_packets, len(destination_hashes))
+            self.assertTrue(engine.unmask_time > 0)
+
+    def test_03_ifac_mask_performance(self):
+        ifac_size = 16
+        rounds    = 32
+        for length in [500, 1064, 8192, 65536, 262144, 524288]:
+            raw  = os.urandom(length)
+            mask = os.urandom(length)
+
+            started = time.time()
+            for i in range(rounds): RNS.Transport.ifac_mask(raw, mask, ifac_size)
+            vectorised = (time.time()-started)/rounds
+            msg = "IFAC masking of "+RNS.prettysize(length)+" takes "+str(round(vectorised*1e6, 1))+" µs, "+RNS.prettyspeed(length*8/vectorised)
+
+            # The byte-by-byte implementation is quadratic
+            # in the packet size, so only compare it on
+            # smaller packets
+            if length <= 8192:
+                started = time.time()
+                legacy_ifac_unmask(raw, mask, ifac_size)
+                legacy = time.time()-started
+                msg += ", "+str(round(legacy/vectorised))+"x faster than byte-wise masking"
+
+            print(msg)
+
+    def test_04_ifac_engine(self):
+        ifac_key = RNS.Cryptography.hkdf(length=64, derive_from=RNS.Identity.full_hash(b"testnetwork"), salt=RNS.Reticulum.IFAC_SALT, context=None)
+        interface = TestInterface("ifac")
+        interface.enable_ifac(ifac_key, ifac_size=8)
+        engine = interface.get_ifac_engine()
+        self.assertIs(interface.get_ifac_engine(), engine)
+
+        for length in [3, 83, 500]:
+            raw = bytes([os.urandom(1)[0] & 0x7f])+os.urandom(length-1)
+            ifac = interface.ifac_identity.sign(raw)[-interface.ifac_size:]
+            mask = RNS.Cryptography.hkdf(length=length+interface.ifac_size, derive_from=ifac, salt=ifac_key, context=None)
+            expected = legacy_ifac_mask(bytes([raw[0] | 0x80, raw[1]])+ifac+raw[2:], mask, interface.ifac_size)
+            self.assertEqual(engine.mask(raw), expected)
+            self.assertEqual(engine.unmask(expected), raw)
+
+        # Changing the IFAC parameters must replace the engine
+        interface.enable_ifac(ifac_key, ifac_size=16)
+        self.assertIsNot(interface.get_ifac_engine(), engine)
+
+        rounds = 200
+        salted_hkdf = RNS.Cryptography.SaltedHKDF(salt=ifac_key)
+        engine = interface.get_ifac_engine()
+        for length in [500, 8192, 65536]:
+            raw = bytes([0x00])+os.urandom(length-1)
+            derive_from = os.urandom(16)
+            self.assertEqual(salted_hkdf.derive(length=length, derive_from=derive_from), RNS.Cryptography.hkdf(length=length, derive_from=derive_from, salt=ifac_key))
+
+            started = time.time()
+            for i in range(rounds): salted_hkdf.derive(length=length, derive_from=derive_from)
+            mask_generation = (time.time()-started)/rounds
+
+            started = time.time()
+            for i in range(rounds//10): engine.mask(raw)
+            masking = (time.time()-started)/(rounds//10)
+
+            print("IFAC for "+RNS.prettysize(length)+" takes "+str(round(masking*1e3, 2))+" ms per packet, of which "+str(round(mask_generation*1e3, 2))+" ms is mask generation")
+
+    def test_05_link_indexes(self):
+        with TransportHarness() as h:
+            pending = h.add_links(4, initiator=True)
+            active  = h.add_links(4)
+            self.assertEqual(len(RNS.Transport.pending_links_map), 4)
+            self.assertEqual(len(RNS.Transport.active_links_map), 4)
+
+            pending[0].status = RNS.Link.ACTIVE
+            RNS.Transport.activate_link(pending[0])
+            self.assertNotIn(pending[0].link_id, RNS.Transport.pending_links_map)
+            self.assertIs(RNS.Transport.active_links_map[pending[0].link_id], pending[0])
+            self.assertEqual(RNS.Transport.pending_links, pending[1:])
+
+            # Closed links are removed from both the lists
+            # and the indexes by the job loop
+            active[1].status = RNS.Link.CLOSED
+            pending[1].status = RNS.Link.CLOSED
+            RNS.Transport.links_last_checked = 0
+            RNS.Transport.jobs()
+            self.assertNotIn(active[1], RNS.Transport.active_links)
+            self.assertNotIn(active[1].link_id, RNS.Transport.active_links_map)
+            self.assertNotIn(pending[1].link_id, RNS.Transport.pending_links_map)
+            self.assertEqual(len(RNS.Transport.active_links), len(RNS.Transport.active_links_map))
+            self.assertEqual(len(RNS.Transport.pending_links), len(RNS.Transport.pending_links_map))
+
+            RNS.Transport.inbound(h.link_packet(active[0].link_id, os.urandom(32)), h.interfaces[0])
+            RNS.Transport.inbound(h.link_packet(active[1].link_id, os.urandom(32)), h.interfaces[0])
+            self.assertEqual(active[0].rx_count, 1)
+            self.assertEqual(active[1].rx_count, 0)
+
+            destination = RNS.Destination(RNS.Identity(), RNS.Destination.IN, RNS.Destination.SINGLE, "transporttest", "index")
+            self.assertIs(RNS.Transport.destinations_map[destination.hash], destination)
+            self.assertRaises(KeyError, RNS.Transport.register_destination, destination)
+            RNS.Transport.deregister_destination(destination)
+            self.assertNotIn(destination.hash, RNS.Transport.destinations_map)
+
+    def test_06_link_dispatch_performance(self):
+        packet_count = 10000
+        for link_count in [10, 100, 1000, 10000, 50000]:
+            with TransportHarness(transport_enabled=False) as h:
+                links   = h.add_links(link_count)
+                frames  = [h.link_packet(links[i%link_count].link_id, os.urandom(64)) for i in range(packet_count)]
+                started = time.time()
+                for raw in frames: RNS.Transport.inbound(raw, h.interfaces[0])
+                elapsed = time.time()-started
+
+                self.assertEqual(sum(link.rx_count for link in links), packet_count)
+                print("Dispatched "+str(packet_count)+" packets to "+str(link_count)+" links in "+RNS.prettytime(elapsed)+", "+str(round(packet_count/elapsed))+" packets/s")
+
+    def test_07_receipt_timeouts(self):
+        with TransportHarness() as h:
+            saved_max_receipts = RNS.Transport.MAX_RECEIPTS
+            try:
+                RNS.Transport.MAX_RECEIPTS = 100000
+                expired   = h.add_receipts(100, timeout=0)
+                extended  = h.add_receipts(10, timeout=0)
+                shortened = h.add_receipts(10, timeout=3600)
+                pending   = h.add_receipts(1000, timeout=3600)
+                for receipt in extended:  receipt.set_timeout(3600)
+                for receipt in shortened: receipt.set_timeout(0)
+
+                time.sleep(0.01)
+                h.check_receipts()
+                self.assertTrue(all(r.status == RNS.PacketReceipt.FAILED for r in expired+shortened))
+                self.assertTrue(all(r.status == RNS.PacketReceipt.SENT for r in extended+pending))
+                self.assertEqual(len(RNS.Transport.receipts), len(extended)+len(pending))
+
+                # Receipts above the maximum are culled oldest first
+                RNS.Transport.MAX_RECEIPTS = len(pending)
+                h.check_receipts()
+                self.assertTrue(all(r.status == RNS.PacketReceipt.CULLED for r in extended))
+                self.assertTrue(all(r.status == RNS.PacketReceipt.SENT for r in pending))
+                self.assertEqual(list(RNS.Transport.receipts.values()), pending)
+
+                # Explicit and implicit proofs are matched to their receipts
+                RNS.Transport.inbound(h.proof_packet(pending[0], explicit=True), h.interfaces[0])
+                RNS.Transport.inbound(h.proof_packet(pending[1], explicit=False), h.interfaces[0])
+                self.assertEqual(pending[0].status, RNS.PacketReceipt.DELIVERED)
+                self.assertEqual(pending[1].status, RNS.PacketReceipt.DELIVERED)
+                self.assertEqual(pending[2].status, RNS.PacketReceipt.SENT)
+                self.assertNotIn(pending[0].truncated_hash, RNS.Transport.receipts)
+                self.assertNotIn(pending[1].truncated_hash, RNS.Transport.receipts)
+
+            finally:
+                RNS.Transport.MAX_RECEIPTS = saved_max_receipts
+
+    def test_08_receipt_performance(self):
+        saved_max_receipts = RNS.Transport.MAX_RECEIPTS
+        try:
+            for receipt_count in [1000, 10000, 100000]:
+                with TransportHarness() as h:
+                    RNS.Transport.MAX_RECEIPTS = receipt_count
+                    receipts = h.add_receipts(receipt_count, timeout=3600)
+                    proofs = [h.proof_packet(receipts[i]) for i in range(0, receipt_count, receipt_count//1000)]
+
+                    started = time.time()
+                    for i in range(10): h.check_receipts()
+                    check_time = (time.time()-started)/10
+
+                    started = time.time()
+                    for raw in proofs: RNS.Transport.inbound(raw, h.interfaces[0])
+                    proof_time = (time.time()-started)/len(proofs)
+
+                    self.assertEqual(len(RNS.Transport.receipts), receipt_count-len(proofs))
+                    print("With "+str(receipt_count)+" outstanding receipts, a timeout check takes "+str(round(check_time*1e3, 3))+" ms and proof matching "+str(round(proof_time*1e6, 1))+" µs per proof")
+
+        finally:
+            RNS.Transport.MAX_RECEIPTS = saved_max_receipts
+
+    def test_09_compact_hashlist(self):
+        capacity = 20000
+        hashlist = RNS.CompactHashlist.CompactHashlist(capacity)
+        added    = [RNS.Identity.full_hash(os.urandom(16)) for i in range(capacity-1)]
+        for packet_hash in added: hashlist.add(packet_hash)
+        self.assertEqual(len(hashlist), len(added))
+        self.assertEqual(hashlist.evictions, 0)
+        self.assertTrue(all(packet_hash in hashlist for packet_hash in added))
+
+        # Measure the false-positive rate with both generations
+        # filled, using a rate high enough to be observable
+        lossy_hashlist = RNS.CompactHashlist.CompactHashlist(capacity, fp_rate=1e-3)
+        for i in range(2*capacity-1): lossy_hashlist.add(RNS.Identity.full_hash(os.urandom(16)))
+        false_positives = 0
+        probes = 100000
+        for i in range(probes):
+            if RNS.Identity.full_hash(os.urandom(16)) in lossy_hashlist: false_positives += 1
+        self.assertTrue(false_positives/probes <= 1e-3)
+
+        hashlist.remove(added[0])
+        self.assertNotIn(added[0], hashlist)
+        self.assertRaises(KeyError, hashlist.remove, added[0])
+
+        # Filling the current generation rotates it, and
+        # entries in the previous generation are still held
+        hashlist.add(added[0])
+        hashlist.add(RNS.Identity.full_hash(os.urandom(16)))
+        self.assertEqual(hashlist.rotations, 1)
+        self.assertEqual(hashlist.previous_count, capacity)
+        hashlist.add(RNS.Identity.full_hash(os.urandom(16)))
+        self.assertEqual(hashlist.current_count, 1)
+        self.assertTrue(all(packet_hash in hashlist for packet_hash in added))
+
+        with tempfile.TemporaryDirectory() as storagepath:
+            hashlist_path = storagepath+"/packet_hashlist"
+            hashlist.to_file(hashlist_path)
+            self.assertEqual(os.path.getsize(hashlist_path), RNS.CompactHashlist.CompactHashlist.HEADER_SIZE+hashlist.memory_usage())
+            with open(hashlist_path, "rb") as file: data = file.read()
+
+            loaded = RNS.CompactHashlist.CompactHashlist(capacity)
+            self.assertTrue(loaded.load(data))
+            self.assertEqual(len(loaded), len(hashlist))
+            self.assertTrue(all(packet_hash in loaded for packet_hash in added))
+
+            # Data written with different parameters is not loaded
+            self.assertFalse(RNS.CompactHashlist.CompactHashlist(capacity, fp_rate=1e-3).load(data))
+            self.assertRaises(ValueError, loaded.load, b"\x90")
+
+    def test_10_compact_hashlist_filtering(self):
+        with TransportHarness() as h:
+            saved_compact = RNS.Transport.hashlist_compact
+            try:
+                RNS.Transport.hashlist_compact = True
+                RNS.Transport.packet_hashlist  = RNS.CompactHashlist.CompactHashlist(1000)
+                destination_hashes = h.add_paths(1)
+                outbound_interface = h.interfaces[-1]
+                raw = h.transport_packet(destination_hashes[0], os.urandom(64))
+                RNS.Transport.inbound(raw, h.interfaces[0])
+                RNS.Transport.inbound(raw, h.interfaces[0])
+                self.assertEqual(outbound_interface.tx_count, 1)
+                self.assertEqual(len(RNS.Transport.packet_hashlist), 1)
+
+                stats = RNS.Transport.get_packet_hashlist_stats()
+                self.assertTrue(stats["compact"])
+                self.assertEqual(stats["entries"], 1)
+
+            finally:
+                RNS.Transport.hashlist_compact = saved_compact
+
+    def test_11_compact_hashlist_memory(self):
+        entries = 250000
+        hashes  = [RNS.Identity.full_hash(os.urandom(16)) for i in range(entries)]
+        with TransportHarness():
+            started = time.time()
+            for packet_hash in hashes: RNS.Transport.packet_hashlist.add(packet_hash)
+            for packet_hash in hashes: packet_hash in RNS.Transport.packet_hashlist
+            set_time = time.time()-started
+            set_memory = RNS.Transport.get_packet_hashlist_stats()["memory"]
+
+        hashlist = RNS.CompactHashlist.CompactHashlist(entries)
+        started  = time.time()
+        for packet_hash in hashes: hashlist.add(packet_hash)
+        for packet_hash in hashes: packet_hash in hashlist
+        compact_time = time.time()-started
+        compact_memory = hashlist.memory_usage()
+
+        self.assertTrue(compact_memory < set_memory)
+        print("Holding "+str(entries)+" packet hashes takes "+RNS.prettysize(set_memory)+" in a set and "+RNS.prettysize(compact_memory)+" in a compact hashlist with "+str(hashlist.fp_size)+"-byte fingerprints")
+        print("Adding and looking up hashes takes "+str(round(set_time/entries*1e6, 2))+" µs per hash for a set and "+str(round(compact_time/entries*1e6, 2))+" µs for a compact hashlist")
+
+    def test_12_announce_signature_cache(self):
+        with TransportHarness():
+            id1 = RNS.Identity()
+            destination = RNS.Destination(id1, RNS.Destination.IN, RNS.Destination.SINGLE, "unittest", "announce", "cache")
+            announce = destination.announce(app_data=b"cached", send=False)
+            announce.pack()
+            RNS.Transport.deregister_destination(destination)
+
+            def received_announce(raw):
+                packet = RNS.Packet(None, raw)
+                packet.unpack()
+                return packet
+
+            RNS.Identity.announce_cache.clear()
+            RNS.Identity.announce_cache_hits = 0
+            RNS.Identity.announce_cache_misses = 0
+
+            self.assertTrue(RNS.Identity.validate_announce(received_announce(announce.raw)))
+            self.assertEqual(RNS.Identity.get_announce_cache_stats(), {"entries": 1, "hits": 0, "misses": 1})
+            self.assertTrue(RNS.Identity.validate_announce(received_announce(announce.raw), only_validate_signature=True))
+            self.assertEqual(RNS.Identity.get_announce_cache_stats(), {"entries": 1, "hits": 1, "misses": 1})
+            self.assertEqual(RNS.Identity.recall_app_data(destination.hash), b"cached")
+
+            # A tampered signature must be rejected, and the
+            # negative result must be cached as well.
+            tampered = bytearray(announce.raw)
+            tampered[-len(b"cached")-1] ^= 0xFF
+            self.assertFalse(RNS.Identity.validate_announce(received_announce(bytes(tampered))))
+            self.assertFalse(RNS.Identity.validate_announce(received_announce(bytes(tampered))))
+            self.assertEqual(RNS.Identity.get_announce_cache_stats(), {"entries": 2, "hits": 2, "misses": 2})
+
+            # The cache is bounded, and evicts least recently
+            # used entries first.
+            cache_size = RNS.Identity.ANNOUNCE_CACHE_SIZE
+            try:
+                RNS.Identity.ANNOUNCE_CACHE_SIZE = 2
+                self.assertTrue(RNS.Identity.validate_announce(received_announce(announce.raw)))
+                other = destination.announce(app_data=b"other", send=False)
+                other.pack()
+                self.assertTrue(RNS.Identity.validate_announce(received_announce(other.raw)))
+                self.assertEqual(len(RNS.Identity.announce_cache), 2)
+                self.assertFalse(RNS.Identity.validate_announce(received_announce(bytes(tampered))))
+                self.assertEqual(RNS.Identity.announce_cache_misses, 4)
+            finally:
+                RNS.Identity.ANNOUNCE_CACHE_SIZE = cache_size
+
+            rounds = 50
+            start = time.time()
+            for n in range(rounds):
+                RNS.Identity.announce_cache.clear()
+                RNS.Identity.validate_announce(received_announce(announce.raw), only_validate_signature=True)
+            uncached_time = (time.time()-start)/rounds
+
+            start = time.time()
+            for n in range(rounds):
+                RNS.Identity.validate_announce(received_announce(announce.raw), only_validate_signature=True)
+            cached_time = (time.time()-start)/rounds
+
+            print("Announce signature validation uncached: "+str(round(uncached_time*1000*1000, 1))+"µs, cached: "+str(round(cached_time*1000*1000, 1))+"µs")
+
+    def test_13_announce_validation_pipeline(self):
+        with TransportHarness() as harness:
+            announces = harness.announce_packets(8, app_data=b"pipeline")
+            tampered  = bytearray(announces[-1])
+            tampered[-len(b"pipeline")-1] ^= 0xFF
+            RNS.Identity.announce_cache.clear()
+
+            # Signatures are verified once per batch, even if the
+            # same announce was received from several neighbours,
+            # and announces are processed in the order received.
+            processed = []
+            validator = RNS.AnnounceValidator.AnnounceValidator(processed.append, workers=2, batch_size=16, queue_depth=4)
+            validator.executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+            batch = [harness.received_announce(raw) for raw in announces[:3]]
+            batch.append(harness.received_announce(announces[0], interface=harness.interfaces[1]))
+            batch.append(harness.received_announce(bytes(tampered)))
+            validator.process_batch(batch)
+            validator.stop()
+
+            self.assertEqual(processed, batch)
+            self.assertEqual(validator.verified, 4)
+            self.assertEqual(validator.invalid, 1)
+            self.assertEqual(len(RNS.Identity.announce_cache), 4)
+            hits = RNS.Identity.announce_cache_hits
+            self.assertTrue(RNS.Identity.validate_announce(batch[0], only_validate_signature=True))
+            self.assertFalse(RNS.Identity.validate_announce(batch[-1], only_validate_signature=True))
+            self.assertEqual(RNS.Identity.announce_cache_hits, hits+2)
+
+            # Announces beyond the queue depth are dropped
+            for raw in announces: validator.submit(harness.received_announce(raw))
+            self.assertEqual(validator.received, 4)
+            self.assertEqual(validator.dropped, len(announces)-4)
+
+            # With a running validator, inbound announces are queued
+            # and path table updates are applied by the dispatcher.
+            saved_cachepath = RNS.Reticulum.cachepath
+            with tempfile.TemporaryDirectory() as cachepath:
+                try:
+                    RNS.Reticulum.cachepath = cachepath
+                    os.makedirs(os.path.join(cachepath, "announces"))
+                    RNS.Transport.announce_validator = RNS.AnnounceValidator.AnnounceValidator(RNS.Transport.inbound_packet, workers=2, batch_size=4)
+                    RNS.Transport.announce_validator.start()
+                    for raw in announces[3:6]: RNS.Transport.inbound(raw, harness.interfaces[0])
+
+                    deadline = time.time()+30
+                    while RNS.Transport.announce_validator.processed < 3 and time.time() < deadline: time.sleep(0.05)
+                    stats = RNS.Transport.get_announce_validation_stats()
+                    self.assertEqual(stats["processed"], 3)
+                    self.assertEqual(stats["dropped"], 0)
+                    self.assertEqual(len(RNS.Transport.path_table), 3)
+
+                finally:
+                    RNS.Transport.announce_validator.stop()
+                    RNS.Transport.announce_validator = None
+                    RNS.Reticulum.cachepath = saved_cachepath
+
+            # Stopping waits for the batch in progress, and
+            # no announces are handled after it returns
+            handled = []
+            def slow_handler(packet):
+                time.sleep(0.1)
+                handled.append(packet)
+
+            validator = RNS.AnnounceValidator.AnnounceValidator(slow_handler, workers=1, batch_size=2)
+            validator.start()
+            for raw in announces[:6]: validator.submit(harness.received_announce(raw))
+            deadline = time.time()+30
+            while len(handled) == 0 and time.time() < deadline: time.sleep(0.01)
+            validator.stop()
+            stopped_count = len(handled)
+            time.sleep(0.5)
+            self.assertEqual(len(handled), stopped_count)
+
+    def test_14_announce_validation_throughput(self):
+        count = 96
+        with TransportHarness() as harness:
+            announces = harness.announce_packets(count)
+
+            RNS.Identity.announce_cache.clear()
+            started = time.time()
+            for raw in announces: RNS.Identity.validate_announce(harness.received_announce(raw), only_validate_signature=True)
+            serial_rate = count/(time.time()-started)
+
+            RNS.Identity.announce_cache.clear()
+            processed = []
+            validator = RNS.AnnounceValidator.AnnounceValidator(processed.append, workers=4, batch_size=32, queue_depth=count)
+            validator.start()
+            try:
+                started = time.time()
+                for raw in announces: validator.submit(harness.received_announce(raw))
+                while len(processed) < count and time.time() < started+60: time.sleep(0.01)
+                batched_rate = count/(time.time()-started)
+
+            finally:
+                validator.stop()
+
+            self.assertEqual(len(processed), count)
+            self.assertEqual(validator.invalid, 0)
+            print("Validating "+str(count)+" announces serially: "+str(round(serial_rate, 1))+"/s, in batches on "+str(validator.workers)+" "+validator.pool_type+" workers: "+str(round(batched_rate, 1))+"/s")
+
+    def test_15_announce_rebroadcast(self):
+        with TransportHarness() as harness:
+            raw    = harness.announce_packets(1, app_data=b"rebroadcast")[0]
+            packet = harness.received_announce(raw, interface=harness.interfaces[0])
+            RNS.Transport.announce_table[packet.destination_hash] = [time.time(), 0, 0, harness.interfaces[0], packet.hops, packet, 0, False, None]
+
+            # Rebroadcasts are re-emitted from the stored announce,
+            # without recalling the identity or building a Destination
+            recall = RNS.Identity.recall
+            def failing_recall(*args, **kwargs):
+                raise AssertionError("Identity recalled for announce rebroadcast")
+
+            try:
+                RNS.Identity.recall = failing_recall
+                RNS.Transport.announces_last_checked = 0
+                RNS.Transport.jobs()
+            finally:
+                RNS.Identity.recall = recall
+
+            flags    = (RNS.Packet.HEADER_2 << 6) | (packet.context_flag << 5) | (RNS.Transport.TRANSPORT << 4) | (RNS.Destination.SINGLE << 2) | RNS.Packet.ANNOUNCE
+            expected = bytes([flags, packet.hops]) + RNS.Transport.identity.hash + packet.destination_hash + bytes([RNS.Packet.NONE]) + packet.data
+            for interface in harness.interfaces: self.assertEqual(interface.last_tx, expected)
+            self.assertEqual(RNS.Transport.announce_table[packet.destination_hash][2], 1)
+
+    def test_16_ratchet_decryption(self):
+        with TransportHarness(), tempfile.TemporaryDirectory() as storagepath:
+            identity    = RNS.Identity()
+            destination = RNS.Destination(identity, RNS.Destination.IN, RNS.Destination.SINGLE, "unittest", "ratchets")
+            destination.enable_ratchets(storagepath+"/ratchets")
+            destination.ratchets = [RNS.Identity._generate_ratchet() for i in range(64)]
+
+            sender = RNS.Identity(create_keys=False)
+            sender.load_public_key(identity.get_public_key())
+            def encrypt_to(ratchet):
+                if ratchet == None: return sender.encrypt(b"ratchet test")
+                else:               return sender.encrypt(b"ratchet test", ratchet=RNS.Identity._ratchet_public_bytes(ratchet))
+
+            # The first packet to an older ratchet has to try all
+            # newer ratchets first
+            ratchet = destination.ratchets[40]
+            self.assertEqual(destination.decrypt(encrypt_to(ratchet)), b"ratchet test")
+            self.assertEqual(destination.latest_ratchet_id, RNS.Identity._get_ratchet_id(RNS.Identity._ratchet_public_bytes(ratchet)))
+            self.assertEqual(destination.get_ratchet_stats()["trials"], 41)
+
+            # After which the ratchet is tried first
+            token = encrypt_to(ratchet)
+            self.assertEqual(destination.decrypt(token), b"ratchet test")
+            self.assertEqual(destination.get_ratchet_stats()["trials"], 42)
+
+            # Retransmitted packets are resolved from their ephemeral key
+            destination.ratchets.insert(0, RNS.Identity._generate_ratchet())
+            self.assertEqual(destination.decrypt(token), b"ratchet test")
+            stats = destination.get_ratchet_stats()
+            self.assertEqual(stats["trials"], 43)
+            self.assertEqual(stats["cache_hits"], 1)
+            self.assertEqual(stats["ratchets"], 65)
+
+            # The rotated-in ratchet was placed first, and then the
+            # ratchet in use moved ahead of it again, so both are
+            # now resolved within two trials
+            self.assertEqual(destination.decrypt(encrypt_to(destination.ratchets[0])), b"ratchet test")
+            self.assertEqual(destination.get_ratchet_stats()["trials"], 45)
+            self.assertEqual(destination.decrypt(encrypt_to(ratchet)), b"ratchet test")
+            self.assertEqual(destination.get_ratchet_stats()["trials"], 47)
+
+            # Packets encrypted to the identity key still decrypt
+            self.assertEqual(destination.decrypt(encrypt_to(None)), b"ratchet test")
+            self.assertEqual(destination.latest_ratchet_id, None)
+            stats = destination.get_ratchet_stats()
+            self.assertEqual(stats["unmatched"], 1)
+            self.assertEqual(stats["max_trials"], 65)
+            self.assertEqual(stats["decryptions"], 5)
+
+            rounds = 5
+            tokens = [encrypt_to(ratchet) for i in range(rounds)]
+            started = time.time()
+            for token in tokens: identity.decrypt(token, ratchets=destination.ratchets)
+            list_time = (time.time()-started)/rounds
+
+            started = time.time()
+            for token in tokens: destination.decrypt(token)
+            keyring_time = (time.time()-started)/rounds
+
+            position = destination.ratchets.index(ratchet)
+            print("Decrypting for ratchet "+str(position)+" of "+str(len(destination.ratchets))+" takes "+str(round(list_time*1000, 1))+"ms trying ratchets in order, "+str(round(keyring_time*1000, 1))+"ms with the keyring")
+            RNS.Transport.deregister_destination(destination)
+
+    def test_17_lazy_unpack_forwarding(self):
+        with TransportHarness() as h:
+            DST_LEN = RNS.Reticulum.TRUNCATED_HASHLENGTH//8
+            destination_hash = h.add_paths(1, hops=2)[0]
+            next_hop = RNS.Transport.path_table[destination_hash][1]
+            payload  = os.urandom(200)
+            raw      = h.transport_packet(destination_hash, payload)
+
+            # Packet data and hash are extracted from raw on use
+            packet = RNS.Packet(None, raw)
+            self.assertTrue(packet.unpack())
+            self.assertEqual(packet.destination_hash, destination_hash)
+            self.assertEqual(packet.transport_id, RNS.Transport.identity.hash)
+            self.assertEqual(packet.data, payload)
+            self.assertEqual(packet.packet_hash, RNS.Identity.full_hash(packet.get_hashable_part()))
+            self.assertEqual(packet.getTruncatedHash(), RNS.Identity.truncated_hash(packet.get_hashable_part()))
+            self.assertFalse(RNS.Packet(None, raw[:DST_LEN+2]).unpack())
+
+            # Forwarded packets get the hop count and next hop
+            # rewritten, and are otherwise passed on unchanged
+            RNS.Transport.inbound(raw, h.interfaces[0])
+            forwarded = h.interfaces[-1].last_tx
+            self.assertEqual(bytes(forwarded), raw[:1]+bytes([2])+next_hop+raw[DST_LEN+2:])
+            self.assertTrue(packet.packet_hash[:DST_LEN] in RNS.Transport.reverse_table)
+
+            # On the last hop, transport headers are stripped
+            RNS.Transport.path_table[destination_hash][2] = 1
+            raw = h.transport_packet(destination_hash, os.urandom(200))
+            RNS.Transport.inbound(raw, h.interfaces[0])
+            forwarded = h.interfaces[-1].last_tx
+            flags = (RNS.Packet.HEADER_1 << 6) | (RNS.Transport.BROADCAST << 4) | (raw[0] & 0b00001111)
+            self.assertEqual(bytes(forwarded), bytes([flags, 2])+raw[DST_LEN+2:])
+
+            # Link packets only get the hop count rewritten
+            link_id = RNS.Identity.get_random_hash()[:DST_LEN]
+            RNS.Transport.link_table[link_id] = [time.time(), next_hop, h.interfaces[-1], 2, h.interfaces[0], 1, destination_hash, True, 0]
+            raw = h.link_packet(link_id, os.urandom(200))
+            RNS.Transport.inbound(raw, h.interfaces[0])
+            self.assertEqual(bytes(h.interfaces[-1].last_tx), raw[:1]+bytes([1])+raw[2:])
+
+            destination_hashes = h.add_paths(1000, hops=2)
+            for size in [200, 8000]:
+                count   = 20000
+                frames  = [h.transport_packet(destination_hashes[i%len(destination_hashes)], os.urandom(size)) for i in range(count)]
+                started = time.time()
+                for raw in frames: RNS.Transport.inbound(raw, h.interfaces[0])
+                elapsed = time.time()-started
+                print("Forwarded "+str(count)+" packets with "+str(size)+" byte payloads in "+RNS.prettytime(elapsed)+", "+str(round(count/elapsed))+" packets/s")
+
+    def test_18_inbound_packet_records(self):
+        with TransportHarness() as h:
+            materialised = 0
+            get_packet = InboundPacket.get_packet
+            def counting_get_packet(record):
+                nonlocal materialised
+                materialised += 1
+                return get_packet(record)
+
+            try:
+                InboundPacket.get_packet = counting_get_packet
+
+                # Forwarded packets are routed as records only
+                destination_hashes = h.add_paths(100)
+                for destination_hash in destination_hashes:
+                    RNS.Transport.inbound(h.transport_packet(destination_hash, os.urandom(64)), h.interfaces[0])
+                self.assertEqual(h.interfaces[-1].tx_count, 100)
+                self.assertEqual(materialised, 0)
+
+                # Packets for local destinations are delivered as
+                # full packets, with everything set from the record
+                received = []
+                destination = RNS.Destination(None, RNS.Destination.IN, RNS.Destination.PLAIN, "unittest", "records")
+                destination.set_packet_callback(lambda data, packet: received.append((data, packet)))
+                packet = RNS.Packet(RNS.Destination(None, RNS.Destination.OUT, RNS.Destination.PLAIN, "unittest", "records"), b"local data", create_receipt=False)
+                packet.pack()
+                h.interfaces[0].r_stat_rssi = -80
+                RNS.Transport.inbound(packet.raw, h.interfaces[0])
+                h.interfaces[0].r_stat_rssi = None
+                RNS.Transport.deregister_destination(destination)
+
+                self.assertEqual(materialised, 1)
+                self.assertEqual(len(received), 1)
+                data, delivered = received[0]
+                self.assertEqual(data, b"local data")
+                self.assertTrue(isinstance(delivered, RNS.Packet))
+                self.assertEqual(delivered.packet_hash, packet.packet_hash)
+                self.assertEqual(delivered.receiving_interface, h.interfaces[0])
+                self.assertEqual(delivered.hops, 1)
+                self.assertEqual(delivered.rssi, -80)
+
+            finally:
+                InboundPacket.get_packet = get_packet
+
+            count  = 10000
+            frames = [h.transport_packet(destination_hashes[i%len(destination_hashes)], os.urandom(200)) for i in range(count)]
+            for decoder in [RNS.Packet, InboundPacket]:
+                # Keep the decoded packets alive, so all objects
+                # allocated while decoding them are measured
+                decoded = []
+                tracemalloc.start()
+                before = tracemalloc.take_snapshot()
+                for raw in frames:
+                    packet = decoder(None, raw) if decoder == RNS.Packet else decoder(raw)
+                    packet.unpack()
+                    packet.packet_hash
+                    decoded.append(packet)
+                after = tracemalloc.take_snapshot()
+                tracemalloc.stop()
+
+                blocks = 0; size = 0
+                for stat in after.compare_to(before, "filename"):
+                    blocks += stat.count_diff; size += stat.size_diff
+
+                started = time.time()
+                for raw in frames:
+                    packet = decoder(None, raw) if decoder == RNS.Packet else decoder(raw)
+                    packet.unpack()
+                decode_time = (time.time()-started)/count
+
+                print("Decoding a forwarded packet as "+decoder.__name__+" allocates "+str(round(blocks/count, 1))+" blocks, "+str(round(size/count))+" bytes, and takes "+str(round(decode_time*1e6, 2))+"µs")
+
+    def test_19_inbound_pipeline(self):
+        with TransportHarness() as h:
+            links     = h.add_links(2)
+            announces = h.announce_packets(8)
+            frames    = [h.link_packet(links[0].link_id, os.urandom(32)) for i in range(40)]
+
+            # Announces are queued separately, and each queue
+            # drops packets once it is full
+            processed = []
+            pipeline  = InboundPipeline(lambda raw, interface: processed.append(raw), workers=1, queue_depth=32, announce_queue_depth=4)
+            worker    = pipeline.workers[0]
+            for raw in announces: pipeline.submit(raw, h.interfaces[0])
+            for raw in frames: pipeline.submit(raw, h.interfaces[0])
+            masked = bytes([frames[0][0] | 0x80])+frames[0][1:]
+            self.assertEqual(len(worker.announce_queue), 4)
+            self.assertEqual(len(worker.queue), 32)
+            self.assertEqual(worker.announces_dropped, 4)
+            self.assertEqual(worker.dropped, 8)
+
+            # Other traffic is served first, but an announce is
+            # let through at regular intervals
+            order = []
+            while True:
+                entry = worker.next_entry()
+                if entry == None: break
+                order.append(entry[0] in announces)
+            self.assertEqual(order.index(True), InboundPipeline.ANNOUNCE_INTERVAL)
+            self.assertEqual(order[InboundPipeline.ANNOUNCE_INTERVAL+1:2*InboundPipeline.ANNOUNCE_INTERVAL+1], [False]*InboundPipeline.ANNOUNCE_INTERVAL)
+            self.assertEqual(order.count(True), 4)
+
+            # Packets with access codes can not be classified
+            pipeline.submit(masked, h.interfaces[0])
+            pipeline.submit(bytes([announces[0][0] | 0x80])+announces[0][1:], h.interfaces[0])
+            self.assertEqual(len(worker.queue), 2)
+
+            # With the pipeline running, Transport only queues
+            # packets, and the workers process them in order
+            # for each interface
+            received = [[], []]
+            links[1].attached_interface = h.interfaces[1]
+            links[0].receive = lambda packet: received[0].append(packet.data)
+            links[1].receive = lambda packet: received[1].append(packet.data)
+            try:
+                RNS.Transport.inbound_pipeline = InboundPipeline(RNS.Transport.inbound, workers=2)
+                RNS.Transport.inbound_pipeline.start()
+                sent = [[], []]
+                for i in range(500):
+                    for j in range(2):
+                        payload = os.urandom(32)
+                        sent[j].append(payload)
+                        RNS.Transport.inbound(h.link_packet(links[j].link_id, payload), h.interfaces[j])
+
+                deadline = time.time()+30
+                while len(received[0])+len(received[1]) < 1000 and time.time() < deadline: time.sleep(0.01)
+                self.assertEqual(received, sent)
+
+                stats = RNS.Transport.get_inbound_pipeline_stats()
+                self.assertEqual(stats["workers"], 2)
+                self.assertEqual(stats["received"], 1000)
+                self.assertEqual(stats["processed"], 1000)
+                self.assertEqual(stats["queued"], 0)
+                self.assertEqual(stats["dropped"], 0)
+
+            finally:
+                RNS.Transport.inbound_pipeline.stop()
+                RNS.Transport.inbound_pipeline = None
+
+    def test_20_inbound_pipeline_latency(self):
+        # Link traffic that arrives right behind a burst of
+        # announces is held up by announce validation, unless
+        # the pipeline lets it through first
+        with TransportHarness() as h:
+            links     = h.add_links(1)
+            announces = h.announce_packets(40)
+            frames    = [h.link_packet(links[0].link_id, os.urandom(32)) for i in range(100)]
+            delivered = []
+            links[0].receive = lambda packet: delivered.append(time.time())
+
+            saved_cachepath = RNS.Reticulum.cachepath
+            with tempfile.TemporaryDirectory() as cachepath:
+                try:
+                    RNS.Reticulum.cachepath = cachepath
+                    os.makedirs(os.path.join(cachepath, "announces"))
+                    results = {}
+                    for mode in ["inline", "pipeline"]:
+                        RNS.Transport.path_table.clear()
+                        RNS.Transport.announce_table.clear()
+                        RNS.Transport.packet_hashlist.clear()
+                        RNS.Transport.packet_hashlist_prev.clear()
+                        RNS.Identity.announce_cache.clear()
+                        delivered.clear()
+                        if mode == "pipeline":
+                            RNS.Transport.inbound_pipeline = InboundPipeline(RNS.Transport.inbound, workers=1)
+                            RNS.Transport.inbound_pipeline.start()
+
+                        started = time.time()
+                        for raw in announces: RNS.Transport.inbound(raw, h.interfaces[0])
+                        for raw in frames: RNS.Transport.inbound(raw, h.interfaces[0])
+                        io_time = time.time()-started
+
+                        deadline = time.time()+60
+                        while (len(delivered) < len(frames) or len(RNS.Transport.path_table) < len(announces)) and time.time() < deadline: time.sleep(0.01)
+                        self.assertEqual(len(delivered), len(frames))
+                        self.assertEqual(len(RNS.Transport.path_table), len(announces))
+                        results[mode] = (io_time, delivered[-1]-started)
+
+                        if RNS.Transport.inbound_pipeline != None:
+                            RNS.Transport.inbound_pipeline.stop()
+                            RNS.Transport.inbound_pipeline = None
+
+                finally:
+                    if RNS.Transport.inbound_pipeline != None:
+                        RNS.Transport.inbound_pipeline.stop()
+                        RNS.Transport.inbound_pipeline = None
+                    RNS.Reticulum.cachepath = saved_cachepath
+
+            for mode in results:
+                io_time, latency = results[mode]
+                print("Receiving "+str(len(announces))+" announces followed by "+str(len(frames))+" link packets "+mode+": receiving thread busy for "+RNS.prettyshorttime(io_time)+", link packets delivered after "+RNS.prettyshorttime(latency))
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)